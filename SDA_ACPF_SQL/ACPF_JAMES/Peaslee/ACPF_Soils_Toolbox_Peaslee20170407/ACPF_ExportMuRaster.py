@@ -479,6 +479,13 @@ def ConvertToRaster(muPolygon, rasterName):
         # 'illegal' names.
         outputRaster = outputRaster.replace("-", "")
 
+        # Tiled GeoTIFF beside the geodatabase, with statistics, overviews and
+        # attribute table written in the same pass as the cells
+        bTiff = mu_raster.NATIVE and mu_tiff.GEOTIFF
+
+        if bTiff:
+            outputRaster = os.path.join(os.path.dirname(gdb), os.path.basename(outputRaster) + ".tif")
+
         if arcpy.Exists(outputRaster):
             arcpy.Delete_management(outputRaster)
             time.sleep(1)
@@ -504,10 +511,12 @@ def ConvertToRaster(muPolygon, rasterName):
         # Using the joined lookup table creates a raster with CellValues that are the
         # same as MUKEY (but integer). This will maintain correct MUKEY values
         # during a moscaic or clip.
+        # The native rasterizer (mu_raster) burns the integer MUKEY itself and needs no Lookup.
         #
-        arcpy.CreateTable_management(os.path.dirname(lu), os.path.basename(lu))
-        arcpy.AddField_management(lu, "CELLVALUE", "LONG")
-        arcpy.AddField_management(lu, "mukey", "TEXT", "#", "#", "30")
+        if not mu_raster.NATIVE:
+            arcpy.CreateTable_management(os.path.dirname(lu), os.path.basename(lu))
+            arcpy.AddField_management(lu, "CELLVALUE", "LONG")
+            arcpy.AddField_management(lu, "mukey", "TEXT", "#", "#", "30")
 
         # Create list of areasymbols present in the MUPOLYGON featureclass
         # Having problems processing CONUS list of MUKEYs. Python seems to be running out of memory,
@@ -539,15 +548,16 @@ def ConvertToRaster(muPolygon, rasterName):
         # Load MUKEY values into Lookup table
         #
         #PrintMsg("\tSaving " + Number_Format(muCnt, 0, True) + " MUKEY values for " + Number_Format(polyCnt, 0, True) + " polygons"  , 0)
-        arcpy.SetProgressorLabel("Creating lookup table...")
+        if not mu_raster.NATIVE:
+            arcpy.SetProgressorLabel("Creating lookup table...")
 
-        with arcpy.da.InsertCursor(lu, ("CELLVALUE", "mukey") ) as inCursor:
-            for mukey in mukeyList:
-                rec = mukey, mukey
-                inCursor.insertRow(rec)
+            with arcpy.da.InsertCursor(lu, ("CELLVALUE", "mukey") ) as inCursor:
+                for mukey in mukeyList:
+                    rec = mukey, mukey
+                    inCursor.insertRow(rec)
 
-        # Add MUKEY attribute index to Lookup table
-        arcpy.AddIndex_management(lu, ["mukey"], "Indx_LU")
+            # Add MUKEY attribute index to Lookup table
+            arcpy.AddIndex_management(lu, ["mukey"], "Indx_LU")
 
         #
         # End of Lookup table code
@@ -567,37 +577,48 @@ def ConvertToRaster(muPolygon, rasterName):
         # Raster conversion process...
         #
         PrintMsg(" \nConverting featureclass " + os.path.basename(muPolygon) + " to raster (" + str(iRaster) + " meter)", 0)
-        tmpPolys = "poly_tmp"
-        arcpy.MakeFeatureLayer_management (muPolygon, tmpPolys)
-        arcpy.AddJoin_management (tmpPolys, "mukey", lu, "mukey", "KEEP_ALL")
-        arcpy.SetProgressor("default", "Running PolygonToRaster conversion...")
 
+        if mu_raster.NATIVE:
+            # Tiled NumPy rasterizer, aligned to the CDL snap raster
+            arcpy.SetProgressor("default", "Running native raster conversion...")
+            muValues, muGrid, rasterKeys = mu_raster.polygonToRaster(muPolygon, "mukey", outputRaster, iRaster, cdlRaster, env.scratchFolder)
+            del muValues
 
-        # Need to make sure that the join was successful
-        time.sleep(1)
-        rasterFields = arcpy.ListFields(tmpPolys)
-        rasterFieldNames = list()
+        else:
+            tmpPolys = "poly_tmp"
+            arcpy.MakeFeatureLayer_management (muPolygon, tmpPolys)
+            arcpy.AddJoin_management (tmpPolys, "mukey", lu, "mukey", "KEEP_ALL")
+            arcpy.SetProgressor("default", "Running PolygonToRaster conversion...")
 
-        for rFld in rasterFields:
-            rasterFieldNames.append(rFld.name.upper())
 
-        if not "LOOKUP.CELLVALUE" in rasterFieldNames:
-            raise MyError, "Join failed for Lookup table (CELLVALUE)"
+            # Need to make sure that the join was successful
+            time.sleep(1)
+            rasterFields = arcpy.ListFields(tmpPolys)
+            rasterFieldNames = list()
 
-        if (os.path.basename(muPolygon).upper() + ".MUKEY") in rasterFieldNames:
-            #raise MyError, "Join failed for Lookup table (SPATIALVERSION)"
-            priorityFld = os.path.basename(muPolygon) + ".MUKEY"
+            for rFld in rasterFields:
+                rasterFieldNames.append(rFld.name.upper())
 
-        else:
-            priorityFld = os.path.basename(muPolygon) + ".CELLVALUE"
+            if not "LOOKUP.CELLVALUE" in rasterFieldNames:
+                raise MyError, "Join failed for Lookup table (CELLVALUE)"
 
+            if (os.path.basename(muPolygon).upper() + ".MUKEY") in rasterFieldNames:
+                #raise MyError, "Join failed for Lookup table (SPATIALVERSION)"
+                priorityFld = os.path.basename(muPolygon) + ".MUKEY"
+
+            else:
+                priorityFld = os.path.basename(muPolygon) + ".CELLVALUE"
 
-        #ListEnv()
-        arcpy.PolygonToRaster_conversion(tmpPolys, "Lookup.CELLVALUE", outputRaster, "MAXIMUM_COMBINED_AREA", "", iRaster) # No priority field for single raster
 
-        # immediately delete temporary polygon layer to free up memory for the rest of the process
-        time.sleep(1)
-        arcpy.Delete_management(tmpPolys)
+            #ListEnv()
+            arcpy.PolygonToRaster_conversion(tmpPolys, "Lookup.CELLVALUE", outputRaster, "MAXIMUM_COMBINED_AREA", "", iRaster) # No priority field for single raster
+
+            # immediately delete temporary polygon layer to free up memory for the rest of the process
+            time.sleep(1)
+            arcpy.Delete_management(tmpPolys)
+
+            # Map units and cell counts in one pass over the raster
+            rasterKeys = mu_raster.rasterSummary(outputRaster)
 
         # End of single raster process
 
@@ -615,7 +636,10 @@ def ConvertToRaster(muPolygon, rasterName):
         # ****************************************************
         # Build pyramids and statistics
         # ****************************************************
-        if arcpy.Exists(outputRaster):
+        if bTiff and arcpy.Exists(outputRaster):
+            PrintMsg("\tStatistics, overviews and attribute table written with " + os.path.basename(outputRaster), 0)
+
+        elif arcpy.Exists(outputRaster):
             time.sleep(1)
             arcpy.SetProgressor("default", "Calculating raster statistics...")
             PrintMsg("\tCalculating raster statistics...", 0)
@@ -648,18 +672,10 @@ def ConvertToRaster(muPolygon, rasterName):
             # Add MUKEY to final raster
             # ****************************************************
             # Build attribute table for final output raster. Sometimes it fails to automatically build.
+            # The MUKEY values are written with it in one cursor pass.
             PrintMsg("\tBuilding raster attribute table and updating MUKEY values", )
             arcpy.SetProgressor("default", "Building raster attrribute table...")
-            arcpy.BuildRasterAttributeTable_management(outputRaster)
-
-            # Add MUKEY values to final mapunit raster
-            #
-            arcpy.SetProgressor("default", "Adding MUKEY attribute to raster...")
-            arcpy.AddField_management(outputRaster, "MUKEY", "TEXT", "#", "#", "30")
-            with arcpy.da.UpdateCursor(outputRaster, ["VALUE", "MUKEY"]) as cur:
-                for rec in cur:
-                    rec[1] = rec[0]
-                    cur.updateRow(rec)
+            mu_raster.writeRAT(outputRaster, rasterKeys, "MUKEY")
 
             # Add attribute index (MUKEY) for raster
             arcpy.AddIndex_management(outputRaster, ["mukey"], "Indx_RasterMukey")
@@ -673,19 +689,10 @@ def ConvertToRaster(muPolygon, rasterName):
         # added to facilitate a line-join.
         #
         arcpy.SetProgressor("default", "Looking for missing map units...")
-        rCnt = int(arcpy.GetRasterProperties_management (outputRaster, "UNIQUEVALUECOUNT").getOutput(0))
+        rCnt = len(rasterKeys)
 
         if rCnt <> muCnt:
-            missingList = list()
-            rList = list()
-
-            # Create list of raster mukeys...
-            with arcpy.da.SearchCursor(outputRaster, ("MUKEY",)) as rcur:
-                for rec in rcur:
-                    mukey = rec[0]
-                    rList.append(mukey)
-
-            missingList = list(set(mukeyList) - set(rList))
+            missingList = rasterKeys.missing(mukeyList)
             queryList = list()
             for mukey in missingList:
                 queryList.append("'" + mukey + "'")
@@ -747,6 +754,10 @@ import sys, string, os, arcpy, locale, traceback, math, time, datetime, shutil
 import xml.etree.cElementTree as ET
 from arcpy import env
 
+# repository root modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..")))
+import mu_raster, mu_tiff
+
 # Create the Geoprocessor object
 try:
     if __name__ == "__main__":
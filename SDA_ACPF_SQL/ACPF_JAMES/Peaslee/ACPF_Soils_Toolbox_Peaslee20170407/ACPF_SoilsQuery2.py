@@ -89,68 +89,6 @@ def FinalDissolve(outputShp):
         errorMsg()
         return ""
 
-## ===================================================================================
-def CreateNewTable(newTable, columnNames, columnInfo):
-    # Create new table. Start with in-memory and then export to geodatabase table
-    #
-    # ColumnNames and columnInfo come from the Attribute query JSON string
-    # MUKEY would normally be included in the list, but it should already exist in the output featureclass
-    #
-    try:
-        # Dictionary: SQL Server to FGDB
-        dType = dict()
-
-        dType["int"] = "long"
-        dType["smallint"] = "short"
-        dType["bit"] = "short"
-        dType["varbinary"] = "blob"
-        dType["nvarchar"] = "text"
-        dType["varchar"] = "text"
-        dType["char"] = "text"
-        dType["datetime"] = "date"
-        dType["datetime2"] = "date"
-        dType["smalldatetime"] = "date"
-        dType["decimal"] = "double"
-        dType["numeric"] = "double"
-        dType["float"] ="double"
-
-        # numeric type conversion depends upon the precision and scale
-        dType["numeric"] = "float"  # 4 bytes
-        dType["real"] = "double" # 8 bytes
-
-        # Iterate through list of field names and add them to the output table
-        i = 0
-
-        # ColumnInfo contains:
-        # ColumnOrdinal, ColumnSize, NumericPrecision, NumericScale, ProviderType, IsLong, ProviderSpecificDataType, DataTypeName
-        #PrintMsg(" \nFieldName, Length, Precision, Scale, Type", 1)
-
-        joinFields = list()
-        outputTbl = os.path.join("IN_MEMORY", os.path.basename(newTable))
-        arcpy.CreateTable_management(os.path.dirname(outputTbl), os.path.basename(outputTbl))
-
-        for i, fldName in enumerate(columnNames):
-            vals = columnInfo[i].split(",")
-            length = int(vals[1].split("=")[1])
-            precision = int(vals[2].split("=")[1])
-            scale = int(vals[3].split("=")[1])
-            dataType = dType[vals[4].lower().split("=")[1]]
-
-            if fldName.lower().endswith("key"):
-                # Per SSURGO standards, key fields should be string. They come from Soil Data Access as long integer.
-                dataType = 'text'
-                length = 30
-
-            arcpy.AddField_management(outputTbl, fldName, dataType, precision, scale, length)
-
-
-        return outputTbl
-
-
-    except:
-        errorMsg()
-        return False
-
 ## ===================================================================================
 def FormAttributeQuery(sQuery, mukeys):
     #
@@ -223,62 +161,36 @@ def AttributeRequest(theURL, mukeys, outputTable, sQuery, keyField):
         #PrintMsg(" \nURL: " + url)
         #PrintMsg("QUERY: " + sQuery)
 
-        # Create SDM connection to service using HTTP
-        jData = json.dumps(dRequest)
-
-        # Send request to SDA Tabular service
-        req = urllib2.Request(url, jData)
-        resp = urllib2.urlopen(req)
-        jsonString = resp.read()
+        # Send request to SDA Tabular service using the shared keep-alive connection pool.
+        # Queries already answered for this SSURGO version come from the local cache.
+        # Rows are parsed and inserted as they arrive instead of holding the whole response.
+        dataList = sda_cache.cachedRows(url, dRequest)     # Service returns everything as string.
 
-        if bVerbose:
-            PrintMsg(" \nSDA attribute data in JSON format: \n " + str(jsonString), 1)
-
-        data = json.loads(jsonString)
-        del jsonString, resp, req
+        # Get column metadata from first two records
+        columnNames = next(dataList, None)
+        columnInfo = next(dataList, None)
 
-        if not "Table" in data:
+        if columnInfo is None:
             raise MyError, "Query failed to select anything: \n " + sQuery
 
-        dataList = data["Table"]     # Data as a list of lists. Service returns everything as string.
-
-        # Get column metadata from first two records
-        columnNames = dataList.pop(0)
-        columnInfo = dataList.pop(0)
-
         PrintMsg(" \n\tImporting attribute data to " + os.path.basename(outputTable) + "...", 0)
         #PrintMsg(" \nColumn Names: " + str(columnNames), 1)
 
-        # Create IN_MEMORY table to hold data
-        newTable = CreateNewTable(outputTable, columnNames, columnInfo)
         keyList = list()
         keyIndx = columnNames.index(keyField)
-        keyInfo = columnInfo[keyIndx]
-        #PrintMsg(" \nKey Info: " + str(keyInfo), 1)
         # Seeing ProviderType=VarChar for areasymbol and ProviderType=Int for mukey and cokey
 
-        # Load data into IN_MEMORY table
-        if keyField.lower() == "mukey":
-            #PrintMsg(" \n" + ", ".join(columnNames), 0)
-            # Also populate a dictionary containing all map unit data
-            with arcpy.da.InsertCursor(newTable, columnNames) as cur:
-                for rec in dataList:
-                    cur.insertRow(rec)
-                    keyVal = rec[keyIndx]
-                    keyList.append(keyVal.encode('ascii'))
-                    #dMapunitInfo[keyVal] = rec
-                    #PrintMsg(str(rec), 1)
+        def keyRows():
+            # Collect the key values while the rows are written
+            for rec in dataList:
+                keyList.append(rec[keyIndx].encode('ascii'))
+                yield rec
 
-        else:
-            #
-            with arcpy.da.InsertCursor(newTable, columnNames) as cur:
-                for rec in dataList:
-                    cur.insertRow(rec)
-                    keyList.append(rec[keyIndx].encode('ascii'))
+        # Write the rows once, straight into the geodatabase table
+        table_writer.writeTable(outputTable, columnNames, columnInfo, keyRows())
 
-        # Convert IN_MEMORY table to permanent geodatabase table
-        #PrintMsg(" \nCreating new table " + os.path.basename(outputTable) + " in AttributeRequest function", 1)
-        arcpy.TableToTable_conversion(newTable, os.path.dirname(outputTable), os.path.basename(outputTable))
+        if bVerbose:
+            PrintMsg(" \nSDA attribute data: " + Number_Format(len(keyList), 0, True) + " records", 1)
 
         arcpy.SetProgressorLabel("Finished importing attribute data")
 
@@ -357,17 +269,8 @@ def GetSDVAtts(theURL, outputFields):
         #dRequest["FORMAT"] = "XML"
         dRequest["QUERY"] = sdvQuery
 
-        # Create SDM connection to service using HTTP
-        jData = json.dumps(dRequest)
-
-        # Send request to SDA Tabular service
-        req = urllib2.Request(url, jData)
-        resp = urllib2.urlopen(req)
-        jsonString = resp.read()
-
-        #PrintMsg(" \njsonString: " + str(jsonString), 1)
-        data = json.loads(jsonString)
-        del jsonString, resp, req
+        # Send request to SDA Tabular service using the shared keep-alive connection pool
+        data = sda_client.getClient().postJSON(url, dRequest)
 
         if not "Table" in data:
             raise MyError, "Query failed to select anything: \n " + sdvQuery
@@ -529,12 +432,42 @@ def FormSpatialQuery(aoiFC):
         return "", None, False
 
 # ===============================================================================
-def RunSpatialQueryJSON(theURL, spatialQuery, outputShp, clipPolygon, bProjected, counter, showStatus):
+def RunTiledSpatialQuery(theURL, outputShp, clipPolygon, bProjected, counter, showStatus):
+    # Spatial request for an AOI larger than maxAcres. The AOI (clipPolygon, GCS WGS1984)
+    # is sent as quadtree cells by aoi_tiles and the polygons are imported and clipped
+    # by RunSpatialQueryJSON.
+
+    try:
+        url = theURL + "/" + "Tabular/post.rest"
+
+        bTiled, dataList, tileStats = aoi_tiles.fetch(clipPolygon, url, lambda msg: PrintMsg("\t" + msg, 0))
+
+        for line in tileStats.report():
+            PrintMsg("\t" + line, 0)
+
+        if not bTiled:
+            raise MyError, dataList
+
+        return RunSpatialQueryJSON(theURL, "", outputShp, clipPolygon, bProjected, counter, showStatus, dataList)
+
+    except MyError, e:
+        PrintMsg(str(e), 2)
+        return 0
+
+    except:
+        errorMsg()
+        return 0
+
+# ===============================================================================
+def RunSpatialQueryJSON(theURL, spatialQuery, outputShp, clipPolygon, bProjected, counter, showStatus, dataList=None):
     # JSON format
     # Send spatial query to SDA Tabular Service
     #
     # Format JSON table containing records with MUKEY and WKT Polygons to a polygon featureclass
     # No clipping!!!
+    #
+    # dataList, when given, holds the (mukey, wkt) records already collected by
+    # aoi_tiles and spatialQuery is not sent.
 
     try:
 
@@ -549,38 +482,16 @@ def RunSpatialQueryJSON(theURL, spatialQuery, outputShp, clipPolygon, bProjected
         #dRequest["FORMAT"] = "'JSON + METADATA + COLUMN"
         dRequest["QUERY"] = spatialQuery
 
-        # Create SDM connection to service using HTTP
-        jData = json.dumps(dRequest)
         #PrintMsg(" \nURL: " + url)
         #PrintMsg("FORMAT: " + "JSON")
         #PrintMsg("QUERY: " + spatialQuery)
 
-        # Send request to SDA Tabular service
-        req = urllib2.Request(url, jData)
-
-        #try:
-        resp = urllib2.urlopen(req)  # A failure here will probably throw an HTTP exception
-
-        #except:
-        responseStatus = resp.getcode()
-        responseMsg = resp.msg
-
-        jsonString = resp.read()
-        resp.close()
-
-        try:
-            data = json.loads(jsonString)
-
-        except:
-            errorMsg()
-            raise MyError, "Spatial Request failed"
-
-        dataList = data["Table"]     # Data as a list of lists. Service returns everything as string.
-
-        if bVerbose:
-            PrintMsg(" \nGeometry in JSON format from SDA: \n " + str(data), 1 )
-
-        del jsonString, resp, req
+        # Send request to SDA Tabular service using the shared keep-alive connection pool.
+        # A failure here will probably throw an HTTP exception.
+        # Polygons are parsed one at a time as the response arrives, so the whole
+        # WKT payload is never held in memory.
+        if dataList is None:
+            dataList = sda_client.getClient().postRows(url, dRequest)     # Service returns everything as string.
 
         # Get coordinate system information for input and output layers
         outputCS = arcpy.Describe(outputShp).spatialReference
@@ -599,21 +510,61 @@ def RunSpatialQueryJSON(theURL, spatialQuery, outputShp, clipPolygon, bProjected
         # Only two fields are used initially, the geometry and MUKEY
         outputFields = ["SHAPE@", "MUKEY"]
 
-        PrintMsg(" \n\tImporting " + Number_Format(len(dataList), 0, True) + " soil polygons...", 0)
+        PrintMsg(" \n\tImporting soil polygons...", 0)
 
         polyCnt = 0
 
-        if counter[1] > 0:
-            step = 1
-            end = len(dataList)
+        # Only the polygons whose envelope crosses the AOI boundary are intersected with it
+        clipper = aoi_clip.EnvelopeClipper(clipPolygon)
 
+        # The number of polygons is not known until the response has been read
+        if counter[1] > 0:
             if counter[1] == 1:
-                arcpy.SetProgressor("step", "Importing spatial data from Soil Data Access", 0, end, step)
+                arcpy.SetProgressor("default", "Importing spatial data from Soil Data Access")
 
             else:
-                arcpy.SetProgressor("step", "Importing spatial data for AOI " + str(counter[0]) + " of " + str(counter[1]), 0, end, step)
+                arcpy.SetProgressor("default", "Importing spatial data for AOI " + str(counter[0]) + " of " + str(counter[1]))
 
-        if bProjected:
+        # UTM and Albers outputs are projected in one batch after clipping (sda_project)
+        outputProj = sda_project.projectionFor(outputCS) if bProjected else None
+
+        if outputProj is not None:
+            # Clip the SDA polygons by the AOI polygon (as GCS WGS1984), then
+            # project all the clipped polygons together
+            #
+            clipped = list()
+
+            for rec in dataList:
+                mukey, wktPoly = rec
+
+                newPolygon = arcpy.FromWKT(wktPoly, inputCS)
+                clippedPolygon = clipper.clip(newPolygon)
+
+                if clippedPolygon is None:
+                    continue
+
+                if clippedPolygon is newPolygon:
+                    clipped.append((wktPoly, mukey))
+
+                else:
+                    clipped.append((clippedPolygon.WKT, mukey))
+
+                if showStatus and len(clipped) % 1000 == 0:
+                    arcpy.SetProgressorLabel("Clipped " + Number_Format(len(clipped), 0, True) + " soil polygons")
+
+            bShift = bool(tm) and outputCS.GCS.datumName == "D_North_American_1983"
+            outputWKT = sda_project.projectWKT([c[0] for c in clipped], outputProj, bShift)
+
+            with arcpy.da.InsertCursor(outputShp, ["SHAPE@WKT", "MUKEY"]) as cur:
+
+                for wkt, (wktPoly, mukey) in zip(outputWKT, clipped):
+                    cur.insertRow([wkt, mukey])
+                    polyCnt += 1
+
+                    if showStatus and polyCnt % 1000 == 0:
+                        arcpy.SetProgressorLabel("Imported " + Number_Format(polyCnt, 0, True) + " soil polygons")
+
+        elif bProjected:
             # Project geometry to match input AOI layer
             #
             #PrintMsg(" \nOutputting projected soils data", 1)
@@ -630,9 +581,13 @@ def RunSpatialQueryJSON(theURL, spatialQuery, outputShp, clipPolygon, bProjected
 
 
                     # Clip the generalized SDA polygon by the original AOI polygon.
-                    # I wonder if this clipping per polygon is slowing things down?
+                    # Polygons wholly inside the AOI are kept as they are and polygons
+                    # wholly outside are skipped.
                     #
-                    clippedPolygon = newPolygon.intersect(clipPolygon, 4)
+                    clippedPolygon = clipper.clip(newPolygon)
+
+                    if clippedPolygon is None:
+                        continue
 
                     # and then project the polygon
                     outputPolygon = clippedPolygon.projectAs(outputCS, tm)
@@ -643,8 +598,8 @@ def RunSpatialQueryJSON(theURL, spatialQuery, outputShp, clipPolygon, bProjected
                     cur.insertRow(rec)
                     polyCnt += 1
 
-                    if showStatus:
-                        arcpy.SetProgressorPosition()
+                    if showStatus and polyCnt % 1000 == 0:
+                        arcpy.SetProgressorLabel("Imported " + Number_Format(polyCnt, 0, True) + " soil polygons")
 
         else:
             # No projection necessary. Input and output coordinate systems are the same.
@@ -661,14 +616,22 @@ def RunSpatialQueryJSON(theURL, spatialQuery, outputShp, clipPolygon, bProjected
                     outputPolygon = arcpy.FromWKT(wktPoly, inputCS)
 
                     # Clip newPolygon by the AOI polygon (as GCS WGS1984)
-                    clippedPolygon = outputPolygon.intersect(clipPolygon, 4)
+                    clippedPolygon = clipper.clip(outputPolygon)
+
+                    if clippedPolygon is None:
+                        continue
 
                     rec = [clippedPolygon, mukey]
                     cur.insertRow(rec)
                     polyCnt += 1
 
-                    if showStatus:
-                        arcpy.SetProgressorPosition()
+                    if showStatus and polyCnt % 1000 == 0:
+                        arcpy.SetProgressorLabel("Imported " + Number_Format(polyCnt, 0, True) + " soil polygons")
+
+        PrintMsg("\tImported " + Number_Format(polyCnt, 0, True) + " soil polygons", 0)
+
+        for line in clipper.stats.report():
+            PrintMsg("\t" + line, 0)
 
         time.sleep(1)
         arcpy.ResetProgressor()
@@ -686,8 +649,13 @@ def RunSpatialQueryJSON(theURL, spatialQuery, outputShp, clipPolygon, bProjected
     except urllib2.HTTPError, e:
         # Currently the messages coming back from the server are not very helpful.
         # Bad Request could mean that the query timed out or tried to return too many JSON characters.
+        # Timeouts have already been retried by sda_client (see sda_retry.classify).
         #
-        if hasattr(e, 'msg'):
+        if getattr(e, 'sdaBody', None):
+            PrintMsg("HTTP Error " + str(e.code) + ": " + e.sdaBody[:500], 2)
+            return 0
+
+        elif hasattr(e, 'msg'):
             PrintMsg("HTTP Error: " + str(e.msg), 2)
             return 0
 
@@ -863,9 +831,11 @@ def GetLastDate(db):
         return ""
 
 ## ===================================================================================
-def CreateOutputTableMu(theMuTable, depthList, dPct):
-    # CreateOutputTableMu(theMuTable, depthList, dPct)
+## ===================================================================================
+def CreateOutputTableMu(theMuTable, depthList, dPct, catalogue):
+    # CreateOutputTableMu(theMuTable, depthList, dPct, catalogue)
     # Create the mapunit level table
+    # catalogue is the valu_engine.ComponentCatalogue of the horizon table
     #
     try:
         # Create the output tables and add required fields
@@ -929,14 +899,11 @@ def CreateOutputTableMu(theMuTable, depthList, dPct):
         # Add Mukey field (primary key)
         arcpy.AddField_management(tmpTable, "mukey", "TEXT", "", "", "30", "mukey")
 
-        # Reading from the hzTable, populate the output table with mukey
+        # Populate the output table with the mukey values from the hzTable
         #PrintMsg(" \n\tPopulating " + theMuTable + " with mukey values", 1)
-        sqlClause = ("DISTINCT mukey", "ORDER BY mukey")
-
-        with arcpy.da.SearchCursor(hzTable, ["mukey"], sql_clause=sqlClause) as incur:
-            outcur = arcpy.da.InsertCursor(theMuTable, ["mukey"])
-            for inrec in incur:
-                outcur.insertRow(inrec)
+        with arcpy.da.InsertCursor(theMuTable, ["mukey"]) as outcur:
+            for mukey in sorted(catalogue.byMukey):
+                outcur.insertRow([mukey])
 
         return True
 
@@ -950,8 +917,9 @@ def CreateOutputTableMu(theMuTable, depthList, dPct):
         return False
 
 ## ===================================================================================
-def CreateOutputTableCo(theCompTable, depthList):
+def CreateOutputTableCo(theCompTable, depthList, catalogue):
     # Create the component level table
+    # catalogue is the valu_engine.ComponentCatalogue of the horizon table
     # The new input field is created using adaptive code from another script.
     #
     try:
@@ -1040,11 +1008,9 @@ def CreateOutputTableCo(theCompTable, depthList):
 
         # populate table with mukey values
         #PrintMsg(" \n\tPopulating " + theCompTable + " with basic component values", 1)
-        sqlClause = ("DISTINCT cokey", "ORDER BY cokey")
-        with arcpy.da.SearchCursor(hzTable, ["mukey", "cokey", "compname", "localphase", "comppct_r"], sql_clause=sqlClause) as incur:
-            outcur = arcpy.da.InsertCursor(theCompTable, ["mukey", "cokey", "compname", "localphase", "comppct_r"])
+        with arcpy.da.InsertCursor(theCompTable, ["mukey", "cokey", "compname", "localphase", "comppct_r"]) as outcur:
 
-            for inrec in incur:
+            for inrec in catalogue.records(["mukey", "cokey", "compname", "localphase", "comppct_r"], "cokey"):
                 outcur.insertRow(inrec)
                 #PrintMsg("\tComponent record: " + str(inrec), 1)
 
@@ -1058,6 +1024,51 @@ def CreateOutputTableCo(theCompTable, depthList):
         return False
 
 
+## ===================================================================================
+# HzData tables already read into valu_engine.HorizonTable, by path
+dHorizons = dict()
+
+def GetHorizons(hzTable, ratingField=None, reload=False, plugins=()):
+    # Read the HzData table once, in "mukey, comppct_r DESC, cokey, hzdept_r ASC" order,
+    # into a columnar valu_engine.HorizonTable. The same table is then used by CalcRZDepth,
+    # CalcAWS, CalcSOC and the AggregateHz functions instead of each of them reading it
+    # again through a SearchCursor for every depth range.
+    #
+    # plugins are valu_engine.Accumulator objects. When the table is read they get the
+    # rows in the same pass; when it is already in memory they are run over the copy.
+    #
+    # Use reload=True after the table has been replaced.
+
+    fields = list(valu_engine.HZ_FIELDS)
+
+    if not ratingField is None and not ratingField.lower() in fields:
+        fields.append(ratingField.lower())
+
+    hz = dHorizons.get(hzTable)
+    reader = valu_engine.HorizonReader(plugins)
+    fields = reader.fields(fields)
+
+    if hz is None or reload or [fld for fld in fields if not hz.has(fld)]:
+        arcpy.SetProgressorLabel("Reading " + os.path.basename(hzTable) + " table...")
+
+        # one ordered pass over the table, feeding the plugins and the in-memory copy
+        collector = valu_engine.HorizonCollector(fields)
+        reader.plugins.insert(0, collector)
+
+        with arcpy.da.SearchCursor(hzTable, fields, sql_clause=(None, valu_engine.HZ_ORDER)) as cur:
+            reader.run(cur, fields)
+
+        hz = collector.table
+
+        # only keep the current table
+        dHorizons.clear()
+        dHorizons[hzTable] = hz
+
+    elif len(reader.plugins) > 0:
+        reader.run(hz.rows(fields), fields)
+
+    return hz
+
 ## ===================================================================================
 def CheckTexture(mukey, cokey, desgnmaster, om, texture, lieutex, taxorder, taxsubgrp):
     # Is this an organic horizon? Look at desgnmaster and OM first. If those
@@ -1269,139 +1280,19 @@ def CalcRZDepth(db, theCompTable, theMuTable, maxD, dPct, dCR):
         #
         # Save these new restriction values to dComp dictionary
         #
-        # Only process major-earthy components...
-        #whereClause = "component.compkind <> 'Miscellaneous area' and component.compkind is not Null and component.majcompflag = 'Yes'"
-        whereClause = "compkind <> 'Miscellaneous area' and compkind is not Null and majcompflag = 'Yes'"
-
-        sqlClause = (None, "ORDER BY mukey, comppct_r DESC, cokey, hzdept_r ASC")
-        curFlds = ["mukey", "cokey", "compname", "compkind", "localphase", "comppct_r", "taxorder", "taxsubgrp", "hzname", "desgnmaster", "hzdept_r", "hzdepb_r", "sandtotal_r", "silttotal_r", "claytotal_r", "om_r", "dbthirdbar_r", "ph1to1h2o_r", "ec_r", "awc_r", "texture", "lieutex"]
-        resList = ['Lithic bedrock','Paralithic bedrock','Densic bedrock', 'Fragipan', 'Duripan', 'Sulfuric']
-
-        lastCokey = "xxxx"
-        lastMukey = 'xxxx'
-
+        # Only process major-earthy components. The horizon checks (CheckTexture,
+        # CheckBulkDensity, pH, EC and the standard component restrictions) are run
+        # on the whole table at once by valu_engine.rootZoneDepth.
+        #
         # Display status of processing input table containing horizon data and component restrictions
         inCnt = int(arcpy.GetCount_management(hzTable).getOutput(0))
 
-        if inCnt > 0:
-            arcpy.SetProgressor ("step", "Processing input table...", 0, inCnt, 1)
-
-        else:
+        if inCnt == 0:
             raise MyError, "Input table contains no data"
 
-        with arcpy.da.SearchCursor(hzTable, curFlds, where_clause=whereClause, sql_clause=sqlClause) as cur:
-            # Reading horizon-level data
-            for rec in cur:
-
-                # ********************************************************
-                #
-                # Read QueryTable_HZ record
-                mukey, cokey, compName, compKind, localPhase, compPct, taxorder, taxsubgrp, hzname, desgnmaster, hzDept, hzDepb, sand, silt, clay, om, bd, pH, ec, awc, texture, lieutex = rec
-
-                # Initialize component restriction depth to maxD
-                dComp2[cokey] = [mukey, compName, localPhase, compPct, maxD, ""]
-
-                if lastCokey != cokey:
-                    # Accumulate a list of components for future use
-                    lastCokey = cokey
-                    coList.append(cokey)
-
-                if hzDept < maxD:
-                    # ********************************************************
-                    # For horizons above the floor level (maxD), look for other restrictive
-                    # layers based on horizon properties such as pH, EC and bulk density.
-                    # Start with the top horizons and work down.
-
-                    # initialize list of restrictions
-                    resKind = ""
-                    restriction = list()
-
-                    bOrganic = CheckTexture(mukey, cokey, desgnmaster, om, texture, lieutex, taxorder, taxsubgrp)
-
-                    if not bOrganic:
-                        # calculate alternate dense layer per Dobos
-                        bDense = CheckBulkDensity(sand, silt, clay, bd, mukey, cokey)
-
-                        if bDense:
-                            # use horizon top depth for the dense layer
-                            restriction.append("Dense")
-                            resDept = hzDept
-
-                        # Not sure whether these horizon property checks should be skipped for Organic
-                        # Bob said to only skip Dense Layer check, but VALU table RZAWS looks like all
-                        # horizon properties were skipped.
-                        #
-                        # If we decide to skip EC and pH horizon checks for histosols/histic, use this query
-                        # Example Pongo muck in North Carolina that have low pH but no other restriction
-                        #
-                        if str(taxorder) != 'Histosols' and str(taxsubgrp).lower().find('histic') == -1:
-                            # Only non histosols/histic soils will be checked for pH or EC restrictive horizons
-                            if pH <= 3.5 and pH is not None:
-                                restriction.append("pH")
-                                resDept = hzDept
-                                #if mukey == tmukey:
-                                #    PrintMsg("\tpH restriction at " + str(resDept) + "cm", 1)
-
-                        if ec >= 16.0 and ec is not None:
-                            # Originally I understood that EC > 12 is a restriction, but Bob says he is
-                            # now using 16.
-                            restriction.append("EC")
-                            resDept = hzDept
-                            #if mukey == tmukey:
-                            #    PrintMsg("\tEC restriction at " + str(resDept) + "cm", 1)
-
-                        #if bd >= 1.8:
-                        #    restriction.append("BD")
-                        #    resDept = hzDept
-
-                        #if awc is None:
-                        #    restriction.append("AWC")
-                        #    resDept = hzDept
-
-                    # ********************************************************
-                    #
-                    # Finally, check for one of the standard component restrictions
-                    #
-                    if cokey in dCR:
-                        resDepth2, resKind = dCR[cokey]
-
-                        if hzDept <= resDepth2 < hzDepb:
-                            # This restriction may not be at the top of the horizon, thus we
-                            # need to override this if one of the other restrictions exists for this
-                            # horizon
-
-                            if len(restriction) == 0:
-                                # If this is the only restriction, set the restriction depth
-                                # to the value from the corestriction table.
-                                resDept = resDepth2
-
-                            # Adding this restriction name to the list even if there are others
-                            # May want to take this out later
-                            restriction.append(resKind)
-
-                    # ********************************************************
-                    #
-                    if len(restriction) > 0:
-                        # Found at least one restriction for this horizon
-
-                        if not cokey in dComp:
-                            # if there are no higher restrictions for this component, save this one
-                            # to the dComp dictionary as the upper-most restriction
-                            #
-                            dComp[cokey] = [mukey, compName, localPhase, compPct, resDept, restriction]
-
-                arcpy.SetProgressorPosition()
-
-        arcpy.ResetProgressor()
-
-        # Load restrictions from dComp into dComp2 so that there is complete information for all components
-
-        for cokey in dComp2:
-            try:
-                dComp2[cokey] = dComp[cokey]
+        arcpy.SetProgressorLabel("Processing input table...")
 
-            except:
-                pass
+        dComp2 = valu_engine.rootZoneDepth(GetHorizons(hzTable), maxD, dCR)
 
         # Return the dictionary containing restriction depths and the dictionary containing defaults
         return dComp2
@@ -1455,191 +1346,169 @@ def GetCoRestrictions(crTable, maxD, resList):
         return dict()
 
 ## ===================================================================================
-def CalcRZAWS(inputDB, outputDB, td, bd, theCompTable, theMuTable, dRestrictions, maxD, dPct):
-    # Create a component-level summary table
-    # Calculate mapunit-weighted average for each mapunit and write to a mapunit-level table
-    # Need to filter out compkind = 'Miscellaneous area' for RZAWS
-    # dRestrictions[cokey] = [mukey, compName, localPhase, compPct, resDept, restriction]
-
-    try:
-        import decimal
-
-        env.workspace = outputDB
-
-        # Using the same component horizon table that has been
-        #queryTbl = os.path.join(outputDB, "QueryTable_Hz")
-        queryTbl = hzTable
-        #tmukey = '757960'
-
-        numRows = int(arcpy.GetCount_management(queryTbl).getOutput(0))
-
-        PrintMsg(" \n\tCalculating Root Zone AWS for " + str(td) + " to " + str(bd) + "cm...", 0)
-
-        # QueryTable_HZ fields
-        qFieldNames = ["mukey", "cokey", "comppct_r",  "compname", "localphase", "majcompflag", "compkind", "taxorder", "taxsubgrp", "desgnmaster", "om_r", "awc_r", "hzdept_r", "hzdepb_r", "texture", "lieutex"]
-
-        #arcpy.SetProgressorLabel("Creating output tables using dominant component...")
-        #arcpy.SetProgressor("step", "Calculating root zone available water supply..." , 0, numRows, 1)
-
-        # Open edit session on geodatabase to allow multiple update cursors
-        with arcpy.da.Editor(inputDB) as edit:
-
-            # initialize list of components with horizon overlaps
-            #badCo = list()
+class RootZoneAwsPlugin(valu_engine.Accumulator):
+    # Horizon part of CalcRZAWS, run by a valu_engine.HorizonReader over the horizon table
+    # in "mukey, comppct_r DESC, cokey, hzdept_r ASC" order.
+    #
+    # Sums the root zone thickness and AWS of each major-earthy component down to its
+    # restriction depth (dRestrictions from CalcRZDepth) or maxD:
+    # dComp[cokey] = mukey, compName, localPhase, compPct, thickness, aws, restriction
 
-            # Output fields for root zone and droughty
-            muFieldNames = ["mukey", "pctearthmc", "rootznemc", "rootznaws", "droughty"]
-            muCursor = arcpy.da.UpdateCursor(theMuTable, muFieldNames)
+    fields = ["mukey", "cokey", "comppct_r",  "compname", "localphase", "majcompflag", "compkind", "taxorder", "taxsubgrp", "desgnmaster", "om_r", "awc_r", "hzdept_r", "hzdepb_r", "texture", "lieutex"]
 
-            # Open component-level output table for updates
-            #coCursor = arcpy.da.InsertCursor(theCompTable, coFieldNames)
-            coFieldNames = ["mukey", "cokey", "compname", "localphase", "comppct_r", "pctearthmc", "rootznemc", "rootznaws", "restriction"]
-            coCursor = arcpy.da.UpdateCursor(theCompTable, coFieldNames)
+    def __init__(self, dRestrictions, maxD):
+        self.dRestrictions = dRestrictions
+        self.maxD = maxD
+        self.dComp = dict()
 
-            # Process query table using cursor, write out horizon data for each major component
-            sqlClause = [None, "order by mukey, comppct_r DESC, cokey, hzdept_r ASC"]
-            iCnt = int(arcpy.GetCount_management(queryTbl).getOutput(0))
+    def row(self, rec):
+        # read each horizon-level input record from QueryTable_HZ ...
+        #
+        dComp = self.dComp
+        mukey, cokey, compPct, compName, localPhase, mjrFlag, cKind, taxorder, taxsubgrp, desgnmaster, om, awc, top, bot, texture, lieutex = rec
 
-            # For root zone calculations, we only want earthy, major components
-            #PrintMsg(" \nFiltering components in Query_HZ for CalcRZAWS1 function", 1)
+        if mjrFlag == "Yes" and cKind != "Miscellaneous area" and cKind is not None:
             #
-            # Major-Earthy Components
-            #hzSQL = "component.compkind <> 'Miscellaneous area' and component.compkind is not NULL and component.majcompflag = 'Yes'"
-            # All Components
+            # Why am I getting bigger numbers here than in the Valu1 table???
+            #if mukey == '757960':
+            #    PrintMsg(str(rec), 1)
 
-            inCur = arcpy.da.SearchCursor(queryTbl, qFieldNames, sql_clause=sqlClause)
+            # For major-earthy components
+            # Get restriction information from dictionary
 
-            arcpy.SetProgressor("step", "Reading query table...",  0, iCnt, 1)
+            # For non-Miscellaneous areas with no horizon data, set hzdepth values to zero so that
+            # PWSL and Droughty will get populated with zeros instead of NULL.
+            if top is None and bot is None:
 
-            # Create dictionaries to handle the mapunit and component summaries
-            dMu = dict()
-            dComp = dict()
+                if not cokey in dComp:
+                    dComp[cokey] = mukey, compName, localPhase, compPct, 0, 0, ""
 
-            # I may have to pull the sum of component percentages out of this function?
-            # It seems to work OK for the earthy-major components, but will not work for
-            # the standard AWS calculations. Those 'Miscellaneous area' components with no horizon data
-            # are excluded from the Query table because it does not support Outer Joins.
-            #
-            mCnt = 0
-            #PrintMsg("\tmukey, cokey, comppct, top, bottom, resdepth, thickness, aws", 0)
+            try:
+                # mukey, compName, localPhase, compPct, resDept, restriction
+                # rDepth is the component restriction depth or calculated horizon restriction from CalcRZDepth1 function
 
-            # TEST: keep list of cokeys as a way to track the top organic horizons
-            skipList = list()
+                # mukey, compName, localPhase, compPct, resDept, restriction] = dRestrictions
+                d1, d2, d3, d4, rDepth, restriction = self.dRestrictions[cokey]
+                cBot = min(rDepth, bot, self.maxD)  # 01-05-2015 Added maxD because I found 46 CONUS mapunits with a ROOTZNEMC > 150
 
-            for rec in inCur:
-                # read each horizon-level input record from QueryTable_HZ ...
-                #
-                mukey, cokey, compPct, compName, localPhase, mjrFlag, cKind, taxorder, taxsubgrp, desgnmaster, om, awc, top, bot, texture, lieutex = rec
+                #if mukey == tmukey and rDepth != 150:
+                #    PrintMsg("\tRestriction, " + str(mukey) + ", " + str(cokey) + ", " + str(rDepth) + " at " + str(restriction) + "cm", 1)
 
-                if mjrFlag == "Yes" and cKind != "Miscellaneous area" and cKind is not None:
-                    #
-                    # Why am I getting bigger numbers here than in the Valu1 table???
-                    #if mukey == '757960':
-                    #    PrintMsg(str(rec), 1)
+            except:
+                #errorMsg()
+                cBot = min(self.maxD, bot)
+                restriction = []
+                rDepth = self.maxD
 
-                    # For major-earthy components
-                    # Get restriction information from dictionary
+            bOrganic = CheckTexture(mukey, cokey, desgnmaster, om, texture, lieutex, taxorder, taxsubgrp)
 
-                    # For non-Miscellaneous areas with no horizon data, set hzdepth values to zero so that
-                    # PWSL and Droughty will get populated with zeros instead of NULL.
-                    if top is None and bot is None:
+            # fix awc_r to 2 decimal places
+            if awc is None:
+                awc = 0.0
 
-                        if not cokey in dComp:
-                            dComp[cokey] = mukey, compName, localPhase, compPct, 0, 0, ""
+            else:
+                awc = round(awc, 2)
 
-                    try:
-                        # mukey, compName, localPhase, compPct, resDept, restriction
-                        # rDepth is the component restriction depth or calculated horizon restriction from CalcRZDepth1 function
+            # Reasons for skipping RZ calculations on a horizon:
+            #   1. Desgnmaster = O, L and Taxorder != Histosol and is at the surface
+            #   2. Do I need to convert null awc values to zero?
+            #   3. Below component restriction or horizon restriction level
 
-                        # mukey, compName, localPhase, compPct, resDept, restriction] = dRestrictions
-                        d1, d2, d3, d4, rDepth, restriction = dRestrictions[cokey]
-                        cBot = min(rDepth, bot, maxD)  # 01-05-2015 Added maxD because I found 46 CONUS mapunits with a ROOTZNEMC > 150
+            if bOrganic:
+                # Organic surface horizon - Not using this horizon in the calculations
+                useHz = False
 
-                        #if mukey == tmukey and rDepth != 150:
-                        #    PrintMsg("\tRestriction, " + str(mukey) + ", " + str(cokey) + ", " + str(rDepth) + " at " + str(restriction) + "cm", 1)
+                #if mukey == tmukey:
+                #    PrintMsg("Organic, " + str(mukey) + ", " + str(cokey) + ", " + str(compPct) + ", " + str(desgnmaster) + ", " + taxorder  + ", " + str(top) + ", " + str(bot) + ", " + str(cBot)  + ", " + str(awc) + ", " + str(useHz), 1)
 
-                    except:
-                        #errorMsg()
-                        cBot = min(maxD, bot)
-                        restriction = []
-                        rDepth = maxD
+            else:
+                # Mineral, Histosol, buried Organic, Bedrock or there is a horizon restriction (EC, pH - Using this horizon in the calculations
+                useHz = True
 
-                        if mukey == tmukey:
-                            PrintMsg("RestrictionError, " + str(mukey) + ", " + str(cokey) + ", " + str(rDepth) + ", " + str(restriction), 1)
+                # Looking for problems
+                #if mukey == tmukey:
+                #    PrintMsg("Mineral, " + str(mukey) + ", " + str(cokey)  + ", " + str(compPct) + ", " + str(desgnmaster) + ", " + str(taxorder) + ", " + str(top) + ", " + str(bot) + ", " + str(cBot) + ", " + str(awc)  + ", " + str(useHz), 1)
 
-                    bOrganic = CheckTexture(mukey, cokey, desgnmaster, om, texture, lieutex, taxorder, taxsubgrp)
+                # Attempt to fix component with a surface-level restriction that might be in an urban soil
+                if not cokey in dComp and cBot == 0:
+                    dComp[cokey] = mukey, compName, localPhase, compPct, 0, 0, restriction
 
-                    # fix awc_r to 2 decimal places
-                    if awc is None:
-                        awc = 0.0
+                    # Looking for problems
+                    #if mukey == tmukey:
+                    #    PrintMsg("MUKEY2: " + str(mukey) + ", " + str(top) + ", " + str(bot) + ", " + str(cBot) + ", " + str(useHz), 1)
 
-                    else:
-                        awc = round(awc, 2)
+            if top < cBot and useHz == True:
+                # If the top depth is less than the bottom depth, proceed with the calculation
+                # Calculate sum of horizon thickness and sum of component ratings for all horizons above bottom
+                hzT = cBot - top
+                aws = float(hzT) * float(awc) * 10.0 # volume in millimeters
 
-                    # Reasons for skipping RZ calculations on a horizon:
-                    #   1. Desgnmaster = O, L and Taxorder != Histosol and is at the surface
-                    #   2. Do I need to convert null awc values to zero?
-                    #   3. Below component restriction or horizon restriction level
+                # Looking for problems
+                #if mukey == tmukey:
+                #    PrintMsg("MUKEY3: " + str(mukey) + ", " + str(top) + ", " + str(bot) + ", " + str(cBot) + ", " + str(useHz), 1)
 
-                    if bOrganic:
-                        # Organic surface horizon - Not using this horizon in the calculations
-                        useHz = False
 
-                        #if mukey == tmukey:
-                        #    PrintMsg("Organic, " + str(mukey) + ", " + str(cokey) + ", " + str(compPct) + ", " + str(desgnmaster) + ", " + taxorder  + ", " + str(top) + ", " + str(bot) + ", " + str(cBot)  + ", " + str(awc) + ", " + str(useHz), 1)
+                if cokey in dComp:
+                    # accumulate total thickness and total rating value by adding to existing component values
+                    mukey, compName, localPhase, compPct, dHzT, dAWS, restriction = dComp[cokey]
+                    dAWS = dAWS + aws
+                    dHzT += hzT
+                    dComp[cokey] = mukey, compName, localPhase, compPct, dHzT, dAWS, restriction
 
-                    else:
-                        # Mineral, Histosol, buried Organic, Bedrock or there is a horizon restriction (EC, pH - Using this horizon in the calculations
-                        useHz = True
-                        skipList.append(cokey)
+                else:
+                    # Create initial entry for this component using the first horizon
+                    dComp[cokey] = mukey, compName, localPhase, compPct, hzT, aws, restriction
 
-                        # Looking for problems
-                        #if mukey == tmukey:
-                        #    PrintMsg("Mineral, " + str(mukey) + ", " + str(cokey)  + ", " + str(compPct) + ", " + str(desgnmaster) + ", " + str(taxorder) + ", " + str(top) + ", " + str(bot) + ", " + str(cBot) + ", " + str(awc)  + ", " + str(useHz), 1)
+            else:
+                # Do not include this horizon in the rootzone calculations
+                pass
 
-                        # Attempt to fix component with a surface-level restriction that might be in an urban soil
-                        if not cokey in dComp and cBot == 0:
-                            dComp[cokey] = mukey, compName, localPhase, compPct, 0, 0, restriction
+        else:
+            # Not a major-earthy component, so write out everything BUT rzaws-related data (last values)
+            dComp[cokey] = mukey, compName, localPhase, compPct, None, None, None, None
 
-                            # Looking for problems
-                            #if mukey == tmukey:
-                            #    PrintMsg("MUKEY2: " + str(mukey) + ", " + str(top) + ", " + str(bot) + ", " + str(cBot) + ", " + str(useHz), 1)
+## ===================================================================================
+def CalcRZAWS(inputDB, outputDB, td, bd, theCompTable, theMuTable, dRestrictions, maxD, dPct):
+    # Create a component-level summary table
+    # Calculate mapunit-weighted average for each mapunit and write to a mapunit-level table
+    # Need to filter out compkind = 'Miscellaneous area' for RZAWS
+    # dRestrictions[cokey] = [mukey, compName, localPhase, compPct, resDept, restriction]
 
-                    if top < cBot and useHz == True:
-                        # If the top depth is less than the bottom depth, proceed with the calculation
-                        # Calculate sum of horizon thickness and sum of component ratings for all horizons above bottom
-                        hzT = cBot - top
-                        aws = float(hzT) * float(awc) * 10.0 # volume in millimeters
+    try:
+        import decimal
 
-                        # Looking for problems
-                        #if mukey == tmukey:
-                        #    PrintMsg("MUKEY3: " + str(mukey) + ", " + str(top) + ", " + str(bot) + ", " + str(cBot) + ", " + str(useHz), 1)
+        env.workspace = outputDB
 
+        # Using the same component horizon table that has been
+        #queryTbl = os.path.join(outputDB, "QueryTable_Hz")
+        queryTbl = hzTable
+        #tmukey = '757960'
 
-                        if cokey in dComp:
-                            # accumulate total thickness and total rating value by adding to existing component values
-                            mukey, compName, localPhase, compPct, dHzT, dAWS, restriction = dComp[cokey]
-                            dAWS = dAWS + aws
-                            dHzT += hzT
-                            dComp[cokey] = mukey, compName, localPhase, compPct, dHzT, dAWS, restriction
+        PrintMsg(" \n\tCalculating Root Zone AWS for " + str(td) + " to " + str(bd) + "cm...", 0)
 
-                        else:
-                            # Create initial entry for this component using the first horizon
-                            dComp[cokey] = mukey, compName, localPhase, compPct, hzT, aws, restriction
+        # Sum the root zone thickness and AWS of the major-earthy components. The horizon
+        # table is already in memory (GetHorizons), so this is not another read of the table.
+        rzPlugin = RootZoneAwsPlugin(dRestrictions, maxD)
+        GetHorizons(queryTbl, plugins=[rzPlugin])
+        dComp = rzPlugin.dComp
 
-                    else:
-                        # Do not include this horizon in the rootzone calculations
-                        pass
+        # Open edit session on geodatabase to allow multiple update cursors
+        with arcpy.da.Editor(inputDB) as edit:
 
-                else:
-                    # Not a major-earthy component, so write out everything BUT rzaws-related data (last values)
-                    dComp[cokey] = mukey, compName, localPhase, compPct, None, None, None, None
+            # initialize list of components with horizon overlaps
+            #badCo = list()
 
-                arcpy.SetProgressorPosition()
+            # Output fields for root zone and droughty
+            muFieldNames = ["mukey", "pctearthmc", "rootznemc", "rootznaws", "droughty"]
+            muCursor = arcpy.da.UpdateCursor(theMuTable, muFieldNames)
 
-            # End of processing major-earthy horizon-level data
+            # Open component-level output table for updates
+            #coCursor = arcpy.da.InsertCursor(theCompTable, coFieldNames)
+            coFieldNames = ["mukey", "cokey", "compname", "localphase", "comppct_r", "pctearthmc", "rootznemc", "rootznaws", "restriction"]
+            coCursor = arcpy.da.UpdateCursor(theCompTable, coFieldNames)
 
-            arcpy.ResetProgressor()
+            # Create dictionary to handle the mapunit summaries
+            dMu = dict()
 
             # get the total number of major-earthy components from the dictionary count
             iComp = len(dComp)
@@ -2134,246 +2003,45 @@ def AggregateHz_DCP_WTA(hzTable, ratingField, top, bot):
         if bVerbose:
             PrintMsg(" \nCurrent function : " + sys._getframe().f_code.co_name, 1)
 
-        #outputTbl = os.path.join(gdb, tblName)
-        fldPrecision = 2
-        inFlds = ["MUKEY", "COKEY", "COMPPCT_R", "HZDEPT_R", "HZDEPB_R", ratingField]
-        #outFlds = ["MUKEY", "COMPPCT_R", dSDV["resultcolumnname"].upper(), "AREASYMBOL"]
-
-        sqlClause =  (None, "ORDER BY MUKEY ASC, COMPPCT_R DESC, HZDEPT_R ASC")
-        whereClause = "COMPPCT_R >=  " + str(cutOff)
-        whereClause = "COMPPCT_R >=  " + str(cutOff) + " AND " + ratingField + " IS NOT NULL"
-
-        #if arcpy.Exists(outputTbl):
-        #    arcpy.Delete_management(outputTbl)
-
-        #outputTbl = CreateOutputTable(initialTbl, outputTbl, dFieldInfo)
-        outputValues= [999999999, -9999999999]
-
-        #if outputTbl == "":
-        #    raise MyError,""
-
-        dPct = dict()  # sum of comppct_r for each map unit
-        dComp = dict() # component level information
-
-        #iCnt = int(arcpy.GetCount_management(initialTbl).getOutput(0))
-
-        # reset variables for cursor
-        sumPct = 0
-        sumProd = 0
-        meanVal = 0
-
-        with arcpy.da.SearchCursor(hzTable, inFlds, where_clause=whereClause, sql_clause=sqlClause) as cur:
-
-            for rec in cur:
-                mukey, cokey, comppct, hzdept, hzdepb, val = rec
-                # top = hzdept
-                # bot = hzdepb
-                # td = top of range
-                # bd = bottom of range
-
-                if val is not None and hzdept is not None and hzdepb is not None:
-
-                    # Calculate sum of horizon thickness and sum of component ratings for all horizons above bottom
-                    hzT = min(hzdepb, bot) - max(hzdept, top)   # usable thickness from this horizon
-
-                    if hzT > 0:
-                        # PrintMsg("\t" + mukey + "; " + cokey + ";  " + str(comppct) + "%;  " + str(max(hzdept, top)) + "; " + str(min(hzdepb, bot)) + "; " + str(hzT) + ", " + str(val), 1)
-                        aws = float(hzT) * val
-
-                        # Need to grab the top or dominant component for this mapunit
-                        if not cokey in dComp and not mukey in dPct:
-                            # Create initial entry for this component using the first horiozon CHK
-                            #PrintMsg("\t" + mukey + "; " + cokey + ";  " + str(comppct) + "%;  " + str(max(hzdept, top)) + "; " + str(min(hzdepb, bot)) + "; " + str(hzT) + ", " + str(val), 1)
-
-                            dComp[cokey] = [mukey, comppct, hzT, aws]
-
-                            try:
-                                dPct[mukey] = dPct[mukey] + comppct
-
-                            except:
-                                dPct[mukey] = comppct
-
-                        else:
-                            try:
-                                # For dominant component:
-                                # accumulate total thickness and total rating value by adding to existing component values  CHK
-                                mukey, comppct, dHzT, dAWS = dComp[cokey]
-                                dAWS = dAWS + aws
-                                dHzT = dHzT + hzT
-                                dComp[cokey] = [mukey, comppct, dHzT, dAWS]
-
-                            except KeyError:
-                                # Hopefully this is a component other than dominant
-                                #errorMsg()
-                                pass
-
-                            except:
-                                errorMsg()
-
-            # get the total number of major components from the dictionary count
-            iComp = len(dComp)
-
-            # Read through the component-level data and summarize to the mapunit level
-
-            if iComp > 0:
-                #PrintMsg("\t" + str(top) + " - " + str(bot) + "cm (" + Number_Format(iComp, 0, True) + " components)"  , 0)
-                #arcpy.SetProgressor("step", "Saving map unit and component AWS data...",  0, iComp, 1)
-
-                for cokey, vals in dComp.items():
-
-                    # get component level data
-                    mukey, comppct, hzT, cval = vals
-
-                    # get sum of comppct for mapunit
-                    sumPct = dPct[mukey]
-
-                    # calculate mean value for entire depth range
-                    newval = float(cval) / hzT
-
-                    if mukey in dMu:
-                        pct, mval = dMu[mukey]
-                        newval = newval + mval
-
-                    dMu[mukey] = [sumPct, round(newval, 2)]
-                    #PrintMsg(mukey + ": " + str([sumPct, newval]), 1)
+        # Dominant component is the one with the first usable horizon in
+        # MUKEY ASC, COMPPCT_R DESC, HZDEPT_R ASC order, ties in OBJECTID order.
+        # COMPPCT_R >= cutOff AND ratingField IS NOT NULL
+        dMu = valu_engine.dominantComponent(GetHorizons(hzTable, ratingField), ratingField, top, bot, cutOff)
 
 
         return dMu
 
     except MyError, e:
         PrintMsg(str(e), 2)
-        return dMu
-
-    except:
-        errorMsg()
-        return dMu
-
-## ===================================================================================
-def AggregateHz_WTA_WTA(hzTable, ratingField, top, bot):
-    # Haven't checked this function to see if it still works
-    #
-    # Originally from gSSURGO_Mapping script
-    # Modify to generate a MUKEY dictionary
-    # This version uses weighted average for numeric horizon data as in AWC and most others
-    # Cannot be used for non-numeric data since it performs weighted average calculations
-    #
-    try:
-        dMu = dict()  # return this dictionary of mapunit data
-        bZero = False # substitute null values with zeros
-
-        arcpy.SetProgressorLabel("Aggregating rating information to the map unit level")
-
-        #
-        if bVerbose:
-            PrintMsg(" \nCurrent function : " + sys._getframe().f_code.co_name, 1)
-
-        # Create final output table with MUKEY, COMPPCT_R and sdvFld
-        #outputTbl = os.path.join(gdb, tblName)
-        fldPrecision = 2
-        inFlds = ["mukey", "cokey", "comppct_r", "hzdept_r", "hzdepb_r", ratingField]
-        outFlds = ["mukey", "comppct_r", ratingField]
-
-        sqlClause =  (None, "ORDER BY mukey ASC, comppct_r DESC, hzdept_r ASC")
-
-        if bZero == False:
-            # ignore any null values
-            whereClause = ratingField + " IS NOT NULL"
-
-        #if arcpy.Exists(outputTbl):
-        #    arcpy.Delete_management(outputTbl)
-
-        #outputTbl = CreateOutputTable(initialTbl, outputTbl, dFieldInfo)
-
-        #if outputTbl == "":
-        #    return outputTbl,[]
-
-        dPct = dict()  # sum of comppct_r for each map unit
-        dComp = dict() # component level information
-
-        #iCnt = int(arcpy.GetCount_management(initialTbl).getOutput(0))
-
-        # reset variables for cursor
-        sumPct = 0
-        sumProd = 0
-        meanVal = 0
-
-        with arcpy.da.SearchCursor(hzTable, inFlds, where_clause=whereClause, sql_clause=sqlClause) as cur:
-            #with arcpy.da.InsertCursor(outputTbl, outFlds) as ocur:
-                #arcpy.SetProgressor("step", "Reading initial query table ...",  0, iCnt, 1)
-
-            for rec in cur:
-                mukey, cokey, comppct, hzdept, hzdepb, val = rec
-                # top = hzdept
-                # bot = hzdepb
-                # td = top of range
-                # bd = bottom of range
-                if val is None and bZero:
-                    val = 0
-
-                if val is not None and hzdept is not None and hzdepb is not None:
-
-                    # Calculate sum of horizon thickness and sum of component ratings for all horizons above bottom
-                    hzT = min(hzdepb, bot) - max(hzdept, top)   # usable thickness from this horizon
-                    #if hzdept == 0:
-                    #    PrintMsg("\tFound horizon for mapunit (" + mukey + ":" + cokey + " with hzthickness of " + str(hzT), 1)
-
-                    if hzT > 0:
-                        aws = float(hzT) * val * comppct
-
-                        if not cokey in dComp:
-                            # Create initial entry for this component using the first horiozon CHK
-                            dComp[cokey] = [mukey, comppct, hzT, aws]
-                            try:
-                                dPct[mukey] = dPct[mukey] + comppct
-
-                            except:
-                                dPct[mukey] = comppct
-
-                        else:
-                            # accumulate total thickness and total rating value by adding to existing component values  CHK
-                            mukey, comppct, dHzT, dAWS = dComp[cokey]
-                            dAWS = dAWS + aws
-                            dHzT = dHzT + hzT
-                            dComp[cokey] = [mukey, comppct, dHzT, dAWS]
-
-                    #else:
-                    #    PrintMsg("\tFound horizon for mapunit (" + mukey + ":" + cokey + " with hzthickness of " + str(hzT), 1)
-
-                #else:
-                #    PrintMsg("\tFound horizon with no data for mapunit (" + mukey + ":" + cokey + " with hzthickness of " + str(hzT), 1)
-
-                # get the total number of major components from the dictionary count
-                iComp = len(dComp)
-
-                # Read through the component-level data and summarize to the mapunit level
-
-                if iComp > 0:
-                    #PrintMsg("\t" + str(top) + " - " + str(bot) + "cm (" + Number_Format(iComp, 0, True) + " components)"  , 0)
-                    #arcpy.SetProgressor("step", "Saving map unit and component AWS data...",  0, iComp, 1)
-
-                    for cokey, vals in dComp.items():
-
-                        # get component level data
-                        mukey, comppct, hzT, cval = vals
-
-                        # get sum of comppct for mapunit
-                        sumPct = dPct[mukey]
+        return dMu
 
-                        # calculate component weighted values
-                        # get weighted layer thickness
-                        divisor = sumPct * hzT
+    except:
+        errorMsg()
+        return dMu
 
-                        if divisor > 0:
-                            newval = float(cval) / divisor
+## ===================================================================================
+def AggregateHz_WTA_WTA(hzTable, ratingField, top, bot):
+    # Haven't checked this function to see if it still works
+    #
+    # Originally from gSSURGO_Mapping script
+    # Modify to generate a MUKEY dictionary
+    # This version uses weighted average for numeric horizon data as in AWC and most others
+    # Cannot be used for non-numeric data since it performs weighted average calculations
+    #
+    try:
+        dMu = dict()  # return this dictionary of mapunit data
+        bZero = False # substitute null values with zeros
 
-                        else:
-                            newval = 0.0
+        arcpy.SetProgressorLabel("Aggregating rating information to the map unit level")
 
-                        if mukey in dMu:
-                            pct, mval = dMu[mukey]
-                            newval = newval + mval
+        #
+        if bVerbose:
+            PrintMsg(" \nCurrent function : " + sys._getframe().f_code.co_name, 1)
 
-                        dMu[mukey] = [sumPct, newval]
+        # Component percent and thickness weighted average, ignoring any null values.
+        # As in the cursor loop, the components read so far are summarized to the map
+        # unit level again after every horizon row (see valu_engine.weightedAverage).
+        dMu = valu_engine.weightedAverage(GetHorizons(hzTable, ratingField), ratingField, top, bot)
 
         return dMu
 
@@ -2397,100 +2065,53 @@ def CalcAWS(db, theCompTable, theMuTable, dPct, depthList):
         # Using the same component horizon table that has been
         numRows = int(arcpy.GetCount_management(hzTable).getOutput(0))
 
-        # mukey, cokey, compPct,val, top, bot
-        qFieldNames = ["mukey", "cokey", "comppct_r", "awc_r", "hzdept_r", "hzdepb_r"]
+        # Horizon table is read once for all depth ranges
+        hz = GetHorizons(hzTable)
 
         # Track map units that are missing data
         missingList = list()
         minusList = list()
 
         PrintMsg(" \n\tCalculating standard available water supply...", 0)
-        arcpy.SetProgressor("step", "Reading QueryTable_HZ ...",  1, len(depthList), 1)
+        arcpy.SetProgressorLabel("Calculating available water supply...")
+
+        # Sum the usable horizon thickness and AWS for each component and depth range, in
+        # horizon order, from the horizon table already in memory. All components with
+        # horizons are used (hzdept_r is not null), there is no other filter.
+        compList = list()   # dComp for each range
+        muList = list()     # dMu for each range
 
         for rng in depthList:
-            # Calculating and updating just one AWS column at a time
-            #
             td = rng[0]
             bd = rng[1]
-            #outputFields = "AWS" + str(td) + "_" + str(bd), "TK" + str(td) + "_" + str(bd) + "A"
-
-            # Open output table Mu...All in write mode
-            #muFieldNames = ["MUKEY", "MUSUMCPCTA", "AWS" + str(td) + "_" + str(bd), "TK" + str(td) + "_" + str(bd) + "A"]
-            muFieldNames = ["MUKEY", "AWS" + str(td) + "_" + str(bd)]
-            coFieldNames = ["COKEY", "AWS" + str(td) + "_" + str(bd)]
-
-            # Create dictionaries to handle the mapunit and component summaries
-            dMu = dict()
-            dComp = dict()
-            dSum = dict()     # store sum of comppct_r and total thickness for the component
-            dHz = dict()      # Trying a new dictionary that will s
-
-
-            arcpy.SetProgressorLabel("Calculating available water supply for " + str(td) + " - " + str(bd) + "cm")
-            #arcpy.SetProgressor("step", "Aggregating data for the dominant component..." , 0, numRows, 1)
-
-            # Open edit session on geodatabase to allow multiple insert cursors
-            with arcpy.da.Editor(db) as edit:
+            dComp = valu_engine.awsComponents(hz, td, bd)
 
-                # Open output mapunit-level table in update mode
-                # MUKEY, AWS
-                muCursor = arcpy.da.UpdateCursor(theMuTable, muFieldNames)
+            if len(dComp) == 0:
+                PrintMsg("\t" + Number_Format(0, 0, True) + " components for "  + str(td) + " - " + str(bd) + "cm", 1)
 
-                # Open output component-level table in write mode
-                # MUKEY, AWS
-                coCursor = arcpy.da.UpdateCursor(theCompTable, coFieldNames)
+            compList.append(dComp)
+            muList.append(dict())
 
-                # Process query table using a searchcursor, write out horizon data for each component
-                # At this time, almost all components are being used! There is no filter.
-                sqlClause = (None, "order by mukey, comppct_r DESC, cokey, hzdept_r ASC")
-                #hzSQL = "compkind is not null and hzdept_r is not null"  # prevent divide-by-zero errors
-                hzSQL = "hzdept_r is not null"  # prevent divide-by-zero errors by skipping components with no horizons
+        # Output fields for all of the ranges, written in a single pass over each table
+        muFieldNames = ["MUKEY"] + ["AWS" + str(rng[0]) + "_" + str(rng[1]) for rng in depthList]
+        coFieldNames = ["COKEY"] + ["AWS" + str(rng[0]) + "_" + str(rng[1]) for rng in depthList]
 
-                iCnt = int(arcpy.GetCount_management(hzTable).getOutput(0))
-                inCur = arcpy.da.SearchCursor(hzTable, qFieldNames, where_clause=hzSQL, sql_clause=sqlClause)
-
-                for rec in inCur:
-                    # read each horizon-level input record from the query table ...
-
-                    mukey, cokey, compPct, awc, top, bot = rec
-
-                    if awc is not None:
-
-                        # Calculate sum of horizon thickness and sum of component ratings for all horizons above bottom
-                        hzT = min(bot, bd) - max(top, td)   # usable thickness from this horizon
-
-                        if hzT > 0:
-                            aws = float(hzT) * float(awc) * 10
-
-                            if not cokey in dComp:
-                                # Create initial entry for this component using the first horizon CHK
-                                dComp[str(cokey)] = (mukey, compPct, hzT, aws)
-
-                            else:
-                                # accumulate total thickness and total rating value by adding to existing component values  CHK
-                                mukey, compName, dHzT, dAWS = dComp[str(cokey)]
-                                dAWS = dAWS + aws
-                                dHzT = dHzT + hzT
-                                dComp[str(cokey)] = (mukey, compPct, dHzT, dAWS)
-
-
-
-                # get the total number of major components from the dictionary count
-                iComp = len(dComp)
+        # Open edit session on geodatabase to allow multiple insert cursors
+        with arcpy.da.Editor(db) as edit:
 
-                # Read through the component-level data and summarize to the mapunit level
+            # Open output component-level table in write mode
+            # COKEY, AWS...
+            with arcpy.da.UpdateCursor(theCompTable, coFieldNames) as coCursor:
 
-                if iComp > 0:
-                    #PrintMsg("\t\t" + str(td) + " - " + str(bd) + "cm (" + Number_Format(iComp, 0, True) + " components)"  , 0)
-                    #arcpy.SetProgressor("step", "Saving map unit and component AWS data...",  0, iComp, 1)
+                for corec in coCursor:
+                    # get component level data  CHK
+                    cokey = str(corec[0])
+                    bUpdate = False
 
-                    for corec in coCursor:
-                        # get component level data  CHK
-                        cokey = str(corec[0])
+                    for i, dComp in enumerate(compList):
 
                         if cokey in dComp:
-                            dRec = dComp[cokey]
-                            mukey, compPct, hzT, awc = dRec
+                            mukey, compPct, hzT, awc = dComp[cokey]
                             mukey = str(mukey)  # not sure if I need this
 
                             # get sum of component percent for the mapunit  CHK
@@ -2500,14 +2121,12 @@ def CalcAWS(db, theCompTable, theMuTable, dPct, depthList):
                                 # Value[2] is all major components
                                 # Value[3] is earthy components
                                 sumCompPct = float(dPct[mukey][0])
-                                #sumCompPct = float(dPct[mukey][1])
 
                             except:
                                 # set the component percent to zero if it is not found in the
                                 # dictionary. This is probably a 'Miscellaneous area' not included in the  CHK
                                 # data or it has no horizon information.
                                 sumCompPct = 0
-                                #missingList.append("'" + mukey + "'")
 
                             # calculate component percentage adjustment
                             if sumCompPct > 0:
@@ -2520,49 +2139,41 @@ def CalcAWS(db, theCompTable, theMuTable, dPct, depthList):
                                 # adjust the rating value down by the component percentage and by the sum of the usable horizon thickness for this component
                                 aws = round((adjCompPct * awc), 2) # component rating
 
-                                corec[1] = aws
+                                corec[i + 1] = aws
+                                bUpdate = True
                                 hzT = hzT * adjCompPct    # Adjust component share of horizon thickness by comppct
-                                #corec[2] = hzT             # This is new for the TK0_5A column
-                                coCursor.updateRow(corec)
-
-                                # Update component values in component dictionary   CHK
-                                # Not sure what dComp is being used for ???
-                                dComp[cokey] = mukey, compPct, hzT, aws
-
-                                # Try to fix high mapunit aggregate HZ by weighting with comppct
 
                                 # Testing new mapunit aggregation 09-08-2014
-                                # Trying to replace dMu dictionary
+                                dMu = muList[i]
+
                                 if mukey in dMu:
                                     val1, val2, val3 = dMu[mukey]
-                                    #dMu[mukey] = (compPct + val1, hzT + val2, aws + val2)
                                     compPct = compPct + val1
                                     hzT = hzT + val2
                                     aws = aws + val3
 
-                                #else:
                                 dMu[mukey] = (compPct, hzT, aws)
-                                #if mukey == '2479892':
 
+                    if bUpdate:
+                        coCursor.updateRow(corec)
 
-                        #arcpy.SetProgressorPosition()
-
-                    #arcpy.ResetProgressor()
-
-                else:
-                    PrintMsg("\t" + Number_Format(iComp, 0, True) + " components for "  + str(td) + " - " + str(bd) + "cm", 1)
+            # Write out map unit aggregated AWS
+            #
+            with arcpy.da.UpdateCursor(theMuTable, muFieldNames) as muCursor:
 
-                # Write out map unit aggregated AWS
-                #
                 for murec in muCursor:
                     mukey = murec[0]
+                    bUpdate = False
 
-                    if mukey in dMu:
-                        compPct, hzT, aws = dMu[mukey]
-                        murec[1] = aws
-                        muCursor.updateRow(murec)
+                    for i, dMu in enumerate(muList):
+
+                        if mukey in dMu:
+                            compPct, hzT, aws = dMu[mukey]
+                            murec[i + 1] = aws
+                            bUpdate = True
 
-            arcpy.SetProgressorPosition()
+                    if bUpdate:
+                        muCursor.updateRow(murec)
 
         if len(missingList) > 0:
             missingList = list(set(missingList))
@@ -2591,142 +2202,53 @@ def CalcSOC(db, theCompTable, theMuTable, dPct, dFrags, depthList, dRestrictions
         # Using the same component horizon table that has been
         numRows = int(arcpy.GetCount_management(hzTable).getOutput(0))
 
-        # mukey, cokey, compPct,val, top, bot
-        #qFieldNames = ["mukey", "cokey", "comppct_r", "hzdept_r", "hzdepb_r", "om_r", "dbthirdbar_r"]
-        qFieldNames = ["mukey","cokey","comppct_r","compname","localphase","chkey","om_r","dbthirdbar_r", "hzdept_r","hzdepb_r", "fragvol"]
+        # Horizon table is read once for all depth ranges
+        hz = GetHorizons(hzTable)
 
         # Track map units that are missing data
         missingList = list()
         minusList = list()
 
         PrintMsg(" \n\tCalculating soil organic carbon...", 0)
-        arcpy.SetProgressor("step", "Calculating soil organic carbon...",  1, len(depthList), 1)
+        arcpy.SetProgressorLabel("Calculating soil organic carbon...")
+
+        # Sum the usable horizon thickness and SOC for each component and depth range, not
+        # below the component restriction depth, in horizon order, from the horizon table
+        # already in memory. All components with horizons are used.
+        compList = list()   # dComp for each range
+        muList = list()     # dMu for each range
 
         for rng in depthList:
-            # Calculating and updating just one SOC column at a time
-            #
             td = rng[0]
             bd = rng[1]
+            dComp = valu_engine.socComponents(hz, td, bd, dRestrictions, maxD)
 
-            # Open output table Mu...All in write mode
-            # I lately added the "MUSUMCPCTS" to the output. Need to check output because
-            # it will be writing this out for every range. Lots more overhead.
-            #
-
-            # Create dictionaries to handle the mapunit and component summaries
-            dMu = dict()
-            dComp = dict()
-            #dSumPct = dict()  # store the sum of comppct_r for each mapunit to use in the calculations
-            dSum = dict()     # store sum of comppct_r and total thickness for the component
-            dHz = dict()      # Trying a new dictionary that will s
-            mCnt = 0
-
-            arcpy.SetProgressorLabel("Calculating SOC for " + str(td) + "->" + str(bd) + "cm...")
-
-            # Open edit session on geodatabase to allow multiple insert cursors
-            with arcpy.da.Editor(db) as edit:
-
-                # Open output mapunit-level table in update mode
-                #muFieldNames = ["MUKEY", "MUSUMCPCTS", "SOC" + str(td) + "_" + str(bd), "TK" + str(td) + "_" + str(bd) + "S"]
-                muFieldNames = ["MUKEY", "SOC" + str(td) + "_" + str(bd)]
-
-                muCursor = arcpy.da.UpdateCursor(theMuTable, muFieldNames)
-
-                # Open output component-level table in write mode
-
-                #coFieldNames = ["COKEY", "SOC" + str(td) + "_" + str(bd), "TK" + str(td) + "_" + str(bd) + "S"]
-                coFieldNames = ["COKEY", "SOC" + str(td) + "_" + str(bd)]
-                coCursor = arcpy.da.UpdateCursor(theCompTable, coFieldNames)
-
-                # Process query table using a searchcursor, write out horizon data for each component
-                # At this time, almost all components are being used! There is no filter.
-                hzSQL = "hzdept_r is not null"  # prevent divide-by-zero errors by skipping components with no horizons
-                sqlClause = (None, "order by mukey, comppct_r DESC, cokey, hzdept_r ASC")
-
-                iCnt = int(arcpy.GetCount_management(hzTable).getOutput(0))
-                inCur = arcpy.da.SearchCursor(hzTable, qFieldNames, where_clause=hzSQL, sql_clause=sqlClause)
-
-                for rec in inCur:
-                    # read each horizon-level input record from the query table ...
-
-                    mukey, cokey, compPct, compName, localPhase, chkey, om, db3, top, bot, fragvol = rec
-                    if fragvol is None:
-                        fragvol = 0.0
-                    #PrintMsg("hzTable: " + str(rec), 1)
-
-                    if om is not None and db3 is not None:
-                        # Calculate sum of horizon thickness and sum of component ratings for
-                        # that portion of the horizon that is with in the td-bd range
-                        top = max(top, td)
-                        bot = min(bot, bd)
-                        om = round(om, 3)
-
-                        try:
-                            rz, resKind = dRestrictions[cokey]
-
-                        except:
-                            rz = maxD
-                            resKind = ""
-
-                        # Now check for horizon restrictions within this range. Do not calculate SOC past
-                        # root zone restrictive layers.
-                        #
-                        if top < rz < bot:
-                            # restriction found in this horizon, use it to set a new depth
-                            #PrintMsg("\t\t" + resKind + " restriction for " + mukey + ":" + cokey + " at " + str(rz) + "cm", 1)
-                            cBot = rz
+            if len(dComp) == 0:
+                PrintMsg("\t" + Number_Format(0, 0, True) + " components for "  + str(td) + " - " + str(bd) + "cm", 1)
 
-                        else:
-                            cBot = min(rz, bot)
-
-                        # Calculate initial usable horizon thickness
-                        hzT = cBot - top
-
-                        if hzT > 0 and top < cBot:
-                            # get horizon fragment volume
-                            #try:
-                            #    fragvol = dFrags[chkey]
-
-                            #except:
-                            #    fragvol = 0.0
-                            #    pass
-
-                            # Calculate SOC using horizon thickness, OM, BD, FragVol, CompPct.
-                            # changed the OM to carbon conversion from * 0.58 to / 1.724 after running FY2017 value table
-                            soc =  ( (hzT * ( ( om / 1.724 ) * db3 )) / 100.0 ) * ((100.0 - fragvol) / 100.0) * ( compPct * 100 )
-
-                            if not cokey in dComp:
-                                # Create initial entry for this component using the first horizon CHK
-                                dComp[cokey] = (mukey, compPct, hzT, soc)
-
-                            else:
-                                # accumulate total thickness and total rating value by adding to existing component values  CHK
-                                mukey, compName, dHzT, dSOC = dComp[cokey]
-                                dSOC = dSOC + soc
-                                dHzT = dHzT + hzT
-                                dComp[cokey] = (mukey, compPct, dHzT, dSOC)
+            compList.append(dComp)
+            muList.append(dict())
 
+        # Output fields for all of the ranges, written in a single pass over each table
+        muFieldNames = ["MUKEY"] + ["SOC" + str(rng[0]) + "_" + str(rng[1]) for rng in depthList]
+        coFieldNames = ["COKEY"] + ["SOC" + str(rng[0]) + "_" + str(rng[1]) for rng in depthList]
 
-                    #arcpy.SetProgressorPosition()
+        # Open edit session on geodatabase to allow multiple insert cursors
+        with arcpy.da.Editor(db) as edit:
 
-                # get the total number of major components from the dictionary count
-                iComp = len(dComp)
+            # Open output component-level table in write mode
+            with arcpy.da.UpdateCursor(theCompTable, coFieldNames) as coCursor:
 
-                # Read through the component-level data and summarize to the mapunit level
-                #
-                if iComp > 0:
-                    #PrintMsg("\t\t" + str(td) + " - " + str(bd) + "cm (" + Number_Format(iComp, 0, True) + " components)", 0)
-                    #arcpy.SetProgressor("step", "Saving map unit and component SOC data...",  0, iComp, 1)
+                for corec in coCursor:
+                    # get component level data  CHK
+                    cokey = str(corec[0])
+                    bUpdate = False
 
-                    for corec in coCursor:
-                        # Could this be where I am losing minor components????
-                        #
-                        # get component level data  CHK
-                        cokey = str(corec[0])
+                    for i, dComp in enumerate(compList):
 
                         if cokey in dComp:
                             # get SOC-related data from dComp by cokey
-                            # dComp soc = ( (hzT * ( ( om * 0.58 ) * db3 )) / 100.0 ) * ~
+                            # dComp soc = ( (hzT * ( ( om / 1.724 ) * db3 )) / 100.0 ) * ~
                             # ((100.0 - fragvol) / 100.0) * ( compPct * 100 )
                             mukey, compPct, hzT, soc = dComp[cokey]
 
@@ -2737,67 +2259,52 @@ def CalcSOC(db, theCompTable, theMuTable, dPct, dFrags, depthList, dRestrictions
                             # Value[3] is earthy components
                             try:
                                 sumCompPct = float(dPct[mukey][0]) # Sum comppct for ALl components
-                                # Sum of comppct for Major-earthy components
-                                #sumCompPct = float(dPct[mukey][1])
 
                             except:
                                 # set the component percent to zero if it is not found in the
                                 # dictionary. This is probably a 'Miscellaneous area' not included in the  CHK
                                 # data or it has no horizon information.
                                 sumCompPct = 0.0
-                                #missingList.append("'" + mukey + "'")
 
                             # calculate component percentage adjustment
                             if sumCompPct > 0:
-                                # adjust the rating value down by the component percentage and by the sum of the usable horizon thickness for this component
-                                #soc = round((adjCompPct * om), 2) # component rating
-
-                                #soc = round((100.0 * om / sumCompPct), 0)  # Try adjusting soc down by the sum of the component percents
-                                adjCompPct = float(compPct) / sumCompPct  #
-
                                 # write the new component-level SOC data to the Co_VALU table
-
-                                corec[1] = soc                      # Test
+                                corec[i + 1] = soc
+                                bUpdate = True
 
                                 hzT = hzT * compPct / 100.0      # Adjust component share of horizon thickness by comppct
-                                #corec[2] = hzT             # This is new for the TK0_5A column
-                                coCursor.updateRow(corec)
-
-                                # Update component values in component dictionary   CHK
-                                dComp[cokey] = mukey, compPct, hzT, soc
-
-                                # Try to fix high mapunit aggregate HZ by weighting with comppct
 
                                 # Testing new mapunit aggregation 09-08-2014
-                                # Trying to replace dMu dictionary
+                                dMu = muList[i]
+
                                 if mukey in dMu:
                                     val1, val2, val3 = dMu[mukey]
-                                    #dMu[mukey] = (compPct + val1, hzT + val2, aws + val2)
                                     compPct = compPct + val1
-
                                     hzT = hzT + val2
                                     soc = soc + val3
 
                                 dMu[mukey] = (compPct, hzT, soc)
 
+                    if bUpdate:
+                        coCursor.updateRow(corec)
 
-                else:
-                    PrintMsg("\t" + Number_Format(iComp, 0, True) + " components for "  + str(td) + " - " + str(bd) + "cm", 1)
+            # Write out map unit aggregated SOC
+            #
+            with arcpy.da.UpdateCursor(theMuTable, muFieldNames) as muCursor:
 
-                # Write out map unit aggregated AWS
-                #
                 for murec in muCursor:
                     mukey = murec[0]
+                    bUpdate = False
 
-                    if mukey in dMu:
-                        compPct, hzT, soc = dMu[mukey]
-                        murec[1] = round(soc, 0)
-                        #murec[1] = compPct
-                        #murec[2] = round(soc, 0)
-                        #murec[3] = round(hzT, 0)  # this value appears to be low sometimes
-                        muCursor.updateRow(murec)
+                    for i, dMu in enumerate(muList):
 
-            arcpy.SetProgressorPosition()
+                        if mukey in dMu:
+                            compPct, hzT, soc = dMu[mukey]
+                            murec[i + 1] = round(soc, 0)
+                            bUpdate = True
+
+                    if bUpdate:
+                        muCursor.updateRow(murec)
 
         #if len(missingList) > 0:
         #    missingList = list(set(missingList))
@@ -2858,6 +2365,7 @@ def GetFragVol(db):
         errorMsg()
         return dict()
 
+## ===================================================================================
 ## ===================================================================================
 def GetSumPct(hzTable):
     # Get map unit - sum of component percent for all components and also for major-earthy components
@@ -2867,58 +2375,11 @@ def GetSumPct(hzTable):
     # Value[2] is all major components
     # Value[3] is earthy components
     #
-    # Do I need to add another option for earthy components?
     # WSS and SDV use all components with data for AWS.
+    # The sums come from the component catalogue of the horizon table (valu_engine.ComponentCatalogue).
 
     try:
-        pctSQL = "comppct_r is not null"
-        pctFlds = ["mukey", "cokey", "compkind", "majcompflag", "comppct_r"]
-        cokeyList = list()
-
-        dPct = dict()
-
-        flds = arcpy.Describe(hzTable).fields
-        fldNames = [fld.name for fld in flds]
-        #PrintMsg(" \nField names for hzTable: " + ", ".join(fldNames), 1)
-
-        with arcpy.da.SearchCursor(hzTable, pctFlds, pctSQL) as pctCur:
-            for rec in pctCur:
-                mukey, cokey, compkind, flag, comppct = rec
-                m = 0     # major component percent
-                me = 0    # major-earthy component percent
-                e = 0     # earthy component percent
-
-                if not cokey in cokeyList:
-                    # These are horizon data, so we only want to use the data once per component
-                    cokeyList.append(cokey)
-
-                    if flag == 'Yes':
-                        # major component percent
-                        m = comppct
-
-                        if not compkind in  ["Miscellaneous area", ""]:
-                            # major-earthy component percent
-                            me = comppct
-                            e = comppct
-
-                        else:
-                            me = 0
-
-                    elif not compkind in  ["Miscellaneous area", ""]:
-                        e = comppct
-
-                    if mukey in dPct:
-                        # This mapunit has a pair of values already
-                        # Get the existing values from the dictionary
-                        #pctAll, pctMjr = dPct[mukey] # all components, major-earthy
-                        pctAll, pctME, pctMjr, pctE = dPct[mukey]
-                        dPct[str(mukey)] = (pctAll + comppct, pctME + me, pctMjr + m, pctE + e)
-
-                    else:
-                        # this is the first component for this map unit
-                        dPct[str(mukey)] = (comppct, me, m, e)
-
-        return dPct
+        return GetHorizons(hzTable).catalogue().sumPct()
 
     except MyError, e:
         # Example: raise MyError("this is an error message")
@@ -3080,162 +2541,164 @@ def CalcNCCPI(db, theMuTable, qTable, dPct):
         return False
 
 ## ===================================================================================
-def CalcPWSL(db, theMuTable, dPct):
-    # Get potential wet soil landscape rating for each map unit
-    # Assuming that all components (with comppct_r) will be processed
+class PwslPlugin(valu_engine.Accumulator):
+    # Potential wet soil landscape part of CalcPWSL, collected by a valu_engine.HorizonReader
+    # from the first horizon of each component with comppct_r > 0.
+    # dMu[mukey] = sum of comppct_r for the wet components, 999 for water
     #
     # Sharon: I treat all map unit components the same, so if I find 1% water I think
     # it should show up as 1% PWSL.  If the percentage of water is >= 80% then I class
     # it into the water body category or 999.
-    try:
-        # Using the same component horizon table as always
-        #queryTbl = os.path.join(outputDB, "QueryTable_Hz")
-        numRows = int(arcpy.GetCount_management(hzTable).getOutput(0))
-        PrintMsg(" \n\tCalculating Potential Wet Soil Landscapes using " + os.path.basename(hzTable) + "...", 0)
-        qFieldNames = ["mukey", "muname", "cokey", "comppct_r",  "compname", "localphase", "otherph", "majcompflag", "compkind", "hydricrating", "drainagecl"]
-        pwSQL = "COMPPCT_R > 0"
-        compList = list()
-        dMu = dict()
+    #
+    # Defining water components SDP
+    # 1. compkind = 'Miscellaneous area' or is NULL and (
+    # 2. compname = 'Water' or
+    # 3. compname like '% water' or
+    # 4. compname like '% Ocean' or
+    # 5. compname like '% swamp'
 
-        drainList = ["Poorly drained", "Very poorly drained"]
-        phaseList = ["drained", "undrained", "channeled", "protected", "ponded", "flooded"]
-
-        # Defining water components SDP
-        # 1. compkind = 'Miscellaneous area' or is NULL and (
-        # 2. compname = 'Water' or
-        # 3. compname like '% water' or
-        # 4. compname like '% Ocean' or
-        # 5. compname like '% swamp'
-        # nameList = []
-
-        iCnt = int(arcpy.GetCount_management(hzTable).getOutput(0))
-        lastCokey = 'xxx'
-        arcpy.SetProgressor("step", "Reading query table table for wetland information...",  0, iCnt, 1)
-
-        with arcpy.da.SearchCursor(hzTable, qFieldNames, where_clause=pwSQL) as pwCur:
-            for rec in pwCur:
-                mukey, muname, cokey, comppct_r,  compname, localphase, otherph, majcompflag, compkind, hydricrating, drainagecl = rec
-                mukey = str(mukey)
-                cokey = str(cokey)
-
-                if cokey != lastCokey:
-                    # only process first horizon record for each component
-
-                    compList.append(cokey)
-                    # Only check the first horizon record, really only need component level
-                    # Not very efficient, should problably create a new query table
-                    #
-                    # Need to split up these tests so that None types can be handled
+    fields = ["mukey", "muname", "cokey", "comppct_r",  "compname", "localphase", "otherph", "majcompflag", "compkind", "hydricrating", "drainagecl"]
 
-                    # Sharon says that if the hydricrating for a component is 'No', don't
-                    # look at it any further. If it is unranked, go ahead and look at
-                    # other properties.
-                    #
-                    pw = False
+    drainList = ["Poorly drained", "Very poorly drained"]
+    phaseList = ["drained", "undrained", "channeled", "protected", "ponded", "flooded"]
 
-                    if ( muname == "Water" or str(compname) == "Water" or (str(compname).lower().find(" water") >= 0) or (str(compname).lower().find(" ocean") >= 0)  or (str(compname).find(" swamp") >= 0) or str(compname) == "Swamp" ) :
+    def __init__(self):
+        self.dMu = dict()
 
-                        # Check for water before looking at Hydric rating
-                        # Probably won't catch everything. Waiting for Sharon's criteria.
+    def begin(self, rec):
+        mukey, muname, cokey, comppct_r,  compname, localphase, otherph, majcompflag, compkind, hydricrating, drainagecl = rec
+        mukey = str(mukey)
+        cokey = str(cokey)
 
-                        if comppct_r >= 80:
-                            # Flag this mapunit with a '999'
-                            # Not necessarily catching map unit with more than one Water component that
-                            # might sum to >= 80. Don't think there are any right now.
-                            #PrintMsg("\tFlagging " + muname + " as Water", 1)
-                            #PrintMsg("\t" + mukey + "; " + muname + "; " + compname + "; " + str(compkind) + "; " + str(comppct_r), 1)
-                            pw = False
-                            dMu[mukey] = 999
+        if comppct_r is not None and comppct_r > 0:
+            # Only check the first horizon record, really only need component level
+            # Not very efficient, should problably create a new query table
+            #
+            # Need to split up these tests so that None types can be handled
 
-                        else:
-                            pw = True
+            # Sharon says that if the hydricrating for a component is 'No', don't
+            # look at it any further. If it is unranked, go ahead and look at
+            # other properties.
+            #
+            pw = False
 
-                            try:
-                                sumPct = dMu[mukey]
+            if ( muname == "Water" or str(compname) == "Water" or (str(compname).lower().find(" water") >= 0) or (str(compname).lower().find(" ocean") >= 0)  or (str(compname).find(" swamp") >= 0) or str(compname) == "Swamp" ) :
 
-                                if sumPct != 999:
-                                    dMu[mukey] = sumPct + comppct_r
+                # Check for water before looking at Hydric rating
+                # Probably won't catch everything. Waiting for Sharon's criteria.
 
-                            except:
-                                dMu[mukey] = comppct_r
+                if comppct_r >= 80:
+                    # Flag this mapunit with a '999'
+                    # Not necessarily catching map unit with more than one Water component that
+                    # might sum to >= 80. Don't think there are any right now.
+                    #PrintMsg("\tFlagging " + muname + " as Water", 1)
+                    #PrintMsg("\t" + mukey + "; " + muname + "; " + compname + "; " + str(compkind) + "; " + str(comppct_r), 1)
+                    pw = False
+                    self.dMu[mukey] = 999
 
-                    elif hydricrating == 'No':
-                        # Added this bit so that other properties cannot override hydricrating = 'No'
-                        pw = False
+                else:
+                    pw = True
 
-                    elif hydricrating == 'Yes':
-                        # This is always a Hydric component
-                        # Get component percent and add to map unit total PWSL
-                        pw = True
-                        #if mukey == tmukey:
-                        #    PrintMsg("\tHydric percent = " + str(comppct_r), 1)
+                    try:
+                        sumPct = self.dMu[mukey]
 
-                        try:
-                            sumPct = dMu[mukey]
+                        if sumPct != 999:
+                            self.dMu[mukey] = sumPct + comppct_r
 
-                            if sumPct != 999:
-                                dMu[mukey] = sumPct + comppct_r
+                    except:
+                        self.dMu[mukey] = comppct_r
 
-                        except:
-                            dMu[mukey] = comppct_r
+            elif hydricrating == 'No':
+                # Added this bit so that other properties cannot override hydricrating = 'No'
+                pw = False
 
-                    elif hydricrating == 'Unranked':
-                        # Not sure how Sharon is handling NULL hydric
-                        #
-                        # Unranked hydric from here on down, looking at other properties such as:
-                        #   Local phase
-                        #   Other phase
-                        #   Drainage class
-                        #   Map unit name strings
-                        #       drainList = ["Poorly drained", "Very poorly drained"]
-                        #       phaseList = ["drained", "undrained", "channeled", "protected", "ponded", "flooded"]
+            elif hydricrating == 'Yes':
+                # This is always a Hydric component
+                # Get component percent and add to map unit total PWSL
+                pw = True
+                #if mukey == tmukey:
+                #    PrintMsg("\tHydric percent = " + str(comppct_r), 1)
 
-                        if [d for d in phaseList if str(localphase).lower().find(d) >= 0]:
-                            pw = True
+                try:
+                    sumPct = self.dMu[mukey]
 
-                            try:
-                                sumPct = dMu[mukey]
-                                dMu[mukey] = sumPct + comppct_r
+                    if sumPct != 999:
+                        self.dMu[mukey] = sumPct + comppct_r
 
-                            except:
-                                dMu[mukey] = comppct_r
+                except:
+                    self.dMu[mukey] = comppct_r
 
-                        # otherphase
-                        elif [d for d in phaseList if str(otherph).lower().find(d) >= 0]:
-                            pw = True
+            elif hydricrating == 'Unranked':
+                # Not sure how Sharon is handling NULL hydric
+                #
+                # Unranked hydric from here on down, looking at other properties such as:
+                #   Local phase
+                #   Other phase
+                #   Drainage class
+                #   Map unit name strings
+                #       self.drainList = ["Poorly drained", "Very poorly drained"]
+                #       self.phaseList = ["drained", "undrained", "channeled", "protected", "ponded", "flooded"]
 
-                            try:
-                                sumPct = dMu[mukey]
-                                dMu[mukey] = sumPct + comppct_r
+                if [d for d in self.phaseList if str(localphase).lower().find(d) >= 0]:
+                    pw = True
 
-                            except:
-                                dMu[mukey] = comppct_r
+                    try:
+                        sumPct = self.dMu[mukey]
+                        self.dMu[mukey] = sumPct + comppct_r
 
-                        # look for specific strings in the map unit name
-                        elif [d for d in phaseList if muname.find(d) >= 0]:
-                            pw = True
-                            #if mukey == tmukey:
-                            #    PrintMsg("\tMuname = " + muname, 1)
+                    except:
+                        self.dMu[mukey] = comppct_r
 
-                            try:
-                                sumPct = dMu[mukey]
-                                dMu[mukey] = sumPct + comppct_r
+                # otherphase
+                elif [d for d in self.phaseList if str(otherph).lower().find(d) >= 0]:
+                    pw = True
 
-                            except:
-                                dMu[mukey] = comppct_r
+                    try:
+                        sumPct = self.dMu[mukey]
+                        self.dMu[mukey] = sumPct + comppct_r
 
-                        elif str(drainagecl) in drainList:
-                            pw = True
+                    except:
+                        self.dMu[mukey] = comppct_r
 
-                            try:
-                                sumPct = dMu[mukey]
-                                dMu[mukey] = sumPct + comppct_r
+                # look for specific strings in the map unit name
+                elif [d for d in self.phaseList if muname.find(d) >= 0]:
+                    pw = True
+                    #if mukey == tmukey:
+                    #    PrintMsg("\tMuname = " + muname, 1)
 
-                            except:
-                                dMu[mukey] = comppct_r
+                    try:
+                        sumPct = self.dMu[mukey]
+                        self.dMu[mukey] = sumPct + comppct_r
 
-                lastCokey = cokey # use this to skip the rest of the horizons for this component
-                arcpy.SetProgressorPosition()
+                    except:
+                        self.dMu[mukey] = comppct_r
+
+                elif str(drainagecl) in self.drainList:
+                    pw = True
+
+                    try:
+                        sumPct = self.dMu[mukey]
+                        self.dMu[mukey] = sumPct + comppct_r
+
+                    except:
+                        self.dMu[mukey] = comppct_r
+
+## ===================================================================================
+def CalcPWSL(db, theMuTable, dPct, dMu=None):
+    # Get potential wet soil landscape rating for each map unit
+    # Assuming that all components (with comppct_r) will be processed
+    #
+    # See PwslPlugin for the rating of each component. dMu is the rating dictionary
+    # of a PwslPlugin that has already been run.
+    try:
+        # The ratings are collected from the horizon table by PwslPlugin, normally in
+        # the CreateValuTable pass over the table
+        PrintMsg(" \n\tCalculating Potential Wet Soil Landscapes using " + os.path.basename(hzTable) + "...", 0)
+
+        if dMu is None:
+            pwPlugin = PwslPlugin()
+            GetHorizons(hzTable, plugins=[pwPlugin])
+            dMu = pwPlugin.dMu
 
         if len(dMu) > 0:
             arcpy.SetProgressor("step", "Populating " + os.path.basename(theMuTable) + "...",  0, len(dMu), 1)
@@ -3561,20 +3024,31 @@ def CreateValuTable(muTable, hzTable, crTable, interpTable):
         logFile = os.path.basename(db)[:-4] + "_Problems.txt"
         logFile = os.path.join(os.path.dirname(db), logFile)
 
+        # Read the horizon table used by all of the calculations below. The potential wet soil
+        # ratings are collected in the same pass over the table.
+        pwPlugin = PwslPlugin()
+        hz = GetHorizons(hzTable, reload=True, plugins=[pwPlugin])
+
+        # Component catalogue (keys, major/earthy flags, component percent sums) shared by
+        # the output tables and calculations
+        catalogue = hz.catalogue()
+
         # Get the mapunit - sum of component percent for calculations
-        dPct = GetSumPct(hzTable)
+        dPct = catalogue.sumPct()
 
         if len(dPct) == 0:
             raise MyError, ""
 
         # Create permanent output tables for the map unit and component levels
+        # AWS and SOC for all of the ranges are computed from the same in-memory horizon
+        # table, so adding ranges here does not add passes over the HzData table.
         #depthList = [(0,5), (5, 20), (20, 50), (50, 100), (100, 150), (150, 999), (0, 20), (0, 30), (0, 100), (0, 150), (0, 999)]
         depthList = [(0, 20), (20, 50), (50, 100)]  # this list is for AWS and SOC in the ACPF table
 
-        if CreateOutputTableMu(muTable, depthList, dPct) == False:
+        if CreateOutputTableMu(muTable, depthList, dPct, catalogue) == False:
             raise MyError, ""
 
-        if CreateOutputTableCo(theCompTable, depthList) == False:
+        if CreateOutputTableCo(theCompTable, depthList, catalogue) == False:
             raise MyError, ""
 
         # Store component restrictions for root growth in a dictionary
@@ -3614,7 +3088,7 @@ def CreateValuTable(muTable, hzTable, crTable, interpTable):
             raise MyError, ""
 
         # Calculate PWSL
-        if CalcPWSL(db, muTable, dPct) == False:
+        if CalcPWSL(db, muTable, dPct, pwPlugin.dMu) == False:
             raise MyError, ""
 
         PrintMsg(" \n\tAll calculations complete", 0)
@@ -3668,15 +3142,19 @@ def CreateValuTable(muTable, hzTable, crTable, interpTable):
 def GetSurfaceData(inputTable, outputTable):
     # Read horizon information from HzData table and pull the top horizon records for the
     # dominant component based on comppct_r.
-    # Need to specify field names I think.
+    # The dominant major component of each map unit comes from the component catalogue.
 
     try:
-        oidList = list()
-        mukeyList = list()
         where_clause = "hzdept_r = 0 and majcompflag = 'Yes'"
         sql_clause = (None, "ORDER BY mukey, comppct_r DESC")
         fldNames = [fld.name.encode('ascii').lower() for fld in arcpy.Describe(inputTable).fields][1:]
         #PrintMsg(" \n" + ", ".join(fldNames), 1)
+        iMukey = fldNames.index("mukey")
+        iCokey = fldNames.index("cokey")
+
+        # mukey: cokey of the dominant major component
+        dDominant = GetHorizons(inputTable).catalogue().dominant(major=True)
+        dDone = dict()
 
         if arcpy.Exists(outputTable):
             arcpy.Delete_management(outputTable)
@@ -3685,11 +3163,13 @@ def GetSurfaceData(inputTable, outputTable):
 
         outCur = arcpy.da.InsertCursor(outputTable, fldNames)
 
-        with arcpy.da.SearchCursor(inputTable, fldNames) as cur:
+        with arcpy.da.SearchCursor(inputTable, fldNames, where_clause=where_clause, sql_clause=sql_clause) as cur:
 
             for rec in cur:
-                if not rec[0] in mukeyList:
-                    mukeyList.append(rec[0])
+                mukey = rec[iMukey]
+
+                if dDominant.get(mukey) == rec[iCokey] and not mukey in dDone:
+                    dDone[mukey] = True
                     #PrintMsg(str(rec), 1)
                     outCur.insertRow(rec)
 
@@ -3760,7 +3240,14 @@ def GetSoilPolygons(aoiFC, db, outputShp):
             PrintMsg(" \n\tSending spatial request to Soil Data Access", 0)
             spatialQuery, clipPolygon, bProjected = FormSpatialQuery(aoiFC)
 
-            if spatialQuery != "":
+            if spatialQuery != "" and polyAcres > maxAcres and aoi_tiles.TILED:
+                # Too large for one request, send the AOI as quadtree cells
+                outCnt = RunTiledSpatialQuery(sdaURL, outputShp, clipPolygon, bProjected, counter, True)
+
+                if outCnt == 0:
+                    raise MyError, "Zero returned by RunTiledSpatialQuery"
+
+            elif spatialQuery != "":
                 # Send spatial query and use results to populate outputShp featureclass
                 #outCnt = RunSpatialQueryJSON(sdaURL, spatialQuery, outputShp, clipPolygon, counter, showStatus)
                 outCnt = RunSpatialQueryJSON(sdaURL, spatialQuery, outputShp, clipPolygon, bProjected, counter, True)
@@ -3807,6 +3294,19 @@ def GetSoilPolygons(aoiFC, db, outputShp):
                         else:
                             arcpy.SetProgressorPosition()
 
+                elif aoi_tiles.TILED:
+                    # Too large for one request, send the AOI as quadtree cells
+                    spatialQuery, clipPolygon, bProjected = FormSpatialQuery(newAOI)
+
+                    if spatialQuery != "":
+                        outCnt = RunTiledSpatialQuery(sdaURL, outputShp, clipPolygon, bProjected, counter, showStatus)
+
+                        if outCnt == 0:
+                            raise MyError, ""
+
+                        else:
+                            arcpy.SetProgressorPosition()
+
                 else:
                     if polyAcres >= maxAcres:
                         raise MyError, "Overall extent of AOI polygon exceeds " + Number_Format(maxAcres, 0, True) + " acre limit \n "
@@ -4007,23 +3507,27 @@ def GetAttributeData(outputShp):
         return False
 
 ## ===================================================================================
-def CreateSoilsData(acpfFolder, acpfDBs):
-    # driving function that calls all other functions in this module
-    # acpfDB is the target ACPF geodatabase which must already contain the
-    # 'buf' featureclass and the 'wsCDL' rasters.
+def CreateSoilsDB(acpfFolder, dbName, verbose):
+    # Create the soils data for a single ACPF geodatabase. This is one job of the
+    # batch run started by CreateSoilsData and may run in a worker process, so the
+    # module settings are set up here again as global variables.
     #
-    try:
-    # Get input parameters
+    # Returns a list containing the HUC code if the database failed, otherwise an empty list
     #
-        from arcpy import env
-        env.overWriteOutput = True
+    from arcpy import env
 
-        if env.scratchWorkspace == None:
-            raise MyError, "Scratch workspace in geoprocessing environment must be set"
+    # the job's scratch folder, removed and the user's scratch workspace put back however the job ends
+    scratchDir = None
+    userScratch = env.scratchWorkspace
+
+    try:
+        env.overWriteOutput = True
 
         # Global variables.
         # It would be better if these were defined as function parameters instead of global variables.
-        global db, aoiFC, aoiCnt, muTable, hzTable, crTable, interpTable, soilprofTable, surfTable, rasterName, muRaster, sdaURL, tm, epsgWM, epsgWGS, epsgNAD83, epsgAlbers
+        global db, aoiFC, aoiCnt, muTable, hzTable, crTable, interpTable, soilprofTable, surfTable, rasterName, muRaster, sdaURL, tm, epsgWM, epsgWGS, epsgNAD83, epsgAlbers, bVerbose
+
+        bVerbose = verbose
 
         # Commonly used EPSG numbers
         epsgWM = 3857 # Web Mercatur
@@ -4042,107 +3546,161 @@ def CreateSoilsData(acpfFolder, acpfDBs):
         # Get geographic coordinate system information for input and output layers
         validDatums = ["D_WGS_1984", "D_North_American_1983"]
 
+        db = os.path.join(acpfFolder, dbName)
 
-        # Loop acpfDBs below
-        for dbName in acpfDBs:
-            db = os.path.join(acpfFolder, dbName)
+        # Get HUC code as string using last 12 characters of database name
+        env.workspace = db
+        hucCode = dbName[4:16]
+        PrintMsg(" \nProcessing ACPF database for HUC " + hucCode, 0)
+        bufLayers = arcpy.ListFeatureClasses("buf" + hucCode, "POLYGON")
 
-            # Get HUC code as string using last 12 characters of database name
-            env.workspace = db
-            hucCode = dbName[4:16]
-            PrintMsg(" \nProcessing ACPF database for HUC " + hucCode, 0)
-            bufLayers = arcpy.ListFeatureClasses("buf" + hucCode, "POLYGON")
+        if len(bufLayers) == 1:
+            aoiFC = os.path.join(db, bufLayers[0])
+            #PrintMsg(" \nUsing AOI featureclass: " + aoiFC, 1)
 
-            if len(bufLayers) == 1:
-                aoiFC = os.path.join(db, bufLayers[0])
-                #PrintMsg(" \nUsing AOI featureclass: " + aoiFC, 1)
+        elif len(bufLayers) == 0:
+            raise MyError, "Buffered HUC featureclass (buf" + hucCode + ") not found in " + db
 
-            elif len(bufLayers) == 0:
-                raise MyError, "Buffered HUC featureclass (buf" + hucCode + ") not found in " + db
+        # Each job gets its own scratch workspace. The raster conversion keeps its
+        # Lookup table and ArcInfo workspace there, which would collide between
+        # databases processed at the same time.
+        scratchDir, scratchGDB = acpf_batch.scratchWorkspace(hucCode)
+        env.scratchWorkspace = scratchGDB
 
-            # input description object
-            aoiDesc = arcpy.Describe(aoiFC)
-            aoiCS = aoiDesc.spatialReference
-            aoiCnt = int(arcpy.GetCount_management(aoiFC).getOutput(0))
-            #aoiFC = aoiDesc.featureclass.catalogPath
+        # input description object
+        aoiDesc = arcpy.Describe(aoiFC)
+        aoiCS = aoiDesc.spatialReference
+        aoiCnt = int(arcpy.GetCount_management(aoiFC).getOutput(0))
+        #aoiFC = aoiDesc.featureclass.catalogPath
 
-            if not aoiCS.GCS.datumName in validDatums:
-                raise MyError, "AOI coordinate system not supported: " + aoiCS.name + ", " + aoiCS.GCS.datumName
+        if not aoiCS.GCS.datumName in validDatums:
+            raise MyError, "AOI coordinate system not supported: " + aoiCS.name + ", " + aoiCS.GCS.datumName
 
-            if aoiCS.GCS.datumName == "D_WGS_1984":
-                tm = ""  # no datum transformation required
+        if aoiCS.GCS.datumName == "D_WGS_1984":
+            tm = ""  # no datum transformation required
 
-            elif aoiCS.GCS.datumName == "D_North_American_1983":
-                tm = "WGS_1984_(ITRF00)_To_NAD_1983"
+        elif aoiCS.GCS.datumName == "D_North_American_1983":
+            tm = "WGS_1984_(ITRF00)_To_NAD_1983"
 
-            else:
-                raise MyError, "AOI CS datum name: " + aoiCS.GCS.datumName
+        else:
+            raise MyError, "AOI CS datum name: " + aoiCS.GCS.datumName
 
-            env.geographicTransformations = tm
-            sdaCS = arcpy.SpatialReference(epsgWGS)
+        env.geographicTransformations = tm
+        sdaCS = arcpy.SpatialReference(epsgWGS)
 
 
-            # Determine whether
-            if aoiCS.PCSName != "":
-                # AOI layer has a projected coordinate system, so geometry will always have to be projected
-                bProjected = True
+        # Determine whether
+        if aoiCS.PCSName != "":
+            # AOI layer has a projected coordinate system, so geometry will always have to be projected
+            bProjected = True
 
-            elif aoiCS.GCS.name != sdaCS.GCS.name:
-                # AOI must be NAD 1983
-                bProjected = True
+        elif aoiCS.GCS.name != sdaCS.GCS.name:
+            # AOI must be NAD 1983
+            bProjected = True
 
-            else:
-                bProjected = False
+        else:
+            bProjected = False
 
-            # Start timer
-            begin = time.time()
+        # Start timer
+        begin = time.time()
 
-            # Output tables as global variables
-            # Change current workspace to location of buf layer and create empty mupolygon featureclass
-            outputShp = os.path.join(db, "mupolygon")
+        # Output tables as global variables
+        # Change current workspace to location of buf layer and create empty mupolygon featureclass
+        outputShp = os.path.join(db, "mupolygon")
 
-            hzTable = os.path.join(db, "HzData")
-            muTable = os.path.join(db, "MuData")
-            crTable = os.path.join(db, "CrData")
-            interpTable = os.path.join(db, "InterpData")
-            soilprofTable = os.path.join(db, "SoilProfile" + hucCode)
-            surfTable = os.path.join(db, "SurfHrz" + hucCode)
-            rasterName = "gSSURGO"
-            muRaster = os.path.join(db, rasterName)
+        hzTable = os.path.join(db, "HzData")
+        muTable = os.path.join(db, "MuData")
+        crTable = os.path.join(db, "CrData")
+        interpTable = os.path.join(db, "InterpData")
+        soilprofTable = os.path.join(db, "SoilProfile" + hucCode)
+        surfTable = os.path.join(db, "SurfHrz" + hucCode)
+        rasterName = "gSSURGO"
+        muRaster = os.path.join(db, rasterName)
 
-            # Begin by getting the soil polygons from Soil Data Access and
-            # convert them to raster
-            outCnt = GetSoilPolygons(aoiFC, db, outputShp)
+        # Begin by getting the soil polygons from Soil Data Access and
+        # convert them to raster
+        outCnt = GetSoilPolygons(aoiFC, db, outputShp)
 
-            if outCnt == 0:
-                raise MyError,  ""
+        if outCnt == 0:
+            raise MyError,  ""
 
-            # Next get the associated soil attribute data
-            #
-            PrintMsg(" \nGetting soil attribute data from Soil Data Access:", 0)
-            bAttributes = GetAttributeData(outputShp)
+        # Next get the associated soil attribute data
+        #
+        PrintMsg(" \nGetting soil attribute data from Soil Data Access:", 0)
+        bAttributes = GetAttributeData(outputShp)
 
-            # Finish up...
-            if bAttributes:
-                #PrintMsg(" \nOutput GML file: " + theGMLFile, 0)
-                try:
-                    # Add output rasters to ArcMap TOC
-                    mxd = arcpy.mapping.MapDocument("CURRENT")
-                    df = mxd.activeDataFrame
+        # Finish up...
+        if bAttributes:
+            #PrintMsg(" \nOutput GML file: " + theGMLFile, 0)
+            try:
+                # Add output rasters to ArcMap TOC
+                mxd = arcpy.mapping.MapDocument("CURRENT")
+                df = mxd.activeDataFrame
 
-                except:
-                    pass
+            except:
+                pass
 
 
-                # Add new raster map layer to ArcMap TOC
-                #arcpy.SetParameter(1, "gSSURGO")
+            # Add new raster map layer to ArcMap TOC
+            #arcpy.SetParameter(1, "gSSURGO")
 
-                eMsg = elapsedTime(begin)
+            eMsg = elapsedTime(begin)
 
-                PrintMsg(" \nElapsed time for SDA request: " + eMsg + " \n ", 0)
+            PrintMsg(" \nElapsed time for SDA request: " + eMsg + " \n ", 0)
 
-            else:
-                PrintMsg("Failed to get spatial data from SDA", 2)
+            if not sda_cache.getCache() is None:
+                PrintMsg("\t" + sda_cache.getCache().report(), 0)
+            return []
+
+        else:
+            PrintMsg("Failed to get spatial data from SDA", 2)
+            return [hucCode]
+
+    except MyError, e:
+        # Example: raise MyError("this is an error message")
+        PrintMsg(str(e) + " \n", 2)
+        return [dbName[4:16]]
+
+    finally:
+        env.scratchWorkspace = userScratch
+
+        if not scratchDir is None:
+            acpf_batch.removeScratch(scratchDir)
+
+## ===================================================================================
+def CreateSoilsData(acpfFolder, acpfDBs):
+    # driving function that calls all other functions in this module
+    # acpfDB is the target ACPF geodatabase which must already contain the
+    # 'buf' featureclass and the 'wsCDL' rasters.
+    #
+    # The databases are independent of each other, so they are handed to a pool of
+    # worker processes (see acpf_batch.WORKERS) and the failures summarized at the end.
+    #
+    try:
+        from arcpy import env
+
+        if env.scratchWorkspace == None:
+            raise MyError, "Scratch workspace in geoprocessing environment must be set"
+
+        jobs = [(dbName, (acpfFolder, dbName, bVerbose)) for dbName in acpfDBs]
+
+        def JobDone(res):
+            if not res.error is None:
+                PrintMsg(" \n" + res.name + " failed: \n" + res.error, 1)
+
+        summary = acpf_batch.runBatch(acpf_batch.jobFunction(__file__, "CreateSoilsDB"), jobs, callback=JobDone)
+
+        for line in summary.report():
+            PrintMsg(line, 0)
+
+        failedList = summary.failed()
+
+        if len(failedList) > 0:
+            PrintMsg(" \nThe following ACPF database(s) did not execute properly:", 1)
+            PrintMsg("\t" + ", ".join(failedList) + " \n ", 1)
+            return False
+
+        return True
 
     except MyError, e:
         # Example: raise MyError("this is an error message")
@@ -4161,6 +3719,10 @@ import xml.etree.cElementTree as ET
 from arcpy import env
 from random import randint
 
+# Shared SDA helper modules live in the root of the ACPF_gSSURGO repository
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..")))
+import sda_client, sda_cache, acpf_batch, table_writer, valu_engine, aoi_clip, aoi_tiles, sda_project
+
 try:
 
     if __name__ == "__main__":
@@ -0,0 +1,197 @@
+#-------------------------------------------------------------------------------
+# Name:        acpf_batch
+# Purpose:     Process many ACPF HUC12 geodatabases at once in a pool of
+#              worker processes.
+#
+#              Every watershed geodatabase is independent, so a state-wide
+#              run is split into one job per geodatabase. Each job gets its
+#              own scratch folder and file geodatabase for intermediate
+#              featureclasses, so parallel jobs never share a scratch name.
+#              Failures are collected per job and summarized once at the end.
+#
+#              arcpy is imported separately by every worker process. When
+#              the tools run inside ArcMap or ArcGIS Pro, sys.executable is
+#              the desktop application, so workers are started with the
+#              Python interpreter that ships with it instead.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, sys, time, shutil, tempfile, traceback, multiprocessing
+
+
+# Number of geodatabases processed at once. Each worker also runs its own
+# SDA requests, so keep this modest against the public service; the workers
+# share sda_client.MAX_PER_HOST connections between them.
+WORKERS = int(os.environ.get("ACPF_WORKERS", str(max(1, min(4, multiprocessing.cpu_count() - 1)))))
+
+
+def setExecutable():
+    # Workers must not be started with ArcMap.exe or ArcGISPro.exe
+    exe = os.path.basename(sys.executable).lower()
+
+    if exe.startswith("arc"):
+        for name in ["pythonw.exe", "python.exe"]:
+            pyExe = os.path.join(sys.exec_prefix, name)
+
+            if os.path.exists(pyExe):
+                multiprocessing.set_executable(pyExe)
+                break
+
+
+def scratchWorkspace(name):
+    # Create an isolated scratch folder and file geodatabase for one job.
+    # Returns (folder, gdb). The caller removes the folder (removeScratch) in
+    # a finally block, so a failed job leaves nothing behind.
+    import arcpy
+
+    folder = tempfile.mkdtemp(prefix="acpf_" + name + "_")
+    arcpy.management.CreateFileGDB(folder, "scratch.gdb")
+
+    return folder, os.path.join(folder, "scratch.gdb")
+
+
+def removeScratch(folder):
+    shutil.rmtree(folder, True)
+
+
+def jobFunction(script, name):
+    # The function name of the tool script at path script, imported as a
+    # module under its own name. A tool runs as __main__, which worker
+    # processes cannot import (in ArcMap it is not even a file), so a job
+    # function taken from it could not be pickled.
+    folder, fileName = os.path.split(os.path.abspath(script))
+
+    if not folder in sys.path:
+        # workers are given the parent's sys.path
+        sys.path.insert(0, folder)
+
+    module = __import__(os.path.splitext(fileName)[0])
+
+    return getattr(module, name)
+
+
+class JobResult(object):
+    # Outcome of one geodatabase job
+
+    def __init__(self, name):
+        self.name = name
+        self.failed = list()        # watersheds that did not execute properly
+        self.error = None           # traceback of an unhandled exception
+        self.seconds = 0.0
+
+    def ok(self):
+        return self.error is None and len(self.failed) == 0
+
+
+class BatchSummary(object):
+    # Aggregated results of a batch run
+
+    def __init__(self):
+        self.results = list()
+        self.wall = 0.0
+
+    def failed(self):
+        # every watershed that did not execute properly, in job order
+        fLst = list()
+
+        for res in self.results:
+            for w in res.failed:
+                if not w in fLst:
+                    fLst.append(w)
+
+            if res.error is not None and not res.name in fLst:
+                fLst.append(res.name)
+
+        return fLst
+
+    def errors(self):
+        return [(res.name, res.error) for res in self.results if res.error is not None]
+
+    def report(self):
+        done = len([res for res in self.results if res.ok()])
+        lines = list()
+        lines.append("Processed " + str(len(self.results)) + " geodatabase(s) in " + "%.1f" % self.wall + " s, " + str(done) + " without problems")
+
+        for res in self.results:
+            status = "ok" if res.ok() else "FAILED"
+            lines.append(res.name + ": " + status + " (" + "%.1f" % res.seconds + " s)")
+
+        return lines
+
+
+def _initWorker(perHost):
+    # Runs once in every worker process: its share of the SDA connections
+    import sda_client
+
+    sda_client.configure(maxPerHost=perHost)
+
+
+def _runJob(args):
+    # Runs in the worker process. func must be a module level function of an
+    # importable module (see jobFunction) so it can be pickled; it returns the
+    # list of watersheds that failed.
+    func, name, jobArgs = args
+    res = JobResult(name)
+    t0 = time.time()
+
+    try:
+        failed = func(*jobArgs)
+
+        if failed:
+            res.failed = list(failed)
+
+    except:
+        res.error = traceback.format_exc()
+
+    res.seconds = time.time() - t0
+
+    return res
+
+
+def runBatch(func, jobs, workers=None, callback=None):
+    # Run func(*jobArgs) for every (name, jobArgs) in jobs
+    #
+    # With more than one worker the jobs run in a process pool, otherwise they
+    # run in this process (geoprocessing messages then reach the tool dialog).
+    # callback, if given, is called with each JobResult as it finishes.
+    # Returns a BatchSummary with results in job order.
+
+    summary = BatchSummary()
+    workers = max(1, min(workers or WORKERS, len(jobs)))
+    tasks = [(func, name, jobArgs) for name, jobArgs in jobs]
+    t0 = time.time()
+
+    if workers == 1:
+        for task in tasks:
+            res = _runJob(task)
+            summary.results.append(res)
+
+            if callback:
+                callback(res)
+
+    else:
+        import sda_client
+
+        setExecutable()
+        perHost = max(1, sda_client.MAX_PER_HOST // workers)
+        pool = multiprocessing.Pool(workers, _initWorker, (perHost,))
+
+        try:
+            byName = dict()
+
+            for res in pool.imap_unordered(_runJob, tasks):
+                byName[res.name] = res
+
+                if callback:
+                    callback(res)
+
+            summary.results = [byName[name] for name, jobArgs in jobs]
+
+        finally:
+            pool.close()
+            pool.join()
+
+    summary.wall = time.time() - t0
+
+    return summary
@@ -0,0 +1,225 @@
+#-------------------------------------------------------------------------------
+# Name:        aoi_clip
+# Purpose:     Envelope prefilter for clipping soil polygons to an AOI.
+#
+#              RunSpatialQueryJSON clipped every polygon SDA returned with
+#              newPolygon.intersect(clipPolygon, 4), although most of them lie
+#              wholly inside the AOI. PreparedAOI holds the AOI boundary as
+#              NumPy edge arrays in a uniform grid and classifies a polygon
+#              envelope as
+#
+#                  INSIDE    no AOI edge touches it and it lies in the AOI:
+#                            the polygon is kept as it is
+#                  OUTSIDE   no AOI edge touches it and it lies outside the
+#                            AOI: the intersection would be empty
+#                  CROSSING  an AOI edge touches it: the polygon is intersected
+#
+#              The classification is exact for the envelope, so a polygon is
+#              only left unclipped when the clip could not change it. ClipStats
+#              keeps the counts and the time spent classifying and intersecting.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+
+
+INSIDE = 1
+OUTSIDE = 0
+CROSSING = 2
+
+_names = {INSIDE: "inside", OUTSIDE: "outside", CROSSING: "crossing"}
+
+
+def geometryRings(geometry):
+    # Rings of an arcpy polygon as lists of (x, y), holes included. Within a
+    # part arcpy separates the rings with None.
+    rings = list()
+
+    for part in geometry:
+        ring = list()
+
+        for pnt in part:
+            if pnt is None:
+                if ring:
+                    rings.append(ring)
+
+                ring = list()
+
+            else:
+                ring.append((pnt.X, pnt.Y))
+
+        if ring:
+            rings.append(ring)
+
+    return rings
+
+
+class PreparedAOI(object):
+    # AOI boundary edges (x0, y0, x1, y1 arrays) with a uniform grid index
+
+    def __init__(self, rings, cellEdges=16):
+        x0 = list()
+        y0 = list()
+        x1 = list()
+        y1 = list()
+
+        for ring in rings:
+            n = len(ring)
+
+            for i in range(n):
+                (ax, ay), (bx, by) = ring[i], ring[(i + 1) % n]
+
+                if (ax, ay) != (bx, by):
+                    x0.append(ax)
+                    y0.append(ay)
+                    x1.append(bx)
+                    y1.append(by)
+
+        self.x0 = np.array(x0, dtype=np.float64)
+        self.y0 = np.array(y0, dtype=np.float64)
+        self.x1 = np.array(x1, dtype=np.float64)
+        self.y1 = np.array(y1, dtype=np.float64)
+
+        self.exmin = np.minimum(self.x0, self.x1)
+        self.exmax = np.maximum(self.x0, self.x1)
+        self.eymin = np.minimum(self.y0, self.y1)
+        self.eymax = np.maximum(self.y0, self.y1)
+
+        self.xmin = float(self.exmin.min())
+        self.xmax = float(self.exmax.max())
+        self.ymin = float(self.eymin.min())
+        self.ymax = float(self.eymax.max())
+
+        # about cellEdges edges per grid cell
+        nCells = max(1, int(np.sqrt(len(x0) / float(cellEdges))))
+        self.nx = nCells
+        self.ny = nCells
+        self.dx = (self.xmax - self.xmin) / nCells or 1.0
+        self.dy = (self.ymax - self.ymin) / nCells or 1.0
+
+        i0, i1 = self._cols(self.exmin, self.exmax)
+        j0, j1 = self._rows(self.eymin, self.eymax)
+        cells = dict()
+
+        for e in range(len(x0)):
+            for i in range(i0[e], i1[e] + 1):
+                for j in range(j0[e], j1[e] + 1):
+                    cells.setdefault((i, j), list()).append(e)
+
+        self.cells = dict((k, np.array(v, dtype=np.int64)) for k, v in cells.items())
+
+    @classmethod
+    def fromGeometry(cls, geometry):
+        return cls(geometryRings(geometry))
+
+    def _cols(self, lo, hi):
+        return (np.clip(((np.asarray(lo) - self.xmin) / self.dx).astype(np.int64), 0, self.nx - 1),
+                np.clip(((np.asarray(hi) - self.xmin) / self.dx).astype(np.int64), 0, self.nx - 1))
+
+    def _rows(self, lo, hi):
+        return (np.clip(((np.asarray(lo) - self.ymin) / self.dy).astype(np.int64), 0, self.ny - 1),
+                np.clip(((np.asarray(hi) - self.ymin) / self.dy).astype(np.int64), 0, self.ny - 1))
+
+    def _candidates(self, xmin, ymin, xmax, ymax):
+        # indexes of the edges in the grid cells the envelope covers
+        i0, i1 = self._cols(xmin, xmax)
+        j0, j1 = self._rows(ymin, ymax)
+        found = [self.cells[(i, j)] for i in range(int(i0), int(i1) + 1) for j in range(int(j0), int(j1) + 1) if (i, j) in self.cells]
+
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+
+        return np.unique(np.concatenate(found))
+
+    def touches(self, xmin, ymin, xmax, ymax):
+        # True when an AOI edge intersects or touches the envelope
+        e = self._candidates(xmin, ymin, xmax, ymax)
+
+        if len(e) == 0:
+            return False
+
+        # bounding boxes overlap ...
+        e = e[(self.exmin[e] <= xmax) & (self.exmax[e] >= xmin) & (self.eymin[e] <= ymax) & (self.eymax[e] >= ymin)]
+
+        if len(e) == 0:
+            return False
+
+        # ... and the edge's line does not leave all four corners on one side
+        x0, y0 = self.x0[e], self.y0[e]
+        ux, uy = self.x1[e] - x0, self.y1[e] - y0
+        sides = [ux * (cy - y0) - uy * (cx - x0) for cx, cy in ((xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax))]
+        above = (sides[0] > 0) & (sides[1] > 0) & (sides[2] > 0) & (sides[3] > 0)
+        below = (sides[0] < 0) & (sides[1] < 0) & (sides[2] < 0) & (sides[3] < 0)
+
+        return bool(np.any(~(above | below)))
+
+    def contains(self, x, y):
+        # Even-odd point in polygon test over all rings (holes included)
+        crosses = (self.y0 > y) != (self.y1 > y)
+        xs = self.x0[crosses] + (y - self.y0[crosses]) * (self.x1[crosses] - self.x0[crosses]) / (self.y1[crosses] - self.y0[crosses])
+
+        return bool(np.count_nonzero(xs > x) % 2)
+
+    def classify(self, xmin, ymin, xmax, ymax):
+        # INSIDE, OUTSIDE or CROSSING for an envelope
+
+        if xmax < self.xmin or xmin > self.xmax or ymax < self.ymin or ymin > self.ymax:
+            return OUTSIDE
+
+        if self.touches(xmin, ymin, xmax, ymax):
+            return CROSSING
+
+        # no edge reaches the envelope, so all of it is on one side of the boundary
+        if self.contains(xmin, ymin):
+            return INSIDE
+
+        return OUTSIDE
+
+
+class ClipStats(object):
+    # Counts of each class and the time spent classifying and intersecting
+
+    def __init__(self):
+        self.counts = {INSIDE: 0, OUTSIDE: 0, CROSSING: 0}
+        self.classifySeconds = 0.0
+        self.clipSeconds = 0.0
+
+    def report(self):
+        # list of message lines
+        total = sum(self.counts.values())
+        lines = ["Envelope prefilter: " + ", ".join(str(self.counts[c]) + " " + _names[c] for c in (INSIDE, CROSSING, OUTSIDE)) + " of " + str(total) + " polygons"]
+        lines.append("classify " + "%.2f" % self.classifySeconds + " s, intersect " + "%.2f" % self.clipSeconds + " s (" + str(self.counts[CROSSING]) + " polygons)")
+
+        return lines
+
+
+class EnvelopeClipper(object):
+    # Clip arcpy polygons to an AOI, intersecting only the ones that cross it
+
+    def __init__(self, clipPolygon):
+        self.clipPolygon = clipPolygon
+        self.aoi = PreparedAOI.fromGeometry(clipPolygon)
+        self.stats = ClipStats()
+
+    def clip(self, polygon):
+        # The part of polygon inside the AOI, or None when there is none
+        t0 = time.time()
+        ext = polygon.extent
+        cls = self.aoi.classify(ext.XMin, ext.YMin, ext.XMax, ext.YMax)
+        self.stats.classifySeconds += time.time() - t0
+        self.stats.counts[cls] += 1
+
+        if cls == INSIDE:
+            return polygon
+
+        if cls == OUTSIDE:
+            return None
+
+        t0 = time.time()
+        clipped = polygon.intersect(self.clipPolygon, 4)
+        self.stats.clipSeconds += time.time() - t0
+
+        return clipped
@@ -0,0 +1,413 @@
+#-------------------------------------------------------------------------------
+# Name:        aoi_tiles
+# Purpose:     Send the soil polygon request for an AOI as quadtree cells.
+#
+#              getHull/geoRequest and FormSpatialQuery send one convex hull per
+#              AOI. A large buffer runs into the SDA response size and time
+#              limits (Peaslee's tool gives up above maxAcres), and the hull of
+#              a concave AOI covers a lot of ground outside it.
+#
+#              fetch() cuts the AOI extent into the cells of a fixed grid of
+#              TILE_DEGREES, clips each cell to the AOI and sends the convex
+#              hull of every clipped piece, so little outside the AOI is asked
+#              for. The cells of a round are sent concurrently. A cell that
+#              fails with a timeout or size error, or returns more than MAX_POLYGONS
+#              polygons, is split into its four quadrants for the next round,
+#              down to MAX_DEPTH splits. The cells return whole mupolygon rows
+#              with their mupolygonkey, so a polygon that several cells
+#              intersect is kept once; the caller clips to the AOI as before.
+#
+#              With the polygon_store on, grid cells are sent whole rather
+#              than clipped, their polygons are stored, and a grid cell that an
+#              earlier AOI completed is read from the store instead.
+#
+#              regions() and prefetch() let a batch of watersheds share
+#              requests: neighbouring buffers are grouped into regions of at
+#              most REGION_CELLS grid cells, and each region's grid cells are
+#              fetched into the store once, before the watersheds read them.
+#
+#              Set ACPF_SDA_TILED to "0" to send the single hull request.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, math, socket
+
+import arcpy
+
+import sda_client, sda_sched, sda_chunk, polygon_store
+
+try:
+    from urllib2 import HTTPError, URLError
+
+except ImportError:
+    from urllib.error import HTTPError, URLError
+
+
+# Tiled mode on/off
+TILED = os.environ.get("ACPF_SDA_TILED", "1") != "0"
+
+# Grid cell size in degrees (0.125 is about 35,000 acres at 42N)
+TILE_DEGREES = float(os.environ.get("ACPF_TILE_DEGREES", "0.125"))
+
+# A cell returning more polygons than this is split and sent again
+MAX_POLYGONS = int(os.environ.get("ACPF_TILE_POLYGONS", "25000"))
+
+# Splits allowed below a grid cell
+MAX_DEPTH = int(os.environ.get("ACPF_TILE_DEPTH", "6"))
+
+# Grid cells one regional prefetch may cover (36 is 0.75 x 0.75 degrees)
+REGION_CELLS = int(os.environ.get("ACPF_REGION_CELLS", "36"))
+
+# Cell outcomes
+OK = "ok"
+SPLIT = "split"
+FAILED = "failed"
+
+
+class Cell(object):
+    # One quadtree cell in WGS84 degrees. path is the grid cell's "i_j",
+    # followed by "/" and a quadrant digit per split.
+
+    def __init__(self, xmin, ymin, xmax, ymax, depth=0, path="0_0"):
+        self.xmin = xmin
+        self.ymin = ymin
+        self.xmax = xmax
+        self.ymax = ymax
+        self.depth = depth
+        self.path = path
+
+    def root(self):
+        # store key of the grid cell this cell lies in
+        return "%g:" % TILE_DEGREES + self.path.split("/")[0]
+
+    def text(self):
+        # the whole cell as polygon WKT
+        return "POLYGON ((%r %r, %r %r, %r %r, %r %r, %r %r))" % (self.xmin, self.ymin, self.xmax, self.ymin, self.xmax, self.ymax, self.xmin, self.ymax, self.xmin, self.ymin)
+
+    def split(self):
+        # the four quadrants, one level deeper
+        xm = (self.xmin + self.xmax) / 2.0
+        ym = (self.ymin + self.ymax) / 2.0
+        d = self.depth + 1
+
+        return [Cell(self.xmin, self.ymin, xm, ym, d, self.path + "/0"),
+                Cell(xm, self.ymin, self.xmax, ym, d, self.path + "/1"),
+                Cell(self.xmin, ym, xm, self.ymax, d, self.path + "/2"),
+                Cell(xm, ym, self.xmax, self.ymax, d, self.path + "/3")]
+
+
+class TileStats(object):
+    # Counts for one tiled request
+
+    def __init__(self):
+        self.rounds = 0
+        self.stored = 0
+        self.sent = 0
+        self.split = 0
+        self.polygons = 0
+        self.duplicates = 0
+
+    def report(self):
+        # list of message lines
+        lines = ["Tiled request: " + str(self.sent) + " cells in " + str(self.rounds) + " rounds, " + str(self.split) + " split, " + str(self.stored) + " grid cells from local store"]
+        lines.append(str(self.polygons) + " soil polygons, " + str(self.duplicates) + " repeated across cells dropped")
+
+        return lines
+
+
+def gridIndexes(ext, size=None):
+    # (i, j) of the grid cells meeting the extent (xmin, ymin, xmax, ymax), row by row
+
+    size = size or TILE_DEGREES
+    xmin, ymin, xmax, ymax = ext
+    found = list()
+
+    for j in range(int(math.floor(ymin / size)), int(math.floor(ymax / size)) + 1):
+        for i in range(int(math.floor(xmin / size)), int(math.floor(xmax / size)) + 1):
+            found.append((i, j))
+
+    return found
+
+
+def gridCell(i, j, size=None):
+    size = size or TILE_DEGREES
+
+    return Cell(i * size, j * size, (i + 1) * size, (j + 1) * size, 0, str(i) + "_" + str(j))
+
+
+def gridCells(ext, size=None):
+    # The grid cells meeting the extent (xmin, ymin, xmax, ymax)
+    return [gridCell(i, j, size) for i, j in gridIndexes(ext, size)]
+
+
+def regions(extents, maxCells=None, size=None):
+    # Group AOI extents (xmin, ymin, xmax, ymax in WGS84) into regions
+    #
+    # An AOI joins the first region holding one of its grid cells or a grid
+    # cell next to one, if the region then stays within maxCells grid cells;
+    # otherwise it starts a region of its own. Returns a list of (indexes of
+    # the extents, [(i, j) of the region's grid cells, row by row]).
+
+    maxCells = maxCells or REGION_CELLS
+    groups = list()
+
+    for k, ext in enumerate(extents):
+        cells = set(gridIndexes(ext, size))
+        near = set((i + di, j + dj) for i, j in cells for di in (-1, 0, 1) for dj in (-1, 0, 1))
+
+        for members, found in groups:
+            if near & found and len(found | cells) <= maxCells:
+                members.append(k)
+                found.update(cells)
+                break
+
+        else:
+            groups.append(([k], cells))
+
+    return [(members, sorted(found, key=lambda c: (c[1], c[0]))) for members, found in groups]
+
+
+def polygonText(wkt):
+    # "POLYGON ((...))" from the MULTIPOLYGON WKT arcpy writes for one polygon
+    return wkt.replace("MULTIPOLYGON (", "POLYGON ")[:-1]
+
+
+def cellPolygons(cell, aoi):
+    # WKT of the convex hull of each part of the AOI geometry inside the cell
+
+    piece = aoi.clip(arcpy.Extent(cell.xmin, cell.ymin, cell.xmax, cell.ymax))
+
+    if piece is None or piece.area <= 0:
+        return list()
+
+    wkts = list()
+
+    for part in piece:
+        # holes lie inside their outer ring and do not change the hull
+        pnts = [p for p in part if p is not None]
+        hull = arcpy.Multipoint(arcpy.Array(pnts), aoi.spatialReference).convexHull()
+
+        if hull.area > 0:
+            wkts.append(polygonText(hull.WKT))
+
+    return wkts
+
+
+def cellQuery(wkts):
+    # Whole mupolygon rows (mupolygonkey, mukey, areasymbol, WKT) intersecting any of the polygons
+
+    decl = list()
+    tests = list()
+
+    for i, wkt in enumerate(wkts):
+        decl.append("DECLARE @p" + str(i) + " geometry = geometry::STPolyFromText('" + wkt + "', 4326);")
+        tests.append("P.mupolygongeo.STIntersects(@p" + str(i) + ") = 1")
+
+    return "\n".join(decl) + """
+
+    SELECT P.mupolygonkey, P.mukey, P.areasymbol, P.mupolygongeo.STAsText() AS wkt
+    FROM mupolygon AS P
+    WHERE """ + "\n    OR ".join(tests)
+
+
+def _fetchCell(wkts, url, limit):
+    # (OK, rows), (SPLIT, message) or (FAILED, message) for one cell
+
+    request = dict()
+    request["format"] = "JSON"
+    request["query"] = cellQuery(wkts)
+
+    rows = list()
+    stream = sda_client.getClient().postRows(url, request)
+
+    try:
+        for row in stream:
+            rows.append(row)
+
+            if limit and len(rows) > limit:
+                return SPLIT, "more than " + str(limit) + " polygons"
+
+        return OK, rows
+
+    except (socket.timeout, socket.error, HTTPError, URLError, ValueError) as e:
+        msg = str(e) or e.__class__.__name__
+
+        if isinstance(e, socket.timeout) or sda_chunk.retryable(msg):
+            return SPLIT, msg
+
+        return FAILED, msg
+
+    finally:
+        stream.close()
+
+
+def _send(todo, wktsFor, url, store, stats, message=None):
+    # Send the cells round by round, splitting the ones that fail or return
+    # too many polygons. wktsFor(cell) gives the polygons to send for a cell.
+    # With a store the rows go into it and each grid cell is covered once
+    # complete; without one they are kept once per mupolygonkey. Returns
+    # (True, rows) with rows a list of (mukey, wkt), empty with a store, or
+    # (False, message) when a cell still fails at MAX_DEPTH.
+
+    polygons = dict()
+    order = list()
+
+    # survey areas met in each grid cell being fetched
+    surveys = dict((c.root(), set()) for c in todo)
+    seen = set()
+
+    while todo:
+        stats.rounds += 1
+        jobs = list()
+        cells = dict()
+
+        for cell in todo:
+            wkts = wktsFor(cell)
+
+            if wkts:
+                limit = MAX_POLYGONS if cell.depth < MAX_DEPTH else 0
+                jobs.append((cell.path, _fetchCell, (wkts, url, limit)))
+                cells[cell.path] = cell
+
+        if message:
+            message("Sending " + str(len(jobs)) + " AOI cells to Soil Data Access (round " + str(stats.rounds) + ")")
+
+        results, timings = sda_sched.runConcurrent(jobs)
+        stats.sent += len(jobs)
+        todo = list()
+
+        for path, func, args in jobs:
+            status, value = results[path]
+            cell = cells[path]
+
+            if status == OK:
+                if store is not None:
+                    # polygons another cell of this request already returned
+                    for row in value:
+                        if row[0] in seen:
+                            stats.duplicates += 1
+
+                        else:
+                            seen.add(row[0])
+
+                    store.put(value)
+                    surveys[cell.root()].update(row[2] for row in value)
+                    continue
+
+                for polyKey, mukey, areasymbol, wkt in value:
+                    if polyKey in polygons:
+                        stats.duplicates += 1
+
+                    else:
+                        polygons[polyKey] = (mukey, wkt)
+                        order.append(polyKey)
+
+            elif status == SPLIT and cell.depth < MAX_DEPTH:
+                stats.split += 1
+                todo.extend(cell.split())
+
+            else:
+                return False, "AOI cell " + path + " failed: " + value
+
+        if store is not None:
+            # a grid cell is complete once none of its quadrants is left
+            pending = set(c.root() for c in todo)
+
+            for root in list(surveys):
+                if not root in pending:
+                    store.cover(root, surveys.pop(root))
+
+    stats.polygons = len(seen) + len(order)
+
+    return True, [polygons[k] for k in order]
+
+
+def fetch(aoi, url=None, message=None):
+    # Soil polygons intersecting the AOI, one row per mupolygonkey
+    #
+    # aoi is the AOI as an arcpy polygon in WGS84. Returns (True, rows, stats)
+    # with rows a list of (mukey, wkt), or (False, message, stats) when a cell
+    # still fails at MAX_DEPTH. message, when given, is called with progress
+    # lines.
+
+    if url is None:
+        url = sda_client.SDA_URL + sda_client.TABULAR_PATH
+
+    ext = aoi.extent
+    bounds = (ext.XMin, ext.YMin, ext.XMax, ext.YMax)
+    stats = TileStats()
+
+    # arcpy geometry is built here, only the requests run on the pool
+    pieces = dict()
+
+    for cell in gridCells(bounds):
+        wkts = cellPolygons(cell, aoi)
+
+        if wkts:
+            pieces[cell.path] = (cell, wkts)
+
+    todo = [pieces[k][0] for k in sorted(pieces)]
+    store = polygon_store.getStore()
+
+    if store is not None:
+        store.refresh(polygon_store.surveyVersions(url))
+        covered = store.covered([c.root() for c in todo])
+        stats.stored = len(covered)
+        todo = [c for c in todo if not c.root() in covered]
+
+    def wktsFor(cell):
+        if store is not None:
+            return [cell.text()]
+
+        elif cell.path in pieces:
+            return pieces[cell.path][1]
+
+        return cellPolygons(cell, aoi)
+
+    ok, value = _send(todo, wktsFor, url, store, stats, message)
+
+    if not ok:
+        return False, value, stats
+
+    if store is not None:
+        rows = store.query(*bounds)
+
+    else:
+        rows = value
+
+    stats.polygons = len(rows)
+
+    return True, rows, stats
+
+
+def prefetch(cells, url=None, message=None):
+    # Fetch whole grid cells into the polygon store, as one tiled request
+    #
+    # cells are the (i, j) grid cells of a region (see regions); the ones the
+    # store covers already are skipped. A later fetch of an AOI inside them
+    # then reads its polygons from the store. Returns (True, None, stats), or
+    # (False, message, stats) when a cell fails or the store is off.
+
+    stats = TileStats()
+    store = polygon_store.getStore()
+
+    if store is None:
+        return False, "polygon store is off", stats
+
+    if url is None:
+        url = sda_client.SDA_URL + sda_client.TABULAR_PATH
+
+    todo = [gridCell(i, j) for i, j in cells]
+
+    store.refresh(polygon_store.surveyVersions(url))
+    covered = store.covered([c.root() for c in todo])
+    stats.stored = len(covered)
+    todo = [c for c in todo if not c.root() in covered]
+
+    ok, value = _send(todo, lambda cell: [cell.text()], url, store, stats, message)
+
+    if not ok:
+        return False, value, stats
+
+    return True, None, stats
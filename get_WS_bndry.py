@@ -53,30 +53,21 @@ def tabRequest(qry, name):
 
     try:
 
-        theURL = "https://sdmdataaccess.nrcs.usda.gov"
-        url = theURL + "/Tabular/SDMTabularService/post.rest"
+        url = sda_client.SDA_URL + sda_client.TABULAR_PATH
 
         # Create request using JSON, return data as JSON
         request = {}
         request["format"] = "JSON+COLUMNNAME+METADATA"
         request["query"] = qry
 
-        #json.dumps = serialize obj (request dictionary) to a JSON formatted str
-        data = json.dumps(request)
+        # Send request to SDA Tabular service over the shared keep-alive connection pool,
+        # unless the same query was already answered for this SSURGO version.
+        # The rows are parsed as the response arrives (sda_stream), so the raw
+        # response and its text are never held next to the parsed rows.
+        resLst = list(sda_cache.cachedRows(url, request))
 
-        # Send request to SDA Tabular service using urllib2 library
-        # because we are passing the "data" argument, this is a POST request, not a GET
-        req = urllib2.Request(url, data)
-        response = urllib2.urlopen(req)
-
-        # read query results
-        qResults = response.read()
-
-        # Convert the returned JSON string into a Python dictionary.
-        qData = json.loads(qResults)
-
-        # get rid of objects
-        del qResults, response, req
+        # SDA sends {} for a query without rows
+        qData = dict(Table=resLst) if resLst else dict()
 
         Msg = 'Successfully collected ' + name + ' for ' + ws[3:]
 
@@ -105,7 +96,7 @@ def tabRequest(qry, name):
 
 
 
-def surfHoriz(keys):
+def surfHorizQry(keys):
 
     surfHorQuery = """SELECT
         CAST (mapunit.mukey AS VARCHAR (30)) AS mukey,
@@ -137,8 +128,16 @@ def surfHoriz(keys):
 
     #arcpy.AddMessage(surfHorQuery)
 
-    #send the query to SDA
-    surfHLogic, surfMsg, surfHrzRes = tabRequest(surfHorQuery, "Surface Horizon")
+    return surfHorQuery
+
+
+def surfHoriz(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(surfHorizQry(keys), "Surface Horizon")
+
+    surfHLogic, surfMsg, surfHrzRes = res
 
 
     if surfHLogic:
@@ -161,14 +160,8 @@ def surfHoriz(keys):
                 columnInfo = resLst.pop(0)
 
 
-                newTable = CreateNewTable(outputTable, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
             else:
                 arcpy.AddWarning('\t' + surfMsg + " but recieved no records or does not match raster count")
@@ -186,7 +179,7 @@ def surfHoriz(keys):
             wLst.append(ws[3:])
 
 
-def surfTex(keys):
+def surfTexQry(keys):
 
     surfTexQuery = """SELECT
         component.cokey,
@@ -210,8 +203,16 @@ def surfTex(keys):
 
     #arcpy.AddMessage(surfTexQuery)
 
-    #send the query to SDA
-    surfTexLogic, surfTexMsg, surfTexRes = tabRequest(surfTexQuery, "Surface Texture")
+    return surfTexQuery
+
+
+def surfTex(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(surfTexQry(keys), "Surface Texture")
+
+    surfTexLogic, surfTexMsg, surfTexRes = res
 
     if surfTexLogic:
 
@@ -232,14 +233,8 @@ def surfTex(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(outputTable, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
 
             else:
@@ -304,9 +299,7 @@ def geoRequest(aoi):
 
     try:
 
-        arcpy.management.CreateFeatureclass(env.workspace, sdaWGS, "POLYGON", None, None, None, wgs)
-        arcpy.management.AddField(sdaWGS, "t_mukey", "TEXT", None, None, "30")
-        arcpy.management.AddField(sdaWGS, "mukey", "LONG")
+        createSdaWGS()
 
         gQry = """ --   Define a AOI in WGS84
         ~DeclareGeometry(@aoi)~
@@ -328,57 +321,22 @@ def geoRequest(aoi):
         #arcpy.AddMessage(gQry)
 
         arcpy.AddMessage('\t' + 'Sending coordinates to Soil Data Access...')
-        theURL = "https://sdmdataaccess.nrcs.usda.gov"
-        url = theURL + "/Tabular/SDMTabularService/post.rest"
+        url = sda_client.SDA_URL + sda_client.TABULAR_PATH
 
         # Create request using JSON, return data as JSON
         request = {}
         request["format"] = "JSON"
         request["query"] = gQry
 
-        #json.dumps = serialize obj (request dictionary) to a JSON formatted str
-        data = json.dumps(request)
-
-        # Send request to SDA Tabular service using urllib2 library
-        # because we are passing the "data" argument, this is a POST request, not a GET
-        req = urllib2.Request(url, data)
-        response = urllib2.urlopen(req)
+        # Send request to SDA Tabular service over the shared keep-alive connection pool.
+        # Polygons are parsed from the JSON response and inserted one at a time.
+        resLst = sda_client.getClient().postRows(url, request)  # All values come back as string
 
-        # read query results
-        qResults = response.read()
+        keyDict = insertPolygons(resLst)
 
-        # Convert the returned JSON string into a Python dictionary.
-        qData = json.loads(qResults)
+        # if any polygons came back
+        if keyDict:
 
-        # get rid of objects
-        del qResults, response, req
-
-        # if dictionary key "Table" is found
-        if "Table" in qData:
-
-
-            # get its value
-            resLst = qData["Table"]  # Data as a list of lists. All values come back as string
-
-            rows =  arcpy.da.InsertCursor(sdaWGS, ["SHAPE@WKT", "t_mukey", "mukey"])
-
-            keyDict = dict()
-
-            for e in resLst:
-
-                mukey = e[0]
-                imukey = int(e[0])
-                geog = e[1]
-
-                #arcpy.AddMessage(mukey)
-
-                if not mukey in keyDict:
-                    keyDict[mukey] = int(mukey)
-
-                value = geog, mukey, imukey
-                rows.insertRow(value)
-
-            del rows
             arcpy.AddMessage('\tReceived SSURGO polygons information successfully.')
 
 
@@ -411,7 +369,96 @@ def geoRequest(aoi):
         return False, Msg
 
 
-def muaggat(keys):
+def getAOI(poly):
+    # The watershed buffer geometry in WGS84, for the tiled request
+
+    try:
+
+        with arcpy.da.SearchCursor(poly, ["SHAPE@"]) as cur:
+            for rec in cur:
+                if wsSR.PCSName != "" or wsSR.GCS.name != wgs.GCS.name:
+                    aoiPolygon = rec[0].projectAs(wgs, tm)
+                else:
+                    aoiPolygon = rec[0]
+
+        return True, aoiPolygon
+
+    except:
+        errorMsg()
+        msg = 'Error projecting watershed buffer'
+        return False, msg
+
+def createSdaWGS():
+    # Empty WGS84 featureclass for the polygons returned by SDA
+
+    arcpy.management.CreateFeatureclass(os.path.dirname(sdaWGS), os.path.basename(sdaWGS), "POLYGON", None, None, None, wgs)
+    arcpy.management.AddField(sdaWGS, "t_mukey", "TEXT", None, None, "30")
+    arcpy.management.AddField(sdaWGS, "mukey", "LONG")
+
+def insertPolygons(resLst):
+    # Write (mukey, wkt) rows to sdaWGS, returns a dictionary of the mukeys seen
+
+    rows =  arcpy.da.InsertCursor(sdaWGS, ["SHAPE@WKT", "t_mukey", "mukey"])
+
+    keyDict = dict()
+
+    for e in resLst:
+
+        mukey = e[0]
+        imukey = int(e[0])
+        geog = e[1]
+
+        #arcpy.AddMessage(mukey)
+
+        if not mukey in keyDict:
+            keyDict[mukey] = int(mukey)
+
+        value = geog, mukey, imukey
+        rows.insertRow(value)
+
+    del rows
+
+    return keyDict
+
+def geoRequestTiled(aoi):
+    # geoRequest for large or concave buffers: the buffer is sent as quadtree
+    # cells (see aoi_tiles) and whole soil polygons come back once each.
+    # They are clipped to the watershed after projecting, as before.
+
+    try:
+
+        createSdaWGS()
+
+        arcpy.AddMessage('\t' + 'Sending AOI cells to Soil Data Access...')
+
+        tLogic, tVal, tStats = aoi_tiles.fetch(aoi, message=lambda m: arcpy.AddMessage('\t' + m))
+
+        for line in tStats.report():
+            arcpy.AddMessage('\t' + line)
+
+        if not tLogic:
+            return False, tVal
+
+        keyDict = insertPolygons(tVal)
+
+        if keyDict:
+
+            arcpy.AddMessage('\tReceived SSURGO polygons information successfully.')
+
+            return True, None
+
+        else:
+            Msg = 'No SSURGO polygons found in watershed buffer'
+            arcpy.AddMessage(Msg)
+            return False, None
+
+    except:
+        errorMsg()
+        Msg = 'Unknown error collecting geometries'
+        return False, Msg
+
+
+def muaggatQry(keys):
 
     """ This is the old NCCPI V2 query-
          SELECT
@@ -503,8 +550,16 @@ def muaggat(keys):
 
     #arcpy.AddMessage('\n\n' + muAgQry)
 
-    #send the query to SDA
-    muAgLogic, muAgMsg, muAgRes = tabRequest(muAgQry, "Muaggat")
+    return muAgQry
+
+
+def muaggat(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(muaggatQry(keys), "Muaggat")
+
+    muAgLogic, muAgMsg, muAgRes = res
 
 
     if muAgLogic:
@@ -527,14 +582,8 @@ def muaggat(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -557,21 +606,42 @@ def muaggat(keys):
         return False, None
 
 
-def rootZnDep(keys):
+def mainQry(keys):
 
-
-    rootZnDepQry ="""SELECT sacatalog.areasymbol AS AREASYMBOL,
-    mapunit.mukey AS mukey,
-    mapunit.musym AS MUSYM,
-    mapunit.muname AS MUNAME
+    #the #main map unit table the rootZnDep, rootZnAwsDrt, potWet and soc
+    #queries start from, built once when they are sent as one batch; sent
+    #on their own they keep their original #main.
+    #sacatalog and muaggatt are outer joined so every map unit is kept;
+    #the tails whose own #main inner joined them (rootZnDep sacatalog,
+    #rootZnAwsDrt and soc muaggatt) skip rows where catsymbol or aggkey is null
+    mainQuery = """SELECT legend.areasymbol, legend.areaname, mapunit.mukey, mapunit.mukey AS mulink, mapunit.musym, mapunit.nationalmusym, mapunit.muname, mapunit.mukind, mapunit.muacres, mt1.aws0150wta,
+    sacatalog.areasymbol AS catsymbol, mt1.mukey AS aggkey
     INTO #main
-    FROM sacatalog
-    INNER JOIN legend ON legend.areasymbol = sacatalog.areasymbol
-    INNER JOIN mapunit ON mapunit.lkey = legend.lkey AND mapunit.mukey IN
-    (""" + ",".join(map("'{0}'".format, keys)) + """)
-    --AND mukind = 'Complex'
-    ORDER BY sacatalog.areasymbol, mapunit.mukey, mapunit.muname
-    ---
+    FROM legend
+    INNER JOIN mapunit ON mapunit.lkey = legend.lkey AND mapunit.mukey IN (""" + ",".join(map("'{0}'".format, keys)) + """)
+    LEFT OUTER JOIN sacatalog ON sacatalog.areasymbol = legend.areasymbol
+    LEFT OUTER JOIN muaggatt AS mt1 ON mapunit.mukey = mt1.mukey
+    ORDER BY legend.areasymbol, mapunit.mukey, mapunit.muname
+
+    """
+
+    return mainQuery
+
+
+def rootZnDepTail(keys=None):
+
+    #the query after its #main; keys None for the batch script (sda_batch),
+    #whose shared #main (mainQry) outer joins sacatalog, so the map units this
+    #query's own #main leaves out are skipped
+    if keys is None:
+        catJoin = " AND #main.catsymbol IS NOT NULL"
+        catWhere = "\n     WHERE #main.catsymbol IS NOT NULL"
+
+    else:
+        catJoin = ""
+        catWhere = ""
+
+    rootZnDepQry ="""---
     --Gets the component information
     ---Min Top Restriction Depth
     ---Major Components Only
@@ -599,7 +669,7 @@ def rootZnDep(keys):
     AND c.cokey=component.cokey  GROUP BY c.cokey, reskind, resdept_r, corestrictkey ORDER BY resdept_r, corestrictkey ), 'No Data') AS FIRST_RESTRICTION_KIND
     INTO #co_main
     FROM #main
-    INNER JOIN component ON component.mukey=#main.mukey AND majcompflag = 'yes'
+    INNER JOIN component ON component.mukey=#main.mukey AND majcompflag = 'yes'""" + catJoin + """
     AND CASE WHEN compkind = 'Miscellaneous area' THEN 2
     WHEN compkind IS NULL THEN 2 ELSE 1 END = 1
     ORDER BY #main.AREASYMBOL,
@@ -695,7 +765,7 @@ def rootZnDep(keys):
      #Hor_main3.MU_RootZnDepth AS RootZnDepth
      INTO #last_step
      FROM  #main
-     LEFT OUTER JOIN #Hor_main3 ON #Hor_main3.mukey=#main.mukey
+     LEFT OUTER JOIN #Hor_main3 ON #Hor_main3.mukey=#main.mukey""" + catWhere + """
      GROUP BY  #main.AREASYMBOL,
      #main.mukey,
      #main.MUSYM,
@@ -712,7 +782,34 @@ def rootZnDep(keys):
 
     #arcpy.AddMessage(rootZnDepQry)
 
-    rtZnDepLogic, rtZnDepMsg, rtZnDepRes = tabRequest(rootZnDepQry, "Root Zone Depth")
+    return rootZnDepQry
+
+
+def rootZnDepQry(keys):
+
+    rootZnDepMain = """SELECT sacatalog.areasymbol AS AREASYMBOL,
+    mapunit.mukey AS mukey,
+    mapunit.musym AS MUSYM,
+    mapunit.muname AS MUNAME
+    INTO #main
+    FROM sacatalog
+    INNER JOIN legend ON legend.areasymbol = sacatalog.areasymbol
+    INNER JOIN mapunit ON mapunit.lkey = legend.lkey AND mapunit.mukey IN
+    (""" + ",".join(map("'{0}'".format, keys)) + """)
+    --AND mukind = 'Complex'
+    ORDER BY sacatalog.areasymbol, mapunit.mukey, mapunit.muname
+    """
+
+    return rootZnDepMain + rootZnDepTail(keys)
+
+
+def rootZnDep(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(rootZnDepQry(keys), "Root Zone Depth")
+
+    rtZnDepLogic, rtZnDepMsg, rtZnDepRes = res
 
     if rtZnDepLogic:
 
@@ -740,14 +837,8 @@ def rootZnDep(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -768,17 +859,20 @@ def rootZnDep(keys):
         return False, None
 
 
-def soc(keys):
+def socTail(keys=None):
 
-    socQry = """SELECT areasymbol, areaname, mapunit.mukey, mapunit.mukey AS mulink, mapunit.musym, nationalmusym, mapunit.muname, mukind, muacres
-        INTO #main
-        FROM legend
-        INNER JOIN mapunit on legend.lkey=mapunit.lkey --AND mapunit.mukey = 2809839
-        INNER JOIN muaggatt AS mt1 on mapunit.mukey=mt1.mukey
-        AND mapunit.mukey IN (""" + ",".join(map("'{0}'".format, keys)) + """)
+    #the query after its #main; keys None for the batch script (sda_batch),
+    #whose shared #main (mainQry) outer joins muaggatt, so the map units this
+    #query's own #main leaves out are skipped
+    if keys is None:
+        muKeys = "SELECT mukey FROM #main"
+        aggWhere = "\n        WHERE #main.aggkey IS NOT NULL"
 
+    else:
+        muKeys = ",".join(map("'{0}'".format, keys))
+        aggWhere = ""
 
-        SELECT
+    socQry = """SELECT
         -- grab survey area data
         LEFT((areasymbol), 2) AS state,
          l.areasymbol,
@@ -818,7 +912,7 @@ def soc(keys):
         INTO #acpf
         FROM legend  AS l
         INNER JOIN mapunit AS mu ON mu.lkey = l.lkey
-        AND mu.mukey IN (""" + ",".join(map("'{0}'".format, keys)) + """)
+        AND mu.mukey IN (""" + muKeys + """)
         INNER JOIN muaggatt AS  mt on mu.mukey=mt.mukey
         INNER JOIN component AS  c ON c.mukey = mu.mukey
         INNER JOIN chorizon AS ch ON ch.cokey = c.cokey and CASE WHEN hzdept_r IS NULL THEN 2
@@ -971,11 +1065,35 @@ def soc(keys):
         ROUND (SUM (CO_SOC_20_50) over(PARTITION BY #SOC3.mukey),3) AS SOC_20_50,
         ROUND(SUM (CO_SOC_50_100) over(PARTITION BY #SOC3.mukey),3)  AS SOC_50_100
         FROM #SOC3
-        RIGHT OUTER JOIN #main ON #main.mukey=#SOC3.mukey"""
+        RIGHT OUTER JOIN #main ON #main.mukey=#SOC3.mukey""" + aggWhere
 
     #arcpy.AddMessage(socQry)
 
-    socLogic, socMsg, socRes = tabRequest(socQry, "SOC")
+    return socQry
+
+
+def socQry(keys):
+
+    socMain = """SELECT areasymbol, areaname, mapunit.mukey, mapunit.mukey AS mulink, mapunit.musym, nationalmusym, mapunit.muname, mukind, muacres
+        INTO #main
+        FROM legend
+        INNER JOIN mapunit on legend.lkey=mapunit.lkey --AND mapunit.mukey = 2809839
+        INNER JOIN muaggatt AS mt1 on mapunit.mukey=mt1.mukey
+        AND mapunit.mukey IN (""" + ",".join(map("'{0}'".format, keys)) + """)
+
+
+        """
+
+    return socMain + socTail(keys)
+
+
+def soc(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(socQry(keys), "SOC")
+
+    socLogic, socMsg, socRes = res
 
     if socLogic:
 
@@ -997,14 +1115,8 @@ def soc(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
             else:
@@ -1023,7 +1135,15 @@ def soc(keys):
             wLst.append(ws[3:])
         return False, None
 
-def potWet(keys):
+def potWetTail(keys=None):
+
+    #the whole query when sent on its own; keys None for the batch script
+    #(sda_batch), where its map units come from the shared #main (mainQry)
+    if keys is None:
+        muFrom = "#main AS mu"
+
+    else:
+        muFrom = "legend  AS l\n     INNER JOIN mapunit AS mu ON mu.lkey = l.lkey AND mu.mukey IN (" + ",".join(map("'{0}'".format, keys)) + ")"
 
     potWetQry = """SELECT
      areasymbol,
@@ -1067,8 +1187,7 @@ def potWet(keys):
     AND hydricrating  = 'Yes' ) AS MU_comppct_SUM
 
      INTO #main_query
-     FROM legend  AS l
-     INNER JOIN mapunit AS mu ON mu.lkey = l.lkey AND mu.mukey IN (""" + ",".join(map("'{0}'".format, keys)) + """)
+     FROM """ + muFrom + """
      ---Getting the component data and criteria together for the Component Percent.
      SELECT  #main_query.areasymbol, #main_query.muname, #main_query.mukey, cokey, compname, hydricrating, localphase, drainagecl,
      CASE
@@ -1118,7 +1237,21 @@ def potWet(keys):
     FROM #main_query
     LEFT OUTER JOIN #mu_agg3 ON #mu_agg3.mukey=#main_query.mukey"""
 
-    potWetLogic, potWetMsg, potWetRes = tabRequest(potWetQry, "Potential Wetland")
+    return potWetQry
+
+
+def potWetQry(keys):
+
+    return potWetTail(keys)
+
+
+def potWet(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(potWetQry(keys), "Potential Wetland")
+
+    potWetLogic, potWetMsg, potWetRes = res
 
     if potWetLogic:
 
@@ -1140,14 +1273,8 @@ def potWet(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1171,7 +1298,7 @@ def potWet(keys):
 
 
 
-def ksat50150(keys):
+def ksat50150Qry(keys):
 
     ksatQry = """SELECT areasymbol, areaname, mapunit.mukey, musym, nationalmusym, muname, mukind
         INTO #main
@@ -1260,7 +1387,16 @@ def ksat50150(keys):
         RIGHT OUTER JOIN #main ON #main.mukey=#last_step2.mukey
         ORDER BY #main.muname ASC, #main.mukey, KSat50_150"""
 
-    ksat50150Logic , ksat50150Msg, ksat50150Res = tabRequest(ksatQry, "KSat 50_150")
+    return ksatQry
+
+
+def ksat50150(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(ksat50150Qry(keys), "KSat 50_150")
+
+    ksat50150Logic , ksat50150Msg, ksat50150Res = res
 
     if ksat50150Logic:
 
@@ -1282,14 +1418,8 @@ def ksat50150(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1310,17 +1440,20 @@ def ksat50150(keys):
             wLst.append(ws[3:])
         return False, None
 
-def rootZnAwsDrt(keys):
+def rootZnAwsDrtTail(keys=None):
 
-    rootZnAwsDrtQry = """SELECT areASymbol, areaname, mapunit.mukey, mapunit.musym, nationalmusym, mapunit.muname, mukind, muacres, aws0150wta
-    INTO #main
-    FROM legend
-    INNER JOIN mapunit on legend.lkey=mapunit.lkey AND mapunit.mukey IN (
-    """ + ",".join(map("'{0}'".format, keys)) + """)
-    INNER JOIN muaggatt AS mt1 on mapunit.mukey=mt1.mukey
+    #the query after its #main; keys None for the batch script (sda_batch),
+    #whose shared #main (mainQry) outer joins muaggatt, so the map units this
+    #query's own #main leaves out are skipped
+    if keys is None:
+        muKeys = "SELECT mukey FROM #main"
+        aggWhere = "\n    WHERE #main.aggkey IS NOT NULL"
 
+    else:
+        muKeys = "\n    " + ",".join(map("'{0}'".format, keys))
+        aggWhere = ""
 
-    SELECT
+    rootZnAwsDrtQry = """SELECT
     -- grab survey area data
     LEFT((areasymbol), 2) AS state,
      l.areASymbol,
@@ -1364,8 +1497,7 @@ def rootZnAwsDrt(keys):
     INTO #acpf
     FROM legend  AS l
     INNER JOIN mapunit AS mu ON mu.lkey = l.lkey
-    INNER JOIN muaggatt mt on mu.mukey=mt.mukey AND mu.mukey IN (
-    """ + ",".join(map("'{0}'".format, keys)) + """)
+    INNER JOIN muaggatt mt on mu.mukey=mt.mukey AND mu.mukey IN (""" + muKeys + """)
     INNER JOIN component c ON c.mukey = mu.mukey AND c.majcompflag = 'yes'
     INNER JOIN chorizon ch ON ch.cokey = c.cokey and CASE WHEN hzdept_r IS NULL THEN 2
     WHEN awc_r IS NULL THEN 2
@@ -1580,7 +1712,7 @@ def rootZnAwsDrt(keys):
 
     FROM #main
     LEFT OUTER JOIN #alldata on #main.mukey=#alldata.mukey
-    LEFT OUTER JOIN #alldata3 on #main.mukey=#alldata3.mukey
+    LEFT OUTER JOIN #alldata3 on #main.mukey=#alldata3.mukey""" + aggWhere + """
     GROUP BY
     --state, #main.areasymbol,  #main.areaname,
     #main.mukey,   muname,
@@ -1591,7 +1723,31 @@ def rootZnAwsDrt(keys):
 
     #arcpy.AddMessage(rootZnAwsDrtQry)
 
-    rtZnAwsDrtLogic, rtZnAwsDrtMsg, rtZnAwsDrtRes = tabRequest(rootZnAwsDrtQry, "Root Zone AWS & Drought")
+    return rootZnAwsDrtQry
+
+
+def rootZnAwsDrtQry(keys):
+
+    rootZnAwsDrtMain = """SELECT areASymbol, areaname, mapunit.mukey, mapunit.musym, nationalmusym, mapunit.muname, mukind, muacres, aws0150wta
+    INTO #main
+    FROM legend
+    INNER JOIN mapunit on legend.lkey=mapunit.lkey AND mapunit.mukey IN (
+    """ + ",".join(map("'{0}'".format, keys)) + """)
+    INNER JOIN muaggatt AS mt1 on mapunit.mukey=mt1.mukey
+
+
+    """
+
+    return rootZnAwsDrtMain + rootZnAwsDrtTail(keys)
+
+
+def rootZnAwsDrt(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(rootZnAwsDrtQry(keys), "Root Zone AWS & Drought")
+
+    rtZnAwsDrtLogic, rtZnAwsDrtMsg, rtZnAwsDrtRes = res
 
     if rtZnAwsDrtLogic:
 
@@ -1613,14 +1769,8 @@ def rootZnAwsDrt(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1641,7 +1791,7 @@ def rootZnAwsDrt(keys):
         return False, None
 
 
-def om(keys):
+def omQry(keys):
     omQry = """SELECT areasymbol, musym, muname, mukey
      INTO #kitchensink
      FROM legend  AS lks
@@ -1714,7 +1864,16 @@ def om(keys):
 
     #arcpy.AddMessage(omQry)
 
-    omLogic, omMsg, omRes = tabRequest(omQry, "Organic Matter")
+    return omQry
+
+
+def om(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(omQry(keys), "Organic Matter")
+
+    omLogic, omMsg, omRes = res
 
     if omLogic:
 
@@ -1737,14 +1896,8 @@ def om(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1766,7 +1919,7 @@ def om(keys):
         return False, None
 
 
-def coarseFrag(keys):
+def coarseFragQry(keys):
 
     coarseFragQry = """SELECT areasymbol, areaname, mapunit.mukey, musym, nationalmusym, muname, mukind
         INTO #main
@@ -1878,7 +2031,16 @@ def coarseFrag(keys):
 
     #arcpy.AddMessage(coarseFragQry)
 
-    coarseFLogic , coarseFMsg, coarseFRes = tabRequest(coarseFragQry, "Coarse Fragments")
+    return coarseFragQry
+
+
+def coarseFrag(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(coarseFragQry(keys), "Coarse Fragments")
+
+    coarseFLogic , coarseFMsg, coarseFRes = res
 
     if coarseFLogic:
 
@@ -1900,14 +2062,8 @@ def coarseFrag(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1929,7 +2085,7 @@ def coarseFrag(keys):
 
 
 
-def aws(keys):
+def awsQry(keys):
 
     awsQry = """SELECT areASymbol, areaname, mapunit.mukey, mapunit.musym, nationalmusym, mapunit.muname, mukind, muacres, aws0150wta
     INTO #main
@@ -2211,8 +2367,16 @@ def aws(keys):
     MU_AWC_WEIGHTED_AVG_0_20, MU_AWC_WEIGHTED_AVG_20_50, MU_AWC_WEIGHTED_AVG_50_100
     ---ORDER BY areasymbol, musym"""
 
+    return awsQry
+
+
+def aws(keys, res=None):
+
+    #send the query to SDA, unless the scheduler already sent it
+    if res is None:
+        res = tabRequest(awsQry(keys), "AWS")
 
-    awsLogic, awsMsg, awsRes = tabRequest(awsQry, "AWS")
+    awsLogic, awsMsg, awsRes = res
 
     if awsLogic:
 
@@ -2234,14 +2398,8 @@ def aws(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -2288,313 +2446,453 @@ def soilProfileTbl(keys):
         cVal = [key]
         cursor.insertRow(cVal)
 
-def CreateNewTable(newTable, columnNames, columnInfo):
-    # Create new table. Start with in-memory and then export to geodatabase table
-    #
-    # ColumnNames and columnInfo come from the Attribute query JSON string
-    # MUKEY would normally be included in the list, but it should already exist in the output featureclass
-    #
-    try:
-        # Dictionary: SQL Server to FGDB
-        dType = dict()
-
-        dType["int"] = "long"
-        dType["smallint"] = "short"
-        dType["bit"] = "short"
-        dType["varbinary"] = "blob"
-        dType["nvarchar"] = "text"
-        dType["varchar"] = "text"
-        dType["char"] = "text"
-        dType["datetime"] = "date"
-        dType["datetime2"] = "date"
-        dType["smalldatetime"] = "date"
-        dType["decimal"] = "double"
-        dType["numeric"] = "double"
-        dType["float"] ="double"
-
-        # numeric type conversion depends upon the precision and scale
-        dType["numeric"] = "float"  # 4 bytes
-        dType["real"] = "double" # 8 bytes
-
-        # Iterate through list of field names and add them to the output table
-        i = 0
-
-        # ColumnInfo contains:
-        # ColumnOrdinal, ColumnSize, NumericPrecision, NumericScale, ProviderType, IsLong, ProviderSpecificDataType, DataTypeName
-        #PrintMsg(" \nFieldName, Length, Precision, Scale, Type", 1)
-
-        joinFields = list()
-        outputTbl = os.path.join("IN_MEMORY", os.path.basename(newTable))
-        arcpy.CreateTable_management(os.path.dirname(outputTbl), os.path.basename(outputTbl))
-
-        for i, fldName in enumerate(columnNames):
-            vals = columnInfo[i].split(",")
-            length = int(vals[1].split("=")[1])
-            precision = int(vals[2].split("=")[1])
-            scale = int(vals[3].split("=")[1])
-            dataType = dType[vals[4].lower().split("=")[1]]
-
-            if fldName.lower().endswith("key"):
-                # Per SSURGO standards, key fields should be string. They come from Soil Data Access as long integer.
-                dataType = 'text'
-                length = 30
-
-            arcpy.AddField_management(outputTbl, fldName, dataType, precision, scale, length)
-
-
-        return outputTbl
+def sdaTransform(sr):
+    # Datum transformation from the SDA polygons (WGS84) to sr, "" for none.
+    # None when the datum is not supported.
 
-    except:
-        errorMsg()
-        return False
+    if sr.GCS.datumName == "D_WGS_1984":
+        return ""
 
-#===============================================================================
+    elif sr.GCS.datumName == "D_North_American_1983":
+        return "WGS_1984_(ITRF00)_To_NAD_1983"
 
-import sys, os, json, socket, arcpy, urllib2, traceback, datetime
-from urllib2 import HTTPError, URLError
-from arcpy import env
+    return None
 
-env.overwriteOutput = True
-day = str(datetime.date.today()).replace("-", "_")
+def bufferExtent(wsDir, wsGDB):
+    # (xmin, ymin, xmax, ymax) in WGS84 of the geodatabase's watershed buffer,
+    # None without a single buffer in a supported datum
 
-inDir = arcpy.GetParameterAsText(0)
-pGDBs = arcpy.GetParameterAsText(1)
-dBool = arcpy.GetParameterAsText(2)
-wgs = arcpy.SpatialReference(4326)
+    env.workspace = os.path.join(wsDir, wsGDB)
+    bufL = arcpy.ListFeatureClasses("buf*", "Polygon")
 
-wLst = list()
-usrGDBs = pGDBs.split(";")
+    if len(bufL) != 1:
+        return None
 
+    desc = arcpy.Describe(bufL[0])
+    rTm = sdaTransform(desc.spatialReference)
 
-#separate tool messages from stock msgs
-arcpy.AddMessage('\n\n')
+    if rTm is None:
+        return None
 
-try:
+    ext = desc.extent.polygon.projectAs(wgs, rTm).extent
 
-    for gdb in usrGDBs:
-        env.workspace = os.path.join(inDir, gdb)
-        bufL = arcpy.ListFeatureClasses("buf*", "Polygon")
-        if len(bufL) == 1:
+    return ext.XMin, ext.YMin, ext.XMax, ext.YMax
 
-            ws = bufL[0]
-            arcpy.AddMessage('Processing watershed buffer ' + ws[3:])
+def prefetchRegion(cells):
+    # Fetch the soil polygons of a region's grid cells (see aoi_tiles.regions)
+    # into the local polygon store. This is one batch job; the watersheds of
+    # the region then read their polygons from the store instead of each
+    # sending the cells they share. A failure only costs the prefetch, the
+    # watersheds send their own requests. Returns the list of failed watersheds.
 
-            try:
+    tLogic, tVal, tStats = aoi_tiles.prefetch(cells, message=lambda m: arcpy.AddMessage('\t' + m))
 
-                snapR = arcpy.ListRasters("ws*", None)[-1]
-                env.snapRaster = snapR
-                arcpy.AddMessage("Snap Raster = " + env.snapRaster)
+    for line in tStats.report():
+        arcpy.AddMessage('\t' + line)
 
-            except:
+    if not tLogic:
+        arcpy.AddWarning('Regional request failed, its watersheds send their own: ' + str(tVal))
 
-                arcpy.AddWarning("No snap raster available for "  + ws[3:])
+    return list()
 
+def processGDB(wsDir, wsGDB, delBool):
+    # Build the gSSURGO raster and the ACPF soil tables for one watershed geodatabase.
+    # This is one batch job; it may run in a worker process, so the state the
+    # query functions read is set up here as module globals.
+    # Returns the list of watersheds that did not execute properly.
 
+    #this job's own scratch folder, removed however the job ends
+    scratchDir, scratchGDB = acpf_batch.scratchWorkspace(os.path.basename(wsGDB)[:-4])
 
-            profTbl = 'SoilProfile' + ws[3:]
+    try:
+        return processWatershed(wsDir, wsGDB, delBool, scratchDir, scratchGDB)
 
-            wsSR = arcpy.Describe(ws).spatialReference
-            #wsPrjName = wsSR.PCSName
+    finally:
+        acpf_batch.removeScratch(scratchDir)
 
-            validDatums = ["D_WGS_1984", "D_North_American_1983"]
+def processWatershed(wsDir, wsGDB, delBool, scratchDir, scratchGDB):
+    # The body of processGDB, with the job's scratch folder and geodatabase
 
-            if not wsSR.GCS.datumName in validDatums:
-                raise MyError , "AOI coordinate system not supported: " + wsSR.name + ", " + wsSR.GCS.datumName
+    global inDir, gdb, dBool, wLst, ws, wsSR, tm, sdaWGS, profTbl, iCnt
 
-            if wsSR.GCS.datumName == "D_WGS_1984":
-                tm = ""  # no datum transformation required
+    inDir, gdb, dBool = wsDir, wsGDB, delBool
+    wLst = list()
 
-            elif wsSR.GCS.datumName == "D_North_American_1983":
-                tm = "WGS_1984_(ITRF00)_To_NAD_1983"
+    env.overwriteOutput = True
 
-            else:
-                raise MyError, "AOI CS datum name: " + wsSR.GCS.datumName
+    env.workspace = os.path.join(inDir, gdb)
+    bufL = arcpy.ListFeatureClasses("buf*", "Polygon")
+    if len(bufL) == 1:
 
+        ws = bufL[0]
+        arcpy.AddMessage('Processing watershed buffer ' + ws[3:])
 
-            #outRaster = name for output SSURGO raster w/ input watershed coor system
-            outRaster = "gSSURGO_" + day
+        try:
 
-            #sdaWGS = WGS84 features from SDA
-            sdaWGS = "sda_conhull_ACPF_Shape"
+            snapR = arcpy.ListRasters("ws*", None)[-1]
+            env.snapRaster = snapR
+            arcpy.AddMessage("Snap Raster = " + env.snapRaster)
 
-            #prjFeats = WGS84 features from SDA projected back native watershed UTM coor. system
-            prjFeats = env.workspace + os.sep + "sda_ch_ACPF_SSURGO"
+        except:
 
-            #finalClip = the final projected, native coor sys, clipped ssurgo features
-            finalClip = env.workspace + os.sep + "final_ssurgo_" + ws
+            arcpy.AddWarning("No snap raster available for "  + ws[3:])
 
-            #set spatial reference code for WGS84
-            sdaSR = arcpy.SpatialReference(4326)
 
-            # get generalized coordinates
-            hullLogic, theHull = getHull(ws)
 
-            if hullLogic:
+        profTbl = 'SoilProfile' + ws[3:]
 
-                #feed generalized coordinates to SDA, WGS84 polys are built
-                grLogic, grVal = geoRequest(theHull)
+        wsSR = arcpy.Describe(ws).spatialReference
+        #wsPrjName = wsSR.PCSName
 
-                if grLogic:
+        validDatums = ["D_WGS_1984", "D_North_American_1983"]
 
-                    #project the features returned from SDA to input watershed
-                    if tm != "":
-                        arcpy.AddMessage("\tReprojecting SDA features to match " + os.path.basename(gdb)[:-4] + " " + wsSR.PCSName + ":" + wsSR.GCS.name)
-                        arcpy.management.Project(sdaWGS, prjFeats, wsSR, tm)
-                        #clip the projeted, sda features to input watesrshed
-                        arcpy.analysis.Clip(prjFeats, ws, finalClip)
+        if not wsSR.GCS.datumName in validDatums:
+            raise MyError , "AOI coordinate system not supported: " + wsSR.name + ", " + wsSR.GCS.datumName
 
-                    else:
-                        arcpy.AddMessage("\tReprojecting SDA features to match " + os.path.basename(gdb)[:-4] + " " + wsSR.PCSName + ":" + wsSR.GCS.name)
-                        #project the features returned from SDA to input watershed, no transformation needed
-                        arcpy.management.Project(sdaWGS, prjFeats, wsSR)
-                        #clip the projeted, sda features to input watesrshed
-                        arcpy.analysis.Clip(prjFeats, ws, finalClip)
+        if wsSR.GCS.datumName == "D_WGS_1984":
+            tm = ""  # no datum transformation required
 
+        elif wsSR.GCS.datumName == "D_North_American_1983":
+            tm = "WGS_1984_(ITRF00)_To_NAD_1983"
 
-                    #converted the projected, clipped ssurgo features to a raster
-                    arcpy.conversion.PolygonToRaster(finalClip, "mukey", outRaster, "MAXIMUM_COMBINED_AREA", None, "10")
+        else:
+            raise MyError, "AOI CS datum name: " + wsSR.GCS.datumName
 
-                    #add a text, mukey field
-                    arcpy.management.AddField(outRaster, "mukey", "TEXT", None, None, "30")
 
-                    #populate the field (insertcursors are usually faster)
-                    arcpy.management.CalculateField(outRaster, "mukey", "!VALUE!", "PYTHON_9.3")
+        #outRaster = name for output SSURGO raster w/ input watershed coor system
+        outRaster = "gSSURGO_" + day
 
-                    #get list of mukeys from raster (not convex hull returned from geoRequest and
-                    #not from clipped polys, very small polygons on border might not get converted)
-                    keys = list()
-                    with arcpy.da.SearchCursor(outRaster, "mukey") as rows:
-                        for row in rows:
-                            val = str(row[0])
-                            if not val in keys:
-                                keys.append(val)
+        #intermediate SDA featureclasses that are deleted go to the job's own
+        #scratch geodatabase, ones that are kept stay in the watershed geodatabase
+        if dBool == "true":
+            tmpGDB = scratchGDB
+        else:
+            tmpGDB = env.workspace
 
-                    keys.sort()
+        #sdaWGS = WGS84 features from SDA
+        sdaWGS = os.path.join(tmpGDB, "sda_conhull_ACPF_Shape")
 
+        #prjFeats = WGS84 features from SDA projected back native watershed UTM coor. system
+        prjFeats = os.path.join(tmpGDB, "sda_ch_ACPF_SSURGO")
 
+        #finalClip = the final projected, native coor sys, clipped ssurgo features
+        finalClip = env.workspace + os.sep + "final_ssurgo_" + ws
 
+        #set spatial reference code for WGS84
+        sdaSR = arcpy.SpatialReference(4326)
 
-                    #get count of records in raster to ensure same number of records
-                    #are returned from SDA queries
-                    #cnt = arcpy.management.GetCount(outRaster)
-                    #iCnt = int(cnt.getOutput(0))
+        #rasterize the WGS84 SDA features directly, no Project or Clip
+        bInverse = mu_inverse.INVERSE and sda_project.projectionFor(wsSR) is not None
 
-                    #no need to run getCount anymore...
-                    iCnt = len(keys)
+        if aoi_tiles.TILED:
 
+            # the buffer itself in WGS84, sent as quadtree cells
+            hullLogic, theHull = getAOI(ws)
 
-                    surfHoriz(keys)
-                    surfTex(keys)
+        else:
 
-                    #these queries populate the gSSURGO vat, in order
-                    #if the logical is False on these, the return message comes from w/ in the function
-                    muAggtLogic, tbl = muaggat(keys)
-                    if muAggtLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, outRaster)
-                        del dataTbl, tbl
+            # get generalized coordinates
+            hullLogic, theHull = getHull(ws)
+
+        if hullLogic:
 
-                    rootZnDepLogic, tbl = rootZnDep(keys)
-                    if rootZnDepLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, outRaster)
-                        del dataTbl, tbl
+            #feed generalized coordinates to SDA, WGS84 polys are built
+            if aoi_tiles.TILED:
+                grLogic, grVal = geoRequestTiled(theHull)
 
+            else:
+                grLogic, grVal = geoRequest(theHull)
 
-                    rootZnAwsDrtLogic, tbl = rootZnAwsDrt(keys)
-                    if rootZnAwsDrtLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, outRaster)
-                        del dataTbl, tbl
+            if grLogic:
 
-                    potWetLogic, tbl = potWet(keys)
-                    if potWetLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, outRaster)
-                        del dataTbl, tbl
+                #project the features returned from SDA to input watershed
+                if bInverse:
+                    arcpy.AddMessage("\tRasterizing SDA features to " + os.path.basename(gdb)[:-4] + " " + wsSR.PCSName + " cells inside " + ws[3:])
 
-                    #build soil profile table
-                    soilProfileTbl(keys)
+                elif tm != "":
+                    arcpy.AddMessage("\tReprojecting SDA features to match " + os.path.basename(gdb)[:-4] + " " + wsSR.PCSName + ":" + wsSR.GCS.name)
+                    if not sda_project.projectFeatures(sdaWGS, prjFeats, wsSR, tm):
+                        arcpy.management.Project(sdaWGS, prjFeats, wsSR, tm)
+                    #clip the projeted, sda features to input watesrshed
+                    arcpy.analysis.Clip(prjFeats, ws, finalClip)
 
+                else:
+                    arcpy.AddMessage("\tReprojecting SDA features to match " + os.path.basename(gdb)[:-4] + " " + wsSR.PCSName + ":" + wsSR.GCS.name)
+                    #project the features returned from SDA to input watershed, no transformation needed
+                    if not sda_project.projectFeatures(sdaWGS, prjFeats, wsSR, tm):
+                        arcpy.management.Project(sdaWGS, prjFeats, wsSR)
+                    #clip the projeted, sda features to input watesrshed
+                    arcpy.analysis.Clip(prjFeats, ws, finalClip)
 
-                    #these queries populate the soil profile table, in order
-                    #if the logical is False on these, the return message comes from w/ in the function
-                    awsLogic, tbl = aws(keys)
-                    if awsLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
-                        del dataTbl, tbl
 
-                    socLogic, tbl = soc(keys)
-                    if socLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
-                        del dataTbl, tbl
+                #converted the projected, clipped ssurgo features to a raster
+                if bInverse:
+                    #cell centres inside the buffer taken back to WGS84 and looked up in the SDA polygons
+                    mukeyValues, mukeyGrid, rasterKeys = mu_inverse.polygonsToRaster(sdaWGS, ws, outRaster, 10, wsSR, tm != "", env.snapRaster, scratchDir)
+                    del mukeyValues
 
-                    omLogic, tbl = om(keys)
-                    if omLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
-                        del dataTbl, tbl
+                elif mu_raster.NATIVE:
+                    #tiled NumPy rasterizer, same cell assignment and snap as PolygonToRaster
+                    #the mukeys and their counts are taken as the tiles are written
+                    mukeyValues, mukeyGrid, rasterKeys = mu_raster.polygonToRaster(finalClip, "mukey", outRaster, 10, env.snapRaster, scratchDir)
+                    del mukeyValues
 
-                    kSatLogic, tbl = ksat50150(keys)
-                    if kSatLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
-                        del dataTbl, tbl
+                else:
+                    arcpy.conversion.PolygonToRaster(finalClip, "mukey", outRaster, "MAXIMUM_COMBINED_AREA", None, "10")
+                    rasterKeys = mu_raster.rasterSummary(outRaster)
 
-                    coarseLogic, tbl = coarseFrag(keys)
-                    if coarseLogic:
-                        dataTbl = os.path.join(inDir,tbl)
-                        buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
-                        del dataTbl, tbl
+                #add a text, mukey field to the raster attribute table
+                mu_raster.writeRAT(outRaster, rasterKeys, "mukey")
 
+                #get list of mukeys from raster (not convex hull returned from geoRequest and
+                #not from clipped polys, very small polygons on border might not get converted)
+                keys = rasterKeys.mukeys
 
-                    #separate jobs for legibility
-                    arcpy.AddMessage('\n')
 
-                    del keys
 
-                    #delete the queries & polygons??
-                    if dBool == "true":
-                        arcpy.management.Delete(sdaWGS)
-                        arcpy.management.Delete(prjFeats)
-                        arcpy.management.Delete(finalClip)
 
-                        dTbls = ['muaggat', 'rtZnDep', 'rtZnAwsDrt', 'potwet', 'SoilProfile', 'aws', 'soc', 'om', 'KSat50_150', 'coarse_frag']
+                #get count of records in raster to ensure same number of records
+                #are returned from SDA queries
+                #cnt = arcpy.management.GetCount(outRaster)
+                #iCnt = int(cnt.getOutput(0))
 
-                        for tbl in arcpy.ListTables():
-                            if tbl in dTbls:
-                                arcpy.management.Delete(tbl)
+                #no need to run getCount anymore...
+                iCnt = len(keys)
 
-                else:
 
-                    arcpy.AddWarning(grVal)
-                    wLst.append(ws[3:])
+                #send all of the property queries to SDA at once, the
+                #geodatabase writes below still happen one at a time, in order.
+                #mapunit-level products only ask SDA for mukeys the local store lacks,
+                #and long mukey lists are split into adaptive chunks
+                #in bulk mode the dominant component products are not sent, one
+                #component/horizon request replaces them and they are derived locally.
+                #in batch mode the products built on #main go to SDA as one script
+                jobs = list()
+                for name, qryFunc in sdaQueries:
+                    if sda_bulk.BULK and name in sda_bulk.PRODUCTS:
+                        continue
+                    if sda_batch.BATCH and name in [p[0] for p in batchProducts]:
+                        continue
+                    if name in muStoreProducts:
+                        jobs.append((name, mukey_store.fetch, (name, qryFunc, keys, tabRequest)))
+                    else:
+                        jobs.append((name, sda_chunk.fetch, (name, qryFunc, keys, tabRequest)))
+                if sda_bulk.BULK:
+                    jobs.append((sda_bulk.NAME, mukey_store.fetch, (sda_bulk.NAME, sda_bulk.bulkQry, keys, tabRequest)))
+                if sda_batch.BATCH:
+                    jobs.append((sda_batch.NAME, sda_batch.fetch, (batchProducts, mainQry, keys, tabRequest)))
+                res, timings = sda_sched.runConcurrent(jobs)
+
+                if sda_bulk.BULK:
+                    res.update(sda_bulk.derive(res[sda_bulk.NAME], ws[3:]))
+
+                if sda_batch.BATCH:
+                    res.update(res[sda_batch.NAME])
+
+                arcpy.AddMessage('\tSDA query times for ' + ws[3:] + ':')
+                for line in timings.report():
+                    arcpy.AddMessage('\t\t' + line)
+
+                if sda_cache.getCache() is not None:
+                    arcpy.AddMessage('\t\t' + sda_cache.getCache().report())
+
+                surfHoriz(keys, res["Surface Horizon"])
+                surfTex(keys, res["Surface Texture"])
+
+                #these queries populate the gSSURGO vat, in order
+                #if the logical is False on these, the return message comes from w/ in the function
+                muAggtLogic, tbl = muaggat(keys, res["Muaggat"])
+                if muAggtLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, outRaster)
+                    del dataTbl, tbl
+
+                rootZnDepLogic, tbl = rootZnDep(keys, res["Root Zone Depth"])
+                if rootZnDepLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, outRaster)
+                    del dataTbl, tbl
+
+
+                rootZnAwsDrtLogic, tbl = rootZnAwsDrt(keys, res["Root Zone AWS & Drought"])
+                if rootZnAwsDrtLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, outRaster)
+                    del dataTbl, tbl
+
+                potWetLogic, tbl = potWet(keys, res["Potential Wetland"])
+                if potWetLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, outRaster)
+                    del dataTbl, tbl
+
+                #build soil profile table
+                soilProfileTbl(keys)
+
+
+                #these queries populate the soil profile table, in order
+                #if the logical is False on these, the return message comes from w/ in the function
+                awsLogic, tbl = aws(keys, res["AWS"])
+                if awsLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
+                    del dataTbl, tbl
+
+                socLogic, tbl = soc(keys, res["SOC"])
+                if socLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
+                    del dataTbl, tbl
+
+                omLogic, tbl = om(keys, res["Organic Matter"])
+                if omLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
+                    del dataTbl, tbl
+
+                kSatLogic, tbl = ksat50150(keys, res["KSat 50_150"])
+                if kSatLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
+                    del dataTbl, tbl
+
+                coarseLogic, tbl = coarseFrag(keys, res["Coarse Fragments"])
+                if coarseLogic:
+                    dataTbl = os.path.join(inDir,tbl)
+                    buildACPF(dataTbl, os.path.join(inDir, gdb, profTbl))
+                    del dataTbl, tbl
+
+
+                #separate jobs for legibility
+                arcpy.AddMessage('\n')
+
+                del keys, res
+
+                #delete the queries & polygons??
+                if dBool == "true":
+                    for fc in [sdaWGS, prjFeats, finalClip]:
+                        if arcpy.Exists(fc):
+                            arcpy.management.Delete(fc)
+
+                    dTbls = ['muaggat', 'rtZnDep', 'rtZnAwsDrt', 'potwet', 'SoilProfile', 'aws', 'soc', 'om', 'KSat50_150', 'coarse_frag']
+
+                    for tbl in arcpy.ListTables():
+                        if tbl in dTbls:
+                            arcpy.management.Delete(tbl)
 
             else:
 
-                arcpy.AddWarning(theHull)
+                arcpy.AddWarning(grVal)
                 wLst.append(ws[3:])
 
         else:
 
-            arcpy.AddWarning('\nUnable to resolve buffered watershed in ' + os.path.basename(gdb)[:-4] + '. None found or ambiguity in feature class names\n')
+            arcpy.AddWarning(theHull)
+            wLst.append(ws[3:])
+
+    else:
+
+        arcpy.AddWarning('\nUnable to resolve buffered watershed in ' + os.path.basename(gdb)[:-4] + '. None found or ambiguity in feature class names\n')
+        wLst.append(os.path.basename(gdb)[:-4])
+
+    return wLst
+
+#===============================================================================
+
+import sys, os, json, socket, arcpy, urllib2, traceback, datetime
+from urllib2 import HTTPError, URLError
+from arcpy import env
+import sda_client, sda_sched, sda_cache, sda_chunk, mukey_store, acpf_batch, table_writer, sda_bulk, sda_batch, aoi_tiles, polygon_store, sda_project, mu_raster, mu_inverse
+
+day = str(datetime.date.today()).replace("-", "_")
+wgs = arcpy.SpatialReference(4326)
+
+#fetch the soil polygons of neighbouring watersheds once into the polygon
+#store before the batch runs (see prefetchRegion); off by default
+REGIONAL = os.environ.get("ACPF_SDA_REGIONAL", "0") != "0"
+
+#SDA property queries sent for every watershed; (name, query builder)
+sdaQueries = [("Surface Horizon", surfHorizQry),
+              ("Surface Texture", surfTexQry),
+              ("Muaggat", muaggatQry),
+              ("Root Zone Depth", rootZnDepQry),
+              ("Root Zone AWS & Drought", rootZnAwsDrtQry),
+              ("Potential Wetland", potWetQry),
+              ("AWS", awsQry),
+              ("SOC", socQry),
+              ("Organic Matter", omQry),
+              ("KSat 50_150", ksat50150Qry),
+              ("Coarse Fragments", coarseFragQry)]
+
+#products that start from the same #main table (mainQry), sent as one
+#batch script with a result set each; (name, query builder, query tail)
+batchProducts = [("Root Zone Depth", rootZnDepQry, rootZnDepTail),
+                 ("Root Zone AWS & Drought", rootZnAwsDrtQry, rootZnAwsDrtTail),
+                 ("Potential Wetland", potWetQry, potWetTail),
+                 ("SOC", socQry, socTail)]
+
+#one row per mukey, so these are kept in the local mukey store and only the
+#map units not fetched for an earlier watershed are sent to SDA
+muStoreProducts = ["Muaggat", "Root Zone Depth", "Root Zone AWS & Drought", "Potential Wetland",
+                   "AWS", "SOC", "Organic Matter", "KSat 50_150", "Coarse Fragments"]
+
+
+#the watershed geodatabases are processed by a pool of worker processes which
+#import this script, so the tool itself only runs as the main module
+if __name__ == "__main__":
+
+    env.overwriteOutput = True
+
+    inDir = arcpy.GetParameterAsText(0)
+    pGDBs = arcpy.GetParameterAsText(1)
+    dBool = arcpy.GetParameterAsText(2)
+
+    usrGDBs = pGDBs.split(";")
 
-    if len(wLst)<>0:
-        arcpy.AddWarning('The following watershed(s) did not execute properly:')
-        for w in wLst:
-            arcpy.AddWarning(w)
 
     #separate tool messages from stock msgs
     arcpy.AddMessage('\n\n')
 
-except:
-    errorMsg()
+    try:
+
+        def jobDone(res):
+            if res.error is not None:
+                arcpy.AddWarning(res.name + ' failed:\n' + res.error)
+            else:
+                arcpy.AddMessage('Finished ' + res.name + ' in ' + '%.1f' % res.seconds + ' s')
+
+        #neighbouring watersheds share their grid cells' spatial requests: each
+        #region of two or more buffers is fetched into the polygon store once,
+        #the regions in parallel on the batch pool
+        if REGIONAL and aoi_tiles.TILED and polygon_store.STORE_PATH and len(usrGDBs) > 1:
+            extents = [e for e in [bufferExtent(inDir, gdb) for gdb in usrGDBs] if e is not None]
+            regionJobs = list()
 
+            for members, cells in aoi_tiles.regions(extents):
+                if len(members) > 1:
+                    regionJobs.append(("region " + str(len(regionJobs) + 1), (cells,)))
 
+            if regionJobs:
+                arcpy.AddMessage('Collecting soil polygons for ' + str(len(regionJobs)) + ' regions of neighbouring watersheds')
+                acpf_batch.runBatch(acpf_batch.jobFunction(__file__, "prefetchRegion"), regionJobs, callback=jobDone)
 
+        jobs = [(os.path.basename(gdb)[:-4], (inDir, gdb, dBool)) for gdb in usrGDBs]
 
+        summary = acpf_batch.runBatch(acpf_batch.jobFunction(__file__, "processGDB"), jobs, callback=jobDone)
 
+        arcpy.AddMessage('\n')
+        for line in summary.report():
+            arcpy.AddMessage(line)
 
+        wLst = summary.failed()
 
+        if len(wLst)<>0:
+            arcpy.AddWarning('The following watershed(s) did not execute properly:')
+            for w in wLst:
+                arcpy.AddWarning(w)
+
+        #separate tool messages from stock msgs
+        arcpy.AddMessage('\n\n')
+
+    except:
+        errorMsg()
@@ -0,0 +1,192 @@
+#-------------------------------------------------------------------------------
+# Name:        mu_inverse
+# Purpose:     Build the watershed's mukey raster straight from the WGS84 soil
+#              polygons SDA returned, without projecting or clipping them.
+#
+#              get_WS_bndry.py projects every SDA polygon to the watershed's
+#              UTM or Albers system, clips the result to the buffer and only
+#              then rasterizes it. Here the 10 m output grid is laid out on
+#              the snap raster in the watershed's system, and tile by tile
+#              the cell centres inside the buffer are taken back to WGS84
+#              (sda_project inverse) and given the mukey of the SDA polygon
+#              they fall in.
+#
+#              The point in polygon test is the even-odd ray test, done for
+#              all centres of a tile at once: the centres are bucketed into
+#              latitude bands and sorted by longitude, so each polygon edge
+#              only meets the centres of its bands lying between its ring's
+#              west edge and the edge itself. Map unit polygons do not
+#              overlap, so the parity is counted per mukey.
+#
+#              A cell takes the mukey at its centre, not the largest combined
+#              area of PolygonToRaster MAXIMUM_COMBINED_AREA, so cells on map
+#              unit boundaries can differ from mu_raster. Set
+#              ACPF_INVERSE_RASTER to "1" to use it.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, math, tempfile
+
+import numpy as np
+
+import mu_raster, sda_project
+
+
+# Inverse-mapped rasterizer on/off
+INVERSE = os.environ.get("ACPF_INVERSE_RASTER", "0") != "0"
+
+
+def _edges(rings, ids):
+    # non-horizontal edges of the rings ids: end points and ring id
+    starts = rings.offsets[ids]
+    counts = rings.offsets[ids + 1] - starts - 1
+    ringOf = np.repeat(np.arange(len(ids)), counts)
+    i = starts[ringOf] + (np.arange(counts.sum()) - (np.cumsum(counts) - counts)[ringOf])
+
+    x0, y0, x1, y1 = rings.x[i], rings.y[i], rings.x[i + 1], rings.y[i + 1]
+    keep = y0 != y1
+
+    return x0[keep], y0[keep], x1[keep], y1[keep], ids[ringOf[keep]]
+
+
+def pointValues(px, py, rings, ids, west=None):
+    # Value of the ring set at each point, NODATA outside every ring
+    #
+    # ids are the rings that may hold the points and west the x minimum of
+    # every ring in the set (rings.bounds()[0]).
+
+    out = np.full(len(px), mu_raster.NODATA, dtype=np.int32)
+    ids = np.asarray(ids, dtype=np.int64)
+
+    if len(px) == 0 or len(ids) == 0:
+        return out
+
+    if west is None:
+        west = rings.bounds()[0]
+
+    x0, y0, x1, y1, ring = _edges(rings, ids)
+    ylo, yhi = np.minimum(y0, y1), np.maximum(y0, y1)
+
+    # latitude bands, about as many as there are point rows
+    bottom = py.min()
+    nb = max(1, int(math.sqrt(len(px))))
+    height = max((py.max() - bottom) / nb, 1e-12)
+    pb = np.minimum(((py - bottom) / height).astype(np.int64), nb - 1)
+
+    # points by band, then x; key is searchable for both at once
+    span = float(px.max() - px.min()) + 1.0
+    left = px.min()
+    order = np.lexsort((px, pb))
+    key = pb[order] * span + (px[order] - left)
+
+    # one entry per edge and band it meets
+    b0 = np.floor((ylo - bottom) / height).astype(np.int64)
+    b1 = np.floor((yhi - bottom) / height).astype(np.int64)
+    b0, b1 = np.maximum(b0, 0), np.minimum(b1, nb - 1)
+    n = np.maximum(b1 - b0 + 1, 0)
+    e = np.repeat(np.arange(len(n)), n)
+    band = b0[e] + (np.arange(n.sum()) - (np.cumsum(n) - n)[e])
+
+    # the points of the band between the ring's west edge and the edge
+    lo = np.searchsorted(key, band * span + (np.maximum(west[ring[e]], left) - left), "left")
+    hi = np.searchsorted(key, band * span + np.minimum(np.maximum(x0, x1)[e] - left, span - 1.0), "right")
+    n = np.maximum(hi - lo, 0)
+    k = np.repeat(np.arange(len(n)), n)
+    pt = order[lo[k] + (np.arange(n.sum()) - (np.cumsum(n) - n)[k])]
+    e = e[k]
+
+    # the ray from each point eastward crosses the edge
+    qy = py[pt]
+    near = (qy >= ylo[e]) & (qy < yhi[e])
+    pt, e, qy = pt[near], e[near], qy[near]
+    cross = px[pt] < x0[e] + (qy - y0[e]) * (x1[e] - x0[e]) / (y1[e] - y0[e])
+    pt, e = pt[cross], e[cross]
+
+    if len(pt) == 0:
+        return out
+
+    # odd crossings per point and mukey, the smaller mukey if two claim a point
+    units, unit = np.unique(rings.value[ring[e]], return_inverse=True)
+    pair, count = np.unique(pt * len(units) + unit, return_counts=True)
+    pair = pair[count % 2 == 1]
+    pt, unit = pair // len(units), pair % len(units)
+
+    if len(pt) == 0:
+        return out
+
+    first = np.concatenate([[True], pt[1:] != pt[:-1]])
+
+    out[pt[first]] = units[unit[first]]
+
+    return out
+
+
+def rasterize(rings, mask, grid, proj, shift, outPath, size=None):
+    # Burn the WGS84 rings into a new int32 memmap at outPath by the value
+    # at each cell centre, for the centres inside the mask rings (in the
+    # grid's system); returns the memmap
+
+    out = np.memmap(outPath, dtype=np.int32, mode="w+", shape=(grid.nrows, grid.ncols))
+    out[:] = mu_raster.NODATA
+
+    west, south, east, north = rings.bounds()
+    maskIds = np.arange(len(mask))
+    maskWest = mask.bounds()[0]
+
+    for r, c, h, w in grid.tiles(size):
+        cols = grid.left + (c + np.arange(w) + 0.5) * grid.cell
+        rows = grid.top - (r + np.arange(h) + 0.5) * grid.cell
+        x = np.tile(cols, h)
+        y = np.repeat(rows, w)
+
+        inside = np.flatnonzero(pointValues(x, y, mask, maskIds, maskWest) != mu_raster.NODATA)
+
+        if len(inside) == 0:
+            continue
+
+        lon, lat = sda_project.untransform(x[inside], y[inside], proj, shift)
+        ids = np.flatnonzero((west <= lon.max()) & (east >= lon.min()) & (south <= lat.max()) & (north >= lat.min()))
+
+        values = np.full(h * w, mu_raster.NODATA, dtype=np.int32)
+        values[inside] = pointValues(lon, lat, rings, ids, west)
+        out[r:r + h, c:c + w] = values.reshape(h, w)
+
+    out.flush()
+
+    return out
+
+
+def polygonsToRaster(sdaFC, maskFC, outRaster, cell, sr, shift, snapRaster=None, folder=None):
+    # The mukey raster of the WGS84 polygons in sdaFC, on a grid of cell in
+    # sr snapped to snapRaster, clipped to the maskFC polygons. Returns the
+    # value array (a memmap in folder), its Grid and ValueSummary, or None
+    # when sda_project has no inverse for sr.
+    import arcpy
+
+    proj = sda_project.projectionFor(sr)
+
+    if proj is None:
+        return None
+
+    if not os.path.dirname(outRaster):
+        outRaster = os.path.join(arcpy.env.workspace, outRaster)
+
+    rings = mu_raster.featureRings(sdaFC, "mukey")
+    mask = mu_raster.featureRings(maskFC, "OID@")
+
+    if len(rings) == 0 or len(mask) == 0:
+        raise ValueError("No polygons to rasterize in " + sdaFC)
+
+    # every mask ring is one value, the test only asks inside or not
+    mask.value = np.ones(len(mask), dtype=np.int64)
+
+    anchor, snapCell = mu_raster.snapAnchor(snapRaster)
+    grid = mu_raster.snapGrid(mask.extent(), float(cell), anchor)
+
+    outPath = os.path.join(folder or tempfile.gettempdir(), "acpf_" + os.path.basename(outRaster) + "_" + str(os.getpid()) + ".dat")
+    values = rasterize(rings, mask, grid, proj, shift, outPath)
+
+    summary = mu_raster.writeRaster(values, grid, outRaster, sr)
+
+    return values, grid, summary
@@ -0,0 +1,589 @@
+#-------------------------------------------------------------------------------
+# Name:        mu_raster
+# Purpose:     Rasterize map unit polygons to a mukey grid in NumPy, tile by
+#              tile, with the MAXIMUM_COMBINED_AREA rule of PolygonToRaster.
+#
+#              arcpy.PolygonToRaster at 10 m has a history of 99999 failures
+#              and memory errors on large layers (see ACPF_ExportMuRaster).
+#              Here the output grid is aligned to the snap raster and cut into
+#              TILE x TILE cell tiles. Each tile is burnt on its own, in a
+#              process pool, and written into a memory-mapped array, so no
+#              single job ever holds more than one tile.
+#
+#              A tile gets the exact area of every map unit in every cell: the
+#              polygon edges are split at the cell lines and each piece adds
+#              the trapezoid to its right to an accumulation buffer, whose
+#              running sum along the row is the covered area of the cell
+#              (the accumulation scheme of font rasterizers). The pieces are
+#              summed per mukey, so the areas of a map unit's polygons in a
+#              cell are combined, and a cell takes the mukey with the largest
+#              combined area; on a tie the smaller mukey wins. Cells no
+#              polygon reaches hold NODATA.
+#
+#              arcpy.PolygonToRaster is still used unless ACPF_NATIVE_RASTER
+#              is set to "1".
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re, math, shutil, tempfile, multiprocessing
+
+import numpy as np
+
+
+# Native rasterizer on/off, off unless asked for
+NATIVE = os.environ.get("ACPF_NATIVE_RASTER", "0") != "0"
+
+# Tile edge in cells, and the worker processes the tiles are spread over
+TILE = int(os.environ.get("ACPF_RASTER_TILE", "1024"))
+WORKERS = int(os.environ.get("ACPF_RASTER_WORKERS", str(max(1, min(4, multiprocessing.cpu_count() - 1)))))
+
+# Cell value where no polygon reaches
+NODATA = 0
+
+# Differences in covered area (in cells) below this are rounding noise
+_EPS = 1e-9
+
+_ring = re.compile(r"(\(+)([^()]*)\)")
+_number = re.compile(r"-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?")
+
+
+class Grid(object):
+    # Output raster geometry: left and top edges, cell size, rows and columns
+
+    def __init__(self, left, top, cell, nrows, ncols):
+        self.left = left
+        self.top = top
+        self.cell = cell
+        self.nrows = nrows
+        self.ncols = ncols
+
+    def bottom(self):
+        return self.top - self.nrows * self.cell
+
+    def tiles(self, size=None):
+        # (row, col, height, width) of every tile, row by row
+        size = size or TILE
+        return [(r, c, min(size, self.nrows - r), min(size, self.ncols - c)) for r in range(0, self.nrows, size) for c in range(0, self.ncols, size)]
+
+    def asTuple(self):
+        return self.left, self.top, self.cell, self.nrows, self.ncols
+
+
+def snapGrid(ext, cell, anchor=None):
+    # Grid of cell size covering ext (xmin, ymin, xmax, ymax), with its cell
+    # corners on anchor (x, y), the snap raster's lower left corner. Without
+    # an anchor the grid starts at the extent's lower left corner.
+
+    xmin, ymin, xmax, ymax = ext
+    ax, ay = anchor if anchor is not None else (xmin, ymin)
+
+    left = ax + math.floor((xmin - ax) / cell) * cell
+    bottom = ay + math.floor((ymin - ay) / cell) * cell
+    ncols = max(1, int(math.ceil((xmax - left) / cell - 1e-9)))
+    nrows = max(1, int(math.ceil((ymax - bottom) / cell - 1e-9)))
+
+    return Grid(left, bottom + nrows * cell, cell, nrows, ncols)
+
+
+def parseRings(wkt):
+    # [(coordinates Nx2, exterior)] for a POLYGON or MULTIPOLYGON WKT. A ring
+    # opening with "((" starts a polygon and is its exterior, the others are holes.
+    rings = list()
+
+    for m in _ring.finditer(wkt):
+        nums = _number.findall(m.group(2))
+
+        if len(nums) >= 6 and len(nums) % 2 == 0:
+            rings.append((np.array(nums, dtype=np.float64).reshape(-1, 2), len(m.group(1)) > 1))
+
+    return rings
+
+
+class RingSet(object):
+    # Every ring of a polygon layer as flat vertex arrays
+    #
+    # offsets[i]:offsets[i + 1] are ring i's vertices (closed, last = first),
+    # value[i] its cell value and sign[i] +1 or -1 so that exteriors add area
+    # and holes remove it whatever way the ring runs.
+
+    def __init__(self, x, y, offsets, value, sign):
+        self.x = x
+        self.y = y
+        self.offsets = offsets
+        self.value = value
+        self.sign = sign
+
+    @classmethod
+    def fromWKT(cls, wkts, values):
+        xs = list()
+        ys = list()
+        offsets = [0]
+        value = list()
+        sign = list()
+
+        for wkt, val in zip(wkts, values):
+            for xy, exterior in parseRings(wkt):
+                if (xy[0] != xy[-1]).any():
+                    xy = np.vstack([xy, xy[:1]])
+
+                # shoelace, positive when counterclockwise
+                area = np.dot(xy[:-1, 0], xy[1:, 1]) - np.dot(xy[1:, 0], xy[:-1, 1])
+
+                if area == 0:
+                    continue
+
+                xs.append(xy[:, 0])
+                ys.append(xy[:, 1])
+                offsets.append(offsets[-1] + len(xy))
+                value.append(int(val))
+                sign.append(1 if (area > 0) == exterior else -1)
+
+        if not xs:
+            xs, ys = [np.zeros(0)], [np.zeros(0)]
+
+        return cls(np.concatenate(xs), np.concatenate(ys), np.array(offsets, dtype=np.int64), np.array(value, dtype=np.int64), np.array(sign, dtype=np.int8))
+
+    def __len__(self):
+        return len(self.value)
+
+    def bounds(self):
+        # per ring (xmin, ymin, xmax, ymax) arrays
+        starts = self.offsets[:-1]
+
+        if len(starts) == 0:
+            empty = np.zeros(0)
+            return empty, empty, empty, empty
+
+        return (np.minimum.reduceat(self.x, starts), np.minimum.reduceat(self.y, starts),
+                np.maximum.reduceat(self.x, starts), np.maximum.reduceat(self.y, starts))
+
+    def extent(self):
+        return float(self.x.min()), float(self.y.min()), float(self.x.max()), float(self.y.max())
+
+    def save(self, folder):
+        for name in ("x", "y", "offsets", "value", "sign"):
+            np.save(os.path.join(folder, "rings_" + name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, folder):
+        # memory-mapped, so every worker process shares the one copy on disk
+        arrays = [np.load(os.path.join(folder, "rings_" + name + ".npy"), mmap_mode="r") for name in ("x", "y", "offsets", "value", "sign")]
+
+        return cls(*arrays)
+
+
+def _segments(rings, ids):
+    # segment end points, sign and value of the rings ids
+    starts = rings.offsets[ids]
+    counts = rings.offsets[ids + 1] - starts - 1
+    ringOf = np.repeat(np.arange(len(ids)), counts)
+    first = np.cumsum(counts) - counts
+    i = starts[ringOf] + (np.arange(counts.sum()) - first[ringOf])
+
+    return rings.x[i], rings.y[i], rings.x[i + 1], rings.y[i + 1], rings.sign[ids][ringOf], rings.value[ids][ringOf]
+
+
+def _pieces(u0, v0, u1, v1, s, h, w):
+    # Split signed segments, given in tile cell units (u right, v down), at
+    # the column lines 0..w and row lines 0..h. Returns, for every piece
+    # inside a tile row, its segment index, row, column, signed height dy
+    # and the fraction fx of the cell left of its midpoint.
+
+    umin, umax = np.minimum(u0, u1), np.maximum(u0, u1)
+    vmin, vmax = np.minimum(v0, v1), np.maximum(v0, v1)
+
+    # horizontal segments add nothing, segments wholly right of the tile neither
+    idx = np.flatnonzero((vmax > 0) & (vmin < h) & (umin < w) & (v0 != v1))
+    u0, v0, du, dv = u0[idx], v0[idx], u1[idx] - u0[idx], v1[idx] - v0[idx]
+    umin, umax, vmin, vmax = umin[idx], umax[idx], vmin[idx], vmax[idx]
+    n = len(idx)
+    local = np.arange(n)
+
+    xlo = np.maximum(np.ceil(umin), 0)
+    xhi = np.minimum(np.floor(umax), w)
+    nx = np.where(du != 0, np.maximum(xhi - xlo + 1, 0), 0).astype(np.int64)
+    ylo = np.maximum(np.ceil(vmin), 0)
+    yhi = np.minimum(np.floor(vmax), h)
+    ny = np.maximum(yhi - ylo + 1, 0).astype(np.int64)
+
+    sx = np.repeat(local, nx)
+    kx = xlo[sx] + (np.arange(nx.sum()) - (np.cumsum(nx) - nx)[sx])
+    sy = np.repeat(local, ny)
+    ky = ylo[sy] + (np.arange(ny.sum()) - (np.cumsum(ny) - ny)[sy])
+
+    seg = np.concatenate([local, local, sx, sy])
+    t = np.concatenate([np.zeros(n), np.ones(n), (kx - u0[sx]) / du[sx], (ky - v0[sy]) / dv[sy]])
+    order = np.lexsort((t, seg))
+    seg, t = seg[order], t[order]
+
+    # pieces between consecutive split points, each inside one cell
+    same = seg[:-1] == seg[1:]
+    sg, ta, tb = seg[:-1][same], t[:-1][same], t[1:][same]
+    tm = (ta + tb) / 2
+    umid = u0[sg] + tm * du[sg]
+    vmid = v0[sg] + tm * dv[sg]
+    dy = (tb - ta) * dv[sg] * s[idx[sg]]
+
+    row = np.floor(vmid).astype(np.int64)
+    keep = (row >= 0) & (row < h) & (dy != 0)
+
+    # pieces left of the tile stand on its left edge and carry into the row
+    uc = np.clip(umid[keep], 0, w)
+    col = np.minimum(np.floor(uc), w).astype(np.int64)
+
+    return idx[sg[keep]], row[keep], col, dy[keep], uc - col
+
+
+def burnTile(rings, ids, grid, r, c, h, w):
+    # Cell values of one tile from the rings ids that may reach it
+    values = np.full((h, w), NODATA, dtype=np.int32)
+
+    if len(ids) == 0:
+        return values
+
+    x0, y0, x1, y1, s, val = _segments(rings, np.asarray(ids, dtype=np.int64))
+
+    # tile cell units
+    left = grid.left + c * grid.cell
+    top = grid.top - r * grid.cell
+    u0, u1 = (x0 - left) / grid.cell, (x1 - left) / grid.cell
+    v0, v1 = (top - y0) / grid.cell, (top - y1) / grid.cell
+
+    seg, row, col, dy, fx = _pieces(u0, v0, u1, v1, s, h, w)
+
+    if len(seg) == 0:
+        return values
+
+    # map unit index, in mukey order
+    units, grp = np.unique(val[seg], return_inverse=True)
+
+    # each piece adds the trapezoid right of it to its cell and the rest of
+    # its height to every cell further right; sum them per map unit, row
+    # and column
+    key = np.concatenate([(grp * h + row) * (w + 1) + col, (grp * h + row) * (w + 1) + col + 1])
+    add = np.concatenate([dy * (1 - fx), dy * fx])
+    key, inv = np.unique(key, return_inverse=True)
+    add = np.bincount(inv, add)
+
+    # running sum along each map unit row: the area of the cells from this
+    # column up to the next one with a contribution, or the tile's edge
+    run = key // (w + 1)
+    starts = np.flatnonzero(np.concatenate([[True], run[1:] != run[:-1]]))
+    total = np.cumsum(add)
+    area = total - np.repeat(total[starts] - add[starts], np.diff(np.append(starts, len(run))))
+    c0 = key % (w + 1)
+    c1 = np.where(np.concatenate([run[1:] == run[:-1], [False]]), np.roll(c0, -1), w)
+
+    spans = (area > _EPS) & (c0 < w)
+    run, c0, c1, area = run[spans], c0[spans], c1[spans], area[spans]
+
+    # one entry per covered cell and map unit
+    n = c1 - c0
+    span = np.repeat(np.arange(len(n)), n)
+    cell = (run[span] % h) * w + c0[span] + (np.arange(n.sum()) - (np.cumsum(n) - n)[span])
+    unit = run[span] // h
+    q = np.round(area[span] / _EPS).astype(np.int64)
+
+    if len(cell) == 0:
+        return values
+
+    # largest combined area per cell, the smaller mukey on a tie
+    order = np.lexsort((unit, -q, cell))
+    cell, unit = cell[order], unit[order]
+    firstOf = np.concatenate([[True], cell[1:] != cell[:-1]])
+
+    values.ravel()[cell[firstOf]] = units[unit[firstOf]]
+
+    return values
+
+
+def tileRings(rings, grid, size=None):
+    # ring ids for every tile whose rows and columns the ring's box meets
+    size = size or TILE
+    tiles = grid.tiles(size)
+    ntc = int(math.ceil(grid.ncols / float(size)))
+    ntr = int(math.ceil(grid.nrows / float(size)))
+
+    xmin, ymin, xmax, ymax = rings.bounds()
+    c0 = np.clip(np.floor((xmin - grid.left) / grid.cell / size), 0, ntc - 1).astype(np.int64)
+    c1 = np.clip(np.floor((xmax - grid.left) / grid.cell / size), 0, ntc - 1).astype(np.int64)
+    r0 = np.clip(np.floor((grid.top - ymax) / grid.cell / size), 0, ntr - 1).astype(np.int64)
+    r1 = np.clip(np.floor((grid.top - ymin) / grid.cell / size), 0, ntr - 1).astype(np.int64)
+
+    nc = c1 - c0 + 1
+    n = (r1 - r0 + 1) * nc
+    ring = np.repeat(np.arange(len(n)), n)
+    j = np.arange(n.sum()) - (np.cumsum(n) - n)[ring]
+    tile = (r0[ring] + j // nc[ring]) * ntc + c0[ring] + j % nc[ring]
+
+    order = np.argsort(tile, kind="mergesort")
+    tile, ring = tile[order], ring[order]
+    cuts = np.searchsorted(tile, np.arange(ntr * ntc + 1))
+
+    return [(t, ring[cuts[i]:cuts[i + 1]]) for i, t in enumerate(tiles)]
+
+
+def _burnJob(args):
+    # Runs in a worker process: burn one tile into the output memmap
+    folder, outPath, gridTuple, tile, ids = args
+    grid = Grid(*gridTuple)
+    r, c, h, w = tile
+
+    values = burnTile(RingSet.load(folder), ids, grid, r, c, h, w)
+
+    out = np.memmap(outPath, dtype=np.int32, mode="r+", shape=(grid.nrows, grid.ncols))
+    out[r:r + h, c:c + w] = values
+    out.flush()
+    del out
+
+    return tile
+
+
+def rasterize(rings, grid, outPath, workers=None, size=None):
+    # Burn rings into a new int32 memmap at outPath, returns it
+
+    out = np.memmap(outPath, dtype=np.int32, mode="w+", shape=(grid.nrows, grid.ncols))
+    out[:] = NODATA
+    out.flush()
+
+    jobs = [(tile, ids) for tile, ids in tileRings(rings, grid, size) if len(ids)]
+
+    # the batch tools already run each watershed in a worker process, and
+    # those may not start processes of their own
+    workers = max(1, min(workers or WORKERS, len(jobs)))
+
+    if multiprocessing.current_process().daemon:
+        workers = 1
+
+    if workers == 1:
+        for (r, c, h, w), ids in jobs:
+            out[r:r + h, c:c + w] = burnTile(rings, ids, grid, r, c, h, w)
+
+        out.flush()
+        return out
+
+    import acpf_batch
+
+    folder = tempfile.mkdtemp(prefix="acpf_raster_")
+
+    try:
+        rings.save(folder)
+        acpf_batch.setExecutable()
+        pool = multiprocessing.Pool(workers)
+
+        try:
+            for done in pool.imap_unordered(_burnJob, [(folder, outPath, grid.asTuple(), tile, ids) for tile, ids in jobs]):
+                pass
+
+        finally:
+            pool.close()
+            pool.join()
+
+    finally:
+        shutil.rmtree(folder, True)
+
+    return np.memmap(outPath, dtype=np.int32, mode="r+", shape=(grid.nrows, grid.ncols))
+
+
+def featureRings(fc, field="mukey"):
+    # RingSet of a polygon featureclass, field giving the cell values
+    import arcpy
+
+    wkts = list()
+    values = list()
+
+    with arcpy.da.SearchCursor(fc, ["SHAPE@WKT", field]) as cur:
+        for wkt, val in cur:
+            if wkt and val is not None:
+                wkts.append(wkt)
+                values.append(val)
+
+    return RingSet.fromWKT(wkts, values)
+
+
+def snapAnchor(snapRaster):
+    # lower left corner and cell size of the snap raster, or None
+    import arcpy
+
+    if not snapRaster:
+        return None, None
+
+    desc = arcpy.Describe(snapRaster)
+
+    return (desc.extent.XMin, desc.extent.YMin), desc.meanCellWidth
+
+
+def writeRaster(values, grid, outRaster, sr):
+    # Save a value array as an integer raster, tile by tile for large grids,
+    # returns its ValueSummary. A ".tif" outRaster is written by mu_tiff.
+    import arcpy
+
+    if outRaster.lower().endswith(".tif"):
+        import mu_tiff
+
+        summary = mu_tiff.writeGeoTIFF(values, grid, outRaster, sr.factoryCode)
+
+        if not sr.factoryCode:
+            arcpy.management.DefineProjection(outRaster, sr)
+
+        return summary
+
+    tiles = grid.tiles(max(TILE, 4096))
+    found = list()
+    counts = list()
+
+    if len(tiles) == 1:
+        block = np.asarray(values)
+        ras = arcpy.NumPyArrayToRaster(block, arcpy.Point(grid.left, grid.bottom()), grid.cell, grid.cell, NODATA)
+        ras.save(outRaster)
+
+        v, n = np.unique(block, return_counts=True)
+        found.append(v)
+        counts.append(n)
+
+    else:
+        folder = tempfile.mkdtemp(prefix="acpf_tiles_")
+
+        try:
+            parts = list()
+
+            for i, (r, c, h, w) in enumerate(tiles):
+                block = np.array(values[r:r + h, c:c + w])
+                ras = arcpy.NumPyArrayToRaster(block, arcpy.Point(grid.left + c * grid.cell, grid.top - (r + h) * grid.cell), grid.cell, grid.cell, NODATA)
+                part = os.path.join(folder, "t" + str(i) + ".tif")
+                ras.save(part)
+                parts.append(part)
+                del ras
+
+                v, n = np.unique(block, return_counts=True)
+                found.append(v)
+                counts.append(n)
+
+            arcpy.management.MosaicToNewRaster(";".join(parts), os.path.dirname(outRaster), os.path.basename(outRaster), sr, "32_BIT_SIGNED", grid.cell, 1)
+
+        finally:
+            shutil.rmtree(folder, True)
+
+    arcpy.management.DefineProjection(outRaster, sr)
+    arcpy.management.BuildRasterAttributeTable(outRaster, "Overwrite")
+
+    return _mergeCounts(found, counts, grid.cell)
+
+
+def polygonToRaster(fc, field, outRaster, cell, snapRaster=None, folder=None):
+    # Stand-in for arcpy PolygonToRaster(fc, field, outRaster, "MAXIMUM_COMBINED_AREA", None, cell)
+    # Returns the value array (a memmap in folder, default the temp folder),
+    # its Grid and its ValueSummary.
+    import arcpy
+
+    if not os.path.dirname(outRaster):
+        outRaster = os.path.join(arcpy.env.workspace, outRaster)
+
+    rings = featureRings(fc, field)
+
+    if len(rings) == 0:
+        raise ValueError("No polygons to rasterize in " + fc)
+
+    anchor, snapCell = snapAnchor(snapRaster)
+    grid = snapGrid(rings.extent(), float(cell), anchor)
+
+    outPath = os.path.join(folder or tempfile.gettempdir(), "acpf_" + os.path.basename(outRaster) + "_" + str(os.getpid()) + ".dat")
+    values = rasterize(rings, grid, outPath)
+
+    summary = writeRaster(values, grid, outRaster, arcpy.Describe(fc).spatialReference)
+
+    return values, grid, summary
+
+
+class ValueSummary(object):
+    # The map units of a mukey raster from one pass over its cells
+    #
+    # values are the distinct cell values in ascending order, counts their
+    # cells and areas their area in square map units. mukeys is the text
+    # mukey list, sorted as the SDA requests expect it.
+
+    def __init__(self, values, counts, cellArea):
+        self.values = values
+        self.counts = counts
+        self.areas = counts * cellArea
+        self.mukeys = sorted(str(v) for v in values.tolist())
+
+    def __len__(self):
+        return len(self.values)
+
+    def missing(self, mukeys):
+        # the source mukeys with no cell in the raster, sorted
+        return sorted(set(str(k) for k in mukeys) - set(self.mukeys))
+
+
+def _mergeCounts(found, counts, cell):
+    # ValueSummary from the (values, counts) of np.unique over several bands
+    if found:
+        v, inv = np.unique(np.concatenate(found), return_inverse=True)
+        n = np.bincount(inv, weights=np.concatenate(counts), minlength=len(v)).astype(np.int64)
+
+    else:
+        v, n = np.zeros(0, np.int64), np.zeros(0, np.int64)
+
+    keep = v != NODATA
+
+    return ValueSummary(v[keep].astype(np.int64), n[keep], float(cell) * float(cell))
+
+
+def summarize(values, cell, rows=None):
+    # ValueSummary of a value array (or memmap), read in bands of rows so a
+    # memmap is never held whole; NODATA cells are left out
+
+    rows = rows or 4 * TILE
+    found = list()
+    counts = list()
+
+    for r in range(0, values.shape[0], rows):
+        v, n = np.unique(np.asarray(values[r:r + rows]), return_counts=True)
+        found.append(v)
+        counts.append(n)
+
+    return _mergeCounts(found, counts, cell)
+
+
+def rasterSummary(inRaster, rows=None):
+    # ValueSummary of an integer raster written by arcpy, read band by band
+    import arcpy
+
+    desc = arcpy.Describe(inRaster)
+    ext = desc.extent
+    cell = desc.meanCellWidth
+    nrows, ncols = desc.height, desc.width
+    rows = rows or 4 * TILE
+    found = list()
+    counts = list()
+
+    for r in range(0, nrows, rows):
+        h = min(rows, nrows - r)
+        band = arcpy.RasterToNumPyArray(inRaster, arcpy.Point(ext.XMin, ext.YMax - (r + h) * cell), ncols, h, NODATA)
+        v, n = np.unique(band, return_counts=True)
+        found.append(v)
+        counts.append(n)
+        del band
+
+    return _mergeCounts(found, counts, cell)
+
+
+def writeRAT(outRaster, summary, field="MUKEY"):
+    # Give the raster attribute table a text mukey field, filled in one
+    # cursor pass from the summary instead of CalculateField on VALUE
+    import arcpy
+
+    names = [f.name.upper() for f in arcpy.ListFields(outRaster)]
+
+    if not "VALUE" in names:
+        arcpy.management.BuildRasterAttributeTable(outRaster, "Overwrite")
+
+    if not field.upper() in names:
+        arcpy.management.AddField(outRaster, field, "TEXT", None, None, "30")
+
+    with arcpy.da.UpdateCursor(outRaster, ["VALUE", field]) as cur:
+        for rec in cur:
+            rec[1] = str(rec[0])
+            cur.updateRow(rec)
@@ -0,0 +1,424 @@
+#-------------------------------------------------------------------------------
+# Name:        mu_tiff
+# Purpose:     Write the mukey raster as an internally tiled, deflate
+#              compressed GeoTIFF with internal overviews, and take its
+#              statistics, histogram and attribute table in the same pass.
+#
+#              ConvertToRaster saved a file geodatabase raster and then read
+#              it back several times: CalculateStatistics (twice, with sleeps
+#              between tries when it failed), BuildPyramids and
+#              BuildRasterAttributeTable. Here each TILE x TILE block of the
+#              mukey array is compressed and written once, and while it is in
+#              memory it adds to the band statistics, the per-mukey cell
+#              counts and the nearest-neighbour overview levels.
+#
+#              All image file directories are reserved at the front of the
+#              file and filled in when the tile offsets are known, followed
+#              by the full resolution tiles and then the overviews. The
+#              statistics and histogram go to the GDAL/ArcGIS .aux.xml
+#              sidecar and the attribute table (Value, Count, MUKEY) to the
+#              .vat.dbf ArcGIS reads for TIFF rasters.
+#
+#              TiffReader memory-maps such a file and inflates only the
+#              tiles a window needs (mu_views reads mukeys through it).
+#
+#              Set ACPF_GEOTIFF to "1" to have ConvertToRaster write
+#              <rasterName>.tif beside the geodatabase.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, struct, zlib, datetime
+
+import numpy as np
+
+import mu_raster
+
+
+# GeoTIFF output on/off
+GEOTIFF = os.environ.get("ACPF_GEOTIFF", "0") != "0"
+
+# Tile edge in cells (a multiple of 16) and the deflate level
+TILE = int(os.environ.get("ACPF_TIFF_TILE", "256"))
+LEVEL = int(os.environ.get("ACPF_TIFF_LEVEL", "6"))
+
+# Histogram buckets in the .aux.xml
+BUCKETS = 256
+
+# TIFF field types
+_SHORT = 3
+_LONG = 4
+_DOUBLE = 12
+_ASCII = 2
+
+_typeCode = {_SHORT: "H", _LONG: "I", _DOUBLE: "d"}
+
+
+class BandStats(object):
+    # Running count, sum, sum of squares, minimum and maximum of the data
+    # cells, and the (values, counts) of every block seen
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.found = list()
+        self.counts = list()
+
+    def add(self, block):
+        v, n = np.unique(block, return_counts=True)
+        self.found.append(v)
+        self.counts.append(n)
+
+        data = v != mu_raster.NODATA
+        v, n = v[data].astype(np.float64), n[data]
+
+        if len(v) == 0:
+            return
+
+        self.count += int(n.sum())
+        self.total += float(np.dot(v, n))
+        self.squares += float(np.dot(v * v, n))
+        self.minimum = float(v[0]) if self.minimum is None else min(self.minimum, float(v[0]))
+        self.maximum = float(v[-1]) if self.maximum is None else max(self.maximum, float(v[-1]))
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def stdDev(self):
+        if not self.count:
+            return 0.0
+
+        return float(np.sqrt(max(self.squares / self.count - self.mean() ** 2, 0.0)))
+
+
+def _ifd(tags, at):
+    # Bytes of one image file directory written at offset at, its
+    # out-of-line values following it. tags is a list of (tag, type, values).
+    # The next-IFD pointer is left 0 and its position returned.
+
+    n = len(tags)
+    head = struct.pack("<H", n)
+    extra = b""
+    dataAt = at + 2 + 12 * n + 4
+    entries = b""
+
+    for tag, typ, values in sorted(tags):
+        if typ == _ASCII:
+            raw = values.encode("ascii") + b"\0"
+            count = len(raw)
+
+        else:
+            raw = struct.pack("<" + _typeCode[typ] * len(values), *values)
+            count = len(values)
+
+        if len(raw) <= 4:
+            entries += struct.pack("<HHI", tag, typ, count) + raw.ljust(4, b"\0")
+
+        else:
+            entries += struct.pack("<HHII", tag, typ, count, dataAt + len(extra))
+            extra += raw
+
+            if len(extra) % 2:
+                extra += b"\0"
+
+    return head + entries + struct.pack("<I", 0) + extra, at + 2 + 12 * n
+
+
+def _tags(nrows, ncols, ntiles, offsets, counts, overview, geo):
+    tags = [(254, _LONG, [1 if overview else 0]),
+            (256, _LONG, [ncols]),
+            (257, _LONG, [nrows]),
+            (258, _SHORT, [32]),
+            (259, _SHORT, [8]),
+            (262, _SHORT, [1]),
+            (277, _SHORT, [1]),
+            (284, _SHORT, [1]),
+            (322, _SHORT, [TILE]),
+            (323, _SHORT, [TILE]),
+            (324, _LONG, offsets or [0] * ntiles),
+            (325, _LONG, counts or [0] * ntiles),
+            (339, _SHORT, [2]),
+            (42113, _ASCII, str(mu_raster.NODATA))]
+
+    if geo is not None:
+        tags.extend(geo)
+
+    return tags
+
+
+def _geoTags(grid, epsg):
+    # ModelPixelScale, ModelTiepoint and the GeoKey directory (projected,
+    # pixel is area, EPSG code when known)
+    keys = [(1024, 0, 1, 1), (1025, 0, 1, 1)]
+
+    if epsg:
+        keys.append((3072, 0, 1, epsg))
+
+    directory = [1, 1, 0, len(keys)]
+
+    for key in keys:
+        directory.extend(key)
+
+    return [(33550, _DOUBLE, [grid.cell, grid.cell, 0.0]),
+            (33922, _DOUBLE, [0.0, 0.0, 0.0, grid.left, grid.top, 0.0]),
+            (34735, _SHORT, directory)]
+
+
+def _tileBlock(values, r, c):
+    # one TILE x TILE block, padded with NODATA past the raster edge
+    block = np.asarray(values[r:r + TILE, c:c + TILE], dtype=np.int32)
+
+    if block.shape != (TILE, TILE):
+        full = np.full((TILE, TILE), mu_raster.NODATA, dtype=np.int32)
+        full[:block.shape[0], :block.shape[1]] = block
+        block = full
+
+    return block
+
+
+def overviewFactors(nrows, ncols):
+    # 2, 4, 8... until the level fits in one tile
+    factors = list()
+    f = 2
+
+    while max(nrows, ncols) > TILE * (f // 2):
+        factors.append(f)
+        f *= 2
+
+    return factors
+
+
+def writeGeoTIFF(values, grid, outTif, epsg=0):
+    # Write the value array (or memmap) as a tiled GeoTIFF with overviews,
+    # returns the mu_raster.ValueSummary taken while writing
+
+    levels = [(grid.nrows, grid.ncols, 1)]
+
+    for f in overviewFactors(grid.nrows, grid.ncols):
+        levels.append((-(-grid.nrows // f), -(-grid.ncols // f), f))
+
+    grids = [(-(-h // TILE), -(-w // TILE)) for h, w, f in levels]
+    geo = _geoTags(grid, epsg)
+
+    # reserve the directories, sizes do not depend on the offsets
+    at = 8
+    places = list()
+
+    for i, (h, w, f) in enumerate(levels):
+        ntiles = grids[i][0] * grids[i][1]
+        raw, nextAt = _ifd(_tags(h, w, ntiles, None, None, i > 0, geo if i == 0 else None), at)
+        places.append(at)
+        at += len(raw)
+
+    overviews = [np.full((h, w), mu_raster.NODATA, dtype=np.int32) for h, w, f in levels[1:]]
+    stats = BandStats()
+    offsets = [list() for l in levels]
+    counts = [list() for l in levels]
+
+    with open(outTif, "wb") as out:
+        out.write(b"II*\0" + struct.pack("<I", places[0]))
+        out.write(b"\0" * (at - 8))
+
+        # full resolution tiles, row by row, feeding the statistics and overviews
+        for tr in range(grids[0][0]):
+            for tc in range(grids[0][1]):
+                r, c = tr * TILE, tc * TILE
+                block = _tileBlock(values, r, c)
+                h, w = min(TILE, grid.nrows - r), min(TILE, grid.ncols - c)
+                stats.add(block[:h, :w])
+
+                for (oh, ow, f), ov in zip(levels[1:], overviews):
+                    i0, j0 = (-r) % f, (-c) % f
+                    part = block[i0:h:f, j0:w:f]
+                    ov[(r + i0) // f:(r + i0) // f + part.shape[0], (c + j0) // f:(c + j0) // f + part.shape[1]] = part
+
+                data = zlib.compress(block.tobytes(), LEVEL)
+                offsets[0].append(out.tell())
+                counts[0].append(len(data))
+                out.write(data)
+
+        for i, ov in enumerate(overviews, 1):
+            for tr in range(grids[i][0]):
+                for tc in range(grids[i][1]):
+                    data = zlib.compress(_tileBlock(ov, tr * TILE, tc * TILE).tobytes(), LEVEL)
+                    offsets[i].append(out.tell())
+                    counts[i].append(len(data))
+                    out.write(data)
+
+        if out.tell() >= 2 ** 32:
+            raise ValueError("GeoTIFF over 4 GB, BigTIFF is not written: " + outTif)
+
+        # fill in the directories, each pointing to the next
+        for i, (h, w, f) in enumerate(levels):
+            ntiles = grids[i][0] * grids[i][1]
+            raw, nextAt = _ifd(_tags(h, w, ntiles, offsets[i], counts[i], i > 0, geo if i == 0 else None), places[i])
+
+            if i + 1 < len(levels):
+                cut = nextAt - places[i]
+                raw = raw[:cut] + struct.pack("<I", places[i + 1]) + raw[cut + 4:]
+
+            out.seek(places[i])
+            out.write(raw)
+
+    summary = mu_raster._mergeCounts(stats.found, stats.counts, grid.cell)
+    writeAux(outTif + ".aux.xml", stats, summary)
+    writeVAT(outTif + ".vat.dbf", summary)
+
+    return summary
+
+
+def writeAux(auxPath, stats, summary):
+    # GDAL PAM sidecar with the band statistics and a histogram built from
+    # the per-mukey counts
+    lines = ['<PAMDataset>', '  <PAMRasterBand band="1">']
+
+    if stats.count:
+        lo, hi = stats.minimum - 0.5, stats.maximum + 0.5
+        hist = np.histogram(summary.values, BUCKETS, (lo, hi), weights=summary.counts)[0].astype(np.int64)
+
+        lines.append('    <Histograms>')
+        lines.append('      <HistItem>')
+        lines.append('        <HistMin>%r</HistMin>' % lo)
+        lines.append('        <HistMax>%r</HistMax>' % hi)
+        lines.append('        <BucketCount>%d</BucketCount>' % BUCKETS)
+        lines.append('        <IncludeOutOfRange>0</IncludeOutOfRange>')
+        lines.append('        <Approximate>0</Approximate>')
+        lines.append('        <HistCounts>' + "|".join(str(n) for n in hist.tolist()) + '</HistCounts>')
+        lines.append('      </HistItem>')
+        lines.append('    </Histograms>')
+
+    lines.append('    <Metadata>')
+    lines.append('      <MDI key="STATISTICS_MAXIMUM">%r</MDI>' % float(stats.maximum or 0))
+    lines.append('      <MDI key="STATISTICS_MEAN">%r</MDI>' % stats.mean())
+    lines.append('      <MDI key="STATISTICS_MINIMUM">%r</MDI>' % float(stats.minimum or 0))
+    lines.append('      <MDI key="STATISTICS_STDDEV">%r</MDI>' % stats.stdDev())
+    lines.append('    </Metadata>')
+    lines.append('  </PAMRasterBand>')
+    lines.append('</PAMDataset>')
+
+    with open(auxPath, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def writeVAT(dbfPath, summary):
+    # dBASE III attribute table: Value, Count and the text MUKEY
+    fields = [("Value", "N", 11), ("Count", "N", 18), ("MUKEY", "C", 30)]
+    today = datetime.date.today()
+    size = 1 + sum(f[2] for f in fields)
+
+    with open(dbfPath, "wb") as f:
+        f.write(struct.pack("<BBBBIHH20x", 3, today.year - 1900, today.month, today.day, len(summary), 32 + 32 * len(fields) + 1, size))
+
+        for name, typ, width in fields:
+            f.write(struct.pack("<11sc4xBB14x", name.encode("ascii"), typ.encode("ascii"), width, 0))
+
+        f.write(b"\r")
+
+        for value, count in zip(summary.values.tolist(), summary.counts.tolist()):
+            f.write(b" " + str(value).rjust(11).encode("ascii") + str(count).rjust(18).encode("ascii") + str(value).ljust(30).encode("ascii"))
+
+        f.write(b"\x1a")
+
+
+class TiffReader(object):
+    # Windowed reads from the full resolution image of a tiled int32
+    # GeoTIFF such as writeGeoTIFF makes. The file is memory-mapped and a
+    # tile is only inflated when a window first needs it; the last
+    # cacheTiles tiles are kept.
+
+    def __init__(self, path, cacheTiles=64):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        self.cacheTiles = cacheTiles
+        self.cache = dict()
+        self.order = list()
+
+        if self.data[:4].tobytes() != b"II*\0":
+            raise ValueError("Not a little-endian classic TIFF: " + path)
+
+        tags = self._tags(struct.unpack("<I", self.data[4:8].tobytes())[0])
+
+        if tags.get(258, [32])[0] != 32 or tags.get(339, [1])[0] != 2 or not 322 in tags or not tags.get(259, [1])[0] in (1, 8):
+            raise ValueError("Only tiled, signed 32-bit TIFFs are read: " + path)
+
+        self.ncols, self.nrows = tags[256][0], tags[257][0]
+        self.tile = tags[322][0]
+        self.compressed = tags[259][0] == 8
+        self.offsets = tags[324]
+        self.counts = tags[325]
+        self.tilesAcross = -(-self.ncols // self.tile)
+
+        scale = tags.get(33550, (1.0, 1.0, 0.0))
+        tie = tags.get(33922, (0.0, 0.0, 0.0, 0.0, 0.0, 0.0))
+        self.grid = mu_raster.Grid(tie[3] - tie[0] * scale[0], tie[4] + tie[1] * scale[1], scale[0], self.nrows, self.ncols)
+
+        # EPSG code from the GeoKey directory, 0 when not given
+        self.epsg = 0
+        keys = tags.get(34735, ())
+
+        for i in range(4, len(keys), 4):
+            if keys[i] in (3072, 2048) and keys[i + 1] == 0:
+                self.epsg = keys[i + 3]
+
+    @property
+    def shape(self):
+        return self.nrows, self.ncols
+
+    def _tags(self, at):
+        tags = dict()
+        n = struct.unpack("<H", self.data[at:at + 2].tobytes())[0]
+
+        for i in range(n):
+            entry = at + 2 + 12 * i
+            tag, typ, count = struct.unpack("<HHI", self.data[entry:entry + 8].tobytes())
+
+            if not typ in _typeCode:
+                continue
+
+            size = struct.calcsize("<" + _typeCode[typ]) * count
+            start = entry + 8 if size <= 4 else struct.unpack("<I", self.data[entry + 8:entry + 12].tobytes())[0]
+            tags[tag] = struct.unpack("<" + _typeCode[typ] * count, self.data[start:start + size].tobytes())
+
+        return tags
+
+    def _tileAt(self, tr, tc):
+        k = tr * self.tilesAcross + tc
+
+        if k in self.cache:
+            return self.cache[k]
+
+        raw = self.data[self.offsets[k]:self.offsets[k] + self.counts[k]].tobytes()
+
+        if self.compressed:
+            raw = zlib.decompress(raw)
+
+        block = np.frombuffer(raw, dtype="<i4").reshape(self.tile, self.tile)
+        self.cache[k] = block
+        self.order.append(k)
+
+        if len(self.order) > self.cacheTiles:
+            del self.cache[self.order.pop(0)]
+
+        return block
+
+    def read(self, r, c, h, w):
+        # cell values of rows r:r + h and columns c:c + w; cells of the
+        # window outside the raster are NODATA, as RasterToNumPyArray fills them
+        out = np.full((h, w), mu_raster.NODATA, dtype=np.int32)
+        t = self.tile
+        rLo, rHi = max(r, 0), min(r + h, self.nrows)
+        cLo, cHi = max(c, 0), min(c + w, self.ncols)
+
+        if rLo >= rHi or cLo >= cHi:
+            return out
+
+        for tr in range(rLo // t, (rHi - 1) // t + 1):
+            for tc in range(cLo // t, (cHi - 1) // t + 1):
+                r0, c0 = max(rLo, tr * t), max(cLo, tc * t)
+                r1, c1 = min(rHi, (tr + 1) * t), min(cHi, (tc + 1) * t)
+                out[r0 - r:r1 - r, c0 - c:c1 - c] = self._tileAt(tr, tc)[r0 - tr * t:r1 - tr * t, c0 - tc * t:c1 - tc * t]
+
+        return out
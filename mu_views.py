@@ -0,0 +1,245 @@
+#-------------------------------------------------------------------------------
+# Name:        mu_views
+# Purpose:     Serve any map unit attribute (RootZnAWS, Droughty, PWSL,
+#              AWS0_20...) as a virtual raster over the mukey raster.
+#
+#              An attribute raster used to be made by joining the VALU or
+#              SoilProfile columns onto the gSSURGO attribute table
+#              (buildACPF, JoinField) and running a Lookup per attribute,
+#              leaving a full copy of the grid on disk for each one. Here the
+#              mukey raster stays the only grid. Its cells are read a window
+#              at a time (a memory-mapped array, a mu_tiff GeoTIFF or, through
+#              RasterToNumPyArray, any arcpy raster) and turned into
+#              attribute values with two array lookups: a dense index from
+#              mukey to table row, shared by every attribute of the table,
+#              and the attribute's column with a NODATA slot at the end.
+#
+#              writeVRT() saves a view as a GDAL VRT: the mukey GeoTIFF with
+#              a value lookup (LUT), so ArcGIS and GDAL can open it as a
+#              raster without the cells being copied.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os
+
+import numpy as np
+
+import mu_raster, mu_tiff
+
+
+# Attribute value of cells with no mukey, or a mukey without a value
+NODATA = -9999.0
+
+# Table fields that are not attributes
+KEY_FIELDS = ["OBJECTID", "MUKEY", "AREASYMBOL", "MUSYM", "MUNAME"]
+
+
+class ArraySource(object):
+    # Mukey cells from an array or memmap (mu_raster.polygonToRaster's)
+    def __init__(self, values, grid):
+        self.values = values
+        self.grid = grid
+        self.shape = values.shape
+
+    def read(self, r, c, h, w):
+        # cells outside the array are NODATA, as the other sources give them
+        out = np.full((h, w), mu_raster.NODATA, dtype=np.int32)
+        r0, r1 = max(r, 0), min(r + h, self.shape[0])
+        c0, c1 = max(c, 0), min(c + w, self.shape[1])
+
+        if r0 < r1 and c0 < c1:
+            out[r0 - r:r1 - r, c0 - c:c1 - c] = self.values[r0:r1, c0:c1]
+
+        return out
+
+
+class TiffSource(object):
+    # Mukey cells from a GeoTIFF written by mu_tiff
+    def __init__(self, path):
+        self.path = path
+        self.reader = mu_tiff.TiffReader(path)
+        self.grid = self.reader.grid
+        self.shape = self.reader.shape
+
+    def read(self, r, c, h, w):
+        return self.reader.read(r, c, h, w)
+
+
+class RasterSource(object):
+    # Mukey cells from any integer raster arcpy reads
+    def __init__(self, inRaster):
+        import arcpy
+
+        desc = arcpy.Describe(inRaster)
+        self.path = inRaster
+        self.grid = mu_raster.Grid(desc.extent.XMin, desc.extent.YMax, desc.meanCellWidth, desc.height, desc.width)
+        self.shape = (desc.height, desc.width)
+
+    def read(self, r, c, h, w):
+        import arcpy
+
+        g = self.grid
+        corner = arcpy.Point(g.left + c * g.cell, g.top - (r + h) * g.cell)
+
+        return arcpy.RasterToNumPyArray(self.path, corner, w, h, mu_raster.NODATA).astype(np.int32)
+
+
+def openMukeys(source, grid=None):
+    # Mukey source for a path (".tif" from mu_tiff, or any arcpy raster) or
+    # an array with its grid
+    if isinstance(source, np.ndarray):
+        return ArraySource(source, grid)
+
+    if source.lower().endswith(".tif"):
+        try:
+            return TiffSource(source)
+
+        except ValueError:
+            pass
+
+    return RasterSource(source)
+
+
+class AttributeTable(object):
+    # Attribute columns by mukey
+    #
+    # index is dense over mukey 0..max: the row of each mukey, or len(mukeys)
+    # for one the table lacks, so column lookups need no search.
+
+    def __init__(self, mukeys, columns):
+        self.mukeys = np.asarray(mukeys, dtype=np.int64)
+        self.columns = columns
+        self.index = np.full(int(self.mukeys.max()) + 2 if len(self.mukeys) else 1, len(self.mukeys), dtype=np.int32)
+        self.index[self.mukeys] = np.arange(len(self.mukeys), dtype=np.int32)
+
+    @classmethod
+    def fromTable(cls, table, fields=None, keyField="mukey"):
+        # Read the numeric fields (all of them by default) of a table with a mukey field
+        import arcpy
+
+        if fields is None:
+            fields = [f.name for f in arcpy.ListFields(table) if f.type in ("Double", "Single", "Integer", "SmallInteger", "BigInteger") and not f.name.upper() in KEY_FIELDS]
+
+        keys = list()
+        cols = [list() for f in fields]
+
+        with arcpy.da.SearchCursor(table, [keyField] + list(fields)) as cur:
+            for rec in cur:
+                if rec[0] is None:
+                    continue
+
+                keys.append(int(rec[0]))
+
+                for col, val in zip(cols, rec[1:]):
+                    col.append(np.nan if val is None else val)
+
+        return cls(keys, dict((f, np.array(col, dtype=np.float64)) for f, col in zip(fields, cols)))
+
+    def names(self):
+        return sorted(self.columns)
+
+    def lut(self, name, nodata=NODATA, dtype=np.float32):
+        # the column in row order with a last NODATA slot, NULLs as NODATA
+        col = self.columns[name]
+        values = np.append(np.where(np.isnan(col), nodata, col), nodata)
+
+        return values.astype(dtype)
+
+    def value(self, name, mukeys, nodata=NODATA):
+        # attribute of each mukey in an array
+        keys = np.clip(np.asarray(mukeys, dtype=np.int64), 0, len(self.index) - 1)
+        return self.lut(name, nodata, np.float64)[self.index[keys]]
+
+
+class AttributeView(object):
+    # One attribute over a mukey source, read by window
+
+    def __init__(self, source, table, name, nodata=NODATA, dtype=np.float32):
+        self.source = source
+        self.table = table
+        self.name = name
+        self.nodata = nodata
+        self.values = table.lut(name, nodata, dtype)
+        self.grid = source.grid
+        self.shape = source.shape
+
+    def read(self, r, c, h, w):
+        # attribute values of rows r:r + h and columns c:c + w
+        keys = self.source.read(r, c, h, w)
+        index = self.table.index
+
+        # mukeys past the table's largest, and NODATA cells, get the last slot
+        rows = index[np.clip(keys, 0, len(index) - 1)]
+        rows[keys <= mu_raster.NODATA] = len(self.values) - 1
+
+        return self.values[rows]
+
+    def __getitem__(self, window):
+        # view[r0:r1, c0:c1], step 1 only
+        rs, cs = window
+        r0, r1, rstep = rs.indices(self.shape[0])
+        c0, c1, cstep = cs.indices(self.shape[1])
+
+        if rstep != 1 or cstep != 1:
+            raise ValueError("Attribute views are read with step 1")
+
+        return self.read(r0, c0, max(r1 - r0, 0), max(c1 - c0, 0))
+
+    def blocks(self, size=None):
+        # (row, col, values) for every tile of the grid
+        for r, c, h, w in self.grid.tiles(size):
+            yield r, c, self.read(r, c, h, w)
+
+    def writeVRT(self, vrtPath, mukeys=None):
+        # Save the view as a GDAL VRT over the mukey GeoTIFF. mukeys are the
+        # raster's mukeys (its ValueSummary values); a VRT LUT interpolates
+        # between entries, so every mukey present needs one.
+        if not isinstance(self.source, TiffSource):
+            raise ValueError("writeVRT needs a GeoTIFF mukey source")
+
+        if mukeys is None:
+            mukeys = self.table.mukeys
+
+        keys = np.unique(np.asarray(mukeys, dtype=np.int64))
+        keys = keys[keys != mu_raster.NODATA]
+        vals = self.table.value(self.name, keys, self.nodata)
+        g = self.grid
+        srs = '  <SRS>EPSG:%d</SRS>\n' % self.source.reader.epsg if self.source.reader.epsg else ''
+        lut = ",".join("%d:%r" % (k, float(v)) for k, v in zip(keys.tolist(), vals.tolist()))
+
+        with open(vrtPath, "w") as f:
+            f.write('<VRTDataset rasterXSize="%d" rasterYSize="%d">\n' % (g.ncols, g.nrows))
+            f.write(srs)
+            f.write('  <GeoTransform>%r, %r, 0.0, %r, 0.0, %r</GeoTransform>\n' % (g.left, g.cell, g.top, -g.cell))
+            f.write('  <VRTRasterBand dataType="Float32" band="1">\n')
+            f.write('    <Description>%s</Description>\n' % self.name)
+            f.write('    <NoDataValue>%r</NoDataValue>\n' % float(self.nodata))
+            f.write('    <ComplexSource>\n')
+            f.write('      <SourceFilename relativeToVRT="%d">%s</SourceFilename>\n' % (self._relative(vrtPath)))
+            f.write('      <SourceBand>1</SourceBand>\n')
+            f.write('      <NODATA>%d</NODATA>\n' % mu_raster.NODATA)
+            f.write('      <LUT>%s</LUT>\n' % lut)
+            f.write('    </ComplexSource>\n')
+            f.write('  </VRTRasterBand>\n')
+            f.write('</VRTDataset>\n')
+
+    def _relative(self, vrtPath):
+        # (relativeToVRT flag, source path) for the VRT
+        folder = os.path.dirname(os.path.abspath(vrtPath))
+
+        if os.path.dirname(os.path.abspath(self.source.path)) == folder:
+            return 1, os.path.basename(self.source.path)
+
+        return 0, os.path.abspath(self.source.path)
+
+
+def attributeViews(mukeyRaster, table, fields=None, nodata=NODATA):
+    # name: AttributeView for the fields of table (a path, or an
+    # AttributeTable) over the mukey raster (a path or source)
+    source = mukeyRaster if hasattr(mukeyRaster, "read") else openMukeys(mukeyRaster)
+
+    if not isinstance(table, AttributeTable):
+        table = AttributeTable.fromTable(table, fields)
+
+    return dict((name, AttributeView(source, table, name, nodata)) for name in (fields or table.names()))
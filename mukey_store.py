@@ -0,0 +1,201 @@
+#-------------------------------------------------------------------------------
+# Name:        mukey_store
+# Purpose:     Local, map unit granular store of the ACPF/VALU1 property rows
+#              returned by SDA.
+#
+#              Whole-query caching (sda_cache) misses as soon as two buffered
+#              watersheds differ by a single map unit. Here every row of a
+#              mapunit-level product (muaggat, rootZnDep, aws, ...) is stored
+#              under its mukey, so a watershed only sends SDA the mukeys that
+#              no earlier watershed has fetched and the rest are read locally.
+#
+#              Rows are stamped with the SSURGO publication date and with a
+#              signature of the product's query text, so a new SSURGO release
+#              or a change to an ACPF query never serves old rows.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, json, hashlib, sqlite3, threading
+
+import sda_cache, sda_chunk
+
+
+# Store file; set ACPF_MUKEY_STORE to "" to turn the store off
+STORE_PATH = os.environ.get("ACPF_MUKEY_STORE", os.path.join(os.path.dirname(sda_cache._defaultPath()), "mukey_store.sqlite"))
+
+
+def querySignature(qryFunc):
+    # Hash of the product query with a placeholder key list. Any edit to the
+    # query text gives the product a new signature.
+    qry = sda_cache.normalizeQuery(qryFunc(["0"]))
+    return hashlib.sha1(qry.encode("utf-8")).hexdigest()[:16]
+
+
+class MukeyStore(object):
+    # SQLite table of product rows keyed by (product, stamp, mukey)
+    #
+    # A mukey that SDA returned no rows for is stored with a NULL row so it is
+    # not requested again.
+
+    def __init__(self, path=None):
+        self.path = path or STORE_PATH
+        self.lock = threading.Lock()
+
+        folder = os.path.dirname(self.path)
+
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS products (product TEXT, stamp TEXT, colnames TEXT, colinfo TEXT, PRIMARY KEY (product, stamp))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS murows (product TEXT, stamp TEXT, mukey TEXT, rows TEXT, PRIMARY KEY (product, stamp, mukey))")
+        self.conn.commit()
+
+    def missing(self, product, stamp, keys):
+        # keys (in the given order) that are not in the store yet
+        with self.lock:
+            have = set()
+
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                sql = "SELECT mukey FROM murows WHERE product = ? AND stamp = ? AND mukey IN (" + ",".join("?" * len(chunk)) + ")"
+
+                for row in self.conn.execute(sql, [product, stamp] + list(chunk)):
+                    have.add(row[0])
+
+        return [k for k in keys if not str(k) in have]
+
+    def put(self, product, stamp, table, keys):
+        # Store an SDA "Table" (column names, column info, rows) for the
+        # requested keys. Returns False when the table has no mukey column.
+
+        columnNames = table[0]
+        columnInfo = table[1]
+        lowerNames = [c.lower() for c in columnNames]
+
+        if not "mukey" in lowerNames:
+            return False
+
+        keyIndx = lowerNames.index("mukey")
+
+        byKey = dict((str(k), list()) for k in keys)
+
+        for row in table[2:]:
+            byKey.setdefault(str(row[keyIndx]), list()).append(row)
+
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO products (product, stamp, colnames, colinfo) VALUES (?, ?, ?, ?)", (product, stamp, json.dumps(columnNames), json.dumps(columnInfo)))
+
+            for mukey, rows in byKey.items():
+                self.conn.execute("INSERT OR REPLACE INTO murows (product, stamp, mukey, rows) VALUES (?, ?, ?, ?)", (product, stamp, mukey, json.dumps(rows) if rows else None))
+
+            self.conn.commit()
+
+        return True
+
+    def putEmpty(self, product, stamp, keys):
+        # Remember keys that SDA returned no rows for
+        with self.lock:
+            for mukey in keys:
+                self.conn.execute("INSERT OR REPLACE INTO murows (product, stamp, mukey, rows) VALUES (?, ?, ?, NULL)", (product, stamp, str(mukey)))
+
+            self.conn.commit()
+
+    def table(self, product, stamp, keys):
+        # Rebuild the SDA "Table" list for keys from the store, rows in key order.
+        # Returns None if the product has never been stored.
+
+        with self.lock:
+            meta = self.conn.execute("SELECT colnames, colinfo FROM products WHERE product = ? AND stamp = ?", (product, stamp)).fetchone()
+
+            if meta is None:
+                return None
+
+            byKey = dict()
+
+            for i in range(0, len(keys), 500):
+                chunk = [str(k) for k in keys[i:i + 500]]
+                sql = "SELECT mukey, rows FROM murows WHERE product = ? AND stamp = ? AND mukey IN (" + ",".join("?" * len(chunk)) + ")"
+
+                for mukey, rows in self.conn.execute(sql, [product, stamp] + chunk):
+                    byKey[mukey] = rows
+
+        table = [json.loads(meta[0]), json.loads(meta[1])]
+
+        for k in keys:
+            rows = byKey.get(str(k))
+
+            if rows:
+                table.extend(json.loads(rows))
+
+        return table
+
+
+_store = None
+_storeLock = threading.Lock()
+
+
+def getStore():
+    # Process-wide store, or None when ACPF_MUKEY_STORE is set to ""
+    global _store
+
+    if not STORE_PATH:
+        return None
+
+    with _storeLock:
+        if _store is None:
+            _store = MukeyStore()
+
+        return _store
+
+
+def fetch(product, qryFunc, keys, request):
+    # Get a mapunit-level product for keys, asking SDA only for missing mukeys
+    #
+    # request is the tool's tabRequest(qry, name) function; the return value
+    # is the same (logical, message, data) triple, with data["Table"] holding
+    # the merged rows for all keys.
+
+    store = getStore()
+
+    if store is None:
+        return sda_chunk.fetch(product, qryFunc, keys, request)
+
+    stamp = sda_cache.ssurgoVersion() + ":" + querySignature(qryFunc)
+    missing = store.missing(product, stamp, keys)
+
+    if missing:
+        noKey = list()
+
+        def storeChunk(chunkKeys, qData):
+            # store every chunk as it arrives, so the map units already
+            # fetched are kept when a later chunk fails
+            if "Table" in qData:
+                if not store.put(product, stamp, qData["Table"], chunkKeys):
+                    noKey.append(True)
+
+            else:
+                # SDA returned no rows at all for these map units
+                store.putEmpty(product, stamp, chunkKeys)
+
+        logic, msg, qData = sda_chunk.fetch(product, qryFunc, missing, request, onChunk=storeChunk)
+
+        if not logic or noKey:
+            # failed, or no mukey column and nothing to merge with
+            return logic, msg, qData
+
+    else:
+        msg = "Successfully collected " + product
+
+    table = store.table(product, stamp, keys)
+
+    if table is None or len(table) < 3:
+        return True, msg, dict()
+
+    # the store gives the rows in key order, put them back in the query's
+    sda_chunk.sortRows(table, sda_chunk.orderBy(qryFunc(["0"])))
+
+    msg = msg + " (" + str(len(keys) - len(missing)) + " of " + str(len(keys)) + " map units from local store)"
+
+    return True, msg, dict(Table=table)
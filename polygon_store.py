@@ -0,0 +1,189 @@
+#-------------------------------------------------------------------------------
+# Name:        polygon_store
+# Purpose:     Local store of SSURGO map unit polygons behind an R-tree, for
+#              the quadtree requests in aoi_tiles.
+#
+#              Neighbouring HUC12 buffers overlap heavily, and each buffer
+#              used to fetch every soil polygon in it from SDA again. Here
+#              every polygon is kept once under its mupolygonkey, with its
+#              mukey, areasymbol and WKT, and its bounding box goes into an
+#              SQLite R*Tree. aoi_tiles requests fixed grid cells; a grid cell
+#              whose polygons have all been stored is marked as covered, so
+#              an AOI only sends SDA its uncovered cells and reads the rest of
+#              its polygons from the index.
+#
+#              Polygons are stamped by survey area: each areasymbol is stored
+#              with the saverest it was fetched under. When SDA reports a new
+#              saverest for a survey area, its polygons and the covered cells
+#              that held any of them are dropped and fetched again.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re, json, zlib, sqlite3, threading
+
+import numpy as np
+
+import sda_client, sda_cache
+
+
+# Store file; set ACPF_POLYGON_STORE to "" to turn the store off
+STORE_PATH = os.environ.get("ACPF_POLYGON_STORE", os.path.join(os.path.dirname(sda_cache._defaultPath()), "polygon_store.sqlite"))
+
+# saverest of every survey area
+surveyQuery = "SELECT areasymbol, CONVERT(varchar(19), saverest, 120) AS saverest FROM sacatalog"
+
+_number = re.compile(r"-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?")
+
+
+def wktBounds(wkt):
+    # (xmin, ymin, xmax, ymax) of a POLYGON or MULTIPOLYGON WKT
+    xy = np.array(_number.findall(wkt), dtype=np.float64).reshape(-1, 2)
+
+    return float(xy[:, 0].min()), float(xy[:, 1].min()), float(xy[:, 0].max()), float(xy[:, 1].max())
+
+
+class PolygonStore(object):
+    # SQLite tables of polygons, their R-tree, covered cells and survey stamps
+
+    def __init__(self, path=None):
+        self.path = path or STORE_PATH
+        self.lock = threading.Lock()
+        self.versions = dict()
+
+        folder = os.path.dirname(self.path)
+
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS polygons (id INTEGER PRIMARY KEY, polykey TEXT UNIQUE, mukey TEXT, areasymbol TEXT, wkt BLOB)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS polygons_areasymbol ON polygons (areasymbol)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cells (cell TEXT PRIMARY KEY, areasymbols TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS surveys (areasymbol TEXT PRIMARY KEY, saverest TEXT)")
+
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS polyindex USING rtree (id, xmin, xmax, ymin, ymax)")
+
+        except sqlite3.OperationalError:
+            # SQLite built without the R*Tree module, same columns on a plain table
+            self.conn.execute("CREATE TABLE IF NOT EXISTS polyindex (id INTEGER PRIMARY KEY, xmin REAL, xmax REAL, ymin REAL, ymax REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS polyindex_x ON polyindex (xmin, xmax)")
+
+        self.conn.commit()
+
+    def refresh(self, versions):
+        # Drop the polygons and cells of every survey area whose saverest is
+        # not the one in versions (areasymbol: saverest)
+
+        with self.lock:
+            self.versions = versions
+            stale = [a for a, v in self.conn.execute("SELECT areasymbol, saverest FROM surveys") if versions.get(a) != v]
+
+            if not stale:
+                return 0
+
+            staleSet = set(stale)
+
+            for a in stale:
+                self.conn.execute("DELETE FROM polyindex WHERE id IN (SELECT id FROM polygons WHERE areasymbol = ?)", (a,))
+                self.conn.execute("DELETE FROM polygons WHERE areasymbol = ?", (a,))
+                self.conn.execute("DELETE FROM surveys WHERE areasymbol = ?", (a,))
+
+            for cell, areasymbols in self.conn.execute("SELECT cell, areasymbols FROM cells").fetchall():
+                if staleSet.intersection(json.loads(areasymbols)):
+                    self.conn.execute("DELETE FROM cells WHERE cell = ?", (cell,))
+
+            self.conn.commit()
+
+        return len(stale)
+
+    def covered(self, cells):
+        # the cells (keys) whose polygons are all in the store
+        with self.lock:
+            have = set()
+
+            for i in range(0, len(cells), 500):
+                chunk = cells[i:i + 500]
+                sql = "SELECT cell FROM cells WHERE cell IN (" + ",".join("?" * len(chunk)) + ")"
+
+                for row in self.conn.execute(sql, chunk):
+                    have.add(row[0])
+
+        return have
+
+    def put(self, rows):
+        # Store (polykey, mukey, areasymbol, wkt) rows, returns how many were new
+
+        new = 0
+
+        with self.lock:
+            for polyKey, mukey, areasymbol, wkt in rows:
+                cur = self.conn.execute("INSERT OR IGNORE INTO polygons (polykey, mukey, areasymbol, wkt) VALUES (?, ?, ?, ?)", (str(polyKey), str(mukey), areasymbol, sqlite3.Binary(zlib.compress(wkt.encode("utf-8")))))
+
+                if cur.rowcount:
+                    xmin, ymin, xmax, ymax = wktBounds(wkt)
+                    self.conn.execute("INSERT INTO polyindex (id, xmin, xmax, ymin, ymax) VALUES (?, ?, ?, ?, ?)", (cur.lastrowid, xmin, xmax, ymin, ymax))
+                    self.conn.execute("INSERT OR IGNORE INTO surveys (areasymbol, saverest) VALUES (?, ?)", (areasymbol, self.versions.get(areasymbol, "")))
+                    new += 1
+
+            self.conn.commit()
+
+        return new
+
+    def cover(self, cell, areasymbols):
+        # Mark a cell as complete, with the survey areas of its polygons
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO cells (cell, areasymbols) VALUES (?, ?)", (cell, json.dumps(sorted(areasymbols))))
+            self.conn.commit()
+
+    def query(self, xmin, ymin, xmax, ymax):
+        # (mukey, wkt) of the polygons whose bounding box meets the envelope
+        with self.lock:
+            sql = "SELECT p.mukey, p.wkt FROM polyindex AS r JOIN polygons AS p ON p.id = r.id WHERE r.xmax >= ? AND r.xmin <= ? AND r.ymax >= ? AND r.ymin <= ? ORDER BY p.id"
+            found = self.conn.execute(sql, (xmin, xmax, ymin, ymax)).fetchall()
+
+        return [(mukey, zlib.decompress(bytes(wkt)).decode("utf-8")) for mukey, wkt in found]
+
+
+_store = None
+_storeLock = threading.Lock()
+
+
+def getStore():
+    # Process-wide store, or None when ACPF_POLYGON_STORE is set to ""
+    global _store
+
+    if not STORE_PATH:
+        return None
+
+    with _storeLock:
+        if _store is None:
+            _store = PolygonStore()
+
+        return _store
+
+
+def surveyVersions(url=None):
+    # areasymbol: saverest for every survey area, remembered in sda_cache for
+    # its VERSION_TTL
+
+    cache = sda_cache.getCache()
+    versions = cache.getMeta("survey_versions", sda_cache.VERSION_TTL) if cache else None
+
+    if versions is not None:
+        return json.loads(versions)
+
+    if url is None:
+        url = sda_client.SDA_URL + sda_client.TABULAR_PATH
+
+    request = dict()
+    request["format"] = "JSON"
+    request["query"] = surveyQuery
+    data = sda_client.getClient().postJSON(url, request)
+    versions = dict((row[0], row[1]) for row in data.get("Table", list()))
+
+    if cache:
+        cache.putMeta("survey_versions", json.dumps(versions))
+
+    return versions
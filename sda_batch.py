@@ -0,0 +1,168 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_batch
+# Purpose:     Send SDA property queries that start from the same temp table
+#              as one T-SQL script with several result sets.
+#
+#              rootZnDep, rootZnAwsDrt and soc each begin by building #main
+#              from the watershed's mukey IN-list, in separate requests, and
+#              potWet reads the same map units. compose() writes one script
+#              that builds a shared #main once (mainQry in get_WS_bndry) and
+#              then runs each product's tail, the product's query rewritten to
+#              read its map units from that #main. The queries sent one by one
+#              keep their own SQL. The temp tables private to a
+#              tail are renamed (#acpf, #muacpf, ... appear in more than one
+#              tail) so the tails cannot collide. SDA returns one result set
+#              per tail, as Table, Table1, ..., and split() routes each of them
+#              back to its product as a tabRequest (logical, message, data)
+#              triple, so the product functions write and join them unchanged.
+#
+#              fetch() sends the script through sda_chunk in adaptive mukey
+#              chunks and keeps every product's rows in mukey_store under the
+#              product's own query signature, so rows fetched in a batch and
+#              rows fetched by the single query are interchangeable.
+#
+#              Set ACPF_SDA_BATCH to "1" to send them as one script.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re
+
+import sda_cache, sda_chunk, mukey_store
+
+
+# Batch mode on/off
+BATCH = os.environ.get("ACPF_SDA_BATCH", "0") != "0"
+
+# Name of the batch request (sda_cache, timing reports)
+NAME = "Muaggatt Batch"
+
+
+def tableKey(i):
+    # Key of the i-th result set in an SDA response
+    if i == 0:
+        return "Table"
+
+    return "Table" + str(i)
+
+
+def privateTables(tail, prefix):
+    # tail with every temp table except the shared #main renamed to #<prefix><name>
+    return re.sub(r"#(?!main\b)([A-Za-z_]\w*)", "#" + prefix + r"\1", tail)
+
+
+def compose(keys, prelude, tails):
+    # One script: prelude(keys), then each tail() in order, one result set per tail
+
+    parts = [prelude(keys)]
+
+    for i, tail in enumerate(tails):
+        parts.append("\n\n    ---- result set " + str(i) + "\n    " + privateTables(tail(), "b" + str(i) + "_"))
+
+    return "".join(parts)
+
+
+def split(res, names):
+    # Product name: tabRequest triple, from the triple of a batch response
+
+    logic, msg, qData = res
+
+    if not logic:
+        return dict((name, res) for name in names)
+
+    out = dict()
+
+    for i, name in enumerate(names):
+        data = dict()
+
+        if qData and tableKey(i) in qData:
+            data["Table"] = qData[tableKey(i)]
+
+        out[name] = (True, msg.replace(NAME, name, 1), data)
+
+    return out
+
+
+def _ordered(out, products):
+    # Sort each product's rows by its own query's ORDER BY, as mukey_store.fetch
+    # does; the store gives them in key order, and chunks of a batch are only
+    # sorted by the script's last ORDER BY
+    for name, qryFunc, tail in products:
+        data = out[name][2]
+
+        if data and "Table" in data:
+            sda_chunk.sortRows(data["Table"], sda_chunk.orderBy(qryFunc(["0"])))
+
+    return out
+
+
+def fetch(products, prelude, keys, request):
+    # Get several products for keys with one script per mukey chunk
+    #
+    # products is a list of (name, qryFunc, tailFunc), where qryFunc(keys) is
+    # the product's query on its own, returning the rows prelude(keys) +
+    # tailFunc() does. request is the tool's tabRequest(qry, name) function.
+    # Returns a dictionary of name: (logical, message, data) triples, as
+    # mukey_store.fetch would return for each product on its own.
+
+    names = [p[0] for p in products]
+    tails = [p[2] for p in products]
+
+    def batchQry(chunkKeys):
+        return compose(chunkKeys, prelude, tails)
+
+    store = mukey_store.getStore()
+
+    if store is None:
+        return _ordered(split(sda_chunk.fetch(NAME, batchQry, keys, request), names), products)
+
+    version = sda_cache.ssurgoVersion()
+    stamps = [version + ":" + mukey_store.querySignature(p[1]) for p in products]
+
+    # map units any of the products still lacks
+    missing = list()
+    seen = set()
+
+    for name, stamp in zip(names, stamps):
+        for k in store.missing(name, stamp, keys):
+            if not k in seen:
+                seen.add(k)
+                missing.append(k)
+
+    msg = "Successfully collected " + NAME
+
+    if missing:
+        noKey = list()
+
+        def storeChunk(chunkKeys, qData):
+            # store each result set as its chunk arrives
+            for i, (name, stamp) in enumerate(zip(names, stamps)):
+                table = qData.get(tableKey(i))
+
+                if table is None:
+                    store.putEmpty(name, stamp, chunkKeys)
+
+                elif not store.put(name, stamp, table, chunkKeys):
+                    noKey.append(name)
+
+        res = sda_chunk.fetch(NAME, batchQry, missing, request, onChunk=storeChunk)
+
+        if not res[0] or noKey:
+            # failed, or no mukey column and nothing to merge with
+            return _ordered(split(res, names), products)
+
+        msg = res[1]
+
+    out = dict()
+
+    for name, stamp in zip(names, stamps):
+        table = store.table(name, stamp, keys)
+        pMsg = msg.replace(NAME, name, 1)
+
+        if table is None or len(table) < 3:
+            out[name] = (True, pMsg, dict())
+
+        else:
+            out[name] = (True, pMsg + " (" + str(len(keys) - len(missing)) + " of " + str(len(keys)) + " map units from local store)", dict(Table=table))
+
+    return _ordered(out, products)
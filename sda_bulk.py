@@ -0,0 +1,475 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_bulk
+# Purpose:     One bulk component/horizon request per watershed, with the
+#              dominant-component products derived locally.
+#
+#              surfHoriz, surfTex, om, ksat50150 and coarseFrag each send SDA
+#              their own query, and every one of them repeats the same
+#              "SELECT TOP 1 c1.cokey ... ORDER BY c1.comppct_r DESC" dominant
+#              component subquery and the same chorizon/chtexturegrp joins.
+#              bulkQry pulls the mapunit, component and chorizon rows for the
+#              keys once, with the RV texture group (chtexturegrp/chtexture)
+#              and the RV parent material group (copmgrp/copm) of each
+#              component. derive() then builds the five result tables from it
+#              with the rules of the SDA queries, returned in the same
+#              (logical, message, data) form as tabRequest so the product
+#              functions write them unchanged.
+#
+#              The five queries still go to SDA unless ACPF_SDA_BULK is set
+#              to "1".
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re
+from decimal import Decimal, ROUND_HALF_UP
+
+
+# Bulk mode on/off, off unless asked for
+BULK = os.environ.get("ACPF_SDA_BULK", "0") != "0"
+
+# Name of the bulk request (sda_cache, mukey_store and timing reports)
+NAME = "Component Horizons"
+
+# Products derived from the bulk table instead of their own SDA query
+PRODUCTS = ["Surface Horizon", "Surface Texture", "Organic Matter", "KSat 50_150", "Coarse Fragments"]
+
+# Parent material textures skipped when looking for the surface horizon
+_pmTextures = ["SPM", "HPM", "MPM"]
+
+
+def bulkQry(keys):
+
+    bulkQuery = """SELECT legend.areasymbol, mapunit.musym, mapunit.muname,
+        CAST (mapunit.mukey AS VARCHAR (30)) AS mukey,
+        CAST (component.cokey AS VARCHAR (30)) AS cokey,
+        component.compname, component.compkind, component.comppct_r, component.majcompflag, component.taxclname,
+        (SELECT TOP 1 cop1.pmgroupname FROM copmgrp AS cop1 WHERE cop1.cokey = component.cokey AND cop1.rvindicator = 'Yes') AS pmgroupname,
+        (SELECT TOP 1 copm1.pmkind FROM copmgrp AS cop2 INNER JOIN copm AS copm1 ON copm1.copmgrpkey = cop2.copmgrpkey WHERE cop2.cokey = component.cokey AND cop2.rvindicator = 'Yes') AS pmkind,
+        CAST (chorizon.chkey AS VARCHAR (30)) AS chkey,
+        chorizon.hzname, chorizon.hzdept_r, chorizon.hzdepb_r,
+        chorizon.kffact, chorizon.kwfact,
+        chorizon.sandtotal_r, chorizon.silttotal_r, chorizon.claytotal_r, chorizon.sandvf_r,
+        chorizon.dbthirdbar_r, chorizon.om_r, chorizon.ksat_r,
+        chorizon.frag3to10_r, chorizon.fraggt10_r, chorizon.sieveno10_r,
+        CAST (chtexturegrp.chtgkey AS VARCHAR (30)) AS chtgkey,
+        chtexturegrp.texture,
+        (SELECT TOP 1 chtexture.texcl FROM chtexture WHERE chtexture.chtgkey = chtexturegrp.chtgkey) AS texcl
+        FROM legend
+        INNER JOIN mapunit ON mapunit.lkey = legend.lkey AND mapunit.mukey IN (""" + ",".join(map("'{0}'".format, keys)) + """)
+        LEFT JOIN component ON component.mukey = mapunit.mukey
+        LEFT JOIN chorizon ON chorizon.cokey = component.cokey
+        LEFT JOIN chtexturegrp ON chtexturegrp.chkey = chorizon.chkey AND chtexturegrp.rvindicator = 'Yes'
+        ORDER BY mapunit.mukey, component.cokey, chorizon.hzdept_r, chorizon.chkey"""
+
+    return bulkQuery
+
+
+## ===================================================================================
+## SQL Server comparisons: NULL never compares, strings compare without case or
+## trailing blanks
+
+def _num(val):
+    if val is None or val == "":
+        return None
+
+    return float(val)
+
+
+def _ci(val):
+    if val is None:
+        return None
+
+    return val.rstrip().lower()
+
+
+def _lt(a, b):
+    return a is not None and b is not None and a < b
+
+
+def _le(a, b):
+    return a is not None and b is not None and a <= b
+
+
+def _gt(a, b):
+    return a is not None and b is not None and a > b
+
+
+def _ge(a, b):
+    return a is not None and b is not None and a >= b
+
+
+def _dec(val, places):
+    # CAST (val AS DECIMAL (p, places))
+    if val is None or val == "":
+        return None
+
+    return Decimal(str(val)).quantize(Decimal(1).scaleb(-places), ROUND_HALF_UP)
+
+
+def _float(val):
+    if val is None:
+        return None
+
+    return float(val)
+
+
+def _nullsFirst(val):
+    # sort key putting NULL where SQL Server puts it in an ASC sort
+    return (val is not None, val)
+
+
+## ===================================================================================
+class Horizon(object):
+    # chorizon row and its RV texture groups, [(texture, texcl)]
+
+    def __init__(self, rec):
+        self.rec = rec
+        self.chkey = rec["chkey"]
+        self.top = _num(rec["hzdept_r"])
+        self.bot = _num(rec["hzdepb_r"])
+        self.groups = list()
+
+
+class Component(object):
+    # component row and its horizons
+
+    def __init__(self, rec):
+        self.rec = rec
+        self.cokey = rec["cokey"]
+        self.pct = _num(rec["comppct_r"])
+        self.horizons = list()
+
+    def major(self):
+        return _ci(self.rec["majcompflag"]) == "yes"
+
+
+class Mapunit(object):
+    # mapunit row and its components
+
+    def __init__(self, rec):
+        self.rec = rec
+        self.mukey = rec["mukey"]
+        self.components = list()
+
+    def dominant(self, byName=True):
+        # The component picked by the SDA queries' dominant component subquery:
+        # TOP 1 ORDER BY comppct_r DESC, CASE WHEN LEFT (muname,2) = LEFT (compname,2)
+        # THEN 1 ELSE 2 END (byName only), cokey
+        muname = self.rec["muname"]
+
+        if muname is not None:
+            muname = _ci(muname[:2])
+
+        def rank(comp):
+            name = comp.rec["compname"]
+            same = 2
+
+            if byName and muname is not None and name is not None and _ci(name[:2]) == muname:
+                same = 1
+
+            return (comp.pct is None, -(comp.pct or 0), same, int(comp.cokey))
+
+        if len(self.components) == 0:
+            return None
+
+        return min(self.components, key=rank)
+
+
+class BulkTable(object):
+    # Map units, components and horizons of a bulk response "Table"
+
+    def __init__(self, table):
+        self.columnNames = [c.lower() for c in table[0]]
+        self.columnInfo = dict(zip(self.columnNames, table[1]))
+        self.mapunits = list()
+
+        dMu = dict()
+        dCo = dict()
+        dHz = dict()
+
+        for row in table[2:]:
+            rec = dict(zip(self.columnNames, row))
+            mukey = rec["mukey"]
+
+            if not mukey in dMu:
+                dMu[mukey] = Mapunit(rec)
+                self.mapunits.append(dMu[mukey])
+
+            if rec["cokey"] is None:
+                continue
+
+            if not rec["cokey"] in dCo:
+                dCo[rec["cokey"]] = Component(rec)
+                dMu[mukey].components.append(dCo[rec["cokey"]])
+
+            if rec["chkey"] is None:
+                continue
+
+            if not rec["chkey"] in dHz:
+                dHz[rec["chkey"]] = Horizon(rec)
+                dCo[rec["cokey"]].horizons.append(dHz[rec["chkey"]])
+
+            if rec["chtgkey"] is not None:
+                dHz[rec["chkey"]].groups.append((rec["texture"], rec["texcl"]))
+
+    def info(self, name):
+        # ColumnInfo of a bulk column, for result columns passed through as is
+        return self.columnInfo[name.lower()]
+
+
+def _info(typeName, size, precision=255, scale=255):
+    # ColumnInfo of a computed result column
+    return "ColumnOrdinal=0,ColumnSize=" + str(size) + ",NumericPrecision=" + str(precision) + ",NumericScale=" + str(scale) + ",ProviderType=" + typeName + ",IsLong=False,DataTypeName=" + typeName.lower()
+
+
+def _table(columns, rows):
+    # SDA "Table" list from [(column name, column info)] and rows
+    names = [c[0] for c in columns]
+    infos = [re.sub(r"^ColumnOrdinal=\d+", "ColumnOrdinal=" + str(i), c[1]) for i, c in enumerate(columns)]
+
+    return [names, infos] + rows
+
+
+## ===================================================================================
+def _surface(comp):
+    # (horizon, texture group) pairs of the surface horizon: the horizons at the
+    # shallowest depth that has an RV texture other than a parent material
+    # texture. [(None, None)] when there are none (the LEFT JOIN row).
+    tops = [h.top for h in comp.horizons for tex, texcl in h.groups if h.top is not None and tex is not None and not tex.upper() in _pmTextures]
+
+    if len(tops) == 0:
+        return [(None, None)]
+
+    minTop = min(tops)
+    pairs = [(h, grp) for h in comp.horizons if h.top == minTop for grp in h.groups]
+
+    return pairs or [(None, None)]
+
+
+def surfHoriz(bulk):
+
+    columns = [("mukey", bulk.info("mukey")), ("cokey", bulk.info("cokey")), ("chkey", bulk.info("chkey")),
+               ("CompPct", bulk.info("comppct_r")), ("CompName", bulk.info("compname")), ("CompKind", bulk.info("compkind")),
+               ("TaxCls", bulk.info("taxclname")), ("HrzThick", _info("Int", 4, 10))]
+    decimals = [("kffact", "kffact"), ("kwfact", "kwfact"), ("totalSand", "sandtotal_r"), ("totalSilt", "silttotal_r"),
+                ("totalClay", "claytotal_r"), ("VFSand", "sandvf_r"), ("DBthirdbar", "dbthirdbar_r"), ("OM", "om_r"), ("KSat", "ksat_r")]
+    columns.extend((name, _info("Decimal", 17, 8, 3)) for name, fld in decimals)
+    rows = list()
+
+    for mu in bulk.mapunits:
+        comp = mu.dominant()
+
+        if comp is None or not comp.major():
+            continue
+
+        for h, grp in _surface(comp):
+            hz = h.rec if h is not None else dict()
+            thick = 0
+
+            if h is not None and h.top is not None and h.bot is not None:
+                thick = int(h.bot - h.top)
+
+            rows.append([mu.mukey, comp.cokey, hz.get("chkey"), comp.rec["comppct_r"], comp.rec["compname"], comp.rec["compkind"], comp.rec["taxclname"], thick] + [_float(_dec(hz.get(fld), 3)) for name, fld in decimals])
+
+    return _table(columns, rows)
+
+
+def surfTex(bulk):
+
+    columns = [("cokey", bulk.info("cokey")), ("comppct_r", bulk.info("comppct_r")), ("Texture", bulk.info("texture")),
+               ("TextCls", bulk.info("texcl")), ("ParMatGrp", bulk.info("pmgroupname")), ("ParMatKind", bulk.info("pmkind"))]
+    rows = list()
+
+    for mu in bulk.mapunits:
+        comp = mu.dominant()
+
+        if comp is None or not comp.major():
+            continue
+
+        for h, grp in _surface(comp):
+            tex, texcl = grp if grp is not None else (None, None)
+            rows.append([comp.cokey, comp.rec["comppct_r"], tex, texcl, comp.rec["pmgroupname"], comp.rec["pmkind"]])
+
+    return _table(columns, rows)
+
+
+def _omHorizons(comp):
+    # (top, bottom, om_r) rows of #main in the OM query: horizons above 100 cm
+    # that are not bedrock (hzname LIKE '%r%') or parent material, once per RV
+    # texture group
+    rows = list()
+
+    for h in comp.horizons:
+        name = h.rec["hzname"]
+
+        if name is None or "r" in name.lower() or h.top is None or not _gt(h.bot, 0) or not _lt(h.top, 100):
+            continue
+
+        for tex, texcl in h.groups:
+            if tex is None:
+                continue
+
+            t = tex.lower()
+
+            if "pm" in t or t.rstrip().endswith("dom") or "br" in t or "wb" in t:
+                continue
+
+            rows.append((h.top, h.bot, h.rec["om_r"]))
+
+    return rows
+
+
+def om(bulk):
+    # Thickness weighted om_r of the 0 - 100 cm layer of the dominant component
+    # (comppct_r, then cokey), if it is a major component
+
+    columns = [("areasymbol", bulk.info("areasymbol")), ("musym", bulk.info("musym")), ("muname", bulk.info("muname")),
+               ("mukey", bulk.info("mukey")), ("om_r", _info("Decimal", 17, 5, 2))]
+    rows = list()
+
+    for mu in bulk.mapunits:
+        comp = mu.dominant(byName=False)
+        val = None
+
+        if comp is not None and comp.major() and comp.pct is not None:
+            hzRows = _omHorizons(comp)
+            thick = [Decimal(int(min(bot, 100) - max(top, 0))) for top, bot, omr in hzRows]
+            sumThick = sum(thick)
+
+            if hzRows and sumThick != 0:
+                # decimal (5,2) / decimal (5,2) has a scale of 8 in SQL Server
+                avg = sum((t / sumThick).quantize(Decimal("1e-8"), ROUND_HALF_UP) * (_dec(omr, 2) or Decimal(0)) for t, (top, bot, omr) in zip(thick, hzRows))
+                val = _float(avg.quantize(Decimal("0.01"), ROUND_HALF_UP))
+
+        rows.append([mu.rec["areasymbol"], mu.rec["musym"], mu.rec["muname"], mu.mukey, val])
+
+    rows.sort(key=lambda row: [_nullsFirst(_ci(v)) for v in row[:4]] + [_nullsFirst(row[4])])
+
+    return _table(columns, rows)
+
+
+def _inRange(h):
+    # The InRangeTop_50_100 >= 50 AND InRangeBot_50_100 <= 150 filter of the
+    # KSat and coarse fragment queries, CASE by CASE
+    t, b = h.top, h.bot
+
+    if _lt(b, 50) or _gt(t, 150):
+        top = 0
+
+    elif _ge(b, 50) and _lt(t, 50):
+        top = 50
+
+    elif _lt(t, 50):
+        top = 0
+
+    elif _lt(t, 150):
+        top = t
+
+    else:
+        top = 50
+
+    if _gt(t, 150) or _lt(b, 50):
+        bot = 0
+
+    elif _le(b, 150):
+        bot = b
+
+    elif _gt(b, 150) and _lt(t, 150):
+        bot = 150
+
+    else:
+        bot = 50
+
+    return top >= 50 and bot <= 150
+
+
+def _maxByCompname(bulk, value):
+    # mukey: largest value(horizon) over the 50 - 150 cm horizons of the
+    # dominant component. As in the SDA queries the maximum is taken
+    # OVER (PARTITION BY compname), so dominant components sharing a name share
+    # the value. Map units without such horizons are left out.
+    dName = dict()
+    dMu = dict()
+
+    for mu in bulk.mapunits:
+        comp = mu.dominant()
+
+        if comp is None:
+            continue
+
+        vals = [value(h) for h in comp.horizons if _inRange(h)]
+        vals = [v for v in vals if v is not None]
+
+        if len(vals) == 0:
+            continue
+
+        name = _ci(comp.rec["compname"])
+        dName[name] = max([dName[name]] + vals) if name in dName else max(vals)
+        dMu[mu.mukey] = name
+
+    return dict((mukey, dName[name]) for mukey, name in dMu.items())
+
+
+def _muTable(bulk, column, dVal, info):
+    # mukey, muname, value for every map unit, NULL for map units not in dVal
+    columns = [("mukey", bulk.info("mukey")), ("muname", bulk.info("muname")), (column, info)]
+    rows = [[mu.mukey, mu.rec["muname"], dVal.get(mu.mukey)] for mu in bulk.mapunits]
+    rows.sort(key=lambda row: (_nullsFirst(_ci(row[1])), row[0], _nullsFirst(row[2])))
+
+    return _table(columns, rows)
+
+
+def ksat50150(bulk):
+    # Largest ksat_r of the 50 - 150 cm horizons of the dominant component
+
+    dVal = _maxByCompname(bulk, lambda h: _num(h.rec["ksat_r"]))
+
+    return _muTable(bulk, "KSat50_150", dVal, bulk.info("ksat_r"))
+
+
+def _totCoarse(h):
+    # Initial_totCoarse of the coarse fragment query
+    f3 = _num(h.rec["frag3to10_r"]) or 0
+    f10 = _num(h.rec["fraggt10_r"]) or 0
+    sieve = _num(h.rec["sieveno10_r"]) or 0
+    sand = _num(h.rec["sandtotal_r"]) or 0
+
+    if f3 == 0 and f10 == 0 and sand == 0:
+        return 0
+
+    return round((f3 + f10) + ((100 - (f3 + f10)) - sieve + (sieve * (sand * 0.01)) * ((100 - (f3 + f10)) * 0.01)), 2)
+
+
+def coarseFrag(bulk):
+    # Largest total coarse fraction of the 50 - 150 cm horizons of the dominant component
+
+    dVal = _maxByCompname(bulk, _totCoarse)
+
+    return _muTable(bulk, "Coarse50_150", dVal, _info("Float", 8, 15))
+
+
+_derivers = [("Surface Horizon", surfHoriz), ("Surface Texture", surfTex), ("Organic Matter", om),
+             ("KSat 50_150", ksat50150), ("Coarse Fragments", coarseFrag)]
+
+
+def derive(res, label):
+    # tabRequest style (logical, message, data) triples of the PRODUCTS, keyed
+    # by product name, from the (logical, message, data) of the bulk request.
+    # label is the watershed name for the messages.
+
+    logic, msg, qData = res
+
+    if not logic:
+        return dict((name, res) for name, func in _derivers)
+
+    if not qData or not "Table" in qData:
+        return dict((name, (True, msg, dict())) for name, func in _derivers)
+
+    bulk = BulkTable(qData["Table"])
+    out = dict()
+
+    for name, func in _derivers:
+        out[name] = (True, "Derived " + name + " for " + label + " from " + NAME.lower(), dict(Table=func(bulk)))
+
+    return out
@@ -0,0 +1,362 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_cache
+# Purpose:     Persistent on-disk cache of SDA tabular query results.
+#
+#              Neighbouring buffered watersheds share most of their map units,
+#              and a state is often re-run after an ACPF code fix, so the same
+#              property queries reach SDA again and again. Results are stored
+#              in a SQLite file keyed by a hash of the normalized query text
+#              (comments and extra whitespace removed), the response format
+#              and the SSURGO publication date. A new SSURGO release therefore
+#              never serves stale data.
+#
+#              Values are stored zlib compressed. Entries expire after TTL
+#              seconds and the least recently used ones are evicted once the
+#              file grows past MAX_BYTES.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, json, time, zlib, hashlib, sqlite3, threading
+
+try:
+    from io import BytesIO
+
+except ImportError:
+    from cStringIO import StringIO as BytesIO
+
+import sda_client, sda_stream
+
+
+def _defaultPath():
+    base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    return os.path.join(base, "ACPF_gSSURGO", "sda_cache.sqlite")
+
+
+# Cache file; set ACPF_SDA_CACHE to "" to turn the cache off
+CACHE_PATH = os.environ.get("ACPF_SDA_CACHE", _defaultPath())
+
+# Entries older than this many seconds are not used (30 days)
+TTL = float(os.environ.get("ACPF_SDA_CACHE_TTL", str(30 * 86400)))
+
+# Upper bound on the stored (compressed) result size, in bytes
+MAX_BYTES = int(os.environ.get("ACPF_SDA_CACHE_BYTES", str(2 * 1024 ** 3)))
+
+# Stores between re-reads of the cache size written by every process
+RESYNC = 64
+
+# How long the SSURGO publication date itself is trusted before SDA is asked
+# again (1 day). Set SDA_SSURGO_VERSION to pin it and skip the lookup.
+VERSION_TTL = float(os.environ.get("ACPF_SDA_VERSION_TTL", "86400"))
+
+versionQuery = "SELECT CONVERT(VARCHAR(30), MAX(saverest), 126) AS saverest FROM sacatalog"
+
+
+def normalizeQuery(qry):
+    # Strip -- and /* */ comments and collapse whitespace outside of quoted
+    # literals, so formatting changes do not change the cache key
+
+    out = list()
+    i = 0
+    n = len(qry)
+    space = False
+
+    while i < n:
+        c = qry[i]
+
+        if c == "'":
+            # copy the literal through, '' is an escaped quote
+            j = i + 1
+
+            while j < n:
+                if qry[j] == "'":
+                    if j + 1 < n and qry[j + 1] == "'":
+                        j += 2
+                        continue
+
+                    break
+
+                j += 1
+
+            if space and out:
+                out.append(" ")
+
+            space = False
+            out.append(qry[i:j + 1])
+            i = j + 1
+
+        elif qry.startswith("--", i):
+            j = qry.find("\n", i)
+            i = n if j < 0 else j
+            space = True
+
+        elif qry.startswith("/*", i):
+            j = qry.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            space = True
+
+        elif c.isspace():
+            space = True
+            i += 1
+
+        else:
+            if space and out:
+                out.append(" ")
+
+            space = False
+            out.append(c)
+            i += 1
+
+    return "".join(out)
+
+
+class ResultCache(object):
+    # SQLite backed, compressed, TTL + LRU bounded store of SDA responses
+
+    def __init__(self, path=None, ttl=None, maxBytes=None):
+        self.path = path or CACHE_PATH
+        self.ttl = TTL if ttl is None else ttl
+        self.maxBytes = MAX_BYTES if maxBytes is None else maxBytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.evictions = 0
+
+        folder = os.path.dirname(self.path)
+
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        # several worker processes may share the file, wait for their locks
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, created REAL, accessed REAL, size INTEGER, data BLOB)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT, created REAL)")
+        self.conn.commit()
+
+        # running size of the stored results, so a put needs no full-table SUM.
+        # Other processes sharing the file make it drift, so it is read again
+        # from the table every RESYNC stores and before anything is evicted.
+        self.total = self._sumSize()
+
+    def key(self, qry, fmt, version):
+        text = "\n".join([version or "", fmt.upper(), normalizeQuery(qry)])
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _sumSize(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def _lookup(self, key):
+        # the stored compressed bytes, or None; an expired entry is deleted
+        now = time.time()
+
+        with self.lock:
+            row = self.conn.execute("SELECT created, size, data FROM results WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            if self.ttl > 0 and now - row[0] > self.ttl:
+                self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.conn.commit()
+                self.total -= row[1]
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+
+        return bytes(row[2])
+
+    def get(self, key):
+        # Return the cached value or None
+        data = self._lookup(key)
+
+        if data is None:
+            return None
+
+        return json.loads(zlib.decompress(data).decode("utf-8"))
+
+    def put(self, key, value):
+        self.putCompressed(key, zlib.compress(json.dumps(value).encode("utf-8"), 6))
+
+    def putCompressed(self, key, data):
+        # Store a value already serialized and compressed like put does
+        now = time.time()
+
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO results (key, created, accessed, size, data) VALUES (?, ?, ?, ?, ?)", (key, now, now, len(data), sqlite3.Binary(data)))
+            self.total += len(data) - (old[0] if old else 0)
+            self.stores += 1
+            self._evict()
+            self.conn.commit()
+
+    def getCompressed(self, key):
+        # Like get, but return the stored compressed bytes without parsing them
+        return self._lookup(key)
+
+    def _evict(self):
+        # drop least recently used entries until the cache fits in maxBytes
+        if self.stores % RESYNC == 0:
+            self.total = self._sumSize()
+
+        if self.total <= self.maxBytes:
+            return
+
+        # the true size, other processes may have stored or evicted entries
+        self.total = self._sumSize()
+
+        if self.total <= self.maxBytes:
+            return
+
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self.evictions += 1
+            self.total -= size
+
+            if self.total <= self.maxBytes:
+                break
+
+    def getMeta(self, name, maxAge):
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM meta WHERE name = ?", (name,)).fetchone()
+
+        if row is None or time.time() - row[1] > maxAge:
+            return None
+
+        return row[0]
+
+    def putMeta(self, name, value):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value, created) VALUES (?, ?, ?)", (name, value, time.time()))
+            self.conn.commit()
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, expired=self.expired, stores=self.stores, evictions=self.evictions)
+
+    def report(self):
+        return "SDA cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses, " + str(self.evictions) + " evicted"
+
+
+_cache = None
+_cacheLock = threading.Lock()
+_version = None
+
+
+def getCache():
+    # Process-wide cache, or None when ACPF_SDA_CACHE is set to ""
+    global _cache
+
+    if not CACHE_PATH:
+        return None
+
+    with _cacheLock:
+        if _cache is None:
+            _cache = ResultCache()
+
+        return _cache
+
+
+def ssurgoVersion(url=None):
+    # SSURGO publication date (latest sacatalog.saverest) used in every key.
+    # Remembered in the cache for VERSION_TTL so a re-run needs no lookup.
+    global _version
+
+    if _version is not None:
+        return _version
+
+    pinned = os.environ.get("SDA_SSURGO_VERSION")
+
+    if pinned:
+        _version = pinned
+        return _version
+
+    cache = getCache()
+    version = cache.getMeta("ssurgo_version", VERSION_TTL) if cache else None
+
+    if version is None:
+        if url is None:
+            url = sda_client.SDA_URL + sda_client.TABULAR_PATH
+
+        request = dict()
+        request["format"] = "JSON"
+        request["query"] = versionQuery
+        data = sda_client.getClient().postJSON(url, request)
+        version = data["Table"][0][0]
+
+        if cache:
+            cache.putMeta("ssurgo_version", version)
+
+    _version = version
+
+    return _version
+
+
+def cachedPostJSON(url, request):
+    # Drop-in replacement for sda_client.getClient().postJSON for tabular
+    # queries. Returns the cached response when there is one, otherwise asks
+    # SDA and stores the response.
+
+    cache = getCache()
+
+    if cache is None:
+        return sda_client.getClient().postJSON(url, request)
+
+    qry = request.get("query", request.get("QUERY", ""))
+    fmt = request.get("format", request.get("FORMAT", ""))
+    key = cache.key(qry, fmt, ssurgoVersion(url))
+
+    data = cache.get(key)
+
+    if data is None:
+        data = sda_client.getClient().postJSON(url, request)
+        cache.put(key, data)
+
+    return data
+
+
+def cachedRows(url, request):
+    # Streaming counterpart of cachedPostJSON: yields the "Table" rows of the
+    # response one at a time (see sda_client.SDAClient.postRows). A cached
+    # response is decompressed and parsed incrementally; a fresh one is
+    # compressed into the cache as it streams past, and stored only once the
+    # whole response has been read.
+
+    cache = getCache()
+
+    if cache is None:
+        for row in sda_client.getClient().postRows(url, request):
+            yield row
+
+        return
+
+    qry = request.get("query", request.get("QUERY", ""))
+    fmt = request.get("format", request.get("FORMAT", ""))
+    key = cache.key(qry, fmt, ssurgoVersion(url))
+
+    data = cache.getCompressed(key)
+
+    if data is not None:
+        for row in sda_stream.iterTable(BytesIO(data), "zlib"):
+            yield row
+
+        return
+
+    writer = sda_stream.RowWriter()
+
+    for row in sda_client.getClient().postRows(url, request):
+        writer.add(row)
+        yield row
+
+    if writer.count:
+        cache.putCompressed(key, writer.finish())
+
+    else:
+        # the same empty response postJSON gets
+        cache.put(key, dict())
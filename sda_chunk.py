@@ -0,0 +1,389 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_chunk
+# Purpose:     Split the mukey IN-list of an SDA property query into chunks,
+#              send the chunks concurrently and concatenate the result tables.
+#
+#              Large buffered watersheds put thousands of mukeys into a single
+#              "mapunit.mukey IN (...)" list and run into the SDA request size
+#              and time limits. The chunk size adapts per product: it grows
+#              while chunks come back quickly and small, and is halved when a
+#              chunk times out or is rejected, in which case that chunk is
+#              split and sent again.
+#
+#              The merged table has the column names and column info of a
+#              single call and every row of it. The rows are sorted again by
+#              the query's final ORDER BY, as far as its leading items are
+#              plain result columns; rows that tie on those keep the chunks'
+#              key order. Responses with several result sets (sda_batch) keep
+#              the key order.
+#
+#              When some chunks still fail after the client's retries, the
+#              final partition and the failed chunks are written to a resume
+#              journal. The next run for the same keys reuses that partition,
+#              so the chunks that succeeded come straight from sda_cache and
+#              only the missing pieces are sent to SDA again.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, json, re, time, hashlib, sqlite3, threading
+
+import sda_sched, sda_cache, sda_client
+
+
+# Starting number of mukeys per request, and the limits it adapts between
+INITIAL_SIZE = int(os.environ.get("SDA_CHUNK_SIZE", "400"))
+MIN_SIZE = int(os.environ.get("SDA_CHUNK_MIN", "25"))
+MAX_SIZE = int(os.environ.get("SDA_CHUNK_MAX", "3000"))
+
+# A chunk should take about this many seconds and return at most this many
+# bytes of JSON
+TARGET_SECONDS = float(os.environ.get("SDA_CHUNK_SECONDS", "30"))
+TARGET_BYTES = int(os.environ.get("SDA_CHUNK_BYTES", str(8 * 1024 ** 2)))
+
+# Resume journal file; set ACPF_SDA_JOURNAL to "" to turn it off
+JOURNAL_PATH = os.environ.get("ACPF_SDA_JOURNAL", os.path.join(os.path.dirname(sda_cache._defaultPath()), "sda_journal.sqlite"))
+
+
+# tabRequest failure messages that mean the request was too big or too slow,
+# rather than wrong. These chunks are split and sent again. SDA answers a
+# query that ran out of execution time with "HTTP Error 400: Bad Request"
+# (or 500); the client does not retry those (see sda_retry.classify), so
+# they land here at once.
+_tooBig = re.compile(r"timeout|timed out|bad request|HTTP Error 50[0234]|request entity too large|HTTP Error 413", re.I)
+
+
+def retryable(msg):
+    return bool(msg) and _tooBig.search(msg) is not None
+
+
+# SQL Server column types compared as numbers when rows are sorted
+_numericTypes = ("bigint", "int", "smallint", "tinyint", "bit", "decimal", "numeric", "float", "real", "money")
+
+
+def _topLevel(qry, word):
+    # start of every occurrence of word outside parentheses and literals in
+    # a normalized query (see sda_cache.normalizeQuery)
+    found = list()
+    depth = 0
+    quoted = False
+    upper = qry.upper()
+
+    for i, c in enumerate(qry):
+        if c == "'":
+            quoted = not quoted
+
+        elif quoted:
+            continue
+
+        elif c == "(":
+            depth += 1
+
+        elif c == ")":
+            depth -= 1
+
+        elif depth == 0 and upper.startswith(word, i):
+            # a keyword must not be part of a longer name
+            before = i > 0 and (qry[i - 1].isalnum() or qry[i - 1] in "_#.")
+            after = i + len(word) < len(qry) and (qry[i + len(word)].isalnum() or qry[i + len(word)] == "_")
+
+            if not word[0].isalpha() or not (before or after):
+                found.append(i)
+
+    return found
+
+
+def orderBy(qry):
+    # [(column name, descending)] of the final ORDER BY of qry, up to the
+    # first item that is not a plain column (an expression or ordinal).
+    # Empty when the last statement has no ORDER BY.
+    qry = sda_cache.normalizeQuery(qry)
+    orders = _topLevel(qry, "ORDER BY")
+
+    if not orders or [i for i in _topLevel(qry, "SELECT") if i > orders[-1]]:
+        return list()
+
+    text = qry[orders[-1] + len("ORDER BY"):]
+    cuts = _topLevel(text, ",") + [len(text)]
+    items = list()
+    start = 0
+
+    for cut in cuts:
+        m = re.match(r"^\s*(?:[#\w]+\.)?\[?(\w+)\]?(?:\s+(ASC|DESC))?\s*$", text[start:cut], re.I)
+        start = cut + 1
+
+        if m is None or m.group(1).isdigit():
+            break
+
+        items.append((m.group(1), (m.group(2) or "").upper() == "DESC"))
+
+    return items
+
+
+def _sortKey(numeric):
+    # SQL Server order: NULL first, numbers by value, text case-insensitive
+    def key(val):
+        if val is None:
+            return (0, 0)
+
+        if numeric:
+            try:
+                return (1, float(val))
+
+            except ValueError:
+                pass
+
+        return (1, val.lower() if hasattr(val, "lower") else val)
+
+    return key
+
+
+def sortRows(table, order):
+    # Sort the rows of an SDA "Table" list (names, column info, rows...) in
+    # place by order (see orderBy). Items that are not columns of the table
+    # end the sort keys; rows that tie keep their order.
+    if len(table) < 4 or not order:
+        return table
+
+    names = [str(n).lower() for n in table[0]]
+    keys = list()
+
+    for name, desc in order:
+        if not name.lower() in names:
+            break
+
+        col = names.index(name.lower())
+        info = str(table[1][col]).lower() if len(table[1]) > col else ""
+        numeric = [t for t in _numericTypes if "providertype=" + t + "," in info + ","] != []
+        keys.append((col, desc, _sortKey(numeric)))
+
+    rows = table[2:]
+
+    # stable sorts, least significant key first
+    for col, desc, key in reversed(keys):
+        rows.sort(key=lambda row: key(row[col]), reverse=desc)
+
+    table[2:] = rows
+
+    return table
+
+
+class ChunkSizer(object):
+    # Adaptive number of mukeys per request for one product
+
+    def __init__(self, size=None, minSize=None, maxSize=None):
+        self.minSize = minSize or MIN_SIZE
+        self.maxSize = maxSize or MAX_SIZE
+        self.size = max(self.minSize, min(self.maxSize, size or INITIAL_SIZE))
+        self.lock = threading.Lock()
+
+    def record(self, n, seconds, nbytes, ok):
+        # Update the size from one finished chunk of n keys
+
+        with self.lock:
+            if not ok:
+                self.size = max(self.minSize, min(self.size, n) // 2)
+                return
+
+            byTime = n * TARGET_SECONDS / max(seconds, 0.01)
+            byBytes = n * float(TARGET_BYTES) / max(nbytes, 1)
+            want = max(self.minSize, min(byTime, byBytes, self.maxSize))
+
+            # move halfway (geometrically) so one odd chunk does not swing the size
+            self.size = int(max(self.minSize, min(self.maxSize, (self.size * want) ** 0.5)))
+
+
+_sizers = dict()
+_sizerLock = threading.Lock()
+
+
+def getSizer(name):
+    with _sizerLock:
+        if not name in _sizers:
+            _sizers[name] = ChunkSizer()
+
+        return _sizers[name]
+
+
+def splitKeys(keys, size):
+    return [keys[i:i + size] for i in range(0, len(keys), size)]
+
+
+class ResumeJournal(object):
+    # Chunk partitions of fetches that did not complete, keyed by product
+    # name, query text and key list
+
+    def __init__(self, path=None):
+        self.path = path or JOURNAL_PATH
+        self.lock = threading.Lock()
+
+        folder = os.path.dirname(self.path)
+
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS journal (key TEXT PRIMARY KEY, name TEXT, created REAL, chunks TEXT, failed TEXT)")
+
+        # entries of runs that were never repeated, same lifetime as the cache
+        self.conn.execute("DELETE FROM journal WHERE created < ?", (time.time() - sda_cache.TTL,))
+        self.conn.commit()
+
+    def key(self, name, qryFunc, keys):
+        qry = sda_cache.normalizeQuery(qryFunc(["0"]))
+        text = "\n".join([name, qry, ",".join(sorted(str(k) for k in keys))])
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        # (chunks, failed chunk indexes) of an unfinished fetch, or None
+        with self.lock:
+            row = self.conn.execute("SELECT chunks, failed FROM journal WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, key, name, chunks, failed):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO journal (key, name, created, chunks, failed) VALUES (?, ?, ?, ?, ?)", (key, name, time.time(), json.dumps(chunks), json.dumps(failed)))
+            self.conn.commit()
+
+    def clear(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM journal WHERE key = ?", (key,))
+            self.conn.commit()
+
+
+_journal = None
+_journalLock = threading.Lock()
+
+
+def getJournal():
+    # Process-wide journal, or None when ACPF_SDA_JOURNAL is set to ""
+    global _journal
+
+    if not JOURNAL_PATH:
+        return None
+
+    with _journalLock:
+        if _journal is None:
+            _journal = ResumeJournal()
+
+        return _journal
+
+
+def _fetchChunk(name, qryFunc, keys, request, sizer, onChunk=None):
+    # Returns a list of (keys, (logical, message, data)) pairs covering keys.
+    # A chunk that fails for size or time is split in two and sent again.
+    # onChunk(keys, data), if given, is called for every chunk that succeeds.
+
+    t0 = time.time()
+    before = sda_client.getClient().received()
+    logic, msg, qData = request(qryFunc(keys), name)
+    seconds = time.time() - t0
+
+    if logic:
+        nbytes = sda_client.getClient().received() - before
+
+        if nbytes:
+            # the response came from SDA, not from sda_cache
+            sizer.record(len(keys), seconds, nbytes, True)
+
+        if onChunk:
+            onChunk(keys, qData)
+
+        return [(keys, (logic, msg, qData))]
+
+    if retryable(msg) and len(keys) > sizer.minSize:
+        sizer.record(len(keys), seconds, 0, False)
+        half = (len(keys) + 1) // 2
+
+        return _fetchChunk(name, qryFunc, keys[:half], request, sizer, onChunk) + _fetchChunk(name, qryFunc, keys[half:], request, sizer, onChunk)
+
+    return [(keys, (logic, msg, qData))]
+
+
+def mergeResults(results, order=None):
+    # Concatenate chunk results into one (logical, message, data) triple.
+    # The first failure, if any, is returned as is. Responses with several
+    # result sets (Table, Table1, ...) are merged table by table. A single
+    # result set made of several chunks is sorted by order (see orderBy).
+
+    for res in results:
+        if not res[0]:
+            return res
+
+    tables = dict()
+
+    for logic, msg, qData in results:
+        for name in (qData or dict()):
+            if re.match(r"^Table\d*$", name):
+                if not name in tables:
+                    tables[name] = list(qData[name][:2])
+
+                tables[name].extend(qData[name][2:])
+
+    msg = results[0][1]
+
+    if len(results) > 1:
+        msg = msg + " (" + str(len(results)) + " requests)"
+
+        if order and list(tables) == ["Table"]:
+            sortRows(tables["Table"], order)
+
+    return True, msg, tables
+
+
+def fetch(name, qryFunc, keys, request, workers=None, onChunk=None):
+    # Send qryFunc(keys) to SDA in adaptive chunks through request
+    # (the tool's tabRequest) and return the merged tabRequest triple.
+    # onChunk(keys, data) is called for every chunk that succeeds, also when
+    # other chunks fail.
+
+    sizer = getSizer(name)
+    journal = getJournal()
+    jKey = None
+    resumed = None
+
+    if journal is not None:
+        jKey = journal.key(name, qryFunc, keys)
+        resumed = journal.get(jKey)
+
+    if resumed is not None:
+        # same partition as the unfinished run, its good chunks are cached
+        chunks = resumed[0]
+
+    elif len(keys) <= sizer.size:
+        chunks = [list(keys)]
+
+    else:
+        chunks = splitKeys(keys, sizer.size)
+
+    if len(chunks) == 1:
+        res = dict([("0", _fetchChunk(name, qryFunc, chunks[0], request, sizer, onChunk))])
+
+    else:
+        jobs = [(str(i), _fetchChunk, (name, qryFunc, chunk, request, sizer, onChunk)) for i, chunk in enumerate(chunks)]
+        res, timings = sda_sched.runConcurrent(jobs, workers)
+
+    leaves = list()
+
+    for i in range(len(chunks)):
+        leaves.extend(res[str(i)])
+
+    failed = [i for i, leaf in enumerate(leaves) if not leaf[1][0]]
+
+    if journal is not None:
+        if failed:
+            journal.put(jKey, name, [list(leaf[0]) for leaf in leaves], failed)
+
+        elif resumed is not None:
+            journal.clear(jKey)
+
+    result = mergeResults([leaf[1] for leaf in leaves], orderBy(qryFunc(["0"])))
+
+    if resumed is not None and not failed:
+        result = (result[0], result[1] + " (resumed, " + str(len(resumed[1])) + " of " + str(len(resumed[0])) + " requests re-sent)", result[2])
+
+    return result
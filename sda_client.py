@@ -0,0 +1,451 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_client
+# Purpose:     Shared, pooled HTTP client for the Soil Data Access (SDA)
+#              Tabular post.rest service.
+#
+#              Every SDA call in the ACPF tools (tabRequest, geoRequest,
+#              AttributeRequest, RunSpatialQueryJSON) goes through one client
+#              so TCP and TLS setup is paid once per host instead of once per
+#              query.  Connections are kept alive and reused, responses are
+#              requested gzip compressed and the number of requests in flight
+#              against a single host is capped.
+#
+#              postRows streams the "Table" rows of a response through
+#              sda_stream instead of reading the whole body first.
+#
+#              Works with the Python 2.7 (ArcMap) and Python 3 (ArcGIS Pro)
+#              interpreters.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, json, socket, threading, time, zlib
+
+import sda_retry, sda_stream
+
+try:
+    import http.client as httplib
+    from urllib.parse import urlsplit
+    from urllib.error import HTTPError
+    from io import BytesIO
+
+except ImportError:
+    import httplib
+    from urlparse import urlsplit
+    from urllib2 import HTTPError
+    from cStringIO import StringIO as BytesIO
+
+
+# Default SDA host. Point SDA_URL at a local stand-in for post.rest to test
+# the tools without touching the production service.
+SDA_URL = os.environ.get("SDA_URL", "https://sdmdataaccess.nrcs.usda.gov")
+TABULAR_PATH = "/Tabular/SDMTabularService/post.rest"
+
+# Maximum number of requests in flight against one host. SDA throttles
+# clients that open too many simultaneous connections. This is the budget for
+# the whole run: acpf_batch divides it among its worker processes.
+MAX_PER_HOST = int(os.environ.get("SDA_MAX_PER_HOST", "4"))
+
+# Socket timeout, in seconds, for a single request
+TIMEOUT = float(os.environ.get("SDA_TIMEOUT", "300"))
+
+
+# Errors raised by a kept-alive connection that the server already closed.
+# The request is sent once more on a fresh connection when one of these is
+# raised by a reused connection.
+_staleErrors = (httplib.BadStatusLine, httplib.CannotSendRequest, httplib.ResponseNotReady, socket.error)
+
+
+class HostPool(object):
+    # Keep-alive connections to a single scheme://host:port
+    #
+    # Idle connections are reused LIFO so the most recently used (and least
+    # likely to have been dropped by the server) socket is tried first.
+    # A bounded semaphore caps the number of requests in flight.
+
+    def __init__(self, scheme, host, port, maxPerHost, timeout):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = list()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(maxPerHost)
+        self.opened = 0
+
+    def _connect(self):
+        if self.scheme == "https":
+            conn = httplib.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+
+        else:
+            conn = httplib.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+        with self.lock:
+            self.opened += 1
+
+        return conn
+
+    def _checkout(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+
+        return self._connect(), False
+
+    def _checkin(self, conn):
+        with self.lock:
+            self.idle.append(conn)
+
+    def request(self, method, path, body, headers):
+        # Send one request and return (status, reason, headers, body bytes).
+        # The body has already been gzip decoded.
+
+        self.slots.acquire()
+
+        try:
+            conn, reused = self._checkout()
+
+            try:
+                status, reason, hdrs, data, keep = self._send(conn, method, path, body, headers)
+
+            except _staleErrors:
+                conn.close()
+
+                if not reused:
+                    raise
+
+                # the server dropped the idle connection, try once more on a new one
+                conn = self._connect()
+
+                try:
+                    status, reason, hdrs, data, keep = self._send(conn, method, path, body, headers)
+
+                except:
+                    conn.close()
+                    raise
+
+            except:
+                conn.close()
+                raise
+
+            if keep:
+                self._checkin(conn)
+
+            else:
+                conn.close()
+
+            return status, reason, hdrs, data
+
+        finally:
+            self.slots.release()
+
+    def open(self, method, path, body, headers):
+        # Send one request and return (response, headers, release) with the
+        # body still unread. The caller reads the response and must then call
+        # release(complete); complete is True when the body was read to the end.
+        # A 4xx/5xx status is returned with the body already read.
+
+        self.slots.acquire()
+
+        try:
+            conn, reused = self._checkout()
+
+            try:
+                resp = self._begin(conn, method, path, body, headers)
+
+            except _staleErrors:
+                conn.close()
+
+                if not reused:
+                    raise
+
+                conn = self._connect()
+                resp = self._begin(conn, method, path, body, headers)
+
+        except:
+            # conn, if any, was closed by _begin
+            self.slots.release()
+            raise
+
+        hdrs = dict((k.lower(), v) for k, v in resp.getheaders())
+
+        def release(complete):
+            try:
+                keep = complete and hdrs.get("connection", "").lower() != "close" and not resp.will_close
+
+                if keep:
+                    self._checkin(conn)
+
+                else:
+                    conn.close()
+
+            finally:
+                self.slots.release()
+
+        return resp, hdrs, release
+
+    def _begin(self, conn, method, path, body, headers):
+        try:
+            conn.request(method, path, body, headers)
+            return conn.getresponse()
+
+        except:
+            conn.close()
+            raise
+
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, path, body, headers)
+        resp = conn.getresponse()
+        data = resp.read()
+
+        hdrs = dict((k.lower(), v) for k, v in resp.getheaders())
+
+        if hdrs.get("content-encoding", "").lower() == "gzip":
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+        elif hdrs.get("content-encoding", "").lower() == "deflate":
+            data = zlib.decompress(data)
+
+        keep = hdrs.get("connection", "").lower() != "close" and not resp.will_close
+
+        return resp.status, resp.reason, hdrs, data, keep
+
+    def close(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+
+            self.idle = list()
+
+
+class SDAClient(object):
+    # Pooled client for SDA post.rest
+    #
+    # One HostPool is kept per scheme://host:port. The client is thread safe;
+    # share a single instance for the life of the tool run (see getClient).
+
+    def __init__(self, maxPerHost=None, timeout=None):
+        self.maxPerHost = maxPerHost or MAX_PER_HOST
+        self.timeout = timeout or TIMEOUT
+        self.pools = dict()
+        self.lock = threading.Lock()
+        self.breaker = sda_retry.CircuitBreaker()
+        self.retries = 0
+        self.local = threading.local()
+
+    def _pool(self, scheme, host, port):
+        key = (scheme, host, port)
+
+        with self.lock:
+            if not key in self.pools:
+                self.pools[key] = HostPool(scheme, host, port, self.maxPerHost, self.timeout)
+
+            return self.pools[key]
+
+    def post(self, url, body, contentType="application/json"):
+        # POST body to url and return the decoded response bytes.
+        # Raises HTTPError for any 4xx/5xx status, like urllib2.urlopen.
+
+        return self._retry(self._post, url, body, contentType)
+
+    def _retry(self, func, *args):
+        # Call func(*args), retrying transient failures (see
+        # sda_retry.classify) with jittered exponential backoff. Every attempt
+        # waits while the circuit breaker is open.
+
+        attempt = 0
+
+        while True:
+            probe = self.breaker.wait()
+
+            try:
+                result = func(*args)
+
+            except Exception as err:
+                # settled below by success() or failure()
+                probe = False
+
+                if sda_retry.classify(err, getattr(err, "sdaBody", None)) != sda_retry.TRANSIENT:
+                    if isinstance(err, HTTPError):
+                        # SDA answered, it is up even if the query was wrong
+                        self.breaker.success()
+
+                    else:
+                        # no usable answer (a corrupt body, say)
+                        self.breaker.failure()
+
+                    raise
+
+                self.breaker.failure()
+
+                if attempt >= sda_retry.RETRIES:
+                    raise
+
+                with self.lock:
+                    self.retries += 1
+
+                time.sleep(sda_retry.backoff(attempt))
+                attempt += 1
+                continue
+
+            else:
+                probe = False
+                self.breaker.success()
+
+                return result
+
+            finally:
+                # a probe ended by anything else (KeyboardInterrupt, SystemExit)
+                # must not hold the half-open breaker for good
+                if probe:
+                    self.breaker.release()
+
+    def _target(self, url, body):
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = parts.path or "/"
+
+        if parts.query:
+            path = path + "?" + parts.query
+
+        if not isinstance(body, bytes):
+            body = body.encode("utf-8")
+
+        return self._pool(scheme, parts.hostname, port), path, body
+
+    def _headers(self, contentType):
+        headers = dict()
+        headers["Content-Type"] = contentType
+        headers["Accept-Encoding"] = "gzip, deflate"
+        headers["Connection"] = "keep-alive"
+
+        return headers
+
+    def _httpError(self, url, status, reason, hdrs, data):
+        err = HTTPError(url, status, reason, hdrs, BytesIO(data))
+        # keep the text for sda_retry.classify, err.read() can only be called once
+        err.sdaBody = data.decode("utf-8", "replace")
+
+        return err
+
+    def _post(self, url, body, contentType):
+        pool, path, body = self._target(url, body)
+        status, reason, hdrs, data = pool.request("POST", path, body, self._headers(contentType))
+
+        if status >= 400:
+            raise self._httpError(url, status, reason, hdrs, data)
+
+        self.local.received = self.received() + len(data)
+
+        return data
+
+    def _open(self, url, body):
+        pool, path, body = self._target(url, body)
+        resp, hdrs, release = pool.open("POST", path, body, self._headers("application/json"))
+
+        if resp.status >= 400:
+            try:
+                data = resp.read()
+
+            finally:
+                release(True)
+
+            encoding = hdrs.get("content-encoding", "").lower()
+
+            if encoding == "gzip":
+                data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+            elif encoding == "deflate":
+                data = zlib.decompress(data)
+
+            raise self._httpError(url, resp.status, resp.reason, hdrs, data)
+
+        return resp, hdrs, release
+
+    def postRows(self, url, request, key="Table"):
+        # Like postJSON, but yields the rows of the response's key list as
+        # they are parsed (see sda_stream.iterTable). The request is retried
+        # like post until the response starts; a failure while rows are being
+        # read is raised to the caller.
+
+        resp, hdrs, release = self._retry(self._open, url, json.dumps(request))
+        complete = False
+
+        def count(n):
+            self.local.received = self.received() + n
+
+        try:
+            for row in sda_stream.iterTable(resp, hdrs.get("content-encoding", "").lower() or None, key=key, onBytes=count):
+                yield row
+
+            # trailing whitespace or compression trailer, so the connection can be reused
+            resp.read()
+            complete = True
+
+        finally:
+            release(complete)
+
+    def postJSON(self, url, request):
+        # Serialize the request dictionary, POST it and return the parsed
+        # JSON response (a dictionary with a "Table" key for SDA queries)
+
+        data = self.post(url, json.dumps(request))
+
+        return json.loads(data.decode("utf-8"))
+
+    def query(self, qry, fmt="JSON+COLUMNNAME+METADATA", url=None):
+        # Convenience wrapper for a Tabular post.rest query
+
+        if url is None:
+            url = SDA_URL + TABULAR_PATH
+
+        request = dict()
+        request["format"] = fmt
+        request["query"] = qry
+
+        return self.postJSON(url, request)
+
+    def received(self):
+        # Decoded response bytes this thread has received through post or
+        # postRows. The difference across a call is the size of its
+        # response, 0 when it was answered from sda_cache.
+        return getattr(self.local, "received", 0)
+
+    def connectionCount(self):
+        # Number of TCP connections opened since the client was created
+        with self.lock:
+            return sum(p.opened for p in self.pools.values())
+
+    def close(self):
+        with self.lock:
+            for pool in self.pools.values():
+                pool.close()
+
+
+_client = None
+_clientLock = threading.Lock()
+
+
+def getClient():
+    # Return the process-wide SDA client, creating it on first use
+    global _client
+
+    with _clientLock:
+        if _client is None:
+            _client = SDAClient()
+
+        return _client
+
+
+def configure(maxPerHost=None, timeout=None):
+    # Replace the process-wide client with one using new settings
+    global _client
+
+    with _clientLock:
+        if _client is not None:
+            _client.close()
+
+        _client = SDAClient(maxPerHost, timeout)
+
+        return _client
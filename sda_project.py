@@ -0,0 +1,367 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_project
+# Purpose:     Project the WGS84 soil polygons from SDA to the watershed's
+#              UTM or Albers coordinate system in NumPy.
+#
+#              get_WS_bndry.py ran arcpy.management.Project over the whole
+#              download and RunSpatialQueryJSON called projectAs once per
+#              polygon. Here the vertices of every polygon are gathered into
+#              one pair of coordinate arrays, with each polygon's offset into
+#              them and the WKT text between its numbers, so the whole layer
+#              is transformed in one batched call and each polygon's WKT is
+#              rebuilt from its slice.
+#
+#              The NAD83 datum shift is the 7-parameter coordinate frame
+#              transformation arcpy uses for WGS_1984_(ITRF00)_To_NAD_1983.
+#              Transverse Mercator uses the Kruger series (sub-millimetre
+#              within a UTM zone) and Albers the ellipsoidal formulas in
+#              Snyder (1987). projectionFor() returns None for any other
+#              coordinate system, and callers then use arcpy as before.
+#
+#              Both have an inverse(), used by mu_inverse to take raster
+#              cell centres back to WGS84.
+#
+#              Large layers are transformed in chunks of CHUNK vertices on
+#              WORKERS threads; NumPy releases the GIL in the array math.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+
+# Vertices per chunk, and the threads the chunks are spread over
+CHUNK = int(os.environ.get("ACPF_PROJECT_CHUNK", "1000000"))
+WORKERS = int(os.environ.get("ACPF_PROJECT_WORKERS", "1"))
+
+# WGS84 and GRS80 ellipsoids (semi-major axis, flattening)
+WGS84 = (6378137.0, 1 / 298.257223563)
+GRS80 = (6378137.0, 1 / 298.257222101)
+
+# WGS_1984_(ITRF00)_To_NAD_1983, coordinate frame: metres, arc-seconds, ppm
+ITRF00_TO_NAD83 = (0.9956, -1.9013, -0.5215, 0.025915, 0.009426, 0.011599, 0.00062)
+
+_number = re.compile(r"-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?")
+_arcsec = np.pi / (180.0 * 3600.0)
+
+
+def helmert(lon, lat, params=ITRF00_TO_NAD83, src=WGS84, dst=GRS80):
+    # Shift geodetic lon, lat (degrees, height 0) with a coordinate frame
+    # transformation, returns lon, lat in degrees on the dst ellipsoid
+
+    dx, dy, dz, rx, ry, rz, ds = params
+    rx, ry, rz = rx * _arcsec, ry * _arcsec, rz * _arcsec
+    m = 1.0 + ds * 1e-6
+
+    a, f = src
+    e2 = f * (2 - f)
+    lam = np.radians(lon)
+    phi = np.radians(lat)
+    sinPhi = np.sin(phi)
+    cosPhi = np.cos(phi)
+    nu = a / np.sqrt(1 - e2 * sinPhi ** 2)
+
+    x = nu * cosPhi * np.cos(lam)
+    y = nu * cosPhi * np.sin(lam)
+    z = nu * (1 - e2) * sinPhi
+
+    # coordinate frame rotation convention
+    x2 = dx + m * (x + rz * y - ry * z)
+    y2 = dy + m * (-rz * x + y + rx * z)
+    z2 = dz + m * (ry * x - rx * y + z)
+
+    # back to geodetic (Bowring), the height is dropped
+    a, f = dst
+    e2 = f * (2 - f)
+    b = a * (1 - f)
+    ep2 = (a * a - b * b) / (b * b)
+    p = np.hypot(x2, y2)
+    theta = np.arctan2(z2 * a, p * b)
+    phi = np.arctan2(z2 + ep2 * b * np.sin(theta) ** 3, p - e2 * a * np.cos(theta) ** 3)
+
+    return np.degrees(np.arctan2(y2, x2)), np.degrees(phi)
+
+
+class TransverseMercator(object):
+    # Kruger series Transverse Mercator on one ellipsoid
+
+    def __init__(self, a, f, lon0, lat0, k0, fe, fn, unit=1.0):
+        self.lon0 = lon0
+        self.k0 = k0
+        self.fe = fe
+        self.fn = fn
+        self.unit = unit
+
+        n = f / (2 - f)
+        self.A = a / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+        self.alpha = (n / 2 - 2 * n ** 2 / 3 + 5 * n ** 3 / 16 + 41 * n ** 4 / 180,
+                      13 * n ** 2 / 48 - 3 * n ** 3 / 5 + 557 * n ** 4 / 1440,
+                      61 * n ** 3 / 240 - 103 * n ** 4 / 140,
+                      49561 * n ** 4 / 161280)
+        self.beta = (n / 2 - 2 * n ** 2 / 3 + 37 * n ** 3 / 96 - n ** 4 / 360,
+                     n ** 2 / 48 + n ** 3 / 15 - 437 * n ** 4 / 1440,
+                     17 * n ** 3 / 480 - 37 * n ** 4 / 840,
+                     4397 * n ** 4 / 161280)
+        self.delta = (2 * n - 2 * n ** 2 / 3 - 2 * n ** 3 + 116 * n ** 4 / 45,
+                      7 * n ** 2 / 3 - 8 * n ** 3 / 5 - 227 * n ** 4 / 45,
+                      56 * n ** 3 / 15 - 136 * n ** 4 / 35,
+                      4279 * n ** 4 / 630)
+        self.c = 2 * np.sqrt(n) / (1 + n)
+
+        # northing of the latitude of origin on the central meridian
+        self.m0 = self._xy(np.array([lon0]), np.array([lat0]))[1][0]
+
+    def _xy(self, lon, lat):
+        phi = np.radians(lat)
+        dLam = np.radians(lon - self.lon0)
+        sinPhi = np.sin(phi)
+
+        t = np.sinh(np.arctanh(sinPhi) - self.c * np.arctanh(self.c * sinPhi))
+        xi = np.arctan2(t, np.cos(dLam))
+        eta = np.arctanh(np.sin(dLam) / np.sqrt(1 + t * t))
+
+        x = eta.copy()
+        y = xi.copy()
+
+        for j, aj in enumerate(self.alpha, 1):
+            x += aj * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+            y += aj * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+
+        return self.k0 * self.A * x, self.k0 * self.A * y
+
+    def forward(self, lon, lat):
+        x, y = self._xy(lon, lat)
+
+        return (self.fe + x) / self.unit, (self.fn + y - self.m0) / self.unit
+
+    def inverse(self, x, y):
+        xi = (y * self.unit - self.fn + self.m0) / (self.k0 * self.A)
+        eta = (x * self.unit - self.fe) / (self.k0 * self.A)
+
+        xi1 = xi.copy()
+        eta1 = eta.copy()
+
+        for j, bj in enumerate(self.beta, 1):
+            xi1 -= bj * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+            eta1 -= bj * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+
+        # conformal latitude, then the geodetic latitude from its series
+        chi = np.arcsin(np.sin(xi1) / np.cosh(eta1))
+        phi = chi.copy()
+
+        for j, dj in enumerate(self.delta, 1):
+            phi += dj * np.sin(2 * j * chi)
+
+        return self.lon0 + np.degrees(np.arctan2(np.sinh(eta1), np.cos(xi1))), np.degrees(phi)
+
+
+class Albers(object):
+    # Ellipsoidal Albers equal-area conic (Snyder 1987, eq. 14-1 to 14-4)
+
+    def __init__(self, a, f, lon0, lat0, lat1, lat2, fe, fn, unit=1.0):
+        self.a = a
+        self.e2 = f * (2 - f)
+        self.e = np.sqrt(self.e2)
+        self.lon0 = lon0
+        self.fe = fe
+        self.fn = fn
+        self.unit = unit
+
+        m1, m2 = self._m(lat1), self._m(lat2)
+        q1, q2 = self._q(lat1), self._q(lat2)
+
+        if abs(lat1 - lat2) > 1e-10:
+            self.n = (m1 * m1 - m2 * m2) / (q2 - q1)
+        else:
+            self.n = np.sin(np.radians(lat1))
+
+        self.C = m1 * m1 + self.n * q1
+        self.rho0 = self._rho(lat0)
+
+    def _m(self, lat):
+        s = np.sin(np.radians(lat))
+        return np.cos(np.radians(lat)) / np.sqrt(1 - self.e2 * s * s)
+
+    def _q(self, lat):
+        s = np.sin(np.radians(lat))
+        e = self.e
+        return (1 - self.e2) * (s / (1 - self.e2 * s * s) - np.log((1 - e * s) / (1 + e * s)) / (2 * e))
+
+    def _rho(self, lat):
+        return self.a * np.sqrt(self.C - self.n * self._q(lat)) / self.n
+
+    def forward(self, lon, lat):
+        rho = self._rho(lat)
+        theta = self.n * np.radians(lon - self.lon0)
+
+        return (self.fe + rho * np.sin(theta)) / self.unit, (self.fn + self.rho0 - rho * np.cos(theta)) / self.unit
+
+    def inverse(self, x, y):
+        # Snyder eq. 14-8 to 14-11, the latitude by iterating eq. 3-16
+        dx = x * self.unit - self.fe
+        dy = self.rho0 - (y * self.unit - self.fn)
+        sgn = 1.0 if self.n > 0 else -1.0
+
+        rho = np.hypot(dx, dy)
+        theta = np.arctan2(sgn * dx, sgn * dy)
+        q = (self.C - (rho * self.n / self.a) ** 2) / self.n
+
+        e, e2 = self.e, self.e2
+        phi = np.arcsin(np.clip(q / 2, -1, 1))
+
+        for i in range(8):
+            s = np.sin(phi)
+            es = e * s
+            phi = phi + (1 - es * es) ** 2 / (2 * np.cos(phi)) * (q / (1 - e2) - s / (1 - es * es) + np.log((1 - es) / (1 + es)) / (2 * e))
+
+        return self.lon0 + np.degrees(theta / self.n), np.degrees(phi)
+
+
+def projectionFor(sr):
+    # Projection object for an arcpy SpatialReference, or None when it is
+    # not a Transverse Mercator or Albers system on WGS84 or NAD83
+
+    if sr.type != "Projected" or not sr.GCS.datumName in ("D_WGS_1984", "D_North_American_1983"):
+        return None
+
+    a, f = sr.GCS.semiMajorAxis, sr.GCS.flattening
+    name = sr.projectionName.lower()
+
+    if name == "transverse_mercator":
+        return TransverseMercator(a, f, sr.centralMeridian, sr.latitudeOfOrigin, sr.scaleFactor, sr.falseEasting, sr.falseNorthing, sr.metersPerUnit)
+
+    if name in ("albers", "albers_conic_equal_area"):
+        return Albers(a, f, sr.centralMeridian, sr.latitudeOfOrigin, sr.standardParallel1, sr.standardParallel2, sr.falseEasting, sr.falseNorthing, sr.metersPerUnit)
+
+    return None
+
+
+def transform(lon, lat, proj, shift=False, workers=None):
+    # Project WGS84 lon, lat arrays, applying the NAD83 shift first when shift
+    # is True. Arrays longer than CHUNK are done in chunks on a thread pool.
+
+    def run(span):
+        i, j = span
+        x, y = lon[i:j], lat[i:j]
+
+        if shift:
+            x, y = helmert(x, y)
+
+        return proj.forward(x, y)
+
+    spans = [(i, min(i + CHUNK, len(lon))) for i in range(0, len(lon), CHUNK)] or [(0, 0)]
+    workers = max(1, min(workers or WORKERS, len(spans)))
+
+    if workers == 1:
+        parts = [run(s) for s in spans]
+
+    else:
+        pool = ThreadPool(workers)
+
+        try:
+            parts = pool.map(run, spans)
+
+        finally:
+            pool.close()
+            pool.join()
+
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def untransform(x, y, proj, shift=False):
+    # Projected x, y arrays back to WGS84 lon, lat, undoing the NAD83 shift
+    # when shift is True (the same transformation with its signs reversed,
+    # which is exact to well below a millimetre for parameters this small)
+
+    lon, lat = proj.inverse(x, y)
+
+    if shift:
+        lon, lat = helmert(lon, lat, tuple(-p for p in ITRF00_TO_NAD83), GRS80, WGS84)
+
+    return lon, lat
+
+
+class CoordinateBlock(object):
+    # The vertices of many WKT polygons as one pair of arrays
+    #
+    # offsets[i]:offsets[i + 1] is polygon i's slice of x and y, and seps[i]
+    # holds the text around its numbers, so toWKT() rebuilds the WKT with the
+    # coordinates replaced.
+
+    def __init__(self, wkts):
+        self.seps = list()
+        numbers = list()
+        offsets = [0]
+
+        for wkt in wkts:
+            nums = _number.findall(wkt)
+            self.seps.append(_number.split(wkt))
+            numbers.extend(nums)
+            offsets.append(offsets[-1] + len(nums) // 2)
+
+        xy = np.array(numbers, dtype=np.float64).reshape(-1, 2)
+        self.x = xy[:, 0].copy()
+        self.y = xy[:, 1].copy()
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.seps)
+
+    def toWKT(self, precision=3):
+        # list of WKT strings with the current coordinates
+        xy = np.empty(2 * len(self.x), dtype=np.float64)
+        xy[0::2] = self.x
+        xy[1::2] = self.y
+        text = np.char.mod("%." + str(precision) + "f", xy).tolist()
+
+        out = list()
+
+        for i, seps in enumerate(self.seps):
+            nums = text[2 * self.offsets[i]:2 * self.offsets[i + 1]]
+            parts = [seps[0]]
+
+            for num, sep in zip(nums, seps[1:]):
+                parts.append(num)
+                parts.append(sep)
+
+            out.append("".join(parts))
+
+        return out
+
+
+def projectWKT(wkts, proj, shift=False, workers=None):
+    # WGS84 WKT polygons to projected WKT polygons
+    block = CoordinateBlock(wkts)
+    block.x, block.y = transform(block.x, block.y, proj, shift, workers)
+
+    return block.toWKT()
+
+
+def projectFeatures(inFC, outFC, sr, tm, fields=("t_mukey", "mukey")):
+    # Stand-in for arcpy.management.Project(inFC, outFC, sr, tm) on the SDA
+    # polygon featureclass. Returns False, having written nothing, when sr
+    # is not a system projectionFor() handles.
+    import arcpy
+
+    proj = projectionFor(sr)
+
+    if proj is None:
+        return False
+
+    fields = list(fields)
+
+    with arcpy.da.SearchCursor(inFC, ["SHAPE@WKT"] + fields) as cur:
+        rows = [row for row in cur if row[0]]
+
+    wkts = projectWKT([row[0] for row in rows], proj, bool(tm) and sr.GCS.datumName == "D_North_American_1983")
+
+    arcpy.management.CreateFeatureclass(os.path.dirname(outFC), os.path.basename(outFC), "POLYGON", inFC, None, None, sr)
+
+    with arcpy.da.InsertCursor(outFC, ["SHAPE@WKT"] + fields) as cur:
+        for wkt, row in zip(wkts, rows):
+            cur.insertRow([wkt] + list(row[1:]))
+
+    return True
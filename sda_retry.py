@@ -0,0 +1,191 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_retry
+# Purpose:     Retry policy and circuit breaker for Soil Data Access requests.
+#
+#              Transient failures (socket timeouts, dropped or refused
+#              connections, 429 and 502-504 responses) are retried with
+#              jittered exponential backoff. Anything else is raised at once,
+#              including the "Bad Request" SDA sends when a query hit its
+#              execution timeout: sending the same query again would time
+#              out again, so sda_chunk splits it instead.
+#
+#              When SDA keeps failing, the circuit breaker opens and every
+#              request, in every thread and in every batch worker process
+#              sharing the breaker file, waits until the cool-down is over.
+#              One probe request is then let through; success closes the
+#              breaker, failure re-opens it for twice as long.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, errno, socket, random, threading, time
+
+try:
+    import http.client as httplib
+    from urllib.error import HTTPError
+
+except ImportError:
+    import httplib
+    from urllib2 import HTTPError
+
+
+# Retries after the first attempt, and the backoff schedule in seconds
+RETRIES = int(os.environ.get("SDA_RETRIES", "4"))
+BACKOFF_BASE = float(os.environ.get("SDA_BACKOFF_BASE", "2"))
+BACKOFF_MAX = float(os.environ.get("SDA_BACKOFF_MAX", "120"))
+
+# Consecutive transient failures that open the breaker, and the first cool-down
+BREAKER_THRESHOLD = int(os.environ.get("SDA_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("SDA_BREAKER_COOLDOWN", "60"))
+BREAKER_MAX_COOLDOWN = float(os.environ.get("SDA_BREAKER_MAX_COOLDOWN", "600"))
+
+# File shared by batch worker processes so an open breaker pauses all of them
+BREAKER_FILE = os.environ.get("SDA_BREAKER_FILE", os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "ACPF_gSSURGO", "sda_breaker"))
+
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+_retryStatus = (429, 502, 503, 504)
+
+# socket errors of a network that dropped or refused the connection; other
+# OSErrors (a missing file, a bad certificate) are not worth retrying
+_transientErrno = set(getattr(errno, name) for name in ["ECONNRESET", "ECONNREFUSED", "ECONNABORTED", "ETIMEDOUT", "EPIPE",
+    "ENETDOWN", "ENETUNREACH", "ENETRESET", "EHOSTDOWN", "EHOSTUNREACH", "WSAECONNRESET", "WSAECONNREFUSED",
+    "WSAECONNABORTED", "WSAETIMEDOUT", "WSAENETDOWN", "WSAENETUNREACH", "WSAENETRESET", "WSAEHOSTDOWN", "WSAEHOSTUNREACH"] if hasattr(errno, name))
+
+
+def classify(err, body=None):
+    # TRANSIENT if err is worth retrying, otherwise FATAL. body, the
+    # response text of an HTTP error, is accepted but the status decides.
+
+    if isinstance(err, HTTPError):
+        # HTTPError is also a socket.error in Python 3, check it first
+        if err.code in _retryStatus:
+            return TRANSIENT
+
+        return FATAL
+
+    if isinstance(err, (socket.timeout, socket.gaierror, httplib.HTTPException)):
+        return TRANSIENT
+
+    if isinstance(err, socket.error) and getattr(err, "errno", None) in _transientErrno:
+        return TRANSIENT
+
+    return FATAL
+
+
+def backoff(attempt):
+    # "Full jitter": uniform between 0 and the exponential cap
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+class CircuitBreaker(object):
+    # closed -> open after BREAKER_THRESHOLD consecutive failures -> half open
+    # after the cool-down (one probe request) -> closed on success
+
+    def __init__(self, threshold=None, cooldown=None, path=None):
+        self.threshold = threshold or BREAKER_THRESHOLD
+        self.baseCooldown = cooldown or BREAKER_COOLDOWN
+        self.cooldown = self.baseCooldown
+        self.path = BREAKER_FILE if path is None else path
+        self.failures = 0
+        self.openUntil = 0.0
+        self.probing = False
+        self.opened = 0
+        self.cond = threading.Condition()
+        self._fileChecked = 0.0
+
+    def _sharedOpenUntil(self):
+        # open-until time written by any process, read at most once a second
+        now = time.time()
+
+        if not self.path or now - self._fileChecked < 1.0:
+            return 0.0
+
+        self._fileChecked = now
+
+        try:
+            with open(self.path) as f:
+                return float(f.read().strip() or 0)
+
+        except (IOError, OSError, ValueError):
+            return 0.0
+
+    def _writeShared(self, until):
+        if not self.path:
+            return
+
+        try:
+            folder = os.path.dirname(self.path)
+
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+
+            with open(self.path, "w") as f:
+                f.write(repr(until))
+
+        except (IOError, OSError):
+            pass
+
+    def wait(self):
+        # Block while the breaker is open. Returns once a request may be sent:
+        # True when it is the half-open probe, which the caller ends with
+        # success(), failure() or release().
+
+        with self.cond:
+            while True:
+                self.openUntil = max(self.openUntil, self._sharedOpenUntil())
+                now = time.time()
+
+                if now < self.openUntil:
+                    self.cond.wait(min(self.openUntil - now, 5.0))
+                    continue
+
+                if self.failures >= self.threshold:
+                    # half open, only one probe at a time
+                    if self.probing:
+                        self.cond.wait(1.0)
+                        continue
+
+                    self.probing = True
+                    return True
+
+                return False
+
+    def release(self):
+        # End a probe that neither succeeded nor failed (the request was
+        # interrupted), so the next request may probe again
+        with self.cond:
+            if self.probing:
+                self.probing = False
+                self.cond.notify_all()
+
+    def success(self):
+        with self.cond:
+            if self.failures >= self.threshold:
+                self._writeShared(0.0)
+
+            self.failures = 0
+            self.cooldown = self.baseCooldown
+            self.probing = False
+            self.cond.notify_all()
+
+    def failure(self):
+        with self.cond:
+            self.failures += 1
+
+            if self.failures >= self.threshold:
+                if self.probing or self.failures == self.threshold:
+                    self.openUntil = time.time() + self.cooldown
+                    self._writeShared(self.openUntil)
+                    self.opened += 1
+
+                    if self.probing:
+                        self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+
+                self.probing = False
+
+            self.cond.notify_all()
+
+    def isOpen(self):
+        return time.time() < self.openUntil
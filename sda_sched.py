@@ -0,0 +1,102 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_sched
+# Purpose:     Run independent SDA requests concurrently on a bounded thread
+#              pool and record how long each one took.
+#
+#              The per-watershed property queries in get_WS_bndry.py do not
+#              depend on each other, so they are all sent at once. Only the
+#              network round trips run on the pool; the caller writes the
+#              results to the geodatabase afterwards, serially and in its own
+#              order, because arcpy cursors are not thread safe.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, time
+from multiprocessing.pool import ThreadPool
+
+import sda_client
+
+
+# Number of queries in flight at once. Requests are also capped per host by
+# sda_client.MAX_PER_HOST, so raising this alone does not flood SDA.
+WORKERS = int(os.environ.get("SDA_QUERY_WORKERS", str(sda_client.MAX_PER_HOST)))
+
+
+class QueryTimings(object):
+    # Wall-clock timings for one batch of scheduled requests
+
+    def __init__(self):
+        self.start = dict()
+        self.elapsed = dict()
+        self.order = list()
+        self.wall = 0.0
+
+    def total(self):
+        # time the batch would have taken run one after another
+        return sum(self.elapsed.values())
+
+    def slowest(self):
+        if not self.elapsed:
+            return None, 0.0
+
+        name = max(self.elapsed, key=self.elapsed.get)
+        return name, self.elapsed[name]
+
+    def report(self):
+        # list of message lines, in submission order
+        lines = list()
+
+        for name in self.order:
+            if name in self.elapsed:
+                lines.append(name + ": " + "%.1f" % self.elapsed[name] + " s")
+
+        lines.append("wall time " + "%.1f" % self.wall + " s, sequential total " + "%.1f" % self.total() + " s")
+
+        return lines
+
+
+def _timed(timings, name, func, args):
+    t0 = time.time()
+    timings.start[name] = t0
+
+    try:
+        return func(*args)
+
+    finally:
+        timings.elapsed[name] = time.time() - t0
+
+
+def runConcurrent(jobs, workers=None):
+    # Run jobs on a thread pool and wait for all of them
+    #
+    # jobs is a list of (name, func, args) tuples. Returns a dictionary of
+    # name: func(*args) and a QueryTimings object. An exception raised by a
+    # job is re-raised here once every job has finished.
+
+    timings = QueryTimings()
+    results = dict()
+
+    if not jobs:
+        return results, timings
+
+    size = max(1, min(workers or WORKERS, len(jobs)))
+    pool = ThreadPool(size)
+    t0 = time.time()
+
+    try:
+        pending = list()
+
+        for name, func, args in jobs:
+            timings.order.append(name)
+            pending.append((name, pool.apply_async(_timed, (timings, name, func, args))))
+
+        for name, asyncRes in pending:
+            results[name] = asyncRes.get()
+
+    finally:
+        pool.close()
+        pool.join()
+        timings.wall = time.time() - t0
+
+    return results, timings
@@ -0,0 +1,187 @@
+#-------------------------------------------------------------------------------
+# Name:        sda_stream
+# Purpose:     Incremental parser for SDA post.rest JSON responses.
+#
+#              A response is a single object, {"Table": [[...], [...], ...]},
+#              and for horizon or polygon queries over whole survey areas the
+#              raw bytes, the decoded text and the parsed list of lists held
+#              together by read() + json.loads run to several hundred MB.
+#              iterTable reads the response in blocks and yields the rows of
+#              "Table" one at a time, so only the current block and the row
+#              being parsed are in memory. With the JSON+COLUMNNAME+METADATA
+#              format the first two rows are the column names and column info.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import codecs, json, zlib
+
+
+# Bytes read from the response at a time
+BLOCK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_space = " \t\r\n"
+
+
+class _Reader(object):
+    # Text buffer over a byte stream, decoded (and decompressed) on the fly
+
+    def __init__(self, fileObj, encoding, blockSize, onBytes=None):
+        self.fileObj = fileObj
+        self.blockSize = blockSize
+        self.onBytes = onBytes
+        self.buf = u""
+        self.pos = 0
+        self.eof = False
+        self.text = codecs.getincrementaldecoder("utf-8")("strict")
+        self.inflate = None
+
+        if encoding == "gzip":
+            self.inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        elif encoding == "deflate" or encoding == "zlib":
+            self.inflate = zlib.decompressobj()
+
+    def more(self):
+        # Append the next block to the buffer, dropping what was parsed.
+        # Returns False at the end of the stream.
+        if self.eof:
+            return False
+
+        data = self.fileObj.read(self.blockSize)
+
+        if not data:
+            self.eof = True
+
+            if self.inflate is not None:
+                data = self.inflate.flush()
+
+            text = self.text.decode(data, True)
+
+        else:
+            if self.inflate is not None:
+                data = self.inflate.decompress(data)
+
+            text = self.text.decode(data)
+
+        if self.onBytes is not None and data:
+            self.onBytes(len(data))
+
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+
+        return True
+
+    def skipSpace(self):
+        # Position on the next non-blank character, or return None at the end
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _space:
+                self.pos += 1
+
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+
+            if not self.more():
+                return None
+
+    def expect(self, chars):
+        c = self.skipSpace()
+
+        if c is None or not c in chars:
+            raise ValueError("Unexpected " + repr(c) + " in SDA response, expected one of " + repr(chars))
+
+        self.pos += 1
+
+        return c
+
+    def value(self):
+        # Decode one complete JSON value, reading more blocks as needed
+        self.skipSpace()
+
+        while True:
+            try:
+                val, end = _decoder.raw_decode(self.buf, self.pos)
+
+                # a number at the end of the buffer may still be incomplete
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return val
+
+            except ValueError:
+                if self.eof:
+                    raise
+
+            if not self.more():
+                val, end = _decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return val
+
+
+def iterTable(fileObj, encoding=None, blockSize=None, key="Table", onBytes=None):
+    # Yield the rows of the key list from an SDA JSON response read from
+    # fileObj (anything with read(n) returning bytes). encoding is the HTTP
+    # content-encoding ("gzip", "deflate") or None. An empty response or a
+    # response without the key yields nothing. onBytes(n), if given, is
+    # called with the size of every block once it is decompressed.
+
+    rdr = _Reader(fileObj, encoding, blockSize or BLOCK_SIZE, onBytes)
+
+    if rdr.skipSpace() is None:
+        return
+
+    rdr.expect("{")
+
+    if rdr.skipSpace() == "}":
+        return
+
+    while True:
+        name = rdr.value()
+        rdr.expect(":")
+
+        if name == key:
+            rdr.expect("[")
+
+            if rdr.skipSpace() == "]":
+                rdr.pos += 1
+
+            else:
+                while True:
+                    yield rdr.value()
+
+                    if rdr.expect(",]") == "]":
+                        break
+
+        else:
+            # some other member, skip it
+            rdr.value()
+
+        if rdr.expect(",}") == "}":
+            return
+
+
+class RowWriter(object):
+    # Write rows back out as the JSON text of {"Table": [...]} through a
+    # zlib compressor, without keeping the rows, so a streamed response can be
+    # stored in sda_cache in the same format as a parsed one
+
+    def __init__(self, level=6, key="Table"):
+        self.zip = zlib.compressobj(level)
+        self.parts = [self.zip.compress(('{"' + key + '": [').encode("utf-8"))]
+        self.count = 0
+
+    def add(self, row):
+        text = json.dumps(row)
+
+        if self.count:
+            text = ", " + text
+
+        self.parts.append(self.zip.compress(text.encode("utf-8")))
+        self.count += 1
+
+    def finish(self):
+        # Compressed bytes of the whole document
+        self.parts.append(self.zip.compress(b"]}"))
+        self.parts.append(self.zip.flush())
+
+        return b"".join(self.parts)
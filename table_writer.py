@@ -0,0 +1,273 @@
+#-------------------------------------------------------------------------------
+# Name:        table_writer
+# Purpose:     Write SDA result rows straight into their final table.
+#
+#              The ACPF tools used to create every SDA result table in
+#              IN_MEMORY, fill it with an InsertCursor and then copy it into
+#              the file geodatabase with TableToTable, so each of the ~11
+#              tables per watershed was written twice. writeTable takes the
+#              column names and column info of an SDA JSON+COLUMNNAME+METADATA
+#              response and any iterable of rows (a list, or the rows streamed
+#              by sda_stream) and writes them once, in batches, through a
+#              writer backend:
+#
+#                  ArcpyTableWriter   file geodatabase table (arcpy)
+#                  SQLiteTableWriter  SQLite database or GeoPackage attribute
+#                                     table (standard library only, so the
+#                                     pipeline also runs without ArcGIS, for
+#                                     example on Linux for benchmarks)
+#
+#              The backend is picked from the output path: a .sqlite, .db or
+#              .gpkg file gets the SQLite writer, anything else arcpy. Field
+#              types follow the SQL Server to FGDB mapping of CreateNewTable,
+#              and values are coerced from the strings SDA returns to the
+#              field type before they are written.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re, sqlite3
+
+
+# Rows handed to a backend at a time
+BATCH_SIZE = int(os.environ.get("ACPF_INSERT_BATCH", "5000"))
+
+# Dictionary: SQL Server to FGDB
+dType = dict()
+
+dType["int"] = "long"
+dType["smallint"] = "short"
+dType["bit"] = "short"
+dType["varbinary"] = "blob"
+dType["nvarchar"] = "text"
+dType["varchar"] = "text"
+dType["char"] = "text"
+dType["datetime"] = "date"
+dType["datetime2"] = "date"
+dType["smalldatetime"] = "date"
+dType["decimal"] = "double"
+dType["float"] = "double"
+
+# numeric type conversion depends upon the precision and scale
+dType["numeric"] = "float"  # 4 bytes
+dType["real"] = "double" # 8 bytes
+
+_sqliteType = dict(long="INTEGER", short="INTEGER", text="TEXT", date="TEXT", double="REAL", float="REAL", blob="BLOB")
+
+_sqliteExt = (".sqlite", ".db", ".gpkg")
+
+
+class FieldSpec(object):
+    # One output field, from an SDA column name and its ColumnInfo string
+
+    def __init__(self, name, dataType, precision=0, scale=0, length=0):
+        self.name = name
+        self.dataType = dataType
+        self.precision = precision
+        self.scale = scale
+        self.length = length
+
+
+def fieldSpecs(columnNames, columnInfo):
+    # FieldSpec list for an SDA response
+    #
+    # ColumnInfo contains:
+    # ColumnOrdinal, ColumnSize, NumericPrecision, NumericScale, ProviderType, IsLong, ProviderSpecificDataType, DataTypeName
+
+    specs = list()
+
+    for i, fldName in enumerate(columnNames):
+        vals = columnInfo[i].split(",")
+        length = int(vals[1].split("=")[1])
+        precision = int(vals[2].split("=")[1])
+        scale = int(vals[3].split("=")[1])
+        dataType = dType[vals[4].lower().split("=")[1]]
+
+        if fldName.lower().endswith("key"):
+            # Per SSURGO standards, key fields should be string. They come from Soil Data Access as long integer.
+            dataType = 'text'
+            length = 30
+
+        specs.append(FieldSpec(fldName, dataType, precision, scale, length))
+
+    return specs
+
+
+def _toInt(val):
+    if val is None or val == "":
+        return None
+
+    try:
+        return int(val)
+
+    except ValueError:
+        # integers sometimes come back as "12.0"
+        return int(float(val))
+
+
+def _toFloat(val):
+    if val is None or val == "":
+        return None
+
+    return float(val)
+
+
+def _toText(val):
+    return val
+
+
+def coercers(specs):
+    # One function per field turning the SDA string into the field's type
+    funcs = list()
+
+    for spec in specs:
+        if spec.dataType in ("long", "short"):
+            funcs.append(_toInt)
+
+        elif spec.dataType in ("double", "float"):
+            funcs.append(_toFloat)
+
+        else:
+            funcs.append(_toText)
+
+    return funcs
+
+
+class ArcpyTableWriter(object):
+    # File geodatabase table written with a single InsertCursor
+
+    def __init__(self, path):
+        self.path = path
+        self.cursor = None
+
+    def create(self, specs):
+        import arcpy
+
+        if arcpy.Exists(self.path):
+            arcpy.management.Delete(self.path)
+
+        arcpy.management.CreateTable(os.path.dirname(self.path), os.path.basename(self.path))
+
+        for spec in specs:
+            arcpy.management.AddField(self.path, spec.name, spec.dataType, spec.precision, spec.scale, spec.length)
+
+        self.cursor = arcpy.da.InsertCursor(self.path, [spec.name for spec in specs])
+
+    def insert(self, rows):
+        for row in rows:
+            self.cursor.insertRow(row)
+
+    def close(self):
+        if self.cursor is not None:
+            del self.cursor
+            self.cursor = None
+
+
+class SQLiteTableWriter(object):
+    # Table in a SQLite database; a .gpkg file gets the GeoPackage system
+    # tables and a gpkg_contents row so GIS software lists it as an
+    # attributes table
+
+    def __init__(self, path):
+        self.db, self.name = _splitPath(path)
+        self.conn = None
+        self.sql = None
+
+    def create(self, specs):
+        folder = os.path.dirname(self.db)
+
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        self.conn = sqlite3.connect(self.db)
+
+        if self.db.lower().endswith(".gpkg"):
+            _initGeoPackage(self.conn)
+
+        cols = ", ".join(_quote(spec.name) + " " + _sqliteType[spec.dataType] for spec in specs)
+
+        self.conn.execute("DROP TABLE IF EXISTS " + _quote(self.name))
+        self.conn.execute("CREATE TABLE " + _quote(self.name) + " (OBJECTID INTEGER PRIMARY KEY AUTOINCREMENT, " + cols + ")")
+
+        if self.db.lower().endswith(".gpkg"):
+            self.conn.execute("DELETE FROM gpkg_contents WHERE table_name = ?", (self.name,))
+            self.conn.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier) VALUES (?, 'attributes', ?)", (self.name, self.name))
+
+        self.sql = "INSERT INTO " + _quote(self.name) + " (" + ", ".join(_quote(spec.name) for spec in specs) + ") VALUES (" + ", ".join("?" * len(specs)) + ")"
+
+    def insert(self, rows):
+        self.conn.executemany(self.sql, rows)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _splitPath(path):
+    # (database file, table name) for ".../soils.gpkg/muaggat" style paths
+    m = re.match(r"^(.*?(?:" + "|".join(re.escape(e) for e in _sqliteExt) + r"))[\\/](.+)$", path, re.I)
+
+    if m is None:
+        raise ValueError("Not a SQLite table path: " + path)
+
+    return m.group(1), m.group(2)
+
+
+def _initGeoPackage(conn):
+    # Minimal GeoPackage 1.2 system tables for an attributes-only package
+    conn.execute("PRAGMA application_id = 1196444487")
+    conn.execute("PRAGMA user_version = 10200")
+    conn.execute("CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT)")
+    conn.execute("INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', NULL)")
+    conn.execute("INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE, description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')), min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER)")
+
+
+def openWriter(path):
+    # Writer backend for an output table path
+    if re.search(r"(" + "|".join(re.escape(e) for e in _sqliteExt) + r")[\\/]", path, re.I):
+        return SQLiteTableWriter(path)
+
+    return ArcpyTableWriter(path)
+
+
+def writeTable(path, columnNames, columnInfo, rows, writer=None, batchSize=None):
+    # Create the table at path from the SDA column names and column info and
+    # write rows into it, batchSize rows at a time. rows may be any iterable,
+    # it is only read once. Returns the number of rows written.
+
+    if writer is None:
+        writer = openWriter(path)
+
+    batchSize = batchSize or BATCH_SIZE
+    specs = fieldSpecs(columnNames, columnInfo)
+    funcs = coercers(specs)
+    count = 0
+
+    writer.create(specs)
+
+    try:
+        batch = list()
+
+        for row in rows:
+            batch.append([f(v) for f, v in zip(funcs, row)])
+
+            if len(batch) >= batchSize:
+                writer.insert(batch)
+                count += len(batch)
+                batch = list()
+
+        if batch:
+            writer.insert(batch)
+            count += len(batch)
+
+    finally:
+        writer.close()
+
+    return count
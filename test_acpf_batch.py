@@ -0,0 +1,58 @@
+#-------------------------------------------------------------------------------
+# Name:        test_acpf_batch
+# Purpose:     acpf_batch job pool: results in job order, failures collected
+#              per job and the SDA connection budget shared by the workers.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os
+
+import acpf_batch, sda_client
+
+
+def poolShare(name):
+    # the connection cap of the worker that ran the job
+    return ["%s:%d" % (name, sda_client.getClient().maxPerHost)]
+
+
+def failing(name):
+    if name == "b":
+        raise ValueError("no watershed " + name)
+
+    return [name] if name == "c" else []
+
+
+def test_serial_results():
+    summary = acpf_batch.runBatch(failing, [(n, (n,)) for n in "abcd"], workers=1)
+
+    assert [res.name for res in summary.results] == list("abcd")
+    assert summary.failed() == ["b", "c"]
+    assert "ValueError" in summary.errors()[0][1]
+
+
+def test_pool_results_in_job_order():
+    summary = acpf_batch.runBatch(failing, [(n, (n,)) for n in "abcdef"], workers=3)
+
+    assert [res.name for res in summary.results] == list("abcdef")
+    assert summary.failed() == ["b", "c"]
+
+
+def test_workers_share_connections(monkeypatch):
+    monkeypatch.setattr(sda_client, "MAX_PER_HOST", 4)
+    summary = acpf_batch.runBatch(poolShare, [(n, (n,)) for n in "abcd"], workers=2)
+
+    assert summary.failed() == ["a:2", "b:2", "c:2", "d:2"]
+
+
+def test_job_function_from_script(tmp_path):
+    # a tool script's function, run by the pool although the tool is __main__
+    script = tmp_path / "acpf_tool_script.py"
+    script.write_text(u"import os\n\ndef job(name):\n    return [name + ':' + str(os.getpid())]\n\nif __name__ == '__main__':\n    raise SystemExit('tool body')\n")
+
+    func = acpf_batch.jobFunction(str(script), "job")
+    summary = acpf_batch.runBatch(func, [(n, (n,)) for n in "abc"], workers=2)
+
+    assert func.__module__ == "acpf_tool_script"
+    assert [w.split(":")[0] for w in summary.failed()] == list("abc")
+    assert not str(os.getpid()) in [w.split(":")[1] for w in summary.failed()]
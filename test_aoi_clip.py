@@ -0,0 +1,138 @@
+#-------------------------------------------------------------------------------
+# Name:        test_aoi_clip
+# Purpose:     aoi_clip envelope classes against a segment clipping test and
+#              sampled points, and EnvelopeClipper on stand-in arcpy polygons.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import math
+
+import numpy as np
+
+import aoi_clip
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.X = x
+        self.Y = y
+
+
+class Extent(object):
+    def __init__(self, xmin, ymin, xmax, ymax):
+        self.XMin = xmin
+        self.YMin = ymin
+        self.XMax = xmax
+        self.YMax = ymax
+
+
+class Polygon(object):
+    # the parts, extent and intersect of an arcpy Polygon
+
+    def __init__(self, parts, extent=None):
+        self.parts = parts
+        self.extent = extent
+        self.intersected = list()
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def intersect(self, other, dimension):
+        self.intersected.append((other, dimension))
+        return "clipped"
+
+
+def starRings():
+    # a 40 point star with a square hole, both as closed rings
+    ang = np.arange(40) * 2 * math.pi / 40
+    rad = np.where(np.arange(40) % 2, 60.0, 100.0)
+    star = [(float(r * math.cos(a)), float(r * math.sin(a))) for a, r in zip(ang, rad)]
+    hole = [(-20.0, -20.0), (-20.0, 20.0), (20.0, 20.0), (20.0, -20.0)]
+
+    return [star + star[:1], hole + hole[:1]]
+
+
+def segmentMeets(ax, ay, bx, by, xmin, ymin, xmax, ymax):
+    # Liang-Barsky: does the segment a-b reach the closed rectangle
+    t0, t1 = 0.0, 1.0
+    dx, dy = bx - ax, by - ay
+
+    for p, q in ((-dx, ax - xmin), (dx, xmax - ax), (-dy, ay - ymin), (dy, ymax - ay)):
+        if p == 0:
+            if q < 0:
+                return False
+
+        elif p < 0:
+            t0 = max(t0, q / p)
+
+        else:
+            t1 = min(t1, q / p)
+
+    return t0 <= t1
+
+
+def inside(rings, x, y):
+    found = np.zeros(x.shape, bool)
+
+    for ring in rings:
+        for (ax, ay), (bx, by) in zip(ring[:-1], ring[1:]):
+            if ay != by:
+                found ^= ((ay > y) != (by > y)) & (x < ax + (y - ay) * (bx - ax) / (by - ay))
+
+    return found
+
+
+def test_classify():
+    rings = starRings()
+    aoi = aoi_clip.PreparedAOI(rings, cellEdges=4)
+    rng = np.random.RandomState(6)
+    seen = set()
+
+    for i in range(2000):
+        x, y = rng.uniform(-120, 120, 2)
+        w, h = rng.uniform(0.1, 30, 2)
+        box = (x, y, x + w, y + h)
+        cls = aoi.classify(*box)
+        seen.add(cls)
+
+        crossing = any(segmentMeets(ax, ay, bx, by, *box) for ring in rings for (ax, ay), (bx, by) in zip(ring[:-1], ring[1:]))
+        assert (cls == aoi_clip.CROSSING) == crossing
+
+        if cls != aoi_clip.CROSSING:
+            sx = rng.uniform(box[0], box[2], 50)
+            sy = rng.uniform(box[1], box[3], 50)
+            assert (inside(rings, sx, sy) == (cls == aoi_clip.INSIDE)).all()
+
+    assert seen == set([aoi_clip.INSIDE, aoi_clip.OUTSIDE, aoi_clip.CROSSING])
+
+    # an envelope in the hole, and one corner touching the boundary
+    assert aoi.classify(-5, -5, 5, 5) == aoi_clip.OUTSIDE
+    assert aoi.classify(20, 0, 25, 5) == aoi_clip.CROSSING
+
+
+def test_geometry_rings():
+    # two parts, the first with a hole after the None separator
+    part1 = [Point(0, 0), Point(0, 10), Point(10, 10), Point(0, 0), None, Point(2, 2), Point(3, 2), Point(2, 2)]
+    part2 = [Point(20, 20), Point(21, 20), Point(20, 20)]
+
+    assert aoi_clip.geometryRings(Polygon([part1, part2])) == [[(0, 0), (0, 10), (10, 10), (0, 0)], [(2, 2), (3, 2), (2, 2)], [(20, 20), (21, 20), (20, 20)]]
+
+
+def test_clipper():
+    ring = [Point(x, y) for x, y in starRings()[0]]
+    aoiPolygon = Polygon([ring])
+    clipper = aoi_clip.EnvelopeClipper(aoiPolygon)
+
+    kept = Polygon([], Extent(30, 0, 40, 10))
+    dropped = Polygon([], Extent(200, 200, 210, 210))
+    crossing = Polygon([], Extent(50, -5, 110, 5))
+
+    assert clipper.clip(kept) is kept
+    assert clipper.clip(dropped) is None
+    assert clipper.clip(crossing) == "clipped"
+
+    assert kept.intersected == [] and dropped.intersected == []
+    assert crossing.intersected == [(aoiPolygon, 4)]
+    assert clipper.stats.counts == {aoi_clip.INSIDE: 1, aoi_clip.OUTSIDE: 1, aoi_clip.CROSSING: 1}
+    assert clipper.stats.report()[0] == "Envelope prefilter: 1 inside, 1 crossing, 1 outside of 3 polygons"
@@ -0,0 +1,389 @@
+#-------------------------------------------------------------------------------
+# Name:        test_aoi_tiles
+# Purpose:     aoi_tiles grid cells, cell pieces and queries on stand-in arcpy
+#              geometry, and fetch against a stand-in SDA client: split and
+#              retry, polygons repeated across cells, and the polygon store.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import re, sys, types, socket
+
+import pytest
+
+import polygon_store, sda_client
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.X = x
+        self.Y = y
+
+
+class Extent(object):
+    def __init__(self, xmin, ymin, xmax, ymax):
+        self.XMin = xmin
+        self.YMin = ymin
+        self.XMax = xmax
+        self.YMax = ymax
+
+
+class Array(list):
+    pass
+
+
+def ring(xmin, ymin, xmax, ymax):
+    return [Point(xmin, ymin), Point(xmax, ymin), Point(xmax, ymax), Point(xmin, ymax), Point(xmin, ymin)]
+
+
+class Boxes(object):
+    # an arcpy polygon made of rectangles, enough for clip, area and parts
+
+    spatialReference = "WGS84"
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.extent = Extent(min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+        self.area = sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes)
+
+    def __iter__(self):
+        return iter([ring(*b) for b in self.boxes])
+
+    def clip(self, ext):
+        inside = list()
+
+        for xmin, ymin, xmax, ymax in self.boxes:
+            box = (max(xmin, ext.XMin), max(ymin, ext.YMin), min(xmax, ext.XMax), min(ymax, ext.YMax))
+
+            if box[0] < box[2] and box[1] < box[3]:
+                inside.append(box)
+
+        return Boxes(inside) if inside else None
+
+
+class Hull(object):
+    def __init__(self, box):
+        self.area = (box[2] - box[0]) * (box[3] - box[1])
+        self.WKT = "MULTIPOLYGON (((" + ", ".join("%r %r" % (p.X, p.Y) for p in ring(*box)) + ")))"
+
+
+class Multipoint(object):
+    def __init__(self, pnts, sr):
+        self.pnts = list(pnts)
+
+    def convexHull(self):
+        # the parts here are rectangles, so their hull is their box
+        xs = [p.X for p in self.pnts]
+        ys = [p.Y for p in self.pnts]
+
+        return Hull((min(xs), min(ys), max(xs), max(ys)))
+
+
+arcpy = types.ModuleType("arcpy")
+arcpy.Extent = Extent
+arcpy.Array = Array
+arcpy.Multipoint = Multipoint
+sys.modules.setdefault("arcpy", arcpy)
+
+import aoi_tiles
+
+
+def square(x0, y0, size):
+    return "POLYGON ((%r %r, %r %r, %r %r, %r %r, %r %r))" % (x0, y0, x0 + size, y0, x0 + size, y0 + size, x0, y0 + size, x0, y0)
+
+
+def soils():
+    # 0.03 degree map unit polygons in rows, every other row shifted, so
+    # many of them straddle the 0.125 degree grid lines
+    rows = list()
+
+    for j in range(10):
+        for i in range(16):
+            x = -93.4 + i * 0.03 + (0.015 if j % 2 else 0.0)
+            y = 41.85 + j * 0.03
+            rows.append((str(500000 + j * 100 + i), str(1000 + (i + j) % 7), "IA169" if x < -93.2 else "IA015", (x, y, x + 0.03, y + 0.03)))
+
+    return rows
+
+
+def meets(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+_polygon = re.compile(r"STPolyFromText\('POLYGON \(\(([^)]*)\)\)', 4326\)")
+
+
+class Client(object):
+    # answers cellQuery with the soils polygons meeting any of its polygons;
+    # fail(box) may return an exception to raise for that request instead
+
+    def __init__(self, fail=None):
+        self.polygons = soils()
+        self.fail = fail
+        self.requests = list()
+
+    def postRows(self, url, request):
+        boxes = list()
+
+        for text in _polygon.findall(request["query"]):
+            xy = [tuple(float(v) for v in p.split()) for p in text.split(",")]
+            boxes.append((min(p[0] for p in xy), min(p[1] for p in xy), max(p[0] for p in xy), max(p[1] for p in xy)))
+
+        self.requests.append(boxes)
+        error = self.fail(boxes) if self.fail else None
+
+        if error is not None:
+            raise error
+
+        for polyKey, mukey, areasymbol, box in self.polygons:
+            if any(meets(box, b) for b in boxes):
+                yield [polyKey, mukey, areasymbol, square(box[0], box[1], 0.03)]
+
+
+aoi = Boxes([(-93.28, 41.93, -93.02, 42.0), (-93.28, 42.0, -93.15, 42.09)])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    found = Client()
+    monkeypatch.setattr(aoi_tiles, "arcpy", arcpy)
+    monkeypatch.setattr(sda_client, "getClient", lambda: found)
+    monkeypatch.setattr(polygon_store, "getStore", lambda: None)
+
+    return found
+
+
+def test_grid_cells():
+    ext = (-93.28, 41.93, -93.02, 42.09)
+    cells = aoi_tiles.gridCells(ext, 0.125)
+
+    # 3 columns from -93.375 to -93.0 and 2 rows from 41.875 to 42.125
+    assert [c.path for c in cells] == ["-747_335", "-746_335", "-745_335", "-747_336", "-746_336", "-745_336"]
+    assert min(c.xmin for c in cells) <= ext[0] and max(c.xmax for c in cells) >= ext[2]
+    assert min(c.ymin for c in cells) <= ext[1] and max(c.ymax for c in cells) >= ext[3]
+
+    for c in cells:
+        assert c.xmax - c.xmin == pytest.approx(0.125) and c.ymax - c.ymin == pytest.approx(0.125)
+        assert meets((c.xmin, c.ymin, c.xmax, c.ymax), ext)
+
+    # the quadrants tile the cell and keep its grid cell as their root
+    quads = cells[0].split()
+    assert sum((q.xmax - q.xmin) * (q.ymax - q.ymin) for q in quads) == pytest.approx(0.125 ** 2)
+    assert set((q.xmin, q.ymin) for q in quads) == set([(-93.375, 41.875), (-93.3125, 41.875), (-93.375, 41.9375), (-93.3125, 41.9375)])
+    assert [q.path for q in quads] == ["-747_335/0", "-747_335/1", "-747_335/2", "-747_335/3"]
+    assert all(q.depth == 1 and q.root() == cells[0].root() for q in quads)
+    assert cells[0].root() == "0.125:-747_335"
+
+
+def test_cell_polygons(client):
+    cells = dict((c.path, c) for c in aoi_tiles.gridCells((-93.28, 41.93, -93.02, 42.09), 0.125))
+
+    # both boxes reach into this cell, each is its own hull
+    assert aoi_tiles.cellPolygons(cells["-747_336"], aoi) == ["POLYGON ((-93.28 42.0, -93.25 42.0, -93.25 42.09, -93.28 42.09, -93.28 42.0))"]
+    assert aoi_tiles.cellPolygons(cells["-747_335"], aoi) == ["POLYGON ((-93.28 41.93, -93.25 41.93, -93.25 42.0, -93.28 42.0, -93.28 41.93))"]
+
+    # the first box only touches the upper row, the second ends before it
+    assert aoi_tiles.cellPolygons(cells["-745_336"], aoi) == []
+
+
+def test_cell_query():
+    qry = aoi_tiles.cellQuery(["POLYGON ((0 0, 1 0, 1 1, 0 0))", "POLYGON ((2 2, 3 2, 3 3, 2 2))"])
+
+    assert qry.startswith("DECLARE @p0 geometry = geometry::STPolyFromText('POLYGON ((0 0, 1 0, 1 1, 0 0))', 4326);\n"
+                          "DECLARE @p1 geometry = geometry::STPolyFromText('POLYGON ((2 2, 3 2, 3 3, 2 2))', 4326);\n")
+    assert "SELECT P.mupolygonkey, P.mukey, P.areasymbol, P.mupolygongeo.STAsText() AS wkt" in qry
+    assert qry.rstrip().endswith("WHERE P.mupolygongeo.STIntersects(@p0) = 1\n    OR P.mupolygongeo.STIntersects(@p1) = 1")
+
+
+def test_fetch_cell(client, monkeypatch):
+    wkts = [square(-93.3, 41.9, 0.1)]
+    status, rows = aoi_tiles._fetchCell(wkts, "http://sda", 100)
+    hits = [r for r in soils() if meets(r[3], (-93.3, 41.9, -93.2, 42.0))]
+
+    assert status == aoi_tiles.OK
+    assert [r[0] for r in rows] == [r[0] for r in hits]
+
+    # too many rows, a timeout and a too big answer are split; other errors fail
+    assert aoi_tiles._fetchCell(wkts, "http://sda", 10) == (aoi_tiles.SPLIT, "more than 10 polygons")
+    assert aoi_tiles._fetchCell(wkts, "http://sda", 0)[0] == aoi_tiles.OK
+
+    for error, expected in [(socket.timeout(), aoi_tiles.SPLIT),
+                            (ValueError("HTTP Error 400: Bad Request"), aoi_tiles.SPLIT),
+                            (ValueError("Invalid column name 'wkt'"), aoi_tiles.FAILED)]:
+        monkeypatch.setattr(client, "fail", lambda boxes: error)
+        assert aoi_tiles._fetchCell(wkts, "http://sda", 100)[0] == expected
+
+
+def expectedRows(cells, pieces):
+    # one row per polygon meeting any piece, cell by cell
+    found = list()
+    seen = set()
+    hits = 0
+
+    for cell in cells:
+        for polyKey, mukey, areasymbol, box in soils():
+            if any(meets(box, p) for p in pieces(cell)):
+                hits += 1
+
+                if not polyKey in seen:
+                    seen.add(polyKey)
+                    found.append((mukey, square(box[0], box[1], 0.03)))
+
+    return found, hits - len(found)
+
+
+def test_fetch(client):
+    ok, rows, stats = aoi_tiles.fetch(aoi, "http://sda")
+    cells = sorted(aoi_tiles.gridCells((-93.28, 41.93, -93.02, 42.09)), key=lambda c: c.path)
+    ext = lambda c: arcpy.Extent(c.xmin, c.ymin, c.xmax, c.ymax)
+    expected, duplicates = expectedRows(cells, lambda c: aoi.clip(ext(c)).boxes if aoi.clip(ext(c)) else [])
+
+    assert ok
+    assert rows == expected
+    assert duplicates > 0 and stats.duplicates == duplicates
+    assert stats.polygons == len(rows)
+
+    # one request per cell holding part of the AOI, its clipped pieces only
+    assert stats.sent == len(client.requests) == 5 and stats.rounds == 1
+    assert client.requests == [[(-93.125, 41.93, -93.02, 42.0)], [(-93.25, 41.93, -93.125, 42.0)], [(-93.25, 42.0, -93.15, 42.09)],
+                               [(-93.28, 41.93, -93.25, 42.0)], [(-93.28, 42.0, -93.25, 42.09)]]
+
+
+def test_fetch_split(client, monkeypatch):
+    whole = aoi_tiles.fetch(aoi, "http://sda")[1]
+    client.requests = list()
+
+    # cells over 0.05 degrees wide time out the first time they are sent
+    failed = set()
+
+    def fail(boxes):
+        key = tuple(boxes)
+
+        if boxes[0][2] - boxes[0][0] > 0.05 and not key in failed:
+            failed.add(key)
+            return socket.timeout()
+
+    monkeypatch.setattr(client, "fail", fail)
+    monkeypatch.setattr(aoi_tiles, "MAX_POLYGONS", 12)
+    ok, rows, stats = aoi_tiles.fetch(aoi, "http://sda")
+
+    assert ok
+    assert sorted(rows) == sorted(whole)
+    assert stats.rounds > 2 and stats.split > 5
+    assert stats.sent == len(client.requests)
+
+
+def test_fetch_fails_at_depth(client, monkeypatch):
+    monkeypatch.setattr(client, "fail", lambda boxes: socket.timeout())
+    monkeypatch.setattr(aoi_tiles, "MAX_DEPTH", 2)
+    ok, msg, stats = aoi_tiles.fetch(aoi, "http://sda")
+
+    assert not ok
+    assert msg == "AOI cell -745_335/0/2 failed: " + (str(socket.timeout()) or socket.timeout.__name__)
+    # 16 of the first quadrants hold part of the AOI, the west halves of
+    # the -747 cells do not
+    assert stats.rounds == 3 and stats.split == 5 + 16
+
+
+def test_fetch_store(client, monkeypatch, tmp_path):
+    store = polygon_store.PolygonStore(str(tmp_path / "store.sqlite"))
+    monkeypatch.setattr(polygon_store, "getStore", lambda: store)
+    monkeypatch.setattr(polygon_store, "surveyVersions", lambda url: {"IA169": "2025-09-01 00:00:00", "IA015": "2025-09-01 00:00:00"})
+
+    # the west neighbour first: polygons on the shared grid line are stored
+    # already, they are not repeats within the next request
+    assert aoi_tiles.fetch(Boxes([(-93.45, 41.9, -93.38, 41.95)]), "http://sda")[0]
+    client.requests = list()
+
+    ok, rows, stats = aoi_tiles.fetch(aoi, "http://sda")
+
+    # whole grid cells are sent, and rows are read back over the AOI extent
+    cells = sorted(aoi_tiles.gridCells((-93.28, 41.93, -93.02, 42.09)), key=lambda c: c.path)
+    sent = [c for c in cells if aoi_tiles.cellPolygons(c, aoi)]
+    hits = sum(1 for c in sent for r in soils() if meets(r[3], (c.xmin, c.ymin, c.xmax, c.ymax)))
+    stored = set(r[0] for c in sent for r in soils() if meets(r[3], (c.xmin, c.ymin, c.xmax, c.ymax)))
+
+    assert ok
+    assert client.requests == [[(c.xmin, c.ymin, c.xmax, c.ymax)] for c in sent]
+    assert stats.duplicates == hits - len(stored)
+    assert sorted(rows) == sorted((r[1], square(r[3][0], r[3][1], 0.03)) for r in soils() if r[0] in stored and meets(r[3], (-93.28, 41.93, -93.02, 42.09)))
+    assert store.covered([c.root() for c in cells]) == set(c.root() for c in sent)
+    assert any(r[3][0] < -93.375 for r in soils() if r[0] in stored)
+
+    # the same AOI again is read from the store alone
+    ok, again, stats = aoi_tiles.fetch(aoi, "http://sda")
+
+    assert ok and again == rows
+    assert len(client.requests) == len(sent)
+    assert stats.sent == 0 and stats.stored == len(sent) and stats.duplicates == 0
+
+
+def test_regions():
+    extents = [(-93.28, 41.93, -93.2, 41.99),     # two grid cells
+               (-93.1, 41.93, -93.05, 41.98),     # the next grid cell east
+               (-91.0, 43.0, -90.95, 43.05),      # far away
+               (-93.36, 42.01, -93.3, 42.05)]     # north of the first
+
+    assert aoi_tiles.regions(extents, 36, 0.125) == [([0, 1, 3], [(-747, 335), (-746, 335), (-745, 335), (-747, 336)]),
+                                                     ([2], [(-728, 344)])]
+
+    # a region full at 3 grid cells, the last neighbour starts its own
+    assert aoi_tiles.regions(extents, 3, 0.125) == [([0, 1], [(-747, 335), (-746, 335), (-745, 335)]),
+                                                    ([2], [(-728, 344)]),
+                                                    ([3], [(-747, 336)])]
+
+
+def test_prefetch_regions(client, monkeypatch, tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    monkeypatch.setattr(polygon_store, "surveyVersions", lambda url: {"IA169": "2025-09-01 00:00:00", "IA015": "2025-09-01 00:00:00"})
+
+    # two neighbouring buffers sharing grid cells, and one on its own
+    sheds = [Boxes([(-93.28, 41.93, -93.13, 42.0)]), Boxes([(-93.2, 41.95, -93.02, 42.05)]), Boxes([(-91.0, 43.0, -90.95, 43.05)])]
+    alone = [aoi_tiles.fetch(a, "http://sda")[1] for a in sheds]
+    client.requests = list()
+
+    # the batch: one prefetch per region of two or more buffers
+    store = polygon_store.PolygonStore(path)
+    monkeypatch.setattr(polygon_store, "getStore", lambda: store)
+    found = aoi_tiles.regions([(a.extent.XMin, a.extent.YMin, a.extent.XMax, a.extent.YMax) for a in sheds])
+    fetched = [cells for members, cells in found if len(members) > 1]
+
+    assert len(fetched) == 1
+
+    ok, msg, stats = aoi_tiles.prefetch(fetched[0], "http://sda")
+    boxes = [(c.xmin, c.ymin, c.xmax, c.ymax) for c in [aoi_tiles.gridCell(i, j) for i, j in fetched[0]]]
+
+    # every grid cell of the region sent once, whole
+    assert ok and stats.sent == len(boxes) == 6
+    assert client.requests == [[b] for b in boxes]
+
+    # the watersheds, each in a worker with its own connection to the store,
+    # read the region's grid cells from it and send nothing
+    store = polygon_store.PolygonStore(path)
+
+    for a, rows in zip(sheds[:2], alone):
+        ok, got, stats = aoi_tiles.fetch(a, "http://sda")
+
+        assert ok and sorted(got) == sorted(rows)
+        assert stats.sent == 0 and stats.stored > 0
+
+    assert len(client.requests) == 6
+
+    # the watershed outside every region sends its own request
+    assert aoi_tiles.fetch(sheds[2], "http://sda")[2].sent == 1
+
+
+def test_prefetch_fails(client, monkeypatch, tmp_path):
+    store = polygon_store.PolygonStore(str(tmp_path / "store.sqlite"))
+    monkeypatch.setattr(polygon_store, "getStore", lambda: store)
+    monkeypatch.setattr(polygon_store, "surveyVersions", lambda url: {})
+    monkeypatch.setattr(client, "fail", lambda boxes: ValueError("Invalid object name 'mupolygon'"))
+
+    ok, msg, stats = aoi_tiles.prefetch([(-747, 335), (-746, 335)], "http://sda")
+
+    assert not ok and msg == "AOI cell -747_335 failed: Invalid object name 'mupolygon'"
+    assert store.covered(["0.125:-747_335", "0.125:-746_335"]) == set()
+
+    # without the store there is nothing to prefetch into
+    monkeypatch.setattr(polygon_store, "getStore", lambda: None)
+    assert aoi_tiles.prefetch([(-747, 335)], "http://sda")[:2] == (False, "polygon store is off")
@@ -0,0 +1,114 @@
+#-------------------------------------------------------------------------------
+# Name:        test_mu_inverse
+# Purpose:     mu_inverse point in polygon values against a plain even-odd
+#              test, and the inverse-mapped raster against the cell centres
+#              taken back to WGS84 one by one.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+import mu_inverse, mu_raster, sda_project
+
+
+def square(x0, y0, size):
+    return "POLYGON ((%r %r, %r %r, %r %r, %r %r, %r %r))" % (x0, y0, x0 + size, y0, x0 + size, y0 + size, x0, y0 + size, x0, y0)
+
+
+def inside(px, py, xy):
+    # even-odd test of the points (px, py) against one closed ring
+    found = np.zeros(px.shape, bool)
+
+    for (ax, ay), (bx, by) in zip(xy[:-1], xy[1:]):
+        if ay == by:
+            continue
+
+        near = (py >= min(ay, by)) & (py < max(ay, by))
+        found ^= near & (px < ax + (py - ay) * (bx - ax) / (by - ay))
+
+    return found
+
+
+def test_point_values():
+    rng = np.random.RandomState(5)
+    wkts = list()
+    values = list()
+
+    # overlapping star shaped polygons, several per mukey
+    for i in range(300):
+        cx, cy = rng.uniform(0, 2, 2)
+        k = rng.randint(4, 12)
+        ang = (np.arange(k) + rng.uniform(0, 0.8, k)) * 2 * np.pi / k
+        rad = rng.uniform(0.01, 0.15, k)
+        pts = [(float(cx + r * np.cos(a)), float(cy + r * np.sin(a))) for a, r in zip(ang, rad)]
+        pts.append(pts[0])
+        wkts.append("POLYGON ((" + ", ".join("%r %r" % p for p in pts) + "))")
+        values.append(int(rng.randint(1, 40)))
+
+    wkts.append("POLYGON ((3 3, 4 3, 4 4, 3 4, 3 3),(3.2 3.2, 3.8 3.2, 3.8 3.8, 3.2 3.8, 3.2 3.2))")
+    values.append(77)
+
+    rings = mu_raster.RingSet.fromWKT(wkts, values)
+    px = rng.uniform(-0.2, 4.2, 50000)
+    py = rng.uniform(-0.2, 4.2, 50000)
+
+    got = mu_inverse.pointValues(px, py, rings, np.arange(len(rings)))
+
+    # parity per mukey, the smaller mukey where two claim a point
+    parity = dict()
+
+    for i in range(len(rings)):
+        j, k = rings.offsets[i], rings.offsets[i + 1]
+        xy = np.column_stack([rings.x[j:k], rings.y[j:k]])
+        val = int(rings.value[i])
+        parity[val] = parity.get(val, np.zeros(len(px), bool)) ^ inside(px, py, xy)
+
+    expected = np.full(len(px), mu_raster.NODATA, dtype=np.int32)
+
+    for val in sorted(parity, reverse=True):
+        expected[parity[val]] = val
+
+    assert (got != mu_raster.NODATA).sum() > 5000
+    assert (got == expected).all()
+
+    hole = (px > 3.2) & (px < 3.8) & (py > 3.2) & (py < 3.8)
+    assert (got[hole] == mu_raster.NODATA).all()
+    assert (got[(px > 3) & (px < 4) & (py > 3) & (py < 4) & ~hole] == 77).all()
+
+
+def test_rasterize_cell_centres(tmp_path):
+    # a 40 x 40 block of 0.002 degree map units, mukey from its column and row
+    size = 0.002
+    wkts = list()
+    values = list()
+
+    for i in range(40):
+        for j in range(40):
+            wkts.append(square(-93.2 + i * size, 42.0 + j * size, size))
+            values.append(1000 + i * 40 + j)
+
+    rings = mu_raster.RingSet.fromWKT(wkts, values)
+    proj = sda_project.TransverseMercator(sda_project.GRS80[0], sda_project.GRS80[1], -93.0, 0.0, 0.9996, 500000.0, 0.0)
+
+    # a diamond shaped buffer in UTM around the middle of the block
+    cx, cy = sda_project.transform(np.array([-93.16]), np.array([42.04]), proj, True)
+    cx, cy, r = float(cx[0]), float(cy[0]), 1500.0
+    mask = mu_raster.RingSet.fromWKT(["POLYGON ((%r %r, %r %r, %r %r, %r %r, %r %r))" % (cx - r, cy, cx, cy - r, cx + r, cy, cx, cy + r, cx - r, cy)], [1])
+
+    grid = mu_raster.snapGrid(mask.extent(), 10.0, (0.0, 0.0))
+    out = np.asarray(mu_inverse.rasterize(rings, mask, grid, proj, True, str(tmp_path / "mu.dat"), size=64))
+
+    # each cell centre taken back to WGS84 on its own
+    cols = grid.left + (np.arange(grid.ncols) + 0.5) * grid.cell
+    rows = grid.top - (np.arange(grid.nrows) + 0.5) * grid.cell
+    x, y = np.meshgrid(cols, rows)
+    lon, lat = sda_project.untransform(x.ravel(), y.ravel(), proj, True)
+
+    expected = 1000 + np.floor((lon + 93.2) / size).astype(np.int64) * 40 + np.floor((lat - 42.0) / size).astype(np.int64)
+    expected[np.abs(x.ravel() - cx) + np.abs(y.ravel() - cy) >= r] = mu_raster.NODATA
+    expected = expected.reshape(grid.nrows, grid.ncols)
+
+    assert len(grid.tiles(64)) > 4
+    assert len(np.unique(out)) > 20
+    assert (out == expected).all()
@@ -0,0 +1,149 @@
+#-------------------------------------------------------------------------------
+# Name:        test_mu_raster
+# Purpose:     mu_raster against cell areas measured by supersampling, and
+#              the tiled and pooled burns against a single tile.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+import pytest
+
+import mu_raster
+
+
+def rect(x0, y0, x1, y1):
+    return "POLYGON ((%r %r, %r %r, %r %r, %r %r, %r %r))" % (x0, y0, x1, y0, x1, y1, x0, y1, x0, y0)
+
+
+def burn(wkts, values, grid):
+    rings = mu_raster.RingSet.fromWKT(wkts, values)
+
+    return mu_raster.burnTile(rings, np.arange(len(rings)), grid, 0, 0, grid.nrows, grid.ncols)
+
+
+def randomPolygons(seed, n):
+    # overlapping star shaped polygons, mukeys drawn from a few values so
+    # a map unit often has several polygons in one cell
+    rng = np.random.RandomState(seed)
+    wkts = list()
+    values = list()
+
+    for i in range(n):
+        cx, cy = rng.uniform(0, 200, 2)
+        k = rng.randint(4, 12)
+        ang = (np.arange(k) + rng.uniform(0, 0.8, k)) * 2 * np.pi / k
+        rad = rng.uniform(1, 15, k)
+        pts = [(float(cx + r * np.cos(a)), float(cy + r * np.sin(a))) for a, r in zip(ang, rad)]
+        pts.append(pts[0])
+        wkts.append("POLYGON ((" + ", ".join("%r %r" % p for p in pts) + "))")
+        values.append(rng.randint(1, 40))
+
+    return wkts, values
+
+
+def inside(px, py, xy):
+    # even-odd point in polygon test of the points (px, py)
+    found = np.zeros(px.shape, bool)
+
+    for (ax, ay), (bx, by) in zip(xy[:-1], xy[1:]):
+        cross = (ay > py) != (by > py)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xs = ax + (py - ay) * (bx - ax) / (by - ay)
+
+        found ^= cross & (px < xs)
+
+    return found
+
+
+def test_square_with_hole():
+    grid = mu_raster.Grid(0.0, 8.0, 1.0, 8, 8)
+    # clockwise exterior, counterclockwise hole
+    wkt = "POLYGON ((0 0, 0 8, 8 8, 8 0, 0 0),(2 2, 6 2, 6 6, 2 6, 2 2))"
+
+    expected = np.full((8, 8), 7, dtype=np.int32)
+    expected[2:6, 2:6] = mu_raster.NODATA
+
+    assert (burn([wkt], [7], grid) == expected).all()
+
+
+def test_largest_combined_area():
+    grid = mu_raster.Grid(0.0, 1.0, 1.0, 1, 1)
+
+    # two polygons of mukey 3 cover 0.6 of the cell, the one of mukey 4 0.4
+    wkts = [rect(0.0, 0.0, 0.3, 1.0), rect(0.3, 0.0, 0.6, 1.0), rect(0.6, 0.0, 1.0, 1.0)]
+    assert burn(wkts, [3, 3, 4], grid)[0, 0] == 3
+
+    # on a tie the smaller mukey wins
+    wkts = [rect(0.0, 0.0, 0.5, 1.0), rect(0.5, 0.0, 1.0, 1.0)]
+    assert burn(wkts, [7, 5], grid)[0, 0] == 5
+    assert burn(wkts, [5, 7], grid)[0, 0] == 5
+
+
+def test_snap_grid():
+    grid = mu_raster.snapGrid((12.3, 4.1, 47.9, 30.0), 10.0, (0.5, 0.25))
+
+    assert grid.asTuple() == (10.5, 30.25, 10.0, 3, 4)
+
+
+def test_matches_supersampled_area():
+    wkts, values = randomPolygons(1, 300)
+    rings = mu_raster.RingSet.fromWKT(wkts, values)
+    grid = mu_raster.snapGrid(rings.extent(), 1.0, (0.5, 0.25))
+    out = mu_raster.burnTile(rings, np.arange(len(rings)), grid, 0, 0, grid.nrows, grid.ncols)
+
+    # combined area of every map unit in a window, from 16 x 16 samples a cell
+    ss = 16
+    r0, c0, h, w = 100, 30, 60, 60
+    yy, xx = np.mgrid[0:h * ss, 0:w * ss]
+    px = grid.left + (c0 + (xx + 0.5) / ss) * grid.cell
+    py = grid.top - (r0 + (yy + 0.5) / ss) * grid.cell
+    areas = dict()
+
+    for wkt, val in zip(wkts, values):
+        xy = mu_raster.parseRings(wkt)[0][0]
+
+        if xy[:, 0].max() < px.min() or xy[:, 0].min() > px.max() or xy[:, 1].max() < py.min() or xy[:, 1].min() > py.max():
+            continue
+
+        cover = inside(px, py, xy).reshape(h, ss, w, ss).sum(axis=(1, 3)) / float(ss * ss)
+        areas[val] = areas.get(val, 0) + cover
+
+    keys = sorted(areas)
+    stack = np.array([areas[k] for k in keys])
+    best = np.array(keys)[stack.argmax(0)]
+    best[stack.max(0) == 0] = mu_raster.NODATA
+
+    # compare where sampling cannot change the winner
+    ranked = np.sort(stack, 0)
+    clear = ranked[-1] - ranked[-2] > 0.07
+    window = out[r0:r0 + h, c0:c0 + w]
+
+    assert clear.sum() > 1000
+    assert (window != mu_raster.NODATA).sum() > 1000
+    assert (best[clear] == window[clear]).all()
+
+
+@pytest.mark.parametrize("workers, size", [(1, 37), (3, 64)])
+def test_tiles_match_single_tile(tmp_path, workers, size):
+    wkts, values = randomPolygons(2, 200)
+    rings = mu_raster.RingSet.fromWKT(wkts, values)
+    grid = mu_raster.snapGrid(rings.extent(), 1.0, (0.5, 0.25))
+    one = mu_raster.burnTile(rings, np.arange(len(rings)), grid, 0, 0, grid.nrows, grid.ncols)
+
+    out = mu_raster.rasterize(rings, grid, str(tmp_path / "mu.dat"), workers=workers, size=size)
+
+    assert len(grid.tiles(size)) > 4
+    assert (np.asarray(out) == one).all()
+
+
+def test_summarize():
+    values = np.array([[0, 5, 5], [7, 7, 7], [0, 0, 5]], dtype=np.int32)
+    summary = mu_raster.summarize(values, 10.0, rows=2)
+
+    assert summary.values.tolist() == [5, 7]
+    assert summary.counts.tolist() == [3, 3]
+    assert summary.areas.tolist() == [300.0, 300.0]
+    assert summary.missing(["5", "9", "7"]) == ["9"]
@@ -0,0 +1,143 @@
+#-------------------------------------------------------------------------------
+# Name:        test_mu_tiff
+# Purpose:     mu_tiff GeoTIFF, overviews, .aux.xml and .vat.dbf read back
+#              with a separate TIFF walker, and TiffReader windows.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import re, struct, zlib
+
+import numpy as np
+
+import pytest
+
+import mu_raster, mu_tiff
+
+
+_formats = {2: "s", 3: "H", 4: "I", 12: "d"}
+
+
+def directories(path):
+    # tags of every image file directory, in file order
+    data = open(path, "rb").read()
+    assert data[:4] == b"II*\0"
+
+    at = struct.unpack("<I", data[4:8])[0]
+    found = list()
+
+    while at:
+        n = struct.unpack("<H", data[at:at + 2])[0]
+        tags = dict()
+
+        for i in range(n):
+            tag, typ, count = struct.unpack("<HHI", data[at + 2 + 12 * i:at + 10 + 12 * i])
+            size = struct.calcsize("<" + _formats[typ]) * count
+            start = at + 10 + 12 * i if size <= 4 else struct.unpack("<I", data[at + 10 + 12 * i:at + 14 + 12 * i])[0]
+            raw = data[start:start + size]
+            tags[tag] = raw.rstrip(b"\0").decode("ascii") if typ == 2 else struct.unpack("<" + _formats[typ] * count, raw)
+
+        found.append(tags)
+        at = struct.unpack("<I", data[at + 2 + 12 * n:at + 6 + 12 * n])[0]
+
+    return data, found
+
+
+def image(data, tags):
+    # the whole image of one directory, tiles inflated and trimmed
+    h, w, t = tags[257][0], tags[256][0], tags[322][0]
+    across, down = -(-w // t), -(-h // t)
+    out = np.zeros((down * t, across * t), dtype=np.int32)
+
+    for k, (at, n) in enumerate(zip(tags[324], tags[325])):
+        tr, tc = divmod(k, across)
+        out[tr * t:(tr + 1) * t, tc * t:(tc + 1) * t] = np.frombuffer(zlib.decompress(data[at:at + n]), dtype="<i4").reshape(t, t)
+
+    return out[:h, :w]
+
+
+@pytest.fixture
+def written(tmp_path, monkeypatch):
+    monkeypatch.setattr(mu_tiff, "TILE", 64)
+
+    rng = np.random.RandomState(3)
+    values = rng.choice([mu_raster.NODATA, 101, 2002, 30003, 7], size=(300, 451)).astype(np.int32)
+    grid = mu_raster.Grid(500000.0, 4700000.0, 10.0, 300, 451)
+    path = str(tmp_path / "mu.tif")
+
+    summary = mu_tiff.writeGeoTIFF(values, grid, path, 26915)
+
+    return values, grid, path, summary
+
+
+def test_levels(written):
+    values, grid, path, summary = written
+    data, found = directories(path)
+
+    # full resolution, then every overview down to one tile
+    assert [tags[254][0] for tags in found] == [0, 1, 1, 1]
+
+    for i, tags in enumerate(found):
+        f = 2 ** i
+        assert tags[322] == (64,) and tags[339] == (2,) and tags[259] == (8,)
+        assert tags[42113] == str(mu_raster.NODATA)
+        assert (image(data, tags) == values[::f, ::f]).all()
+
+    assert found[0][33550] == (10.0, 10.0, 0.0)
+    assert found[0][33922] == (0.0, 0.0, 0.0, 500000.0, 4700000.0, 0.0)
+    assert found[0][34735][-4:] == (3072, 0, 1, 26915)
+    assert not 33550 in found[1]
+
+
+def test_statistics(written):
+    values, grid, path, summary = written
+    data = values[values != mu_raster.NODATA]
+    v, n = np.unique(data, return_counts=True)
+
+    assert summary.values.tolist() == v.tolist()
+    assert summary.counts.tolist() == n.tolist()
+    assert summary.areas.tolist() == (n * 100.0).tolist()
+
+    aux = open(path + ".aux.xml").read()
+    stat = dict((k, float(x)) for k, x in re.findall(r'<MDI key="STATISTICS_(\w+)">([^<]*)</MDI>', aux))
+
+    assert stat["MINIMUM"] == 7.0 and stat["MAXIMUM"] == 30003.0
+    assert stat["MEAN"] == pytest.approx(data.mean(), rel=1e-12)
+    assert stat["STDDEV"] == pytest.approx(data.std(), rel=1e-9)
+
+    hist = [int(x) for x in re.search(r"<HistCounts>([^<]*)</HistCounts>", aux).group(1).split("|")]
+    assert len(hist) == mu_tiff.BUCKETS
+    # 7 and 101 share the first bucket
+    assert hist[0] == n[0] + n[1] and hist[-1] == n[-1] and sum(hist) == len(data)
+
+
+def test_attribute_table(written):
+    values, grid, path, summary = written
+    dbf = open(path + ".vat.dbf", "rb").read()
+
+    records, headSize, size = struct.unpack("<IHH", dbf[4:12])
+    names = [dbf[32 + 32 * i:43 + 32 * i].rstrip(b"\0") for i in range(3)]
+    rows = [dbf[headSize + size * i:headSize + size * (i + 1)] for i in range(records)]
+
+    assert names == [b"Value", b"Count", b"MUKEY"]
+    assert dbf[-1:] == b"\x1a" and len(dbf) == headSize + size * records + 1
+    assert [(int(r[1:12]), int(r[12:30]), r[30:].strip().decode("ascii")) for r in rows] == \
+        [(v, n, str(v)) for v, n in zip(summary.values.tolist(), summary.counts.tolist())]
+
+
+def test_reader_windows(written):
+    values, grid, path, summary = written
+    reader = mu_tiff.TiffReader(path, cacheTiles=3)
+
+    assert reader.shape == values.shape
+    assert reader.grid.asTuple() == grid.asTuple()
+    assert reader.epsg == 26915
+
+    rng = np.random.RandomState(4)
+
+    for i in range(50):
+        r, c = rng.randint(0, 300), rng.randint(0, 451)
+        h, w = rng.randint(1, 301 - r), rng.randint(1, 452 - c)
+        assert (reader.read(r, c, h, w) == values[r:r + h, c:c + w]).all()
+
+    assert len(reader.cache) <= 3
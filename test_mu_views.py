@@ -0,0 +1,169 @@
+#-------------------------------------------------------------------------------
+# Name:        test_mu_views
+# Purpose:     mu_views attribute lookups by mukey, windowed views over an
+#              array and a mu_tiff GeoTIFF, edge windows, and the VRT over
+#              the mukey GeoTIFF.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+import pytest
+
+import mu_raster, mu_tiff, mu_views
+
+
+MUKEYS = [101, 2002, 30003, 7, 45]
+
+
+def table():
+    # RootZnAWS with a NULL for 30003, and mukey 45 that is not in the raster
+    return mu_views.AttributeTable(MUKEYS, {"RootZnAWS": np.array([120.5, 88.0, np.nan, 210.25, 3.0]), "Droughty": np.array([0.0, 1.0, 1.0, 0.0, 1.0])})
+
+
+@pytest.fixture
+def raster(tmp_path, monkeypatch):
+    monkeypatch.setattr(mu_tiff, "TILE", 64)
+
+    rng = np.random.RandomState(9)
+    # 555 is a mukey the table lacks
+    values = rng.choice([mu_raster.NODATA, 101, 2002, 30003, 7, 555], size=(150, 203)).astype(np.int32)
+    grid = mu_raster.Grid(400000.0, 4600000.0, 30.0, 150, 203)
+    path = str(tmp_path / "mukey.tif")
+    mu_tiff.writeGeoTIFF(values, grid, path, 5070)
+
+    return values, grid, path
+
+
+def expected(values, name, r, c, h, w):
+    # the attribute of every cell of a window, NODATA outside the raster,
+    # for no mukey, for mukeys the table lacks and for NULL values
+    tab = table()
+    byKey = dict(zip(MUKEYS, tab.columns[name].tolist()))
+    out = np.full((h, w), mu_views.NODATA)
+
+    for i in range(h):
+        for j in range(w):
+            if 0 <= r + i < values.shape[0] and 0 <= c + j < values.shape[1]:
+                v = byKey.get(int(values[r + i, c + j]), np.nan)
+                out[i, j] = mu_views.NODATA if np.isnan(v) else v
+
+    return out.astype(np.float32)
+
+
+def test_table_lookup():
+    tab = table()
+
+    assert tab.names() == ["Droughty", "RootZnAWS"]
+    assert len(tab.index) == 30005 and tab.index[30003] == 2 and tab.index[8] == 5
+
+    keys = [7, 101, 30003, 45, 8, 0, 999999, -1]
+    assert tab.value("RootZnAWS", keys).tolist() == [210.25, 120.5, mu_views.NODATA, 3.0] + [mu_views.NODATA] * 4
+    assert tab.value("Droughty", np.array([[2002, 9]]), nodata=-1).tolist() == [[1.0, -1.0]]
+    assert tab.lut("RootZnAWS").tolist() == [120.5, 88.0, mu_views.NODATA, 210.25, 3.0, mu_views.NODATA]
+
+    empty = mu_views.AttributeTable([], {"RootZnAWS": np.array([])})
+    assert empty.value("RootZnAWS", [0, 5]).tolist() == [mu_views.NODATA] * 2
+
+
+def test_windows(raster):
+    values, grid, path = raster
+    sources = [mu_views.openMukeys(values, grid), mu_views.openMukeys(path)]
+
+    assert isinstance(sources[1], mu_views.TiffSource)
+    assert sources[1].grid.asTuple() == grid.asTuple()
+
+    rng = np.random.RandomState(10)
+
+    for source in sources:
+        view = mu_views.AttributeView(source, table(), "RootZnAWS")
+
+        for i in range(30):
+            r, c = rng.randint(-20, 160), rng.randint(-20, 213)
+            h, w = rng.randint(1, 90), rng.randint(1, 90)
+
+            assert (view.read(r, c, h, w) == expected(values, "RootZnAWS", r, c, h, w)).all()
+
+
+def test_edges(raster):
+    values, grid, path = raster
+
+    for source in (mu_views.ArraySource(values, grid), mu_views.TiffSource(path)):
+        # past the last tile, across the corner, and wholly outside
+        assert (source.read(140, 190, 20, 80)[:10, :13] == values[140:, 190:]).all()
+        assert (source.read(140, 190, 20, 80)[10:] == mu_raster.NODATA).all()
+        assert (source.read(140, 190, 20, 80)[:, 13:] == mu_raster.NODATA).all()
+        assert (source.read(-3, -4, 6, 8)[3:, 4:] == values[:3, :4]).all()
+        assert (source.read(-3, -4, 6, 8)[:3] == mu_raster.NODATA).all()
+        assert (source.read(150, 0, 5, 5) == mu_raster.NODATA).all()
+        assert source.read(-10, 300, 4, 6).shape == (4, 6)
+
+        # slices are clipped to the raster like numpy's
+        view = mu_views.AttributeView(source, table(), "Droughty")
+        assert view[140:400, 190:].shape == (10, 13)
+        assert (view[140:400, 190:] == expected(values, "Droughty", 140, 190, 10, 13)).all()
+        assert view[-5:, :3].shape == (5, 3)
+        assert view[200:300, 0:10].shape == (0, 10)
+
+        with pytest.raises(ValueError):
+            view[::2, :]
+
+
+def test_blocks(raster):
+    values, grid, path = raster
+    view = mu_views.attributeViews(path, table())["RootZnAWS"]
+    out = np.zeros(values.shape, dtype=np.float32)
+
+    for r, c, block in view.blocks(64):
+        out[r:r + block.shape[0], c:c + block.shape[1]] = block
+
+    assert (out == expected(values, "RootZnAWS", 0, 0, 150, 203)).all()
+
+
+def test_vrt(raster, tmp_path):
+    values, grid, path = raster
+    view = mu_views.AttributeView(mu_views.TiffSource(path), table(), "RootZnAWS")
+    vrtPath = str(tmp_path / "RootZnAWS.vrt")
+
+    view.writeVRT(vrtPath, mukeys=np.unique(values))
+
+    root = ET.parse(vrtPath).getroot()
+    band = root.find("VRTRasterBand")
+    src = band.find("ComplexSource")
+
+    assert (root.get("rasterXSize"), root.get("rasterYSize")) == ("203", "150")
+    assert root.find("SRS").text == "EPSG:5070"
+    assert [float(v) for v in root.find("GeoTransform").text.split(",")] == [400000.0, 30.0, 0.0, 4600000.0, 0.0, -30.0]
+    assert band.get("band") == "1" and band.find("Description").text == "RootZnAWS"
+    assert float(band.find("NoDataValue").text) == mu_views.NODATA
+
+    # the mukey GeoTIFF next to the VRT, its first band
+    assert src.find("SourceFilename").get("relativeToVRT") == "1"
+    assert src.find("SourceFilename").text == "mukey.tif"
+    assert src.find("SourceBand").text == "1"
+    assert int(src.find("NODATA").text) == mu_raster.NODATA
+
+    # one LUT entry per mukey in the raster; 555 and the NULL are NODATA
+    lut = [entry.split(":") for entry in src.find("LUT").text.split(",")]
+    assert [(int(k), float(v)) for k, v in lut] == [(7, 210.25), (101, 120.5), (555, mu_views.NODATA), (2002, 88.0), (30003, mu_views.NODATA)]
+
+    # elsewhere the source is an absolute path
+    os.mkdir(str(tmp_path / "views"))
+    view.writeVRT(str(tmp_path / "views" / "RootZnAWS.vrt"))
+    src = ET.parse(str(tmp_path / "views" / "RootZnAWS.vrt")).getroot().find("VRTRasterBand/ComplexSource")
+
+    assert src.find("SourceFilename").get("relativeToVRT") == "0"
+    assert src.find("SourceFilename").text == os.path.abspath(path)
+    assert [int(e.split(":")[0]) for e in src.find("LUT").text.split(",")] == sorted(MUKEYS)
+
+
+def test_vrt_needs_tiff(raster, tmp_path):
+    values, grid, path = raster
+    view = mu_views.AttributeView(mu_views.ArraySource(values, grid), table(), "RootZnAWS")
+
+    with pytest.raises(ValueError):
+        view.writeVRT(str(tmp_path / "RootZnAWS.vrt"))
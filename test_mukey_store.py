@@ -0,0 +1,199 @@
+#-------------------------------------------------------------------------------
+# Name:        test_mukey_store
+# Purpose:     mukey_store rows by map unit, fetch sending SDA only the
+#              missing mukeys, and the SSURGO version and query signature
+#              stamps, against a stand-in for the tool's tabRequest.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import pytest
+
+import mukey_store, sda_cache, sda_chunk
+
+
+NAMES = ["mukey", "compname", "comppct_r"]
+INFO = ["ColumnOrdinal=0,ColumnSize=4,NumericPrecision=10,NumericScale=255,ProviderType=Int,IsLong=False,DataTypeName=int",
+        "ColumnOrdinal=1,ColumnSize=60,NumericPrecision=255,NumericScale=255,ProviderType=VarChar,IsLong=False,DataTypeName=varchar",
+        "ColumnOrdinal=2,ColumnSize=2,NumericPrecision=5,NumericScale=255,ProviderType=SmallInt,IsLong=False,DataTypeName=smallint"]
+
+COMPNAMES = ["Clarion", "nicollet", "Webster", "Canisteo", "Okoboji"]
+
+
+def compQry(keys):
+    return """SELECT mukey, compname, comppct_r FROM component
+        WHERE mukey IN (""" + ",".join(keys) + """)
+        ORDER BY compname, comppct_r DESC"""
+
+
+def rows(keys):
+    # two components per map unit; map units divisible by 7 have none
+    found = list()
+
+    for k in keys:
+        if int(k) % 7:
+            found.append([k, COMPNAMES[int(k) % 5], str(int(k) % 50 + 40)])
+            found.append([k, COMPNAMES[int(k) % 3], str(int(k) % 40)])
+
+    return found
+
+
+def sdaOrder(table):
+    # ORDER BY compname, comppct_r DESC as SQL Server sorts: case blind,
+    # numbers as numbers
+    return sorted(table, key=lambda r: (r[1].lower(), -int(r[2])))
+
+
+class StandIn(object):
+    # tabRequest over a fake SDA, recording the mukeys of every request
+    def __init__(self):
+        self.calls = list()
+        self.fail = False
+
+    def __call__(self, qry, name):
+        keys = qry.split("IN (")[1].split(")")[0].split(",")
+        self.calls.append(keys)
+
+        if self.fail:
+            return False, "HTTP Error 500: Internal Server Error", None
+
+        table = sdaOrder(rows(keys))
+
+        if not table:
+            # SDA leaves the Table out when no rows match
+            return True, "Successfully collected " + name, dict()
+
+        return True, "Successfully collected " + name, dict(Table=[NAMES, INFO] + table)
+
+
+def keyRange(a, b):
+    return [str(k) for k in range(a, b)]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # a fresh store per test, no resume journal
+    monkeypatch.setattr(mukey_store, "STORE_PATH", str(tmp_path / "store" / "mukey_store.sqlite"))
+    monkeypatch.setattr(mukey_store, "_store", None)
+    monkeypatch.setattr(sda_cache, "ssurgoVersion", lambda: "2025-09-01")
+    monkeypatch.setattr(sda_chunk, "JOURNAL_PATH", "")
+    monkeypatch.setattr(sda_chunk, "_journal", None)
+    monkeypatch.setattr(sda_chunk, "_sizers", dict())
+
+    return mukey_store.getStore()
+
+
+def test_put_table(store):
+    keys = ["101", "102", "105", "140"]
+    table = [NAMES, INFO] + rows(keys)
+
+    assert store.missing("Comp", "v1", keys) == keys
+    assert store.table("Comp", "v1", keys) is None
+    assert store.put("Comp", "v1", table, keys)
+
+    # 140 had no rows and is stored empty, 999 was never asked for
+    assert store.missing("Comp", "v1", ["999", "140", "101"]) == ["999"]
+    assert store.missing("Comp", "v2", keys) == keys
+    assert store.missing("Other", "v1", keys) == keys
+
+    # rows come back in the order of the keys asked for
+    assert store.table("Comp", "v1", ["105", "999", "140", "101"]) == [NAMES, INFO] + rows(["105"]) + rows(["101"])
+
+    # a table without a mukey column is not stored
+    assert not store.put("Comp", "v1", [["cokey"], ["ColumnOrdinal=0"], ["1"]], ["103"])
+    assert store.missing("Comp", "v1", ["103"]) == ["103"]
+
+    store.putEmpty("Comp", "v1", ["103", 104])
+    assert store.missing("Comp", "v1", ["103", "104"]) == []
+    assert store.table("Comp", "v1", ["103", "104"]) == [NAMES, INFO]
+
+
+def test_many_keys(store):
+    # more keys than one IN list takes
+    keys = keyRange(1000, 2300)
+    store.put("Comp", "v1", [NAMES, INFO] + rows(keys[::2]), keys[::2])
+
+    assert store.missing("Comp", "v1", keys) == keys[1::2]
+    assert store.table("Comp", "v1", keys)[2:] == rows(keys[::2])
+
+
+def test_fetch_missing_only(store):
+    request = StandIn()
+    first = keyRange(1000, 1020)
+    second = keyRange(1010, 1030)
+
+    logic, msg, data = mukey_store.fetch("Comp", compQry, first, request)
+
+    assert logic and request.calls == [first]
+    assert data["Table"] == [NAMES, INFO] + sdaOrder(rows(first))
+    assert msg == "Successfully collected Comp (0 of 20 map units from local store)"
+
+    # only the new mukeys go to SDA; the merged rows are in ORDER BY order,
+    # as one request for every key would give them
+    logic, msg, data = mukey_store.fetch("Comp", compQry, second, request)
+
+    assert logic and request.calls[1:] == [keyRange(1020, 1030)]
+    assert data["Table"] == StandIn()(compQry(second), "Comp")[2]["Table"]
+    assert msg.endswith("(10 of 20 map units from local store)")
+
+    # map units without rows (1015, 1022) are not asked for again
+    logic, msg, data = mukey_store.fetch("Comp", compQry, ["1015", "1022", "1002"], request)
+
+    assert len(request.calls) == 2
+    assert data["Table"] == [NAMES, INFO] + sdaOrder(rows(["1002"]))
+
+    logic, msg, data = mukey_store.fetch("Comp", compQry, ["1015", "1022"], request)
+
+    assert (logic, data) == (True, dict())
+
+
+def test_fetch_failure_keeps_rows(store):
+    request = StandIn()
+    mukey_store.fetch("Comp", compQry, keyRange(1000, 1010), request)
+
+    request.fail = True
+    logic, msg, data = mukey_store.fetch("Comp", compQry, keyRange(1005, 1015), request)
+
+    assert not logic and request.calls[-1] == keyRange(1010, 1015)
+    assert store.missing("Comp", "2025-09-01:" + mukey_store.querySignature(compQry), keyRange(1000, 1015)) == keyRange(1010, 1015)
+
+
+def test_stamp(store, monkeypatch):
+    request = StandIn()
+    keys = keyRange(1000, 1010)
+    mukey_store.fetch("Comp", compQry, keys, request)
+    mukey_store.fetch("Comp", compQry, keys, request)
+
+    assert len(request.calls) == 1
+
+    # a new SSURGO release
+    monkeypatch.setattr(sda_cache, "ssurgoVersion", lambda: "2026-10-01")
+    mukey_store.fetch("Comp", compQry, keys, request)
+
+    assert request.calls[1:] == [keys]
+
+    # an edited query
+    def editedQry(keys):
+        return compQry(keys).replace("comppct_r FROM", "comppct_r AS comppct_r FROM")
+
+    assert mukey_store.querySignature(editedQry) != mukey_store.querySignature(compQry)
+    assert mukey_store.querySignature(lambda keys: "  " + compQry(keys).replace("\n", "\n  ")) == mukey_store.querySignature(compQry)
+
+    mukey_store.fetch("Comp", editedQry, keys, request)
+
+    assert request.calls[2:] == [keys]
+
+
+def test_store_off(monkeypatch, store):
+    monkeypatch.setattr(mukey_store, "STORE_PATH", "")
+    monkeypatch.setattr(mukey_store, "_store", None)
+    request = StandIn()
+    keys = keyRange(1000, 1010)
+
+    assert mukey_store.getStore() is None
+
+    for i in range(2):
+        logic, msg, data = mukey_store.fetch("Comp", compQry, keys, request)
+        assert data["Table"] == [NAMES, INFO] + sdaOrder(rows(keys))
+
+    assert request.calls == [keys, keys]
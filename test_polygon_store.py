@@ -0,0 +1,106 @@
+#-------------------------------------------------------------------------------
+# Name:        test_polygon_store
+# Purpose:     polygon_store envelope queries against a scan of the stored
+#              boxes, duplicate polygons, covered cells and the saverest
+#              refresh.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+import polygon_store, sda_cache, sda_client
+
+
+def store(tmp_path):
+    return polygon_store.PolygonStore(str(tmp_path / "store.sqlite"))
+
+
+def square(x0, y0, size):
+    return "POLYGON ((%r %r, %r %r, %r %r, %r %r, %r %r))" % (x0, y0, x0 + size, y0, x0 + size, y0 + size, x0, y0 + size, x0, y0)
+
+
+def randomRows(seed, n, areasymbol="IA169", first=10000):
+    rng = np.random.RandomState(seed)
+    rows = list()
+
+    for i in range(n):
+        x, y = rng.uniform(-94.0, -93.0), rng.uniform(41.0, 42.0)
+        rows.append((str(first + i), str(rng.randint(1, 50)), areasymbol, square(float(x), float(y), float(rng.uniform(0.001, 0.05)))))
+
+    return rows
+
+
+def test_bounds():
+    wkt = "MULTIPOLYGON (((-93.1 41.5, -93.0 41.5, -93.0 41.6, -93.1 41.5)),((-92.9 41.4, -92.8 41.5, -92.8 41.6, -92.9 41.4)))"
+
+    assert polygon_store.wktBounds(wkt) == (-93.1, 41.4, -92.8, 41.6)
+
+
+def test_query(tmp_path):
+    s = store(tmp_path)
+    rows = randomRows(7, 500)
+
+    assert s.put(rows) == 500
+
+    boxes = [polygon_store.wktBounds(r[3]) for r in rows]
+    rng = np.random.RandomState(8)
+
+    for i in range(100):
+        x, y = rng.uniform(-94.1, -93.0), rng.uniform(40.9, 42.0)
+        env = (x, y, x + rng.uniform(0, 0.2), y + rng.uniform(0, 0.2))
+
+        # every box meeting the envelope, in the order the rows were put
+        expected = [(r[1], r[3]) for r, b in zip(rows, boxes) if b[2] >= env[0] and b[0] <= env[2] and b[3] >= env[1] and b[1] <= env[3]]
+
+        assert s.query(*env) == expected
+
+
+def test_duplicates_ignored(tmp_path):
+    s = store(tmp_path)
+    rows = randomRows(7, 20)
+
+    assert s.put(rows[:15]) == 15
+    assert s.put(rows[10:]) == 5
+    assert len(s.query(-180, -90, 180, 90)) == 20
+
+
+def test_refresh(tmp_path):
+    s = store(tmp_path)
+    s.refresh({"IA169": "2025-09-01 00:00:00", "IA015": "2025-09-01 00:00:00"})
+    s.put(randomRows(1, 30, "IA169") + randomRows(2, 30, "IA015", 20000))
+    s.cover("a", ["IA169"])
+    s.cover("b", ["IA015"])
+    s.cover("c", ["IA015", "IA169"])
+
+    # stamps survive a new connection
+    s = store(tmp_path)
+    assert s.refresh({"IA169": "2025-09-01 00:00:00", "IA015": "2025-09-01 00:00:00"}) == 0
+    assert s.covered(["a", "b", "c", "d"]) == set(["a", "b", "c"])
+
+    # IA169 was updated: its polygons and every cell holding one are dropped
+    assert s.refresh({"IA169": "2026-10-01 00:00:00", "IA015": "2025-09-01 00:00:00"}) == 1
+    assert s.covered(["a", "b", "c"]) == set(["b"])
+    assert len(s.query(-180, -90, 180, 90)) == 30
+    assert s.conn.execute("SELECT COUNT(*) FROM polyindex").fetchone()[0] == 30
+
+    # fetched again under the new saverest
+    assert s.put(randomRows(1, 30, "IA169")) == 30
+    assert s.refresh({"IA169": "2026-10-01 00:00:00", "IA015": "2025-09-01 00:00:00"}) == 0
+
+
+def test_survey_versions(monkeypatch):
+    class Client(object):
+        def __init__(self):
+            self.requests = list()
+
+        def postJSON(self, url, request):
+            self.requests.append(request)
+            return {"Table": [["IA169", "2026-10-01 00:00:00"], ["IA015", "2025-09-01 00:00:00"]]}
+
+    client = Client()
+    monkeypatch.setattr(sda_cache, "getCache", lambda: None)
+    monkeypatch.setattr(sda_client, "getClient", lambda: client)
+
+    assert polygon_store.surveyVersions("http://sda") == {"IA169": "2026-10-01 00:00:00", "IA015": "2025-09-01 00:00:00"}
+    assert client.requests == [{"format": "JSON", "query": polygon_store.surveyQuery}]
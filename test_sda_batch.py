@@ -0,0 +1,303 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_batch
+# Purpose:     The batch script of sda_batch against the four queries it
+#              replaces, on a small SSURGO database in SQLite (T-SQL turned
+#              into SQLite statements by test_sda_bulk.tsql), and fetch()
+#              against mukey_store.fetch for the order of the rows.
+#
+#              The original query text and the batch prelude and tails are
+#              read from get_WS_bndry, a Python 2 arcpy script.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re, random, sqlite3
+
+import pytest
+
+import sda_batch, sda_cache, sda_chunk, mukey_store
+
+from test_sda_bulk import tsql, sdaResponse, cells
+
+
+schema = """
+CREATE TABLE sacatalog (areasymbol TEXT COLLATE NOCASE, saverest TEXT);
+CREATE TABLE legend (lkey INTEGER, areasymbol TEXT COLLATE NOCASE, areaname TEXT COLLATE NOCASE);
+CREATE TABLE mapunit (lkey INTEGER, mukey INTEGER, musym TEXT COLLATE NOCASE, nationalmusym TEXT COLLATE NOCASE, muname TEXT COLLATE NOCASE, mukind TEXT COLLATE NOCASE, muacres INTEGER);
+CREATE TABLE muaggatt (mukey INTEGER, aws025wta REAL, aws050wta REAL, aws0100wta REAL, aws0150wta REAL, brockdepmin INTEGER);
+CREATE TABLE component (mukey INTEGER, cokey INTEGER, compname TEXT COLLATE NOCASE, compkind TEXT COLLATE NOCASE, comppct_r INTEGER, majcompflag TEXT COLLATE NOCASE,
+    hydricrating TEXT COLLATE NOCASE, localphase TEXT COLLATE NOCASE, drainagecl TEXT COLLATE NOCASE, slope_l REAL, slope_r REAL, slope_h REAL);
+CREATE TABLE corestrictions (cokey INTEGER, corestrictkey INTEGER, reskind TEXT COLLATE NOCASE, resdept_r INTEGER);
+CREATE TABLE chorizon (cokey INTEGER, chkey INTEGER, hzname TEXT COLLATE NOCASE, hzdept_r INTEGER, hzdepb_r INTEGER, ph1to1h2o_r REAL, ec_r REAL,
+    sandtotal_r REAL, silttotal_r REAL, claytotal_r REAL, dbthirdbar_r REAL, om_r REAL, awc_r REAL);
+CREATE TABLE chfrags (chkey INTEGER, fragvol_r INTEGER);
+CREATE TABLE chtexturegrp (chkey INTEGER, chtgkey INTEGER, texture TEXT COLLATE NOCASE, rvindicator TEXT COLLATE NOCASE);
+"""
+
+
+def ssurgo(seed, nMu):
+    # SQLite database with nMu random map units in three survey areas, one
+    # of them missing from sacatalog, some map units without muaggatt
+    R = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(schema)
+
+    for lkey, areasymbol in [(1, "IA169"), (2, "IA015"), (3, "IA079")]:
+        conn.execute("INSERT INTO legend VALUES (?, ?, ?)", (lkey, areasymbol, areasymbol + " County, Iowa"))
+
+        if areasymbol != "IA079":
+            conn.execute("INSERT INTO sacatalog VALUES (?, '2025-09-01')", (areasymbol,))
+
+    def maybe(v, p=0.1):
+        return None if R.random() < p else v
+
+    names = ["Clarion", "Nicollet", "Webster", "Canisteo", "Harps", "Okoboji", "Water", "Pits, gravel"]
+    kinds = ["Lithic bedrock", "Paralithic bedrock", "Densic bedrock", "Fragipan", "Duripan", "Sulfuric", "Abrupt textural change",
+             "bedrock, lithic", "bedrock, paralithic", "duripan", "fragipan"]
+    keys = list()
+    cokey = 400000
+    chkey = 900000
+    key = 0
+
+    for m in range(nMu):
+        mukey = 100000 + m * 3
+        keys.append(str(mukey))
+        muname = "Water" if R.random() < 0.05 else R.choice(names[:6]) + " loam, 2 to 5 percent slopes"
+        conn.execute("INSERT INTO mapunit VALUES (?, ?, ?, ?, ?, ?, ?)", (R.choice([1, 1, 2, 3]), mukey, str(m), "abc" + str(m), muname, R.choice(["Consociation", "Complex"]), R.randint(1, 900)))
+
+        if R.random() < 0.9:
+            aws = sorted(round(R.uniform(1, 30), 2) for i in range(4))
+            conn.execute("INSERT INTO muaggatt VALUES (?, ?, ?, ?, ?, ?)", (mukey, aws[0], aws[1], aws[2], maybe(aws[3]), maybe(R.choice([50, 100, 200]), 0.5)))
+
+        for c in range(R.choice([0, 1, 2, 2, 3, 4])):
+            cokey += R.choice([1, 2, 5])
+            name = R.choice(names)
+            kind = R.choice(["Series", "Taxadjunct", "Miscellaneous area", None]) if name in ("Water", "Pits, gravel") else R.choice(["Series", "Taxadjunct", None])
+            conn.execute("INSERT INTO component VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (mukey, cokey, name, kind, R.choice([None, 5, 10, 40, 55, 85]), R.choice(["Yes", "Yes", "No"]),
+                R.choice(["Yes", "No", "Unranked", None]), maybe(R.choice(["drained", "channeled", "rarely flooded", "ponded", "eroded"]), 0.4), R.choice(["Poorly drained", "Well drained"]), 1, 3, 5))
+
+            for r in range(R.choice([0, 0, 1, 2])):
+                key += 1
+                conn.execute("INSERT INTO corestrictions VALUES (?, ?, ?, ?)", (cokey, key, R.choice(kinds), maybe(R.choice([30, 50, 75, 100, 140]))))
+
+            top = 0
+
+            for h in range(R.choice([0, 1, 3, 4, 5])):
+                chkey += R.choice([1, 3])
+                bot = top + R.choice([5, 10, 18, 25, 40, 60])
+                conn.execute("INSERT INTO chorizon VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (cokey, chkey, R.choice(["Oa", "Ap", "A", "Bt", "Bw", "C", "Cr", None]), maybe(top, 0.03), maybe(bot, 0.03),
+                    maybe(round(R.uniform(3.0, 8.5), 1)), maybe(R.choice([0, 2, 8, 20])), maybe(round(R.uniform(5, 80), 1)), maybe(round(R.uniform(5, 60), 1)), maybe(round(R.uniform(5, 45), 1)),
+                    maybe(round(R.uniform(1.1, 1.9), 2)), maybe(round(R.uniform(0, 8), 2), 0.15), maybe(round(R.uniform(0.05, 0.25), 2), 0.15)))
+
+                for f in range(R.choice([0, 1, 2])):
+                    conn.execute("INSERT INTO chfrags VALUES (?, ?)", (chkey, maybe(R.choice([2, 5, 15]))))
+
+                for g in range(R.choice([0, 1, 1, 2])):
+                    key += 1
+                    conn.execute("INSERT INTO chtexturegrp VALUES (?, ?, ?, ?)", (chkey, key, R.choice(["L", "SIL", "CL", "SPM", "MUCK", "BR"]), "Yes" if g == 0 else "No"))
+
+                top = bot
+
+    conn.commit()
+
+    return conn, keys
+
+
+def results(conn, script):
+    # (column names, rows) of every result set of a script, run on a copy of
+    # the database so its temporary tables go with it
+    copy = sqlite3.connect(":memory:")
+    conn.backup(copy)
+    cur = copy.cursor()
+    found = list()
+
+    for stmt in tsql(script):
+        cur.execute(stmt)
+
+        if cur.description:
+            found.append(([d[0] for d in cur.description], [list(row) for row in cur.fetchall()]))
+
+    copy.close()
+
+    return found
+
+
+def _queries():
+    # the query builders of get_WS_bndry the batch covers, with mainQry and the tails
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "get_WS_bndry.py")
+    src = open(path).read()
+    ns = dict()
+
+    for name in ["mainQry", "rootZnDepTail", "rootZnDepQry", "rootZnAwsDrtTail", "rootZnAwsDrtQry", "potWetTail", "potWetQry", "socTail", "socQry"]:
+        m = re.search(r"^def " + name + r"\(.*?(?=^def )", src, flags=re.M | re.S)
+        exec(m.group(0), ns)
+
+    return ns
+
+
+def products():
+    # batchProducts of get_WS_bndry
+    ns = _queries()
+
+    return [(name, ns[qry], ns[tail]) for name, qry, tail in [("Root Zone Depth", "rootZnDepQry", "rootZnDepTail"),
+                                                              ("Root Zone AWS & Drought", "rootZnAwsDrtQry", "rootZnAwsDrtTail"),
+                                                              ("Potential Wetland", "potWetQry", "potWetTail"),
+                                                              ("SOC", "socQry", "socTail")]]
+
+
+def rowSet(rows):
+    key = lambda row: [(v is not None, str(v)) for v in row]
+
+    return sorted(cells(rows), key=key)
+
+
+@pytest.fixture(scope="module")
+def database():
+    return ssurgo(5, 120)
+
+
+@pytest.fixture(scope="module")
+def single(database):
+    # each product's own query: (column names, rows)
+    conn, keys = database
+
+    return [results(conn, qry(keys))[-1] for name, qry, tail in products()]
+
+
+def test_single_query_sql():
+    # the single queries build their own #main, not the batch's
+    ns = _queries()
+
+    for name, qry, tail in products():
+        assert not "catsymbol" in qry(["1"]) and not "aggkey" in qry(["1"])
+        assert not ns["mainQry"](["1"]) in qry(["1"])
+
+    assert not "#main" in ns["potWetQry"](["1"]).replace("#main_query", "")
+
+
+def test_tail_matches_query(database, single):
+    # mainQry + tail gives the rows of the product's own query
+    conn, keys = database
+    ns = _queries()
+
+    for (name, qry, tail), (names, rows) in zip(products(), single):
+        newNames, newRows = results(conn, ns["mainQry"](keys) + tail())[-1]
+
+        assert [n.lower() for n in newNames] == [n.lower() for n in names]
+        assert len(rows) > 20
+        assert rowSet(newRows) == rowSet(rows)
+
+
+def test_survey_area_filters(database, single):
+    # map units outside sacatalog or muaggatt are in the shared #main, and
+    # still left out where the single query's own #main left them out
+    conn, keys = database
+    ns = _queries()
+    main = results(conn, ns["mainQry"](keys) + "\n    SELECT mukey, catsymbol, aggkey FROM #main")[-1][1]
+
+    assert len(main) == len(keys)
+    assert [r for r in main if r[1] is None] and [r for r in main if r[2] is None]
+
+    rootZnDep = single[0][1]
+    assert len(rootZnDep) < len(keys)
+
+
+def test_compose(database, single):
+    conn, keys = database
+    ns = _queries()
+    script = sda_batch.compose(keys, ns["mainQry"], [p[2] for p in products()])
+    sets = results(conn, script)
+
+    assert script.count("INTO #main\n") == 1
+    assert len(sets) == 4
+
+    for (names, rows), (newNames, newRows) in zip(single, sets):
+        assert [n.lower() for n in newNames] == [n.lower() for n in names]
+        assert rowSet(newRows) == rowSet(rows)
+
+    # split gives each product its own result set as a single query response
+    response = dict()
+
+    for i, (names, rows) in enumerate(sets):
+        response[sda_batch.tableKey(i)] = sdaResponse(names, rows)["Table"]
+
+    out = sda_batch.split((True, "Successfully collected " + sda_batch.NAME, response), [p[0] for p in products()])
+
+    for (name, qry, tail), (names, rows) in zip(products(), single):
+        logic, msg, data = out[name]
+
+        assert logic and msg == "Successfully collected " + name
+        assert rowSet(data["Table"][2:]) == rowSet(sdaResponse(names, rows)["Table"][2:])
+
+
+def test_private_tables():
+    tail = "SELECT * INTO #acpf FROM #main JOIN #main_query ON #main.mukey = #main_query.mukey\n    SELECT * FROM #acpf2, #mainx WHERE x = '#main'"
+
+    assert sda_batch.privateTables(tail, "b1_") == \
+        "SELECT * INTO #b1_acpf FROM #main JOIN #b1_main_query ON #main.mukey = #b1_main_query.mukey\n    SELECT * FROM #b1_acpf2, #b1_mainx WHERE x = '#main'"
+
+    # the same private table in two tails does not collide
+    script = sda_batch.compose(["1"], lambda keys: "SELECT 1 AS mukey INTO #main\n", [lambda: "SELECT * INTO #acpf FROM #main", lambda: "SELECT * INTO #acpf FROM #main"])
+
+    assert "#b0_acpf" in script and "#b1_acpf" in script and not "#acpf" in script
+
+
+def test_split_failure():
+    res = (False, "SDA error", None)
+
+    assert sda_batch.split(res, ["A", "B"]) == {"A": res, "B": res}
+
+    # a result set SDA did not send is an empty table
+    out = sda_batch.split((True, "Successfully collected " + sda_batch.NAME, {"Table1": [["mukey"], ["info"], ["1"]]}), ["A", "B"])
+
+    assert out["A"] == (True, "Successfully collected A", dict())
+    assert out["B"] == (True, "Successfully collected B", {"Table": [["mukey"], ["info"], ["1"]]})
+
+
+def test_fetch_order(monkeypatch, tmp_path):
+    # rows come back in each product's ORDER BY, as mukey_store.fetch gives them
+    rows = dict((k, [k, str(v)]) for k, v in zip(["3", "1", "2", "5", "4"], [20, 50, 10, 40, 30]))
+    info = ["ColumnOrdinal=0,ProviderType=VarChar", "ColumnOrdinal=1,ProviderType=Int"]
+
+    def prelude(keys):
+        return "SELECT mukey INTO #main FROM mapunit WHERE mukey IN (" + ",".join(keys) + ")\n"
+
+    def valueQry(keys):
+        return prelude(keys) + "SELECT mukey, value FROM #main ORDER BY value DESC"
+
+    def keyQry(keys):
+        return prelude(keys) + "SELECT mukey, value FROM #main"
+
+    requests = list()
+
+    def request(qry, name):
+        # both result sets of the batch, or the one of a single query
+        keys = re.search(r"IN \(([^)]*)\)", qry).group(1).split(",")
+        table = [["mukey", "value"], info] + [rows[k] for k in keys]
+        requests.append(name)
+
+        if name == sda_batch.NAME:
+            return True, "Successfully collected " + name, {"Table": [list(r) for r in table], "Table1": [list(r) for r in table]}
+
+        return True, "Successfully collected " + name, {"Table": table}
+
+    monkeypatch.setattr(mukey_store, "STORE_PATH", str(tmp_path / "store.sqlite"))
+    monkeypatch.setattr(mukey_store, "_store", None)
+    monkeypatch.setattr(sda_cache, "ssurgoVersion", lambda: "2025-09-01")
+    monkeypatch.setattr(sda_chunk, "getJournal", lambda: None)
+
+    batch = [("By value", valueQry, lambda: "SELECT mukey, value FROM #main ORDER BY value DESC"),
+             ("By key", keyQry, lambda: "SELECT mukey, value FROM #main")]
+    keys = ["3", "1", "2", "5", "4"]
+
+    out = sda_batch.fetch(batch, prelude, keys, request)
+
+    assert [r[0] for r in out["By value"][2]["Table"][2:]] == ["1", "5", "4", "3", "2"]
+    assert [r[0] for r in out["By key"][2]["Table"][2:]] == keys
+    assert requests == [sda_batch.NAME]
+
+    # and the same rows as each product fetched on its own, from the store
+    for name, qryFunc, tail in batch:
+        assert mukey_store.fetch(name, qryFunc, keys, request)[2] == out[name][2]
+
+    assert requests == [sda_batch.NAME]
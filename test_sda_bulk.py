@@ -0,0 +1,317 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_bulk
+# Purpose:     sda_bulk.derive() against the five SDA queries it replaces.
+#
+#              The original query text is taken from get_WS_bndry (a Python 2
+#              arcpy script, so its query builders are read from the source)
+#              and run, together with sda_bulk.bulkQry, on a small SSURGO
+#              database in SQLite. tsql() turns the T-SQL of those queries
+#              into SQLite statements; text columns compare without case, as
+#              in SDA. The derived tables must hold the rows the queries
+#              return.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re, random, sqlite3
+
+import pytest
+
+import sda_bulk
+
+
+## ===================================================================================
+## T-SQL to SQLite
+
+def _close(sql, i):
+    # position of the parenthesis closing the one at i
+    depth = 0
+
+    for j in range(i, len(sql)):
+        if sql[j] == "(":
+            depth += 1
+
+        elif sql[j] == ")":
+            depth -= 1
+
+            if depth == 0:
+                return j
+
+    raise ValueError("unbalanced parentheses")
+
+
+def _depth(sql, i):
+    return sql[:i].count("(") - sql[:i].count(")")
+
+
+def _arguments(sql, i):
+    # the top level, comma separated arguments of the parenthesis at i
+    end = _close(sql, i)
+    args = list()
+    start = i + 1
+
+    for j in range(i + 1, end):
+        if sql[j] == "," and _depth(sql, j) == _depth(sql, i) + 1:
+            args.append(sql[start:j].strip())
+            start = j + 1
+
+    args.append(sql[start:end].strip())
+
+    return args, end
+
+
+def tsql(script):
+    # SQLite statements for a T-SQL script of SDA queries; SELECT ... INTO #t
+    # becomes CREATE TEMP TABLE t AS SELECT
+    sql = re.sub(r"--[^\n]*", "", script)
+    sql = re.sub(r"#(\w+)", r"tmp_\1", sql)
+    sql = re.sub(r"\bISNULL\s*\(", "IFNULL(", sql, flags=re.I)
+    sql = re.sub(r"\bCOUNT_BIG\s*\(", "COUNT(", sql, flags=re.I)
+    sql = re.sub(r"\bLEFT\s*\(\s*(\(\s*\w+\s*\)|\w+)\s*,\s*(\d+)\s*\)", r"substr(\1, 1, \2)", sql, flags=re.I)
+
+    # CONCAT (a, b, ...) joins its arguments as text, NULL as ''
+    for m in reversed(list(re.finditer(r"\bCONCAT\s*\(", sql, flags=re.I))):
+        args, end = _arguments(sql, m.end() - 1)
+        sql = sql[:m.start()] + "(" + " || ".join("IFNULL(" + a + ", '')" for a in args) + ")" + sql[end + 1:]
+
+    # CROSS APPLY (SELECT MIN(e) x FROM (VALUES (a), (b), ...) AS t(e)) A, the
+    # least of the values, becomes a correlated subquery in place of the
+    # bare column x it adds to the select list
+    for m in reversed(list(re.finditer(r"\bCROSS\s+APPLY\s*\(\s*SELECT\s+MIN\s*\(\s*(\w+)\s*\)\s+(\w+)\s+FROM\s*\(\s*VALUES\s*", sql, flags=re.I))):
+        values = re.findall(r"\(([^()]*)\)", sql[m.end():_close(sql, sql.rindex("(", m.start(), m.end()))])
+        end = _close(sql, sql.index("(", m.start()))
+        alias = re.match(r"\s*\w+", sql[end + 1:])
+        least = "(SELECT MIN(" + m.group(1) + ") FROM (" + " UNION ALL ".join("SELECT " + v + " AS " + m.group(1) for v in values) + ")) AS " + m.group(2)
+        start = [s.start() for s in re.finditer(r"\bSELECT\b", sql[:m.start()], flags=re.I) if _depth(sql, s.start()) == 0][-1]
+        head = re.sub(r"(,\s*)" + m.group(2) + r"(\s+INTO\b)", lambda x: x.group(1) + least + x.group(2), sql[start:m.start()], count=1, flags=re.I)
+        sql = sql[:start] + head + sql[end + 1 + alias.end():]
+
+    # CAST (x AS DECIMAL (p, s)) rounds to s places; from the last CAST back,
+    # so inner ones are done first
+    for m in reversed(list(re.finditer(r"\bCAST\s*\(", sql, flags=re.I))):
+        start = m.end() - 1
+        end = _close(sql, start)
+        inner = sql[start + 1:end]
+        typ = re.search(r"\bAS\s+decimal\s*\(\s*\d+\s*,\s*(\d+)\s*\)\s*$", inner, flags=re.I)
+
+        if typ:
+            sql = sql[:m.start()] + "ROUND(CAST(" + inner[:typ.start()] + " AS REAL), " + typ.group(1) + ")" + sql[end + 1:]
+
+    # (SELECT TOP 1 ...) becomes (SELECT ... LIMIT 1)
+    while True:
+        m = re.search(r"\(\s*SELECT\s+TOP\s+1\b", sql, flags=re.I)
+
+        if m is None:
+            break
+
+        end = _close(sql, m.start())
+        body = re.sub(r"\bTOP\s+1\b", "", sql[m.start() + 1:end], count=1, flags=re.I)
+        sql = sql[:m.start()] + "(" + body + " LIMIT 1)" + sql[end + 1:]
+
+    # one statement per top level SELECT
+    starts = [m.start() for m in re.finditer(r"\bSELECT\b", sql, flags=re.I) if _depth(sql, m.start()) == 0]
+    statements = list()
+
+    for a, b in zip(starts, starts[1:] + [len(sql)]):
+        stmt = sql[a:b].strip()
+        into = [m for m in re.finditer(r"\bINTO\s+(\w+)", stmt, flags=re.I) if _depth(stmt, m.start()) == 0]
+
+        if into:
+            # a table has no row order, so the ORDER BY of a SELECT INTO goes
+            order = [o for o in re.finditer(r"\bORDER\s+BY\b", stmt, flags=re.I) if _depth(stmt, o.start()) == 0]
+
+            if order:
+                stmt = stmt[:order[0].start()]
+
+            m = into[0]
+            stmt = "CREATE TEMP TABLE " + m.group(1) + " AS " + stmt[:m.start()] + stmt[m.end():]
+
+        statements.append(stmt)
+
+    return statements
+
+
+## ===================================================================================
+## SSURGO database
+
+schema = """
+CREATE TABLE legend (lkey INTEGER, areasymbol TEXT COLLATE NOCASE, areaname TEXT COLLATE NOCASE);
+CREATE TABLE mapunit (lkey INTEGER, mukey INTEGER, musym TEXT COLLATE NOCASE, nationalmusym TEXT COLLATE NOCASE, muname TEXT COLLATE NOCASE, mukind TEXT COLLATE NOCASE);
+CREATE TABLE component (mukey INTEGER, cokey INTEGER, compname TEXT COLLATE NOCASE, compkind TEXT COLLATE NOCASE, comppct_r INTEGER, majcompflag TEXT COLLATE NOCASE, taxclname TEXT COLLATE NOCASE);
+CREATE TABLE chorizon (cokey INTEGER, chkey INTEGER, hzname TEXT COLLATE NOCASE, hzdept_r INTEGER, hzdepb_r INTEGER, kffact TEXT COLLATE NOCASE, kwfact TEXT COLLATE NOCASE,
+    sandtotal_r REAL, silttotal_r REAL, claytotal_r REAL, sandvf_r REAL, dbthirdbar_r REAL, om_r REAL, ksat_r REAL, frag3to10_r INTEGER, fraggt10_r INTEGER, sieveno10_r REAL);
+CREATE TABLE chtexturegrp (chkey INTEGER, chtgkey INTEGER, texture TEXT COLLATE NOCASE, rvindicator TEXT COLLATE NOCASE);
+CREATE TABLE chtexture (chtgkey INTEGER, texcl TEXT COLLATE NOCASE, lieutex TEXT COLLATE NOCASE);
+CREATE TABLE copmgrp (cokey INTEGER, copmgrpkey INTEGER, pmgroupname TEXT COLLATE NOCASE, rvindicator TEXT COLLATE NOCASE);
+CREATE TABLE copm (copmgrpkey INTEGER, pmkind TEXT COLLATE NOCASE);
+"""
+
+
+def ssurgo(seed, nMu):
+    # SQLite database with nMu random map units, and their mukeys
+    R = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(schema)
+    conn.execute("INSERT INTO legend VALUES (1, 'IA169', 'Story County, Iowa')")
+
+    def maybe(v, p=0.1):
+        return None if R.random() < p else v
+
+    names = ["Clarion", "Nicollet", "Webster", "Canisteo", "Harps", "Okoboji", "Storden", "Coland"]
+    keys = list()
+    cokey = 400000
+    chkey = 900000
+    key = 0
+
+    for m in range(nMu):
+        mukey = 100000 + m * 3
+        keys.append(str(mukey))
+        compNames = R.sample(names, 3)
+        conn.execute("INSERT INTO mapunit VALUES (1, ?, ?, ?, ?, 'Consociation')", (mukey, str(m), "abc" + str(m), compNames[0] + " loam, 2 to 5 percent slopes"))
+
+        for c in range(R.choice([0, 1, 2, 2, 3, 4])):
+            cokey += R.choice([1, 2, 5])
+            pct = R.choice([None, 10, 40, 40, 55, 85]) if c > 0 else R.choice([40, 55, 85])
+            name = R.choice(names) if R.random() < 0.5 else compNames[c % 3]
+            conn.execute("INSERT INTO component VALUES (?, ?, ?, ?, ?, ?, ?)", (mukey, cokey, name, R.choice(["Series", "Taxadjunct", None]), pct, R.choice(["Yes", "Yes", "No"]), "Fine-loamy, mixed, mesic Typic Hapludolls"))
+
+            key += 1
+            conn.execute("INSERT INTO copmgrp VALUES (?, ?, ?, 'Yes')", (cokey, key, R.choice(["till", "loess over till", None])))
+            conn.execute("INSERT INTO copm VALUES (?, ?)", (key, R.choice(["Till", "Loess", None])))
+
+            top = 0
+
+            for h in range(R.choice([0, 1, 3, 4, 5])):
+                chkey += R.choice([1, 3])
+                bot = top + R.choice([5, 10, 18, 25, 40, 60])
+                hzname = R.choice(["Oi", "Ap", "A", "Bt", "Bw", "C", "Cr", "R", None])
+                f3 = maybe(R.choice([0, 2, 5]), 0.3)
+                f10 = maybe(R.choice([0, 1, 10]), 0.3)
+                conn.execute("INSERT INTO chorizon VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (cokey, chkey, hzname, maybe(top, 0.03), maybe(bot, 0.03), maybe(R.choice([".28", ".32", ".37"])), maybe(R.choice([".28", ".43"])),
+                    maybe(round(R.uniform(5, 80), 1)), maybe(round(R.uniform(5, 60), 1)), maybe(round(R.uniform(5, 45), 1)), maybe(round(R.uniform(0, 10), 1), 0.5),
+                    maybe(round(R.uniform(1.1, 1.7), 2)), maybe(round(R.uniform(0, 8), 2), 0.15), maybe(round(R.uniform(0.1, 90), 2), 0.2), f3, f10, maybe(round(R.uniform(60, 100), 1), 0.3)))
+
+                # an RV texture group for most horizons, now and then a second one
+                for g in range(R.choice([0, 1, 1, 1, 1, 2])):
+                    key += 1
+                    texture = R.choice(["L", "SIL", "CL", "GR-L", "SPM", "MPM", "HPM", "MUCK", "UDOM", "BR", "WB", "CB-L"])
+                    conn.execute("INSERT INTO chtexturegrp VALUES (?, ?, ?, ?)", (chkey, key, texture, "Yes" if g == 0 or R.random() < 0.3 else "No"))
+                    conn.execute("INSERT INTO chtexture VALUES (?, ?, ?)", (key, R.choice(["loam", "silt loam", "clay loam", None]), None))
+
+                top = bot if R.random() < 0.9 else top
+
+    conn.commit()
+
+    return conn, keys
+
+
+def run(conn, script):
+    # (column names, rows) of the last statement of a script, run on a copy
+    # of the database so its temporary tables go with it
+    copy = sqlite3.connect(":memory:")
+    conn.backup(copy)
+    cur = copy.cursor()
+
+    for stmt in tsql(script):
+        cur.execute(stmt)
+
+    names = [d[0] for d in cur.description]
+    rows = [list(row) for row in cur.fetchall()]
+    copy.close()
+
+    return names, rows
+
+
+def sdaResponse(names, rows):
+    # the JSON+COLUMNNAME+METADATA "Table" SDA sends: every value as text
+    info = ["ColumnOrdinal=%d,ColumnSize=30,NumericPrecision=255,NumericScale=255,ProviderType=VarChar,IsLong=False,DataTypeName=varchar" % i for i in range(len(names))]
+
+    return {"Table": [names, info] + [[None if v is None else str(v) for v in row] for row in rows]}
+
+
+def _value(v):
+    # a cell as the table writer sees it: numbers as float, other text as is
+    if v is None:
+        return None
+
+    try:
+        return round(float(v), 6)
+
+    except ValueError:
+        return v
+
+
+def cells(rows):
+    return [[_value(v) for v in row] for row in rows]
+
+
+## ===================================================================================
+
+def _queries():
+    # the original query builders of get_WS_bndry, by product name
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "get_WS_bndry.py")
+    src = open(path).read()
+    ns = dict()
+
+    for name in ["surfHorizQry", "surfTexQry", "omQry", "ksat50150Qry", "coarseFragQry"]:
+        m = re.search(r"^def " + name + r"\(.*?(?=^def )", src, flags=re.M | re.S)
+        exec(m.group(0), ns)
+
+    return dict(zip(sda_bulk.PRODUCTS, [ns["surfHorizQry"], ns["surfTexQry"], ns["omQry"], ns["ksat50150Qry"], ns["coarseFragQry"]]))
+
+
+# product: the query has an ORDER BY, rows are compared in order
+ordered = {"Surface Horizon": False, "Surface Texture": False, "Organic Matter": True, "KSat 50_150": True, "Coarse Fragments": True}
+
+
+@pytest.fixture(scope="module")
+def database():
+    return ssurgo(3, 150)
+
+
+@pytest.fixture(scope="module")
+def derived(database):
+    conn, keys = database
+    names, rows = run(conn, sda_bulk.bulkQry(keys))
+
+    return sda_bulk.derive((True, "", sdaResponse(names, rows)), "WS1")
+
+
+def test_tsql():
+    stmts = tsql("""SELECT mukey INTO #main FROM mapunit -- keys
+        SELECT CAST (om_r AS DECIMAL (5,2)) AS om, (SELECT TOP 1 c1.cokey FROM component AS c1 ORDER BY c1.comppct_r DESC) AS cokey
+        FROM #main WHERE LEFT (muname,2) = 'Cl'""")
+
+    assert stmts[0] == "CREATE TEMP TABLE tmp_main AS SELECT mukey  FROM mapunit"
+    assert "ROUND(CAST(om_r  AS REAL), 2)" in stmts[1]
+    assert "LIMIT 1)" in stmts[1] and not "TOP" in stmts[1]
+    assert "substr(muname, 1, 2)" in stmts[1]
+
+
+@pytest.mark.parametrize("product", sda_bulk.PRODUCTS)
+def test_derived_matches_query(database, derived, product):
+    conn, keys = database
+    names, rows = run(conn, _queries()[product](keys))
+    logic, msg, data = derived[product]
+    table = data["Table"]
+
+    assert logic
+    assert [n.lower() for n in table[0]] == [n.lower() for n in names]
+    assert len(table[1]) == len(names)
+
+    new = cells(table[2:])
+    old = cells(rows)
+
+    if not ordered[product]:
+        key = lambda row: [(v is not None, str(v)) for v in row]
+        new.sort(key=key)
+        old.sort(key=key)
+
+    assert len(old) > 0
+    assert new == old
+
+
+def test_failed_request_passed_on():
+    res = (False, "SDA error", None)
+
+    assert sda_bulk.derive(res, "WS1") == dict((name, res) for name in sda_bulk.PRODUCTS)
@@ -0,0 +1,185 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_cache
+# Purpose:     sda_cache keys, expiry and size-bounded eviction; cachedRows
+#              and the tabRequest of get_WS_bndry reading through it.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import os, re, socket, time, zlib
+from urllib.error import HTTPError, URLError
+
+import pytest
+
+import sda_cache, sda_client
+
+
+def cache(tmp_path, **kw):
+    return sda_cache.ResultCache(str(tmp_path / "cache.sqlite"), **kw)
+
+
+def tableSize(c):
+    return c.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+
+def test_key_ignores_formatting():
+    c = sda_cache.ResultCache.__new__(sda_cache.ResultCache)
+
+    a = c.key("SELECT mukey -- the key\n  FROM mapunit WHERE muname = 'a  b'", "json", "2026-10-01")
+    b = c.key("SELECT mukey FROM /* x */ mapunit\nWHERE muname = 'a  b'", "JSON", "2026-10-01")
+
+    assert a == b
+    assert a != c.key("SELECT mukey FROM mapunit WHERE muname = 'a b'", "JSON", "2026-10-01")
+    assert a != c.key("SELECT mukey FROM mapunit WHERE muname = 'a  b'", "JSON", "2026-11-01")
+
+
+def test_round_trip(tmp_path):
+    c = cache(tmp_path)
+    c.put("k", {"Table": [["1", "a"]]})
+
+    assert c.get("k") == {"Table": [["1", "a"]]}
+    assert zlib.decompress(c.getCompressed("k")) == b'{"Table": [["1", "a"]]}'
+    assert c.get("missing") is None
+    assert c.stats()["hits"] == 2 and c.stats()["misses"] == 1
+
+
+def test_expired_entries_deleted(tmp_path):
+    c = cache(tmp_path, ttl=10)
+    c.put("a", [1])
+    c.put("b", [2])
+    c.conn.execute("UPDATE results SET created = ?", (time.time() - 60,))
+
+    assert c.getCompressed("a") is None
+    assert c.get("b") is None
+    assert c.stats()["expired"] == 2
+    assert c.stats()["misses"] == 2
+    assert c.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+    assert c.total == 0
+
+
+def test_running_total(tmp_path):
+    c = cache(tmp_path)
+
+    for i in range(20):
+        c.put("k%d" % (i % 7), list(range(i * 10)))
+
+    assert c.total == tableSize(c)
+    assert cache(tmp_path).total == tableSize(c)
+
+
+def test_lru_eviction(tmp_path):
+    c = cache(tmp_path)
+    data = zlib.compress(b"x" * 1000)
+    c.maxBytes = 3 * len(data)
+
+    for i in range(3):
+        c.putCompressed("k%d" % i, data)
+        time.sleep(0.01)
+
+    c.getCompressed("k0")
+    c.putCompressed("k3", data)
+
+    assert c.evictions == 1
+    assert c.getCompressed("k1") is None
+    assert [c.getCompressed(k) is not None for k in ["k0", "k2", "k3"]] == [True] * 3
+    assert c.total == tableSize(c) == 3 * len(data)
+
+
+def test_other_process_stores_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(sda_cache, "RESYNC", 2)
+    a = cache(tmp_path)
+    b = cache(tmp_path)
+    data = zlib.compress(b"y" * 1000)
+    a.maxBytes = b.maxBytes = 4 * len(data)
+
+    for i in range(4):
+        b.putCompressed("b%d" % i, data)
+
+    # a's running total does not know about b's entries until it re-reads the size
+    a.putCompressed("a0", data)
+    assert a.evictions == 0
+
+    a.putCompressed("a1", data)
+    assert a.evictions == 2
+    assert a.total == tableSize(a) == 4 * len(data)
+
+
+class Client(object):
+    # postRows of a stand-in SDA: the rows of each query, or an exception
+    # raised after the first row
+    def __init__(self, tables):
+        self.tables = tables
+        self.requests = list()
+
+    def postRows(self, url, request):
+        self.requests.append(request["query"])
+        found = self.tables[request["query"]]
+
+        if isinstance(found, Exception):
+            yield ["mukey"]
+            raise found
+
+        for row in found:
+            yield row
+
+
+@pytest.fixture
+def rowsCache(tmp_path, monkeypatch):
+    c = cache(tmp_path)
+    monkeypatch.setattr(sda_cache, "getCache", lambda: c)
+    monkeypatch.setattr(sda_cache, "ssurgoVersion", lambda url=None: "2025-09-01")
+
+    return c
+
+
+def test_cached_rows(rowsCache, monkeypatch):
+    rows = [["mukey", "muname"], ["ColumnOrdinal=0", "ColumnOrdinal=1"], ["1", "Clarion"], ["2", None]]
+    client = Client({"SELECT 1": rows, "SELECT 2": [], "SELECT 3": rows})
+    monkeypatch.setattr(sda_client, "getClient", lambda: client)
+    request = lambda qry: {"format": "JSON+COLUMNNAME+METADATA", "query": qry}
+
+    assert list(sda_cache.cachedRows("http://sda", request("SELECT 1"))) == rows
+    assert list(sda_cache.cachedRows("http://sda", request("SELECT  1"))) == rows
+    assert client.requests == ["SELECT 1"]
+
+    # stored as cachedPostJSON stores a response, and the other way round
+    assert sda_cache.cachedPostJSON("http://sda", request("SELECT 1")) == {"Table": rows}
+    rowsCache.put(rowsCache.key("SELECT 4", "JSON+COLUMNNAME+METADATA", "2025-09-01"), {"Table": rows[:3]})
+    assert list(sda_cache.cachedRows("http://sda", request("SELECT 4"))) == rows[:3]
+
+    # an empty response is kept too
+    assert list(sda_cache.cachedRows("http://sda", request("SELECT 2"))) == []
+    assert list(sda_cache.cachedRows("http://sda", request("SELECT 2"))) == []
+    assert sda_cache.cachedPostJSON("http://sda", request("SELECT 2")) == dict()
+    assert client.requests == ["SELECT 1", "SELECT 2"]
+
+    # a response that was not read to the end is not stored
+    partial = sda_cache.cachedRows("http://sda", request("SELECT 3"))
+    next(partial)
+    partial.close()
+    list(sda_cache.cachedRows("http://sda", request("SELECT 3")))
+
+    assert client.requests == ["SELECT 1", "SELECT 2", "SELECT 3", "SELECT 3"]
+
+
+def tabRequest(**ns):
+    # tabRequest of get_WS_bndry, a Python 2 arcpy script
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "get_WS_bndry.py")
+    m = re.search(r"^def tabRequest\(.*?(?=^def )", open(path).read(), flags=re.M | re.S)
+    ns.update(sda_client=sda_client, sda_cache=sda_cache, socket=socket, HTTPError=HTTPError, URLError=URLError, ws="WS_070801050901")
+    exec(m.group(0), ns)
+
+    return ns["tabRequest"]
+
+
+def test_tab_request(rowsCache, monkeypatch):
+    rows = [["mukey"], ["ColumnOrdinal=0"], ["1"], ["2"]]
+    client = Client({"SELECT 1": rows, "SELECT 2": [], "SELECT 3": socket.timeout("timed out")})
+    monkeypatch.setattr(sda_client, "getClient", lambda: client)
+    request = tabRequest(errorMsg=lambda: None)
+
+    assert request("SELECT 1", "Muaggat") == (True, "Successfully collected Muaggat for 070801050901", {"Table": rows})
+    assert request("SELECT 1", "Muaggat") == (True, "Successfully collected Muaggat for 070801050901", {"Table": rows})
+    assert request("SELECT 2", "SOC") == (True, "Successfully collected SOC for 070801050901", dict())
+    assert request("SELECT 3", "AWS") == (False, "Soil Data Access timeout error", None)
+    assert client.requests == ["SELECT 1", "SELECT 2", "SELECT 3"]
@@ -0,0 +1,131 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_chunk
+# Purpose:     sda_chunk splitting, merging and ORDER BY restoration against a
+#              stand-in for the tool's tabRequest.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import pytest
+
+import sda_chunk, sda_client
+
+
+NAMES = ["mukey", "muname", "KSat50_150"]
+INFO = ["ColumnOrdinal=0,ColumnSize=4,NumericPrecision=10,NumericScale=255,ProviderType=Int,IsLong=False,DataTypeName=int",
+        "ColumnOrdinal=1,ColumnSize=240,NumericPrecision=255,NumericScale=255,ProviderType=VarChar,IsLong=False,DataTypeName=varchar",
+        "ColumnOrdinal=2,ColumnSize=8,NumericPrecision=15,NumericScale=255,ProviderType=Float,IsLong=False,DataTypeName=float"]
+
+MUNAMES = ["Clarion loam", "nicollet clay loam", "Webster clay loam", "Canisteo", None, "Okoboji silty clay loam"]
+
+
+def ksatQry(keys):
+    return """SELECT #main.mukey, #main.muname, KSat50_150 -- ORDER BY nothing
+        FROM #last_step2 RIGHT OUTER JOIN #main ON #main.mukey=#last_step2.mukey
+        WHERE #main.mukey IN (""" + ",".join(keys) + """)
+        ORDER BY #main.muname ASC, #main.mukey, KSat50_150"""
+
+
+def rows(keys):
+    return [[k, MUNAMES[int(k) % len(MUNAMES)], str(int(k) % 3 * 1.5)] for k in keys]
+
+
+class StandIn(object):
+    # tabRequest over a fake SDA that sorts like SQL Server and fails big requests
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.calls = list()
+
+    def __call__(self, qry, name):
+        keys = qry.split("IN (")[1].split(")")[0].split(",")
+        self.calls.append(keys)
+
+        if self.limit and len(keys) > self.limit:
+            return False, "HTTP Error 400: Bad Request", None
+
+        table = rows(keys)
+        table.sort(key=lambda r: (r[1] is not None, (r[1] or "").lower(), int(r[0])))
+
+        return True, "Successfully collected KSat", dict(Table=[NAMES, INFO] + table)
+
+
+@pytest.fixture(autouse=True)
+def noJournal(monkeypatch):
+    monkeypatch.setattr(sda_chunk, "JOURNAL_PATH", "")
+    monkeypatch.setattr(sda_chunk, "_sizers", dict())
+
+
+def test_order_by():
+    assert sda_chunk.orderBy(ksatQry(["1"])) == [("muname", False), ("mukey", False), ("KSat50_150", False)]
+    assert sda_chunk.orderBy("SELECT a FROM t ORDER BY b DESC, CASE WHEN c = 1 THEN 1 END, d") == [("b", True)]
+    assert sda_chunk.orderBy("SELECT a INTO #x FROM t ORDER BY a\nSELECT a FROM #x") == []
+    assert sda_chunk.orderBy("SELECT (SELECT TOP 1 b FROM u ORDER BY b) AS a FROM t") == []
+    assert sda_chunk.orderBy("SELECT a, border_r FROM t WHERE s = 'ORDER BY x' ORDER BY 2") == []
+
+
+def test_sort_rows():
+    table = [NAMES, INFO, ["10", "b", "1"], ["9", "B", "2"], ["100", None, "0"], ["9", "a", None]]
+    sda_chunk.sortRows(table, [("muname", True), ("mukey", False)])
+
+    assert [r[0] for r in table[2:]] == ["9", "10", "9", "100"]
+
+    sda_chunk.sortRows(table, [("mukey", False), ("KSat50_150", True)])
+    assert table[2:] == [["9", "B", "2"], ["9", "a", None], ["10", "b", "1"], ["100", None, "0"]]
+
+
+def test_chunks_merged_in_query_order(monkeypatch):
+    keys = [str(k) for k in range(1000, 1100)]
+    monkeypatch.setattr(sda_chunk, "INITIAL_SIZE", 30)
+    request = StandIn()
+
+    logic, msg, data = sda_chunk.fetch("KSat", ksatQry, keys, request, workers=2)
+
+    assert logic
+    assert len(request.calls) == 4
+    assert data["Table"] == StandIn()(ksatQry(keys), "KSat")[2]["Table"]
+
+
+def test_rejected_chunks_split(monkeypatch):
+    keys = [str(k) for k in range(1000, 1100)]
+    monkeypatch.setattr(sda_chunk, "MIN_SIZE", 10)
+    request = StandIn(limit=40)
+
+    logic, msg, data = sda_chunk.fetch("KSat", ksatQry, keys, request)
+
+    assert logic
+    assert max(len(c) for c in request.calls if len(c) <= 40) <= 40
+    assert sorted(r[0] for r in data["Table"][2:]) == keys
+    assert data["Table"] == StandIn()(ksatQry(keys), "KSat")[2]["Table"]
+    assert sda_chunk.getSizer("KSat").size < 100
+
+
+def test_sizer_uses_client_byte_count(monkeypatch):
+    client = sda_client.SDAClient()
+    monkeypatch.setattr(sda_client, "getClient", lambda: client)
+    sizer = sda_chunk.ChunkSizer(100, 10, 1000)
+    recorded = list()
+    monkeypatch.setattr(sizer, "record", lambda *args: recorded.append(args))
+
+    def request(qry, name):
+        # a response of 5000 bytes from SDA
+        client.local.received = client.received() + 5000
+        return True, "", dict(Table=[NAMES, INFO])
+
+    def cached(qry, name):
+        # answered from sda_cache, nothing was received
+        return True, "", dict(Table=[NAMES, INFO])
+
+    sda_chunk._fetchChunk("KSat", ksatQry, ["1", "2"], request, sizer)
+    sda_chunk._fetchChunk("KSat", ksatQry, ["1", "2"], cached, sizer)
+
+    assert len(recorded) == 1
+    assert recorded[0][0] == 2 and recorded[0][2] == 5000
+
+
+def test_retryable():
+    # query timeouts reach sda_chunk at once (sda_retry does not resend them)
+    assert sda_chunk.retryable("HTTP Error 400: Bad Request")
+    assert sda_chunk.retryable("HTTP Error 500: Internal Server Error")
+    assert sda_chunk.retryable("Soil Data Access timeout error")
+    assert not sda_chunk.retryable("HTTP Error 404: Not Found")
+    assert not sda_chunk.retryable("")
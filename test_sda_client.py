@@ -0,0 +1,194 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_client
+# Purpose:     sda_client against a local HTTP stand-in for SDA post.rest:
+#              connection reuse, gzip bodies, HTTP errors and retries.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import gzip, json, threading
+
+import pytest
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.error import HTTPError
+
+import sda_client, sda_retry
+
+
+class StandIn(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), Handler)
+        # (status, body, gzip, drop) for the next requests, then 200 "{}"
+        self.script = list()
+        self.requests = list()
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            return self.script.pop(0) if self.script else (200, b'{"Table": []}', False, False)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, data, zipped, drop = self.server.next()
+
+        with self.server.lock:
+            self.server.requests.append(json.loads(body.decode("utf-8")))
+            self.server.connections.add(self.client_address)
+
+        if zipped:
+            data = gzip.compress(data)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+
+        if zipped:
+            self.send_header("Content-Encoding", "gzip")
+
+        self.end_headers()
+        self.wfile.write(data)
+
+        if drop:
+            # close without "Connection: close", like an idle timeout on the server
+            self.close_connection = True
+
+
+@pytest.fixture
+def server():
+    srv = StandIn()
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield srv
+
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(sda_retry, "backoff", lambda attempt: 0.0)
+    cl = sda_client.SDAClient(maxPerHost=2, timeout=5)
+    cl.breaker = sda_retry.CircuitBreaker(path="")
+
+    yield cl
+
+    cl.close()
+
+
+def url(srv):
+    return "http://127.0.0.1:%d%s" % (srv.server_address[1], sda_client.TABULAR_PATH)
+
+
+def test_connection_reused(server, client):
+    for i in range(5):
+        client.query("SELECT %d" % i, url=url(server))
+
+    assert client.connectionCount() == 1
+    assert len(server.connections) == 1
+    assert [r["query"] for r in server.requests] == ["SELECT %d" % i for i in range(5)]
+
+
+def test_gzip_body(server, client):
+    table = {"Table": [["mukey"], ["ColumnOrdinal=0"], ["123"], ["456"]]}
+    server.script.append((200, json.dumps(table).encode("utf-8"), True, False))
+
+    assert client.query("SELECT mukey", url=url(server)) == table
+    # decoded bytes, not the compressed ones on the wire
+    assert client.received() == len(json.dumps(table))
+
+
+def test_rows_streamed(server, client):
+    table = {"Table": [["mukey"], ["123"], ["456"]]}
+    server.script.append((200, json.dumps(table).encode("utf-8"), True, False))
+
+    rows = list(client.postRows(url(server), {"format": "JSON", "query": "SELECT mukey"}))
+
+    assert rows == table["Table"]
+    # counted like a post, decoded
+    assert client.received() == len(json.dumps(table))
+    # read to the end, so the connection went back to the pool
+    client.query("SELECT 1", url=url(server))
+    assert client.connectionCount() == 1
+
+
+def test_http_error_not_retried(server, client):
+    server.script.append((400, b"Invalid column name 'mukye'.", False, False))
+
+    with pytest.raises(HTTPError) as info:
+        client.query("SELECT mukye", url=url(server))
+
+    assert info.value.code == 400
+    assert "mukye" in info.value.sdaBody
+    assert len(server.requests) == 1
+    assert client.retries == 0
+
+
+def test_transient_status_retried(server, client):
+    server.script.append((503, b"Service Unavailable", False, False))
+    server.script.append((502, b"Bad Gateway", False, False))
+
+    assert client.query("SELECT 1", url=url(server)) == {"Table": []}
+    assert len(server.requests) == 3
+    assert client.retries == 2
+
+
+def test_retries_exhausted(server, client, monkeypatch):
+    monkeypatch.setattr(sda_retry, "RETRIES", 2)
+    server.script.extend([(503, b"", False, False)] * 3)
+
+    with pytest.raises(HTTPError):
+        client.query("SELECT 1", url=url(server))
+
+    assert len(server.requests) == 3
+
+
+def test_dropped_connection_resent(server, client):
+    server.script.append((200, b'{"Table": []}', False, True))
+    client.query("SELECT 1", url=url(server))
+
+    # the idle connection was closed by the server, the query goes out on a new one
+    assert client.query("SELECT 2", url=url(server)) == {"Table": []}
+    assert client.connectionCount() == 2
+    assert client.retries == 0
+
+
+def test_failed_resend_closes_connection(server, client, monkeypatch):
+    client.query("SELECT 1", url=url(server))
+    pool = list(client.pools.values())[0]
+    closed = list()
+    connect = pool._connect
+
+    def track(conn):
+        close = conn.close
+        conn.close = lambda: (closed.append(conn), close())
+        return conn
+
+    def send(conn, *args):
+        # the kept-alive connection is stale and the fresh one fails too
+        raise sda_client.httplib.BadStatusLine("")
+
+    stale = track(pool.idle[-1])
+    monkeypatch.setattr(pool, "_connect", lambda: track(connect()))
+    monkeypatch.setattr(pool, "_send", send)
+
+    with pytest.raises(sda_client.httplib.BadStatusLine):
+        pool.request("POST", sda_client.TABULAR_PATH, b"{}", {})
+
+    assert len(closed) == 2
+    assert closed[0] is stale
+    assert pool.idle == []
+    assert pool.opened == 2
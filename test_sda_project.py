@@ -0,0 +1,112 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_project
+# Purpose:     sda_project against the worked examples in Snyder (1987), the
+#              inverse projections and NAD83 shift as round trips, and the
+#              WKT rebuilt from a coordinate block.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+import pytest
+
+import sda_project
+
+
+# Clarke 1866, the ellipsoid of Snyder's numerical examples
+CLARKE1866 = (6378206.4, 1 - np.sqrt(1 - 0.00676866))
+
+
+def utm15(datum=sda_project.GRS80):
+    return sda_project.TransverseMercator(datum[0], datum[1], -93.0, 0.0, 0.9996, 500000.0, 0.0)
+
+
+def albers(datum=sda_project.GRS80):
+    # USA Contiguous Albers Equal Area Conic
+    return sda_project.Albers(datum[0], datum[1], -96.0, 23.0, 29.5, 45.5, 0.0, 0.0)
+
+
+def lonLat(n=20000):
+    rng = np.random.RandomState(3)
+
+    return rng.uniform(-96.0, -90.0, n), rng.uniform(38.0, 46.0, n)
+
+
+def test_transverse_mercator_example():
+    # Snyder (1987) p. 269
+    tm = sda_project.TransverseMercator(CLARKE1866[0], CLARKE1866[1], -75.0, 0.0, 0.9996, 0.0, 0.0)
+    x, y = tm.forward(np.array([-73.5]), np.array([40.5]))
+
+    assert x[0] == pytest.approx(127106.5, abs=0.05)
+    assert y[0] == pytest.approx(4484124.4, abs=0.05)
+
+
+def test_transverse_mercator_meridian():
+    # on the central meridian the northing is k0 times the meridian arc,
+    # 4984944.378 m from the equator to 45 degrees on WGS84
+    x, y = utm15(sda_project.WGS84).forward(np.array([-93.0]), np.array([45.0]))
+
+    assert x[0] == pytest.approx(500000.0, abs=1e-6)
+    assert y[0] == pytest.approx(0.9996 * 4984944.378, abs=0.001)
+
+
+def test_albers_example():
+    # Snyder (1987) p. 292
+    x, y = albers(CLARKE1866).forward(np.array([-75.0]), np.array([35.0]))
+
+    assert x[0] == pytest.approx(1885472.7, abs=0.05)
+    assert y[0] == pytest.approx(1535925.0, abs=0.05)
+
+
+@pytest.mark.parametrize("proj", [utm15(), albers()], ids=["utm", "albers"])
+@pytest.mark.parametrize("shift", [False, True])
+def test_inverse_round_trip(proj, shift):
+    lon, lat = lonLat()
+    x, y = sda_project.transform(lon, lat, proj, shift)
+    lon2, lat2 = sda_project.untransform(x, y, proj, shift)
+
+    # a millimetre is about 1e-8 degrees
+    assert np.abs(lon2 - lon).max() < 1e-8
+    assert np.abs(lat2 - lat).max() < 1e-8
+
+
+def test_nad83_shift():
+    lon, lat = lonLat()
+    proj = utm15()
+    x0, y0 = sda_project.transform(lon, lat, proj)
+    x1, y1 = sda_project.transform(lon, lat, proj, shift=True)
+
+    # WGS84 (ITRF00) and NAD83 are about a metre apart in the Midwest
+    moved = np.hypot(x1 - x0, y1 - y0)
+    assert 0.5 < moved.min() and moved.max() < 2.0
+
+
+def test_chunks_on_threads(monkeypatch):
+    lon, lat = lonLat()
+    proj = albers()
+    x0, y0 = sda_project.transform(lon, lat, proj, True, workers=1)
+
+    monkeypatch.setattr(sda_project, "CHUNK", 997)
+    x1, y1 = sda_project.transform(lon, lat, proj, True, workers=3)
+
+    assert (x0 == x1).all() and (y0 == y1).all()
+
+
+def test_project_wkt():
+    wkts = ["POLYGON ((-93.5 42.0, -93.4 42.0, -93.4 42.1, -93.5 42.0))",
+            "MULTIPOLYGON (((-93.1 41.5, -93.0 41.5, -93.0 41.6, -93.1 41.5)),((-92.9 41.5, -92.8 41.5, -92.8 41.6, -92.9 41.5),(-92.85 41.52, -92.82 41.52, -92.82 41.55, -92.85 41.52)))"]
+    proj = utm15()
+    out = sda_project.projectWKT(wkts, proj, shift=True)
+
+    block = sda_project.CoordinateBlock(wkts)
+    x, y = sda_project.transform(block.x, block.y, proj, True)
+
+    for i, (wkt, projected) in enumerate(zip(wkts, out)):
+        # the same text around the new numbers
+        assert sda_project._number.split(projected) == sda_project._number.split(wkt)
+
+        xy = np.array(sda_project._number.findall(projected), dtype=np.float64).reshape(-1, 2)
+        j, k = block.offsets[i], block.offsets[i + 1]
+        assert np.abs(xy[:, 0] - x[j:k]).max() <= 0.0005
+        assert np.abs(xy[:, 1] - y[j:k]).max() <= 0.0005
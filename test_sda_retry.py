@@ -0,0 +1,140 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_retry
+# Purpose:     sda_retry error classification and the circuit breaker as the
+#              pooled client drives it.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import errno, socket, threading, zlib
+
+import pytest
+
+from io import BytesIO
+from urllib.error import HTTPError
+
+import sda_client, sda_retry
+
+
+def httpError(code, body=b""):
+    err = HTTPError("http://sda", code, "status", {}, BytesIO(body))
+    err.sdaBody = body.decode("utf-8")
+    return err
+
+
+def test_classify():
+    assert sda_retry.classify(httpError(503)) == sda_retry.TRANSIENT
+    assert sda_retry.classify(httpError(429)) == sda_retry.TRANSIENT
+    assert sda_retry.classify(httpError(404)) == sda_retry.FATAL
+    assert sda_retry.classify(socket.timeout()) == sda_retry.TRANSIENT
+    assert sda_retry.classify(ConnectionResetError(errno.ECONNRESET, "reset")) == sda_retry.TRANSIENT
+    assert sda_retry.classify(socket.error(errno.ECONNREFUSED, "refused")) == sda_retry.TRANSIENT
+    assert sda_retry.classify(sda_client.httplib.BadStatusLine("")) == sda_retry.TRANSIENT
+    assert sda_retry.classify(FileNotFoundError(errno.ENOENT, "no file")) == sda_retry.FATAL
+    assert sda_retry.classify(PermissionError(errno.EACCES, "denied")) == sda_retry.FATAL
+    assert sda_retry.classify(ValueError("bad JSON")) == sda_retry.FATAL
+
+
+def test_query_timeout_not_retried():
+    # the same query would run out of time again; sda_chunk splits it instead
+    err = httpError(400, b"Invalid query: The query has exceeded the execution timeout")
+
+    assert sda_retry.classify(err, err.sdaBody) == sda_retry.FATAL
+
+
+class Calls(object):
+    # func for SDAClient._retry raising the given errors in turn, then "ok"
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+
+        if self.errors:
+            raise self.errors.pop(0)
+
+        return "ok"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(sda_retry, "backoff", lambda attempt: 0.0)
+    cl = sda_client.SDAClient()
+    cl.breaker = sda_retry.CircuitBreaker(threshold=2, cooldown=0.01, path="")
+
+    return cl
+
+
+def halfOpen(breaker):
+    # two failures open the breaker; past the cool-down the next wait probes
+    breaker.failure()
+    breaker.failure()
+    breaker.openUntil = 0.0
+
+
+def runWithin(func, seconds=5):
+    # run func on a thread; fail instead of hanging the test run
+    out = list()
+    thread = threading.Thread(target=lambda: out.append(func()))
+    thread.daemon = True
+    thread.start()
+    thread.join(seconds)
+
+    assert not thread.is_alive(), "blocked on the circuit breaker"
+
+    return out[0]
+
+
+def test_transient_then_success(client):
+    calls = Calls(socket.timeout(), httpError(503))
+
+    assert client._retry(calls) == "ok"
+    assert calls.count == 3
+    assert client.retries == 2
+    assert client.breaker.failures == 0
+
+
+def test_http_error_counts_as_answer(client):
+    client.breaker.failure()
+
+    with pytest.raises(HTTPError):
+        client._retry(Calls(httpError(400, b"Invalid column name")))
+
+    assert client.breaker.failures == 0
+
+
+def test_fatal_probe_error_releases_breaker(client):
+    halfOpen(client.breaker)
+
+    with pytest.raises(zlib.error):
+        client._retry(Calls(zlib.error("incorrect header check")))
+
+    # the failed probe re-opened the breaker, the next probe goes through
+    assert not client.breaker.probing
+    client.breaker.openUntil = 0.0
+    assert runWithin(lambda: client._retry(Calls())) == "ok"
+
+
+def test_interrupted_probe_releases_breaker(client):
+    halfOpen(client.breaker)
+
+    with pytest.raises(KeyboardInterrupt):
+        client._retry(Calls(KeyboardInterrupt()))
+
+    assert not client.breaker.probing
+    assert runWithin(lambda: client._retry(Calls())) == "ok"
+
+
+def test_only_probe_releases(client):
+    halfOpen(client.breaker)
+
+    assert client.breaker.wait() is True
+
+    # a request that was not the probe does not end it
+    client.breaker.failures = 0
+    with pytest.raises(KeyboardInterrupt):
+        client._retry(Calls(KeyboardInterrupt()))
+
+    client.breaker.failures = 2
+    assert client.breaker.probing
@@ -0,0 +1,203 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_sched
+# Purpose:     sda_sched.runConcurrent results by name and QueryTimings, a
+#              failing job reaching the caller, and processWatershed writing
+#              the SDA results to the geodatabase on its own thread.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import io, os, re, textwrap, threading, time
+
+import pytest
+
+import sda_sched
+
+
+def sleeper(name, secs, seen=None):
+    # a request that takes secs seconds, recording the thread it ran on
+    if seen is not None:
+        seen.append((name, threading.current_thread()))
+
+    time.sleep(secs)
+    return name.upper(), secs
+
+
+def test_results_and_timings():
+    secs = [("Muaggat", 0.3), ("AWS", 0.05), ("SOC", 0.2), ("Potential Wetland", 0.1)]
+    seen = list()
+    jobs = [(name, sleeper, (name, s, seen)) for name, s in secs]
+
+    res, timings = sda_sched.runConcurrent(jobs, workers=4)
+
+    assert res == dict((name, (name.upper(), s)) for name, s in secs)
+    assert timings.order == [name for name, s in secs]
+
+    for name, s in secs:
+        assert s <= timings.elapsed[name] < s + 0.25
+        assert timings.start[name] - timings.start["Muaggat"] < 0.25
+
+    # sent at once: the batch takes about as long as its slowest request
+    assert timings.total() == pytest.approx(sum(timings.elapsed.values()))
+    assert 0.3 <= timings.wall < timings.total()
+    assert timings.slowest() == ("Muaggat", timings.elapsed["Muaggat"])
+    assert all(t is not threading.current_thread() for name, t in seen)
+
+    lines = timings.report()
+
+    assert [line.split(":")[0] for line in lines[:-1]] == timings.order
+    assert lines[1] == "AWS: %.1f s" % timings.elapsed["AWS"]
+    assert lines[-1] == "wall time %.1f s, sequential total %.1f s" % (timings.wall, timings.total())
+
+
+def test_one_worker():
+    jobs = [(name, sleeper, (name, 0.05)) for name in ("c", "a", "b")]
+
+    res, timings = sda_sched.runConcurrent(jobs, workers=1)
+
+    assert res == {"a": ("A", 0.05), "b": ("B", 0.05), "c": ("C", 0.05)}
+    assert timings.order == ["c", "a", "b"]
+    # one after another, in submission order
+    assert timings.start["c"] < timings.start["a"] < timings.start["b"]
+    assert timings.wall >= timings.total()
+
+
+def test_no_jobs():
+    res, timings = sda_sched.runConcurrent([])
+
+    assert res == dict()
+    assert timings.slowest() == (None, 0.0)
+    assert timings.report() == ["wall time 0.0 s, sequential total 0.0 s"]
+
+
+def test_failing_job():
+    done = list()
+
+    def fails():
+        time.sleep(0.05)
+        raise IOError("HTTP Error 503: Service Unavailable")
+
+    def slow():
+        time.sleep(0.3)
+        done.append("slow")
+
+    jobs = [("slow", slow, ()), ("fails", fails, ()), ("fast", done.append, ("fast",))]
+
+    with pytest.raises(IOError, match="503"):
+        sda_sched.runConcurrent(jobs, workers=3)
+
+    # raised once every other job has finished
+    assert sorted(done) == ["fast", "slow"]
+
+
+#-------------------------------------------------------------------------------
+# processWatershed, from the SDA jobs to the last table write
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "get_WS_bndry.py")
+
+
+def scriptSource():
+    with io.open(SCRIPT, encoding="latin-1") as f:
+        return f.read()
+
+
+def writeSection(source):
+    # the body of processWatershed that sends the SDA jobs and writes the
+    # results, dedented to run on its own
+    body = re.search(r"^def processWatershed\(.*?(?=^def |^#=)", source, re.M | re.S).group(0)
+    start = body.index("                jobs = list()")
+    end = body.index("                #separate jobs for legibility")
+
+    return textwrap.dedent(body[start:end])
+
+
+def listNames(source, var):
+    block = re.search("^" + var + r" = \[.*?\]\s*$", source, re.M | re.S).group(0)
+    return re.findall(r'"([^"]+)"', block)
+
+
+class Recorder(object):
+    # every fetch and geodatabase write, with the thread it ran on
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fetched = list()
+        self.writes = list()
+        self.events = list()
+
+    def fetch(self, name, qryFunc, keys, request):
+        with self.lock:
+            self.fetched.append((name, threading.current_thread()))
+
+        time.sleep(0.02)
+
+        with self.lock:
+            self.events.append("fetched")
+
+        return True, "Successfully collected " + name, dict(Table=[["mukey"], ["ColumnOrdinal=0"]] + [[k] for k in keys])
+
+    def writer(self, tbl):
+        def write(*args):
+            self.writes.append((tbl, threading.current_thread(), args))
+            self.events.append("write")
+            return True, tbl
+
+        return write
+
+
+class ArcPy(object):
+    def __init__(self):
+        self.messages = list()
+
+    def AddMessage(self, msg):
+        self.messages.append(msg)
+
+
+class Flags(object):
+    BULK = False
+    BATCH = False
+
+
+class NoCache(object):
+    @staticmethod
+    def getCache():
+        return None
+
+
+def test_writes_on_calling_thread():
+    source = scriptSource()
+    rec = Recorder()
+    keys = ["101", "102", "103"]
+    store = Flags()
+    store.fetch = rec.fetch
+
+    ns = dict(os=os, sda_sched=sda_sched, sda_cache=NoCache, sda_bulk=Flags, sda_batch=Flags,
+              mukey_store=store, sda_chunk=store, arcpy=ArcPy(),
+              sdaQueries=[(name, None) for name in listNames(source, "sdaQueries")],
+              muStoreProducts=listNames(source, "muStoreProducts"), batchProducts=list(),
+              keys=keys, tabRequest=None, mainQry=None, ws="C:\\ws", inDir="C:\\ws",
+              gdb="acpf.gdb", profTbl="SoilProfile", outRaster="gSSURGO")
+
+    for name in ("surfHoriz", "surfTex", "muaggat", "rootZnDep", "rootZnAwsDrt", "potWet", "aws", "soc", "om", "ksat50150", "coarseFrag", "buildACPF"):
+        ns[name] = rec.writer(name)
+
+    ns["soilProfileTbl"] = rec.writer("soilProfileTbl")
+
+    exec(writeSection(source), ns)
+
+    caller = threading.current_thread()
+
+    # every SDA query on the pool, sent before anything was written
+    assert sorted(name for name, t in rec.fetched) == sorted(name for name, qryFunc in ns["sdaQueries"])
+    assert all(t is not caller for name, t in rec.fetched)
+    assert rec.events == ["fetched"] * len(rec.fetched) + ["write"] * len(rec.writes)
+
+    # every write on the calling thread, in the script's order, each
+    # handed its own product
+    assert all(t is caller for tbl, t, args in rec.writes)
+    assert [tbl for tbl, t, args in rec.writes if tbl != "buildACPF"] == \
+        ["surfHoriz", "surfTex", "muaggat", "rootZnDep", "rootZnAwsDrt", "potWet", "soilProfileTbl", "aws", "soc", "om", "ksat50150", "coarseFrag"]
+    assert [args[1][1] for tbl, t, args in rec.writes if tbl == "muaggat"] == ["Successfully collected Muaggat"]
+    assert len([tbl for tbl, t, args in rec.writes if tbl == "buildACPF"]) == 9
+
+    assert ns["arcpy"].messages[0] == "\tSDA query times for ws:"
@@ -0,0 +1,120 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sda_stream
+# Purpose:     sda_stream.iterTable against json.loads of the same response:
+#              rows split across read blocks, gzip and deflate bodies, other
+#              top-level members and empty tables; RowWriter round trips.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import json, zlib
+from io import BytesIO
+
+import pytest
+
+import sda_stream
+
+
+ROWS = [["mukey", "muname", "aws0150wta"],
+        ["ColumnOrdinal=0,ColumnSize=4", "ColumnOrdinal=1,ColumnSize=240", "ColumnOrdinal=2,ColumnSize=8"],
+        ["1234567", "Clarion loam, 2 to 6 percent slopes", "27.81"],
+        ["7654321", "Façade – érodé \"quoted\" \\ back", None],
+        ["1", "🌱 seedling", "-0.000125"],
+        [12345678901234, -3.5e-07, True, False, None, [], {}, {"a": [1, 2]}],
+        ["", "   ", "\n\t"]]
+
+
+def body(doc, **kw):
+    return json.dumps(doc, **kw).encode("utf-8")
+
+
+def gzipped(data):
+    z = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return z.compress(data) + z.flush()
+
+
+class Chunked(object):
+    # a response that hands back fewer bytes than asked for, as sockets do
+    def __init__(self, data, sizes):
+        self.data = data
+        self.sizes = sizes
+        self.pos = 0
+        self.reads = 0
+
+    def read(self, n):
+        n = min(n, self.sizes[self.reads % len(self.sizes)])
+        self.reads += 1
+        out = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return out
+
+
+@pytest.mark.parametrize("blockSize", [1, 2, 3, 5, 7, 16, 64, 100000])
+def test_block_boundaries(blockSize):
+    # every split point of numbers, escapes and multi-byte characters
+    for doc, kw in (({"Table": ROWS}, dict()), ({"Table": ROWS}, dict(ensure_ascii=False)), ({"Table": ROWS}, dict(indent=3))):
+        data = body(doc, **kw)
+
+        assert list(sda_stream.iterTable(BytesIO(data), blockSize=blockSize)) == json.loads(data.decode("utf-8"))["Table"]
+
+
+def test_short_reads():
+    data = body({"Table": ROWS}, ensure_ascii=False)
+
+    assert list(sda_stream.iterTable(Chunked(data, [1, 3, 2, 9]), blockSize=8)) == ROWS
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "deflate", "zlib"])
+def test_compressed(encoding):
+    data = body({"Table": ROWS * 50}, ensure_ascii=False)
+    packed = gzipped(data) if encoding == "gzip" else zlib.compress(data)
+
+    for blockSize in (1, 13, 4096):
+        assert list(sda_stream.iterTable(BytesIO(packed), encoding, blockSize=blockSize)) == ROWS * 50
+
+
+def test_other_members():
+    doc = '{"Meta": {"Table": [["not", "these"]], "n": [1, {"x": "]}"}]}, "Count" : 3 ,\n "Table" : [ ["a"] , ["b", 2] ] , "Table1": [["c"]], "Error": null }'
+    data = doc.encode("utf-8")
+
+    for blockSize in (1, 4, 1000):
+        assert list(sda_stream.iterTable(BytesIO(data), blockSize=blockSize)) == [["a"], ["b", 2]]
+        assert list(sda_stream.iterTable(BytesIO(data), blockSize=blockSize, key="Table1")) == [["c"]]
+        assert list(sda_stream.iterTable(BytesIO(data), blockSize=blockSize, key="Table2")) == []
+
+
+@pytest.mark.parametrize("data", [b"", b"  \r\n ", b"{}", b" { } ", b'{"Table": []}', b'{"Table":[ ]}\n', b'{"Other": [["x"]]}'])
+def test_empty(data):
+    assert list(sda_stream.iterTable(BytesIO(data), blockSize=2)) == []
+    assert list(sda_stream.iterTable(BytesIO(gzipped(data)), "gzip", blockSize=2)) == []
+
+
+@pytest.mark.parametrize("data", [b'["Table"]', b'{"Table": [["a"], ["b"]', b'{"Table": [["a"] ["b"]]}', b'{"Table": [["a", ]]}'])
+def test_malformed(data):
+    with pytest.raises(ValueError):
+        list(sda_stream.iterTable(BytesIO(data), blockSize=3))
+
+
+def test_decoded_bytes():
+    # onBytes sees the decompressed size, not the bytes on the wire
+    data = body({"Table": ROWS * 20}, ensure_ascii=False)
+    seen = list()
+
+    list(sda_stream.iterTable(BytesIO(gzipped(data)), "gzip", blockSize=50, onBytes=seen.append))
+
+    assert sum(seen) == len(data)
+
+
+def test_row_writer():
+    writer = sda_stream.RowWriter()
+
+    for row in ROWS:
+        writer.add(row)
+
+    packed = writer.finish()
+
+    assert writer.count == len(ROWS)
+    assert json.loads(zlib.decompress(packed).decode("utf-8")) == {"Table": ROWS}
+    assert list(sda_stream.iterTable(BytesIO(packed), "zlib", blockSize=7)) == ROWS
+
+    assert list(sda_stream.iterTable(BytesIO(sda_stream.RowWriter().finish()), "zlib")) == []
@@ -0,0 +1,174 @@
+#-------------------------------------------------------------------------------
+# Name:        test_table_writer
+# Purpose:     table_writer field specs and coercion, SQLite and GeoPackage
+#              tables read back with sqlite3, and the batches writeTable hands
+#              a backend.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import sqlite3
+
+import pytest
+
+import table_writer
+
+
+def info(i, typeName, size=30, precision=255, scale=255):
+    return "ColumnOrdinal=%d,ColumnSize=%d,NumericPrecision=%d,NumericScale=%d,ProviderType=%s,IsLong=False,DataTypeName=%s" % (i, size, precision, scale, typeName, typeName.lower())
+
+
+NAMES = ["mukey", "musym", "comppct_r", "hydric", "aws0150wta", "om_r", "saverest"]
+INFO = [info(0, "Int", 4, 10), info(1, "VarChar", 6), info(2, "SmallInt", 2, 5), info(3, "Bit", 1, 1), info(4, "Float", 8, 15), info(5, "Real", 4, 7), info(6, "DateTime", 8, 23, 3)]
+
+
+class Writer(object):
+    # backend stand-in recording what writeTable does
+
+    def __init__(self):
+        self.calls = list()
+        self.batches = list()
+
+    def create(self, specs):
+        self.calls.append(("create", [spec.name for spec in specs]))
+
+    def insert(self, rows):
+        self.calls.append("insert")
+        self.batches.append(rows)
+
+    def close(self):
+        self.calls.append("close")
+
+
+def sdaRows(n):
+    # rows as SDA sends them: text, NULL now and then, integers as "12.0"
+    rows = list()
+
+    for i in range(n):
+        rows.append([str(100000 + i), "A" + str(i), None if i % 5 == 0 else (str(i % 90) if i % 3 else str(i % 90) + ".0"), str(i % 2),
+                     None if i % 7 == 0 else "%.2f" % (i * 0.37), "" if i % 11 == 0 else str(i / 8.0), "2025-09-0%d 00:00:00" % (i % 9 + 1)])
+
+    return rows
+
+
+def test_field_specs():
+    specs = table_writer.fieldSpecs(NAMES, INFO)
+
+    # key fields are text per SSURGO, whatever SDA says
+    assert [spec.dataType for spec in specs] == ["text", "text", "short", "short", "double", "double", "date"]
+    assert (specs[0].length, specs[1].length) == (30, 6)
+    assert (specs[4].precision, specs[6].scale) == (15, 3)
+
+
+def test_coercers():
+    funcs = table_writer.coercers(table_writer.fieldSpecs(NAMES, INFO))
+    row = ["101", "12B", "85.0", "1", "0.125", "", "2025-09-01 00:00:00"]
+
+    assert [f(v) for f, v in zip(funcs, row)] == ["101", "12B", 85, 1, 0.125, None, "2025-09-01 00:00:00"]
+    assert [f(None) for f in funcs] == [None] * len(funcs)
+    assert funcs[2]("") is None and funcs[2]("-3") == -3
+
+    with pytest.raises(ValueError):
+        funcs[4]("n/a")
+
+
+def test_open_writer(tmp_path):
+    for name in ("soils.sqlite/muaggatt", "soils.DB\\muaggatt", "soils.gpkg/muaggatt"):
+        assert isinstance(table_writer.openWriter(str(tmp_path / name)), table_writer.SQLiteTableWriter)
+
+    assert isinstance(table_writer.openWriter(str(tmp_path / "soils.gdb" / "muaggatt")), table_writer.ArcpyTableWriter)
+    assert isinstance(table_writer.openWriter(str(tmp_path / "soils.sqlite")), table_writer.ArcpyTableWriter)
+
+    with pytest.raises(ValueError):
+        table_writer.SQLiteTableWriter(str(tmp_path / "soils.sqlite"))
+
+
+def test_sqlite(tmp_path):
+    db = str(tmp_path / "out" / "soils.sqlite")
+    rows = sdaRows(23)
+
+    assert table_writer.writeTable(db + "/muaggatt", NAMES, INFO, iter(rows), batchSize=5) == 23
+
+    conn = sqlite3.connect(db)
+    cols = [(r[1], r[2]) for r in conn.execute('PRAGMA table_info("muaggatt")')]
+
+    assert cols == [("OBJECTID", "INTEGER"), ("mukey", "TEXT"), ("musym", "TEXT"), ("comppct_r", "INTEGER"), ("hydric", "INTEGER"), ("aws0150wta", "REAL"), ("om_r", "REAL"), ("saverest", "TEXT")]
+
+    found = conn.execute("SELECT * FROM muaggatt ORDER BY OBJECTID").fetchall()
+    funcs = table_writer.coercers(table_writer.fieldSpecs(NAMES, INFO))
+
+    assert [r[0] for r in found] == list(range(1, 24))
+    assert [list(r[1:]) for r in found] == [[f(v) for f, v in zip(funcs, row)] for row in rows]
+
+    # NULLs stay NULL, numbers are stored as numbers
+    for col, typ in (("comppct_r", "integer"), ("aws0150wta", "real"), ("om_r", "real")):
+        assert set(r[0] for r in conn.execute("SELECT DISTINCT typeof(" + col + ") FROM muaggatt")) == set(["null", typ])
+
+    # written again: the table is replaced, other tables stay
+    conn.execute("CREATE TABLE other (x INTEGER)")
+    conn.commit()
+    conn.close()
+
+    assert table_writer.writeTable(db + "/muaggatt", NAMES, INFO, rows[:3]) == 3
+
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM muaggatt").fetchone()[0] == 3
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'other'").fetchone() == ("other",)
+
+
+def test_geopackage(tmp_path):
+    db = str(tmp_path / "soils.gpkg")
+
+    assert table_writer.writeTable(db + "/muaggatt", NAMES, INFO, sdaRows(4)) == 4
+    assert table_writer.writeTable(db + "/component", NAMES[:2], INFO[:2], sdaRows(2)) == 2
+    assert table_writer.writeTable(db + "/muaggatt", NAMES, INFO, sdaRows(6)) == 6
+
+    conn = sqlite3.connect(db)
+
+    assert conn.execute("PRAGMA application_id").fetchone()[0] == 1196444487
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 10200
+    assert conn.execute("SELECT table_name, data_type, identifier FROM gpkg_contents ORDER BY table_name").fetchall() == \
+        [("component", "attributes", "component"), ("muaggatt", "attributes", "muaggatt")]
+    assert sorted(r[0] for r in conn.execute("SELECT srs_id FROM gpkg_spatial_ref_sys")) == [-1, 0]
+    assert conn.execute("SELECT COUNT(*) FROM muaggatt").fetchone()[0] == 6
+
+
+@pytest.mark.parametrize("n, sizes", [(0, []), (4, [4]), (12, [4, 4, 4]), (13, [4, 4, 4, 1])])
+def test_batches(n, sizes):
+    writer = Writer()
+    read = list()
+
+    def rows():
+        # read once, lazily
+        for row in sdaRows(n):
+            read.append(row[0])
+            yield row
+
+    assert table_writer.writeTable("muaggatt", NAMES, INFO, rows(), writer=writer, batchSize=4) == n
+    assert [len(b) for b in writer.batches] == sizes
+    assert writer.calls == [("create", NAMES)] + ["insert"] * len(sizes) + ["close"]
+    assert [r[0] for b in writer.batches for r in b] == read
+
+
+def test_batch_size_default(monkeypatch):
+    monkeypatch.setattr(table_writer, "BATCH_SIZE", 3)
+    writer = Writer()
+
+    assert table_writer.writeTable("muaggatt", NAMES, INFO, sdaRows(7), writer=writer) == 7
+    assert [len(b) for b in writer.batches] == [3, 3, 1]
+
+
+def test_closed_on_error():
+    writer = Writer()
+
+    def rows():
+        for row in sdaRows(6):
+            yield row
+
+        raise IOError("connection reset")
+
+    with pytest.raises(IOError):
+        table_writer.writeTable("muaggatt", NAMES, INFO, rows(), writer=writer, batchSize=4)
+
+    # the first batch went in, the table was closed
+    assert writer.calls == [("create", NAMES), "insert", "close"]
@@ -0,0 +1,859 @@
+#-------------------------------------------------------------------------------
+# Name:        test_valu_engine
+# Purpose:     valu_engine against the SearchCursor loops it replaced in
+#              ACPF_SoilsQuery2, on a synthetic HzData table. The loops below
+#              are the original ones with the cursor replaced by a sorted list
+#              of rows; the dictionaries must come out identical. The PWSL and
+#              root zone AWS plugins of ACPF_SoilsQuery2 are run the same way,
+#              through GetHorizons, against the CalcPWSL and CalcRZAWS loops.
+#              ComponentCatalogue against GetSumPct and the dominant component
+#              pick.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import io, os, random, re
+
+import pytest
+
+import valu_engine
+
+
+# the AWS and SOC ranges of the commented-out VALU depthList
+depthList = [(0, 5), (5, 20), (20, 50), (50, 100), (100, 150), (150, 999), (0, 20), (0, 30), (0, 100), (0, 150), (0, 999)]
+
+
+class Fixture(object):
+    # HzData rows as dictionaries (oid is the row's OBJECTID) plus component
+    # restrictions, like the tables CreateValuTable works from
+
+    def __init__(self, seed, nMu):
+        R = random.Random(seed)
+        self.rows = list()
+        self.dCR = dict()
+        self.dRestrictions = dict()
+        cokey = 100000
+
+        def maybe(v, p=0.1):
+            return None if R.random() < p else v
+
+        for m in range(nMu):
+            mukey = str(200000 + m)
+
+            for c in range(R.randint(1, 5)):
+                # cokeys out of step with the table order, so ties show
+                cokey += R.choice([1, 7, 13])
+                co = str(cokey)
+                pct = R.choice([5, 10, 10, 15, 40, 40, 60, 85])
+                kind = R.choice(["Series", "Series", "Taxadjunct", "Miscellaneous area", None])
+                major = R.choice(["Yes", "Yes", "No"])
+                taxorder = R.choice(["Mollisols", "Alfisols", "Histosols", None])
+                taxsubgrp = R.choice(["Typic Argiudolls", "Histic Humaquepts", None, "Aquic Hapludalfs"])
+
+                if R.random() < 0.4:
+                    self.dCR[co] = (float(R.choice([20, 50, 80, 100, 149, 151])), R.choice(["Lithic bedrock", "Fragipan"]))
+
+                if R.random() < 0.4:
+                    self.dRestrictions[co] = (float(R.choice([10, 30, 75, 120])), "Lithic bedrock")
+
+                top = 0
+
+                for h in range(R.randint(0, 7)):
+                    bot = top + R.choice([3, 5, 8, 12, 15, 20, 25, 33, 40, 60])
+                    sand = maybe(round(R.uniform(0, 80), 1))
+                    silt = maybe(round(R.uniform(0, 60), 1))
+                    clay = None if sand is None or silt is None else round(100.0 - sand - silt, 1)
+
+                    if R.random() < 0.2 and not clay is None:
+                        clay = maybe(round(R.uniform(0, 50), 1), 0.3)
+
+                    self.rows.append(dict(mukey=mukey, cokey=co, compname="C" + co, compkind=kind, majcompflag=major, localphase=maybe("phase", 0.7), comppct_r=pct, taxorder=taxorder, taxsubgrp=taxsubgrp,
+                        desgnmaster=R.choice(["A", "B", "C", "O", "L", None]), hzdept_r=top, hzdepb_r=bot, sandtotal_r=sand, silttotal_r=silt, claytotal_r=clay,
+                        om_r=maybe(round(R.uniform(0, 30), 3), 0.15), dbthirdbar_r=maybe(round(R.uniform(0.9, 2.1), 2), 0.15), ph1to1h2o_r=maybe(round(R.uniform(3, 8), 1)),
+                        ec_r=maybe(R.choice([0.0, 2.0, 16.0, 20.0]), 0.2), awc_r=maybe(round(R.uniform(0, 0.3), 2), 0.15), ksat_r=maybe(round(R.uniform(0, 100), 2)),
+                        texture=R.choice(["L", "SIL", "MUCK", "PEAT", None]), lieutex=R.choice(["Muck", None, None, "Bedrock"]), fragvol=maybe(R.choice([0.0, 5.0, 12.5, 40.0]), 0.3)))
+
+                    # an overlapping horizon now and then
+                    top = bot if R.random() < 0.9 else top
+
+        # rows were written to the table in no particular order
+        R.shuffle(self.rows)
+
+        for oid, row in enumerate(self.rows):
+            row["oid@"] = oid + 1
+
+    def cursor(self, fields, order, where=None):
+        # SearchCursor rows: order is the ORDER BY as (field, descending)
+        # pairs, ties come back in OBJECTID order
+        rows = [row for row in self.rows if where is None or where(row)]
+
+        # NULL sorts first, so last in DESC order
+        for fld, desc in reversed(list(order) + [("oid@", False)]):
+            rows.sort(key=lambda row: (not row[fld] is None, row[fld]), reverse=desc)
+
+        return [tuple(row[f] for f in fields) for row in rows]
+
+    def horizons(self):
+        fields = list(valu_engine.HZ_FIELDS)
+        order = [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]
+
+        return valu_engine.HorizonTable(fields, self.cursor([f.lower() for f in fields], order))
+
+
+@pytest.fixture(scope="module")
+def fixture():
+    return Fixture(11, 400)
+
+
+def legacyAWS(fx, td, bd):
+    # dComp of the CalcAWS loop for one range
+    dComp = dict()
+    qFieldNames = ["mukey", "cokey", "comppct_r", "awc_r", "hzdept_r", "hzdepb_r"]
+    order = [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]
+
+    for rec in fx.cursor(qFieldNames, order, lambda row: not row["hzdept_r"] is None):
+        mukey, cokey, compPct, awc, top, bot = rec
+
+        if awc is not None:
+            hzT = min(bot, bd) - max(top, td)
+
+            if hzT > 0:
+                aws = float(hzT) * float(awc) * 10
+
+                if not cokey in dComp:
+                    dComp[str(cokey)] = (mukey, compPct, hzT, aws)
+
+                else:
+                    mukey, compName, dHzT, dAWS = dComp[str(cokey)]
+                    dAWS = dAWS + aws
+                    dHzT = dHzT + hzT
+                    dComp[str(cokey)] = (mukey, compPct, dHzT, dAWS)
+
+    return dComp
+
+
+def legacySOC(fx, td, bd, dRestrictions, maxD):
+    # dComp of the CalcSOC loop for one range
+    dComp = dict()
+    qFieldNames = ["mukey", "cokey", "comppct_r", "om_r", "dbthirdbar_r", "hzdept_r", "hzdepb_r", "fragvol"]
+    order = [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]
+
+    for rec in fx.cursor(qFieldNames, order, lambda row: not row["hzdept_r"] is None):
+        mukey, cokey, compPct, om, db3, top, bot, fragvol = rec
+
+        if fragvol is None:
+            fragvol = 0.0
+
+        if om is not None and db3 is not None:
+            top = max(top, td)
+            bot = min(bot, bd)
+            om = round(om, 3)
+
+            try:
+                rz, resKind = dRestrictions[cokey]
+
+            except:
+                rz = maxD
+                resKind = ""
+
+            if top < rz < bot:
+                cBot = rz
+
+            else:
+                cBot = min(rz, bot)
+
+            hzT = cBot - top
+
+            if hzT > 0 and top < cBot:
+                soc =  ( (hzT * ( ( om / 1.724 ) * db3 )) / 100.0 ) * ((100.0 - fragvol) / 100.0) * ( compPct * 100 )
+
+                if not cokey in dComp:
+                    dComp[cokey] = (mukey, compPct, hzT, soc)
+
+                else:
+                    mukey, compName, dHzT, dSOC = dComp[cokey]
+                    dSOC = dSOC + soc
+                    dHzT = dHzT + hzT
+                    dComp[cokey] = (mukey, compPct, dHzT, dSOC)
+
+    return dComp
+
+
+def checkTexture(desgnmaster, texture, lieutex, taxorder, taxsubgrp):
+    # CheckTexture
+    if str(taxorder) == 'Histosols' or str(taxsubgrp).lower().find('histic') >= 0:
+        return False
+
+    elif desgnmaster in ["O", "L"]:
+        return True
+
+    elif str(texture) in valu_engine.txList:
+        return True
+
+    elif str(lieutex) in valu_engine.lieuList:
+        return True
+
+    return False
+
+
+def checkBulkDensity(sand, silt, clay, bd):
+    # CheckBulkDensity
+    txlist = [sand, silt, clay]
+
+    if bd is None:
+        return False
+
+    if txlist.count(None) == 1:
+        if txlist[0] is None:
+            sand = 100.0 - silt - clay
+
+        elif silt is None:
+            silt = 100.0 - sand - clay
+
+        else:
+            clay = 100.0 - sand - silt
+
+        txlist = [sand, silt, clay]
+
+    if txlist.count(None) > 0:
+        return False
+
+    if round(sum(txlist), 1) != 100.0:
+        return False
+
+    a = bd - ((( sand * 1.65 ) / 100.0 ) + (( silt * 1.30 ) / 100.0 ) + (( clay * 1.25 ) / 100.0))
+    b = ( 0.002081 * sand ) + ( 0.003912 * silt ) + ( 0.0024351 * clay )
+
+    return a > b
+
+
+def legacyRZDepth(fx, maxD, dCR):
+    # dComp2 of the CalcRZDepth loop. The None tests of pH and ec come first
+    # here; Python 2 compared None with numbers, Python 3 raises.
+    dComp = dict()
+    dComp2 = dict()
+    curFlds = ["mukey", "cokey", "compname", "compkind", "localphase", "comppct_r", "taxorder", "taxsubgrp", "desgnmaster", "hzdept_r", "hzdepb_r", "sandtotal_r", "silttotal_r", "claytotal_r", "dbthirdbar_r", "ph1to1h2o_r", "ec_r", "texture", "lieutex"]
+    order = [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]
+    where = lambda row: row["compkind"] != 'Miscellaneous area' and not row["compkind"] is None and row["majcompflag"] == 'Yes'
+
+    for rec in fx.cursor(curFlds, order, where):
+        mukey, cokey, compName, compKind, localPhase, compPct, taxorder, taxsubgrp, desgnmaster, hzDept, hzDepb, sand, silt, clay, bd, pH, ec, texture, lieutex = rec
+        dComp2[cokey] = [mukey, compName, localPhase, compPct, maxD, ""]
+
+        if hzDept < maxD:
+            restriction = list()
+
+            if not checkTexture(desgnmaster, texture, lieutex, taxorder, taxsubgrp):
+                if checkBulkDensity(sand, silt, clay, bd):
+                    restriction.append("Dense")
+                    resDept = hzDept
+
+                if str(taxorder) != 'Histosols' and str(taxsubgrp).lower().find('histic') == -1:
+                    if pH is not None and pH <= 3.5:
+                        restriction.append("pH")
+                        resDept = hzDept
+
+                if ec is not None and ec >= 16.0:
+                    restriction.append("EC")
+                    resDept = hzDept
+
+            if cokey in dCR:
+                resDepth2, resKind = dCR[cokey]
+
+                if hzDept <= resDepth2 < hzDepb:
+                    if len(restriction) == 0:
+                        resDept = resDepth2
+
+                    restriction.append(resKind)
+
+            if len(restriction) > 0:
+                if not cokey in dComp:
+                    dComp[cokey] = [mukey, compName, localPhase, compPct, resDept, restriction]
+
+    for cokey in dComp2:
+        if cokey in dComp:
+            dComp2[cokey] = dComp[cokey]
+
+    return dComp2
+
+
+def legacyDCP(fx, ratingField, top, bot, cutOff=0):
+    # dMu of the AggregateHz_DCP_WTA loop
+    dMu = dict()
+    dPct = dict()
+    dComp = dict()
+    inFlds = ["mukey", "cokey", "comppct_r", "hzdept_r", "hzdepb_r", ratingField]
+    order = [("mukey", False), ("comppct_r", True), ("hzdept_r", False)]
+    where = lambda row: not row["comppct_r"] is None and row["comppct_r"] >= cutOff and not row[ratingField] is None
+
+    for rec in fx.cursor(inFlds, order, where):
+        mukey, cokey, comppct, hzdept, hzdepb, val = rec
+
+        if val is not None and hzdept is not None and hzdepb is not None:
+            hzT = min(hzdepb, bot) - max(hzdept, top)
+
+            if hzT > 0:
+                aws = float(hzT) * val
+
+                if not cokey in dComp and not mukey in dPct:
+                    dComp[cokey] = [mukey, comppct, hzT, aws]
+
+                    try:
+                        dPct[mukey] = dPct[mukey] + comppct
+
+                    except:
+                        dPct[mukey] = comppct
+
+                else:
+                    try:
+                        mukey, comppct, dHzT, dAWS = dComp[cokey]
+                        dAWS = dAWS + aws
+                        dHzT = dHzT + hzT
+                        dComp[cokey] = [mukey, comppct, dHzT, dAWS]
+
+                    except KeyError:
+                        pass
+
+    for cokey, vals in dComp.items():
+        mukey, comppct, hzT, cval = vals
+        sumPct = dPct[mukey]
+        newval = float(cval) / hzT
+
+        if mukey in dMu:
+            pct, mval = dMu[mukey]
+            newval = newval + mval
+
+        dMu[mukey] = [sumPct, round(newval, 2)]
+
+    return dMu
+
+
+def legacyWTA(fx, ratingField, top, bot):
+    # dMu of the AggregateHz_WTA_WTA loop, with its map unit rollup inside
+    # the row loop
+    dMu = dict()
+    dPct = dict()
+    dComp = dict()
+    inFlds = ["mukey", "cokey", "comppct_r", "hzdept_r", "hzdepb_r", ratingField]
+    order = [("mukey", False), ("comppct_r", True), ("hzdept_r", False)]
+
+    for rec in fx.cursor(inFlds, order, lambda row: not row[ratingField] is None):
+        mukey, cokey, comppct, hzdept, hzdepb, val = rec
+
+        if val is not None and hzdept is not None and hzdepb is not None:
+            hzT = min(hzdepb, bot) - max(hzdept, top)
+
+            if hzT > 0:
+                aws = float(hzT) * val * comppct
+
+                if not cokey in dComp:
+                    dComp[cokey] = [mukey, comppct, hzT, aws]
+
+                    try:
+                        dPct[mukey] = dPct[mukey] + comppct
+
+                    except:
+                        dPct[mukey] = comppct
+
+                else:
+                    mukey, comppct, dHzT, dAWS = dComp[cokey]
+                    dAWS = dAWS + aws
+                    dHzT = dHzT + hzT
+                    dComp[cokey] = [mukey, comppct, dHzT, dAWS]
+
+        iComp = len(dComp)
+
+        if iComp > 0:
+            for cokey, vals in dComp.items():
+                mukey, comppct, hzT, cval = vals
+                sumPct = dPct[mukey]
+                divisor = sumPct * hzT
+
+                if divisor > 0:
+                    newval = float(cval) / divisor
+
+                else:
+                    newval = 0.0
+
+                if mukey in dMu:
+                    pct, mval = dMu[mukey]
+                    newval = newval + mval
+
+                dMu[mukey] = [sumPct, newval]
+
+    return dMu
+
+
+def test_root_zone_matches_loop(fixture):
+    hz = fixture.horizons()
+
+    for maxD in (150.0, 999.0):
+        assert valu_engine.rootZoneDepth(hz, maxD, fixture.dCR) == legacyRZDepth(fixture, maxD, fixture.dCR)
+
+
+def test_aws_matches_loop(fixture):
+    hz = fixture.horizons()
+
+    for td, bd in depthList:
+        old = legacyAWS(fixture, td, bd)
+        new = valu_engine.awsComponents(hz, td, bd)
+
+        assert new == old
+
+        # the component AWS written to Co_VALU
+        for cokey, (mukey, compPct, hzT, aws) in old.items():
+            assert round(new[cokey][1] / 100.0 * new[cokey][3], 2) == round(compPct / 100.0 * aws, 2)
+
+
+def test_soc_matches_loop(fixture):
+    hz = fixture.horizons()
+
+    for maxD in (150.0, 999.0):
+        for td, bd in depthList:
+            assert valu_engine.socComponents(hz, td, bd, fixture.dRestrictions, maxD) == legacySOC(fixture, td, bd, fixture.dRestrictions, maxD)
+
+
+@pytest.mark.parametrize("ratingField, top, bot", [("om_r", 0, 100), ("awc_r", 0, 20), ("ksat_r", 50, 150)])
+def test_dominant_component_matches_loop(fixture, ratingField, top, bot):
+    assert valu_engine.dominantComponent(fixture.horizons(), ratingField, top, bot) == legacyDCP(fixture, ratingField, top, bot)
+
+
+@pytest.mark.parametrize("ratingField, top, bot", [("om_r", 0, 100), ("awc_r", 0, 20), ("ksat_r", 50, 150)])
+def test_weighted_average_matches_loop(fixture, ratingField, top, bot):
+    assert valu_engine.weightedAverage(fixture.horizons(), ratingField, top, bot) == legacyWTA(fixture, ratingField, top, bot)
+
+
+def test_ties_in_table_order(fixture):
+    # the same rows under other OBJECTIDs pick other dominant components
+    # where comppct_r and hzdept_r tie
+    other = Fixture(11, 400)
+    R = random.Random(5)
+    oids = [row["oid@"] for row in other.rows]
+    R.shuffle(oids)
+
+    for row, oid in zip(other.rows, oids):
+        row["oid@"] = oid
+
+    a = valu_engine.dominantComponent(fixture.horizons(), "om_r", 0, 100)
+    b = valu_engine.dominantComponent(other.horizons(), "om_r", 0, 100)
+
+    assert a != b
+    assert b == legacyDCP(other, "om_r", 0, 100)
+
+
+SOILS_QUERY2 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SDA_ACPF_SQL", "ACPF_JAMES", "Peaslee", "ACPF_Soils_Toolbox_Peaslee20170407", "ACPF_SoilsQuery2.py")
+
+
+def soilsQuery2(names, **ns):
+    # functions and classes of ACPF_SoilsQuery2, a Python 2 arcpy script, run
+    # in ns; CheckTexture is the one above
+    src = io.open(SOILS_QUERY2, encoding="latin-1").read()
+    ns.update(valu_engine=valu_engine, os=os)
+    ns.setdefault("CheckTexture", lambda mukey, cokey, desgnmaster, om, texture, lieutex, taxorder, taxsubgrp: checkTexture(desgnmaster, texture, lieutex, taxorder, taxsubgrp))
+
+    for name in names:
+        m = re.search(r"^(def|class) " + name + r"\b.*?(?=^## =)", src, flags=re.M | re.S)
+        exec(m.group(0), ns)
+
+    return ns
+
+
+def wetFixture(seed, nMu):
+    # Fixture with the map unit and component fields CalcPWSL reads: water
+    # components, the three hydric ratings and the phases and drainage
+    # classes an unranked component is judged by
+    fx = Fixture(seed, nMu)
+    R = random.Random(seed + 1)
+    dMu = dict()
+    dCo = dict()
+
+    for row in sorted(fx.rows, key=lambda row: row["oid@"]):
+        if not row["mukey"] in dMu:
+            dMu[row["mukey"]] = R.choice(["Clarion loam", "Water", "Okoboji silty clay loam, ponded", "Harps loam, drained", "Canisteo clay loam"])
+
+        if not row["cokey"] in dCo:
+            dCo[row["cokey"]] = dict(compname=R.choice(["Clarion", "Water", "Lake water", "Tidal Ocean", "Cypress swamp", "Swamp", "Okoboji"]),
+                comppct_r=R.choice([row["comppct_r"]] * 4 + [0, 85]), hydricrating=R.choice(["Yes", "No", "Unranked", "Unranked", None]),
+                localphase=R.choice([None, None, "Drained", "eroded", "channeled"]), otherph=R.choice([None, None, "flooded", "stony"]),
+                drainagecl=R.choice(["Poorly drained", "Very poorly drained", "Well drained", None]))
+
+        row["muname"] = dMu[row["mukey"]]
+        row.update(dCo[row["cokey"]])
+
+    return fx
+
+
+def legacyPWSL(fx):
+    # dMu of the CalcPWSL loop. Its cursor has no ORDER BY; HzData is
+    # written in mukey, comppct_r DESC, cokey, hzdept_r order.
+    qFieldNames = ["mukey", "muname", "cokey", "comppct_r",  "compname", "localphase", "otherph", "majcompflag", "compkind", "hydricrating", "drainagecl"]
+    order = [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]
+    dMu = dict()
+    drainList = ["Poorly drained", "Very poorly drained"]
+    phaseList = ["drained", "undrained", "channeled", "protected", "ponded", "flooded"]
+    lastCokey = 'xxx'
+
+    for rec in fx.cursor(qFieldNames, order, lambda row: row["comppct_r"] > 0):
+        mukey, muname, cokey, comppct_r,  compname, localphase, otherph, majcompflag, compkind, hydricrating, drainagecl = rec
+        mukey = str(mukey)
+        cokey = str(cokey)
+
+        if cokey != lastCokey:
+            if ( muname == "Water" or str(compname) == "Water" or (str(compname).lower().find(" water") >= 0) or (str(compname).lower().find(" ocean") >= 0)  or (str(compname).find(" swamp") >= 0) or str(compname) == "Swamp" ) :
+                if comppct_r >= 80:
+                    dMu[mukey] = 999
+
+                else:
+                    try:
+                        sumPct = dMu[mukey]
+
+                        if sumPct != 999:
+                            dMu[mukey] = sumPct + comppct_r
+
+                    except:
+                        dMu[mukey] = comppct_r
+
+            elif hydricrating == 'No':
+                pass
+
+            elif hydricrating == 'Yes':
+                try:
+                    sumPct = dMu[mukey]
+
+                    if sumPct != 999:
+                        dMu[mukey] = sumPct + comppct_r
+
+                except:
+                    dMu[mukey] = comppct_r
+
+            elif hydricrating == 'Unranked':
+                if [d for d in phaseList if str(localphase).lower().find(d) >= 0] or [d for d in phaseList if str(otherph).lower().find(d) >= 0] or \
+                   [d for d in phaseList if muname.find(d) >= 0] or str(drainagecl) in drainList:
+                    try:
+                        sumPct = dMu[mukey]
+                        dMu[mukey] = sumPct + comppct_r
+
+                    except:
+                        dMu[mukey] = comppct_r
+
+        lastCokey = cokey
+
+    return dMu
+
+
+def legacyRZAWS(fx, dRestrictions, maxD):
+    # dComp of the CalcRZAWS loop. The tmukey print of the restriction
+    # fallback is left out; tmukey was commented out and raised NameError.
+    qFieldNames = ["mukey", "cokey", "comppct_r",  "compname", "localphase", "majcompflag", "compkind", "taxorder", "taxsubgrp", "desgnmaster", "om_r", "awc_r", "hzdept_r", "hzdepb_r", "texture", "lieutex"]
+    order = [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]
+    dComp = dict()
+
+    for rec in fx.cursor(qFieldNames, order):
+        mukey, cokey, compPct, compName, localPhase, mjrFlag, cKind, taxorder, taxsubgrp, desgnmaster, om, awc, top, bot, texture, lieutex = rec
+
+        if mjrFlag == "Yes" and cKind != "Miscellaneous area" and cKind is not None:
+            if top is None and bot is None:
+                if not cokey in dComp:
+                    dComp[cokey] = mukey, compName, localPhase, compPct, 0, 0, ""
+
+            try:
+                d1, d2, d3, d4, rDepth, restriction = dRestrictions[cokey]
+                cBot = min(rDepth, bot, maxD)
+
+            except:
+                cBot = min(maxD, bot)
+                restriction = []
+                rDepth = maxD
+
+            bOrganic = checkTexture(desgnmaster, texture, lieutex, taxorder, taxsubgrp)
+
+            if awc is None:
+                awc = 0.0
+
+            else:
+                awc = round(awc, 2)
+
+            if bOrganic:
+                useHz = False
+
+            else:
+                useHz = True
+
+                if not cokey in dComp and cBot == 0:
+                    dComp[cokey] = mukey, compName, localPhase, compPct, 0, 0, restriction
+
+            if top < cBot and useHz == True:
+                hzT = cBot - top
+                aws = float(hzT) * float(awc) * 10.0
+
+                if cokey in dComp:
+                    mukey, compName, localPhase, compPct, dHzT, dAWS, restriction = dComp[cokey]
+                    dAWS = dAWS + aws
+                    dHzT += hzT
+                    dComp[cokey] = mukey, compName, localPhase, compPct, dHzT, dAWS, restriction
+
+                else:
+                    dComp[cokey] = mukey, compName, localPhase, compPct, hzT, aws, restriction
+
+        else:
+            dComp[cokey] = mukey, compName, localPhase, compPct, None, None, None, None
+
+    return dComp
+
+
+class ArcPy(object):
+    # arcpy.da.SearchCursor over a Fixture, counting the reads
+
+    class Cursor(list):
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+    def __init__(self, fx):
+        self.da = self
+        self.fx = fx
+        self.reads = 0
+
+    def SetProgressorLabel(self, label):
+        pass
+
+    def SearchCursor(self, table, fields, sql_clause=None):
+        assert sql_clause == (None, valu_engine.HZ_ORDER)
+        self.reads += 1
+
+        return self.Cursor(self.fx.cursor(fields, [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]))
+
+
+@pytest.fixture(scope="module")
+def wet():
+    return wetFixture(13, 400)
+
+
+def test_pwsl_matches_loop(wet):
+    ns = soilsQuery2(["PwslPlugin"])
+    plugin = ns["PwslPlugin"]()
+    fields = valu_engine.HorizonReader([plugin]).fields(valu_engine.HZ_FIELDS)
+    valu_engine.HorizonReader([plugin]).run(wet.cursor(fields, [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]), fields)
+    old = legacyPWSL(wet)
+
+    assert plugin.dMu == old
+    assert 999 in old.values() and len(old) > 100
+
+
+def test_pwsl_ratings():
+    # one rating per component, from its first horizon
+    fields = ["mukey", "muname", "cokey", "comppct_r", "compname", "localphase", "otherph", "majcompflag", "compkind", "hydricrating", "drainagecl", "hzdept_r"]
+    comps = [("1", "Water", "11", 85, "Water", None, None, "Yes", "Miscellaneous area", "Unranked", None),
+             ("1", "Water", "12", 10, "Okoboji", None, None, "No", "Series", "Yes", "Poorly drained"),
+             ("2", "Webster clay loam", "21", 40, "Webster", None, None, "Yes", "Series", "Yes", "Poorly drained"),
+             ("2", "Webster clay loam", "22", 30, "Clarion", "drained", None, "No", "Series", "No", "Poorly drained"),
+             ("3", "Harps loam", "31", 25, "Harps", "Drained", None, "Yes", "Series", "Unranked", "Well drained"),
+             ("3", "Harps loam", "32", 15, "Canisteo", None, "ponded", "No", "Series", "Unranked", "Well drained"),
+             ("3", "Harps loam", "33", 10, "Okoboji", None, None, "No", "Series", "Unranked", "Very poorly drained"),
+             ("3", "Harps loam", "34", 5, "Clarion", "eroded", None, "No", "Series", "Unranked", "Well drained"),
+             ("4", "Okoboji, ponded", "41", 60, "Okoboji", None, None, "Yes", "Series", "Unranked", None),
+             ("4", "Okoboji, ponded", "42", 0, "Water", None, None, "No", "Miscellaneous area", "Yes", None),
+             ("5", "Clarion loam", "51", 100, "Clarion", None, None, "Yes", "Series", "No", "Poorly drained"),
+             ("6", "Lakes and swamps", "61", 20, "Lake water", None, None, "Yes", None, None, None),
+             ("6", "Lakes and swamps", "62", 10, "Swamp", None, None, "No", None, "No", None)]
+    rows = [comp + (top,) for comp in comps for top in (0, 20)]
+
+    ns = soilsQuery2(["PwslPlugin"])
+    plugin = ns["PwslPlugin"]()
+    valu_engine.HorizonReader([plugin]).run(rows, fields)
+
+    assert plugin.dMu == {"1": 999, "2": 40, "3": 50, "4": 60, "6": 30}
+
+
+def test_root_zone_aws_matches_loop(wet):
+    hz = wet.horizons()
+    ns = soilsQuery2(["RootZoneAwsPlugin"])
+    fields = list(valu_engine.HZ_FIELDS)
+
+    for maxD in (150.0, 999.0):
+        # the restrictions of CalcRZDepth, as CalcRZAWS gets them
+        dRestrictions = valu_engine.rootZoneDepth(hz, maxD, wet.dCR)
+        plugin = ns["RootZoneAwsPlugin"](dRestrictions, maxD)
+        valu_engine.HorizonReader([plugin]).run(hz.rows(fields), fields)
+        old = legacyRZAWS(wet, dRestrictions, maxD)
+
+        assert plugin.dComp == old
+
+        # components cut off at a restriction above their lowest horizon
+        cut = [cokey for cokey, v in old.items() if len(v) == 7 and v[4] and dRestrictions[cokey][4] < maxD and v[4] == dRestrictions[cokey][4]]
+        assert len(cut) > 10
+
+
+def test_root_zone_aws_truncated():
+    fields = ["mukey", "cokey", "comppct_r", "compname", "localphase", "majcompflag", "compkind", "taxorder", "taxsubgrp", "desgnmaster", "om_r", "awc_r", "hzdept_r", "hzdepb_r", "texture", "lieutex"]
+    rows = [("1", "11", 60, "Clarion", None, "Yes", "Series", "Mollisols", None, "O", 40.0, 0.3, 0, 5, "MUCK", None),
+            ("1", "11", 60, "Clarion", None, "Yes", "Series", "Mollisols", None, "A", 3.0, 0.2, 5, 20, "L", None),
+            ("1", "11", 60, "Clarion", None, "Yes", "Series", "Mollisols", None, "B", 1.0, 0.15, 20, 60, "L", None),
+            ("1", "11", 60, "Clarion", None, "Yes", "Series", "Mollisols", None, "C", 0.5, None, 60, 200, "L", None),
+            ("1", "12", 30, "Urban land", None, "Yes", "Series", None, None, "A", 1.0, 0.2, 0, 20, "L", None),
+            ("1", "13", 10, "Pits", None, "No", "Miscellaneous area", None, None, None, None, None, 0, 20, None, None)]
+    dRestrictions = {"11": ["1", "Clarion", None, 60, 48, ["Lithic bedrock"]], "12": ["1", "Urban land", None, 30, 0, ["Dense"]]}
+
+    ns = soilsQuery2(["RootZoneAwsPlugin"])
+    plugin = ns["RootZoneAwsPlugin"](dRestrictions, 150.0)
+    valu_engine.HorizonReader([plugin]).run(rows, fields)
+
+    # the organic surface horizon is skipped, the B horizon cut at 48 cm
+    assert plugin.dComp["11"] == ("1", "Clarion", None, 60, 43, 15 * 0.2 * 10 + 28 * 0.15 * 10, ["Lithic bedrock"])
+    assert plugin.dComp["12"] == ("1", "Urban land", None, 30, 0, 0, ["Dense"])
+    assert plugin.dComp["13"] == ("1", "Pits", None, 10, None, None, None, None)
+
+    plugin = ns["RootZoneAwsPlugin"](dict(), 150.0)
+    valu_engine.HorizonReader([plugin]).run(rows, fields)
+
+    assert plugin.dComp["11"][4] == 145 and plugin.dComp["12"][4:] == (20, 40.0, [])
+
+
+def test_get_horizons_plugins(wet):
+    # both plugins in the pass that reads the table, then again over the copy
+    fake = ArcPy(wet)
+    ns = soilsQuery2(["GetHorizons", "PwslPlugin", "RootZoneAwsPlugin"], arcpy=fake, dHorizons=dict())
+    dRestrictions = valu_engine.rootZoneDepth(wet.horizons(), 150.0, wet.dCR)
+    pwsl, rzaws = legacyPWSL(wet), legacyRZAWS(wet, dRestrictions, 150.0)
+
+    for reload, reads in ((False, 1), (False, 1), (True, 2)):
+        pwPlugin = ns["PwslPlugin"]()
+        rzPlugin = ns["RootZoneAwsPlugin"](dRestrictions, 150.0)
+        hz = ns["GetHorizons"]("HzData", reload=reload, plugins=[pwPlugin, rzPlugin])
+
+        assert fake.reads == reads
+        assert pwPlugin.dMu == pwsl and rzPlugin.dComp == rzaws
+        assert hz.num("awc_r").shape == wet.horizons().num("awc_r").shape
+
+
+def sparseFixture(seed, nMu):
+    # Fixture with components missing comppct_r and components without
+    # horizons: one row with NULL horizon fields, as the outer join of the
+    # horizon query gives them
+    fx = Fixture(seed, nMu)
+    R = random.Random(seed + 2)
+    cokeys = sorted(set(row["cokey"] for row in fx.rows))
+    noPct = set(R.sample(cokeys, len(cokeys) // 10))
+    hzFields = ["desgnmaster", "hzdept_r", "hzdepb_r", "sandtotal_r", "silttotal_r", "claytotal_r", "om_r", "dbthirdbar_r", "ph1to1h2o_r", "ec_r", "awc_r", "ksat_r", "texture", "lieutex", "fragvol"]
+    extra = list()
+
+    for row in fx.rows:
+        if row["cokey"] in noPct:
+            row["comppct_r"] = None
+
+    for i, mukey in enumerate(sorted(set(row["mukey"] for row in fx.rows))):
+        if R.random() < 0.3:
+            row = dict(R.choice([row for row in fx.rows if row["mukey"] == mukey]))
+            row.update(dict((f, None) for f in hzFields))
+            row.update(cokey=str(800000 + i), compname="Rock outcrop", compkind=R.choice(["Miscellaneous area", "Series"]), comppct_r=R.choice([None, 5, 40, 85]), majcompflag=R.choice(["Yes", "No"]))
+            extra.append(row)
+
+    # a map unit of components without horizons only
+    for c, pct in enumerate([60, 60, None]):
+        extra.append(dict(fx.rows[0], **dict([(f, None) for f in hzFields] + [("mukey", "299999"), ("cokey", str(900100 - c)), ("comppct_r", pct), ("majcompflag", "Yes")])))
+
+    fx.rows.extend(extra)
+    R.shuffle(fx.rows)
+
+    for oid, row in enumerate(fx.rows):
+        row["oid@"] = oid + 1
+
+    return fx
+
+
+def legacySumPct(fx):
+    # dPct of the GetSumPct loop
+    pctFlds = ["mukey", "cokey", "compkind", "majcompflag", "comppct_r"]
+    cokeyList = list()
+    dPct = dict()
+
+    for rec in fx.cursor(pctFlds, [], lambda row: not row["comppct_r"] is None):
+        mukey, cokey, compkind, flag, comppct = rec
+        m = 0
+        me = 0
+        e = 0
+
+        if not cokey in cokeyList:
+            cokeyList.append(cokey)
+
+            if flag == 'Yes':
+                m = comppct
+
+                if not compkind in  ["Miscellaneous area", ""]:
+                    me = comppct
+                    e = comppct
+
+                else:
+                    me = 0
+
+            elif not compkind in  ["Miscellaneous area", ""]:
+                e = comppct
+
+            if mukey in dPct:
+                pctAll, pctME, pctMjr, pctE = dPct[mukey]
+                dPct[str(mukey)] = (pctAll + comppct, pctME + me, pctMjr + m, pctE + e)
+
+            else:
+                dPct[str(mukey)] = (comppct, me, m, e)
+
+    return dPct
+
+
+def legacyDominant(fx, major):
+    # the first component of each map unit in mukey, comppct_r DESC order,
+    # cokey breaking ties as in the DCP loops; major=True is GetSurfaceData's
+    # majcompflag = 'Yes'
+    dDom = dict()
+    order = [("mukey", False), ("comppct_r", True), ("cokey", False), ("hzdept_r", False)]
+
+    for mukey, cokey in fx.cursor(["mukey", "cokey"], order, lambda row: not major or row["majcompflag"] == 'Yes'):
+        if not mukey in dDom:
+            dDom[mukey] = cokey
+
+    return dDom
+
+
+@pytest.fixture(scope="module")
+def sparse():
+    return sparseFixture(17, 300)
+
+
+def test_sum_pct_matches_loop(sparse):
+    catalogue = sparse.horizons().catalogue()
+    old = legacySumPct(sparse)
+
+    assert catalogue.sumPct() == old
+
+    # map units of components without comppct_r are left out, components
+    # without horizons are counted
+    missing = set(row["mukey"] for row in sparse.rows) - set(old)
+    assert missing and all(row["comppct_r"] is None for row in sparse.rows if row["mukey"] in missing)
+    assert old["299999"] == (120, 120, 120, 120)
+
+
+def test_dominant_matches_loop(sparse):
+    catalogue = sparse.horizons().catalogue()
+
+    for major in (False, True):
+        assert catalogue.dominant(major) == legacyDominant(sparse, major)
+
+    # the tie of two components without horizons goes to the lower cokey
+    assert catalogue.dominant(True)["299999"] == "900099"
+
+
+def test_dominant_ties(sparse):
+    # map units where the dominant comppct_r is shared
+    catalogue = sparse.horizons().catalogue()
+    dDom = catalogue.dominant()
+    ties = 0
+
+    for mukey, groups in catalogue.byMukey.items():
+        top = [catalogue.cokeys[g] for g in groups if catalogue.compPct[g] == catalogue.compPct[groups[0]]]
+
+        if len(top) > 1:
+            ties += 1
+            assert dDom[mukey] == min(top, key=int)
+
+    assert ties > 10
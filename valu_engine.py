@@ -0,0 +1,702 @@
+#-------------------------------------------------------------------------------
+# Name:        valu_engine
+# Purpose:     NumPy engine for the VALU1 horizon aggregations in
+#              ACPF_SoilsQuery2 (CalcRZDepth, CalcAWS, CalcSOC,
+#              AggregateHz_DCP_WTA and AggregateHz_WTA_WTA).
+#
+#              Those functions each walked the whole HzData table through a
+#              SearchCursor, once per depth range, accumulating into
+#              dictionaries keyed by cokey or mukey. Here the horizon table
+#              is read once into columnar arrays (HorizonTable) and every
+#              aggregation is a set of array expressions followed by grouped
+#              reductions.
+#
+#              The results are the dictionaries the original loops built,
+#              with the same values: every expression is evaluated in the
+#              original operand order, grouped sums use np.bincount (which
+#              adds in row order, like the loops did) and rounding goes
+#              through the interpreter's own round(). Rows a cursor returned
+#              in no defined order, ties of an ORDER BY without cokey, are
+#              taken in OBJECTID order. The module does not use arcpy.
+#
+# Created:     17/10/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+
+
+# HzData fields used by the aggregations
+HZ_FIELDS = ["mukey", "cokey", "compname", "compkind", "majcompflag", "localphase", "comppct_r", "taxorder", "taxsubgrp", "desgnmaster", "hzdept_r", "hzdepb_r", "sandtotal_r", "silttotal_r", "claytotal_r", "om_r", "dbthirdbar_r", "ph1to1h2o_r", "ec_r", "awc_r", "ksat_r", "texture", "lieutex", "fragvol", "OID@"]
+
+# OBJECTID of a row, the order ties of an ORDER BY come back in
+OID = "OID@"
+
+# Row order of the table, the same ORDER BY the cursors used
+HZ_ORDER = "ORDER BY mukey, comppct_r DESC, cokey, hzdept_r ASC"
+
+# Organic horizon textures and lieutex values (CheckTexture)
+lieuList = ['Slightly decomposed plant material', 'Moderately decomposed plant material', \
+'Highly decomposed plant material', 'Undecomposed plant material', 'Muck', 'Mucky peat', \
+'Peat', 'Coprogenous earth']
+txList = ["CE", "COP-MAT", "HPM", "MPM", "MPT", "MUCK", "PDOM", "PEAT", "SPM", "UDOM"]
+
+
+class HorizonTable(object):
+    # Columnar copy of the HzData table
+    #
+    # rows (or the columns, one list per field) must be in HZ_ORDER. Every
+    # field is kept as the list of values the cursor returned (raw), so values
+    # copied into the results keep their Python type; numeric fields are also
+    # available as float64 arrays with NaN for NULL (num).
+
+    def __init__(self, fields, rows=(), columns=None):
+        self.fields = [f.lower() for f in fields]
+
+        if columns is None:
+            cols = [list() for f in fields]
+
+            for row in rows:
+                for col, val in zip(cols, row):
+                    col.append(val)
+
+        else:
+            cols = columns
+
+        self.raw = dict(zip(self.fields, cols))
+        self.n = len(cols[0]) if cols else 0
+        self._num = dict()
+        self._text = dict()
+        self._catalogue = None
+
+        # OBJECTID of every row, or the row position for a table read without it
+        self.oid = self.num(OID) if self.has(OID) else np.arange(self.n, dtype=np.float64)
+
+        # components are contiguous runs of cokey
+        cokey = self.text("cokey")
+        newCo = np.ones(self.n, dtype=bool)
+
+        if self.n > 1:
+            newCo[1:] = cokey[1:] != cokey[:-1]
+
+        self.coStart = np.flatnonzero(newCo)
+        self.coIndex = np.cumsum(newCo) - 1
+        self.coCount = len(self.coStart)
+
+        # and so are map units
+        mukey = self.text("mukey")
+        newMu = np.ones(self.n, dtype=bool)
+
+        if self.n > 1:
+            newMu[1:] = mukey[1:] != mukey[:-1]
+
+        self.muStart = np.flatnonzero(newMu)
+        self.muIndex = np.cumsum(newMu) - 1
+
+    def has(self, field):
+        return field.lower() in self.raw
+
+    def catalogue(self):
+        # ComponentCatalogue of the table, built on first use
+        if self._catalogue is None:
+            self._catalogue = ComponentCatalogue(self)
+
+        return self._catalogue
+
+    def rows(self, fields):
+        # The rows again, as tuples of fields, for a HorizonReader
+        return zip(*[self.raw[f.lower()] for f in fields])
+
+    def num(self, field):
+        # float64 array of a numeric field, NaN for NULL
+        field = field.lower()
+
+        if not field in self._num:
+            self._num[field] = np.array([np.nan if v is None else v for v in self.raw[field]], dtype=np.float64)
+
+        return self._num[field]
+
+    def text(self, field):
+        # object array of a field's values
+        field = field.lower()
+
+        if not field in self._text:
+            arr = np.empty(self.n, dtype=object)
+            arr[:] = self.raw[field]
+            self._text[field] = arr
+
+        return self._text[field]
+
+
+
+class ComponentCatalogue(object):
+    # Component level view of a HorizonTable, one entry per component in
+    # HZ_ORDER, indexed by cokey (index) and by mukey (byMukey, the
+    # components of each map unit in comppct_r DESC order)
+    #
+    # The flags follow GetSumPct: major is majcompflag = 'Yes', earthy is any
+    # compkind except 'Miscellaneous area' or ''.
+
+    def __init__(self, hz):
+        self.hz = hz
+        self.first = hz.coStart
+        self.cokeys = [hz.raw["cokey"][i] for i in self.first]
+        self.mukeys = [hz.raw["mukey"][i] for i in self.first]
+        self.compPct = [hz.raw["comppct_r"][i] for i in self.first]
+        self.index = dict()
+        self.byMukey = dict()
+
+        for g, cokey in enumerate(self.cokeys):
+            self.index[cokey] = g
+            self.byMukey.setdefault(self.mukeys[g], list()).append(g)
+
+        compkind = [hz.raw["compkind"][i] for i in self.first]
+        flag = [hz.raw["majcompflag"][i] for i in self.first]
+        self.major = np.array([f == 'Yes' for f in flag], dtype=bool)
+        self.earthy = np.array([not k in ["Miscellaneous area", ""] for k in compkind], dtype=bool)
+        self.majorEarthy = self.major & self.earthy
+        self._sumPct = None
+
+    def __len__(self):
+        return len(self.cokeys)
+
+    def value(self, cokey, field):
+        # Component level field of a component (from its first horizon)
+        return self.hz.raw[field.lower()][self.first[self.index[cokey]]]
+
+    def records(self, fields, order=None):
+        # [field values] of every component, in HZ_ORDER or sorted by the
+        # field named in order
+        cols = [self.hz.raw[f.lower()] for f in fields]
+        recs = [[col[i] for col in cols] for i in self.first]
+
+        if not order is None:
+            pos = [f.lower() for f in fields].index(order.lower())
+            recs.sort(key=lambda rec: rec[pos])
+
+        return recs
+
+    def sumPct(self):
+        # dPct of GetSumPct: mukey: (sum of comppct_r for all components,
+        # major-earthy, major, earthy), components without comppct_r left out
+        if self._sumPct is None:
+            dPct = dict()
+
+            for mukey, groups in self.byMukey.items():
+                pct = [(self.compPct[g], g) for g in groups if not self.compPct[g] is None]
+
+                if len(pct) == 0:
+                    continue
+
+                dPct[str(mukey)] = (sum(p for p, g in pct), sum(p for p, g in pct if self.majorEarthy[g]), sum(p for p, g in pct if self.major[g]), sum(p for p, g in pct if self.earthy[g]))
+
+            self._sumPct = dPct
+
+        return self._sumPct
+
+    def dominant(self, major=False):
+        # mukey: cokey of the dominant component, the one with the highest
+        # comppct_r (ties to the lower cokey). major=True only looks at
+        # major components.
+        dDom = dict()
+
+        for mukey, groups in self.byMukey.items():
+            for g in groups:
+                if not major or self.major[g]:
+                    dDom[mukey] = self.cokeys[g]
+                    break
+
+        return dDom
+
+
+class Accumulator(object):
+    # Plugin of a HorizonReader
+    #
+    # fields are the horizon table fields the plugin reads; the hooks get the
+    # values of a row as a tuple in that order. begin is called with the
+    # first row of each component, row with every row (the first one
+    # included), end after the last row of the component and finish once
+    # after the last component.
+
+    fields = ()
+
+    def bind(self, fields):
+        # Positions of the plugin fields in the reader rows
+        pos = [fields.index(f.lower()) for f in self.fields]
+        self.get = lambda rec: tuple(rec[i] for i in pos)
+
+    def begin(self, rec):
+        pass
+
+    def row(self, rec):
+        pass
+
+    def end(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+class HorizonReader(object):
+    # One ordered pass over the horizon table, handing each component's
+    # horizons to every registered Accumulator
+    #
+    # Calculations that need the same table register a plugin instead of
+    # opening another cursor, so the table is read once however many
+    # products are computed from it.
+
+    def __init__(self, plugins):
+        self.plugins = list(plugins)
+
+    def fields(self, base=()):
+        # Fields for the cursor: base, then any other field a plugin reads
+        fields = [f.lower() for f in base]
+
+        for plugin in self.plugins:
+            for f in plugin.fields:
+                if not f.lower() in fields:
+                    fields.append(f.lower())
+
+        if not "cokey" in fields:
+            fields.append("cokey")
+
+        return fields
+
+    def run(self, rows, fields):
+        # Dispatch rows (tuples of fields, ordered so that the horizons of a
+        # component are together) to the plugins
+        fields = [f.lower() for f in fields]
+        coPos = fields.index("cokey")
+
+        for plugin in self.plugins:
+            plugin.bind(fields)
+
+        plugins = [(plugin, plugin.get) for plugin in self.plugins]
+        lastCokey = None
+        bFirst = True
+
+        for rec in rows:
+            cokey = rec[coPos]
+
+            if bFirst or cokey != lastCokey:
+                if not bFirst:
+                    for plugin, get in plugins:
+                        plugin.end()
+
+                for plugin, get in plugins:
+                    plugin.begin(get(rec))
+
+                lastCokey = cokey
+                bFirst = False
+
+            for plugin, get in plugins:
+                plugin.row(get(rec))
+
+        if not bFirst:
+            for plugin, get in plugins:
+                plugin.end()
+
+        for plugin in self.plugins:
+            plugin.finish()
+
+
+class HorizonCollector(Accumulator):
+    # Plugin keeping the rows as a HorizonTable (table, after finish)
+
+    def __init__(self, fields=None):
+        self.fields = [f.lower() for f in (fields or HZ_FIELDS)]
+        self.cols = [list() for f in self.fields]
+        self.table = None
+
+    def bind(self, fields):
+        self.pos = [fields.index(f) for f in self.fields]
+        self.get = lambda rec: rec
+
+    def row(self, rec):
+        for col, i in zip(self.cols, self.pos):
+            col.append(rec[i])
+
+    def finish(self):
+        self.table = HorizonTable(self.fields, columns=self.cols)
+        self.cols = None
+
+
+def pyRound(values, digits):
+    # round() of every value, as the interpreter rounds floats, NaN kept
+    out = values.copy()
+    ok = ~np.isnan(values)
+
+    if ok.any():
+        uniq, inv = np.unique(values[ok], return_inverse=True)
+        out[ok] = np.array([round(float(v), digits) for v in uniq], dtype=np.float64)[inv.ravel()]
+
+    return out
+
+
+def _sums(groups, weights, size):
+    # Sum weights by group in row order
+    return np.bincount(groups, weights=weights, minlength=size)
+
+
+def _lastRows(hz, mask):
+    # Last row index per component among masked rows, -1 where none
+    last = np.full(hz.coCount, -1, dtype=np.int64)
+    rows = np.flatnonzero(mask)[::-1]
+    groups, pos = np.unique(hz.coIndex[rows], return_index=True)
+    last[groups] = rows[pos]
+
+    return last
+
+
+def _firstRows(hz, mask):
+    # First row index per component among masked rows, -1 where none
+    first = np.full(hz.coCount, -1, dtype=np.int64)
+    rows = np.flatnonzero(mask)
+    groups, pos = np.unique(hz.coIndex[rows], return_index=True)
+    first[groups] = rows[pos]
+
+    return first
+
+
+def intervalComponents(hz, mask, hzT, value):
+    # dComp of the CalcAWS and CalcSOC loops:
+    # str(cokey): (mukey, comppct_r, sum of usable thickness, sum of value)
+    # for the components with masked rows, both sums added up in row order
+
+    groups = hz.coIndex[mask]
+    count = np.bincount(groups, minlength=hz.coCount)
+    sumT = _sums(groups, hzT[mask], hz.coCount)
+    sumV = _sums(groups, value[mask], hz.coCount)
+
+    cokey = hz.raw["cokey"]
+    mukey = hz.raw["mukey"]
+    pct = hz.raw["comppct_r"]
+
+    dComp = dict()
+
+    for g in np.flatnonzero(count):
+        i = hz.coStart[g]
+        dComp[str(cokey[i])] = (mukey[i], pct[i], float(sumT[g]), float(sumV[g]))
+
+    return dComp
+
+
+def awsComponents(hz, td, bd):
+    # Component available water supply for the td - bd range (CalcAWS)
+
+    with np.errstate(invalid="ignore"):
+        top = hz.num("hzdept_r")
+        bot = hz.num("hzdepb_r")
+        awc = hz.num("awc_r")
+
+        # usable thickness from this horizon
+        hzT = np.minimum(bot, bd) - np.maximum(top, td)
+        mask = ~np.isnan(top) & ~np.isnan(awc) & (hzT > 0)
+        aws = hzT * awc * 10
+
+    return intervalComponents(hz, mask, hzT, aws)
+
+
+def socComponents(hz, td, bd, dRestrictions, maxD):
+    # Component soil organic carbon for the td - bd range, not below the
+    # component restriction depth (CalcSOC)
+
+    # restriction depth by component
+    cokey = hz.raw["cokey"]
+    rz = np.array([dRestrictions[cokey[i]][0] if cokey[i] in dRestrictions else maxD for i in hz.coStart], dtype=np.float64)
+
+    with np.errstate(invalid="ignore"):
+        hzdept = hz.num("hzdept_r")
+        top = np.maximum(hzdept, td)
+        bot = np.minimum(hz.num("hzdepb_r"), bd)
+        om = pyRound(hz.num("om_r"), 3)
+        db3 = hz.num("dbthirdbar_r")
+        fragvol = np.nan_to_num(hz.num("fragvol"))
+        compPct = hz.num("comppct_r")
+
+        # usable thickness above the restriction
+        cBot = np.minimum(rz[hz.coIndex], bot)
+        hzT = cBot - top
+        mask = ~np.isnan(hzdept) & ~np.isnan(om) & ~np.isnan(db3) & (hzT > 0)
+
+        soc = ( (hzT * ( ( om / 1.724 ) * db3 )) / 100.0 ) * ((100.0 - fragvol) / 100.0) * ( compPct * 100 )
+
+    return intervalComponents(hz, mask, hzT, soc)
+
+
+def organicHorizons(hz):
+    # CheckTexture for every row: True for an organic horizon
+
+    histic = _histic(hz)
+    organic = np.array([str(d) in ("O", "L") or str(t) in txList or str(l) in lieuList for d, t, l in zip(hz.raw["desgnmaster"], hz.raw["texture"], hz.raw["lieutex"])], dtype=bool)
+
+    return organic & ~histic
+
+
+def _histic(hz):
+    # Histosols and histic components, by row
+    coHistic = np.array([str(hz.raw["taxorder"][i]) == 'Histosols' or str(hz.raw["taxsubgrp"][i]).lower().find('histic') >= 0 for i in hz.coStart], dtype=bool)
+
+    return coHistic[hz.coIndex]
+
+
+def denseHorizons(hz):
+    # CheckBulkDensity for every row: True for a dense layer
+
+    with np.errstate(invalid="ignore"):
+        sand = hz.num("sandtotal_r").copy()
+        silt = hz.num("silttotal_r").copy()
+        clay = hz.num("claytotal_r").copy()
+        bd = hz.num("dbthirdbar_r")
+
+        nSand = np.isnan(sand)
+        nSilt = np.isnan(silt)
+        nClay = np.isnan(clay)
+        nulls = nSand.astype(int) + nSilt + nClay
+
+        # Missing a single total_r value, calculate it
+        one = nulls == 1
+        fill = one & nSand
+        sand[fill] = 100.0 - silt[fill] - clay[fill]
+        fill = one & nSilt
+        silt[fill] = 100.0 - sand[fill] - clay[fill]
+        fill = one & nClay
+        clay[fill] = 100.0 - sand[fill] - silt[fill]
+
+        total = pyRound(sand + silt + clay, 1)
+
+        a = bd - ((( sand * 1.65 ) / 100.0 ) + (( silt * 1.30 ) / 100.0 ) + (( clay * 1.25 ) / 100.0))
+        b = ( 0.002081 * sand ) + ( 0.003912 * silt ) + ( 0.0024351 * clay )
+
+        return ~np.isnan(bd) & (nulls <= 1) & (total == 100.0) & (a > b)
+
+
+def rootZoneDepth(hz, maxD, dCR):
+    # dComp2 of CalcRZDepth: cokey: [mukey, compname, localphase, comppct_r,
+    # restriction depth, restriction list or ""] for the major earthy
+    # components, using the horizon properties and the component
+    # restrictions in dCR
+
+    compkind = hz.raw["compkind"]
+    majcomp = hz.raw["majcompflag"]
+    coMajor = np.array([compkind[i] is not None and compkind[i] != 'Miscellaneous area' and majcomp[i] == 'Yes' for i in hz.coStart], dtype=bool)
+    major = coMajor[hz.coIndex]
+
+    with np.errstate(invalid="ignore"):
+        hzDept = hz.num("hzdept_r")
+        hzDepb = hz.num("hzdepb_r")
+        pH = hz.num("ph1to1h2o_r")
+        ec = hz.num("ec_r")
+
+        mineral = major & (hzDept < maxD) & ~organicHorizons(hz)
+        dense = mineral & denseHorizons(hz)
+        lowPH = mineral & ~_histic(hz) & (pH <= 3.5)
+        highEC = mineral & (ec >= 16.0)
+
+        # standard component restriction within this horizon
+        cokey = hz.raw["cokey"]
+        coRes = np.array([dCR[cokey[i]][0] if cokey[i] in dCR else np.nan for i in hz.coStart], dtype=np.float64)
+        resDepth2 = coRes[hz.coIndex]
+        inHz = major & (hzDept < maxD) & (hzDept <= resDepth2) & (resDepth2 < hzDepb)
+
+    byProperty = dense | lowPH | highEC
+    first = _firstRows(hz, byProperty | inHz)
+
+    mukey = hz.raw["mukey"]
+    compName = hz.raw["compname"]
+    localPhase = hz.raw["localphase"]
+    compPct = hz.raw["comppct_r"]
+    hzTop = hz.raw["hzdept_r"]
+
+    dComp2 = dict()
+    last = _lastRows(hz, major)
+
+    for g in np.flatnonzero(last >= 0):
+        i = last[g]
+        co = cokey[i]
+        j = first[g]
+
+        if j < 0:
+            # Initialize component restriction depth to maxD
+            dComp2[co] = [mukey[i], compName[i], localPhase[i], compPct[i], maxD, ""]
+            continue
+
+        restriction = list()
+
+        if dense[j]:
+            restriction.append("Dense")
+
+        if lowPH[j]:
+            restriction.append("pH")
+
+        if highEC[j]:
+            restriction.append("EC")
+
+        if inHz[j]:
+            resDept2, resKind = dCR[co]
+            restriction.append(resKind)
+
+        if byProperty[j]:
+            # use horizon top depth
+            resDept = hzTop[j]
+
+        else:
+            resDept = resDept2
+
+        dComp2[co] = [mukey[j], compName[j], localPhase[j], compPct[j], resDept, restriction]
+
+    return dComp2
+
+
+def dominantComponent(hz, ratingField, top, bot, cutOff=0):
+    # dMu of AggregateHz_DCP_WTA: mukey: [comppct_r, thickness weighted
+    # average of ratingField over top - bot for the dominant component]
+    #
+    # The dominant component is the one with the first usable horizon in
+    # (mukey, comppct_r DESC, hzdept_r) order.
+
+    with np.errstate(invalid="ignore"):
+        val = hz.num(ratingField)
+        hzdept = hz.num("hzdept_r")
+        hzdepb = hz.num("hzdepb_r")
+        compPct = hz.num("comppct_r")
+
+        # usable thickness from this horizon
+        hzT = np.minimum(hzdepb, bot) - np.maximum(hzdept, top)
+        mask = (compPct >= cutOff) & ~np.isnan(val) & ~np.isnan(hzdept) & ~np.isnan(hzdepb) & (hzT > 0)
+        aws = hzT * val
+
+    rows = np.flatnonzero(mask)
+    dMu = dict()
+
+    if len(rows) == 0:
+        return dMu
+
+    # first usable row per map unit, ties in OBJECTID order
+    order = rows[np.lexsort((hz.oid[rows], hzdept[rows], -compPct[rows], hz.muIndex[rows]))]
+    firstOfMu = np.ones(len(order), dtype=bool)
+    firstOfMu[1:] = hz.muIndex[order[1:]] != hz.muIndex[order[:-1]]
+    domRows = order[firstOfMu]
+
+    groups = hz.coIndex[mask]
+    sumT = _sums(groups, hzT[mask], hz.coCount)
+    sumV = _sums(groups, aws[mask], hz.coCount)
+
+    mukey = hz.raw["mukey"]
+    pct = hz.raw["comppct_r"]
+
+    for i in domRows:
+        g = hz.coIndex[i]
+
+        # calculate mean value for entire depth range
+        newval = float(sumV[g]) / float(sumT[g])
+        dMu[mukey[i]] = [pct[i], round(newval, 2)]
+
+    return dMu
+
+
+def weightedAverage(hz, ratingField, top, bot):
+    # dMu of AggregateHz_WTA_WTA: mukey: [sum of comppct_r, component percent
+    # and thickness weighted average of ratingField over top - bot]
+    #
+    # The loop rolled the components up to the map unit after every cursor
+    # row, not once at the end: each row added the current value of every
+    # component read so far to its map unit again. That is kept. The rows
+    # of a map unit are replayed one at a time; the repeats after its last
+    # row use the final component values and are added for all map units
+    # together, one array operation per row and component.
+
+    with np.errstate(invalid="ignore"):
+        val = hz.num(ratingField)
+        hzdept = hz.num("hzdept_r")
+        hzdepb = hz.num("hzdepb_r")
+        compPct = hz.num("comppct_r")
+
+        # usable thickness from this horizon
+        hzT = np.minimum(hzdepb, bot) - np.maximum(hzdept, top)
+        usable = ~np.isnan(hzdept) & ~np.isnan(hzdepb) & (hzT > 0)
+        aws = hzT * val * compPct
+
+    # cursor rows: ratingField IS NOT NULL in (mukey, comppct_r DESC,
+    # hzdept_r) order, ties in OBJECTID order
+    rows = np.flatnonzero(~np.isnan(val))
+    rows = rows[np.lexsort((hz.oid[rows], hzdept[rows], -compPct[rows], hz.muIndex[rows]))]
+    n = len(rows)
+
+    dMu = dict()
+
+    if n == 0:
+        return dMu
+
+    # last cursor row of each map unit
+    muRows = hz.muIndex[rows]
+    ends = np.flatnonzero(np.append(muRows[1:] != muRows[:-1], True))
+
+    cokey = hz.raw["cokey"]
+    mukey = hz.raw["mukey"]
+    pct = hz.raw["comppct_r"]
+
+    finished = list()   # (rows after the map unit, mukey, final component values)
+    start = 0
+
+    for end in ends:
+        m = mukey[rows[start]]
+        sumPct = 0
+        index = dict()      # cokey: position in the lists below
+        sumT = list()       # usable thickness by component
+        sumV = list()       # rating by component
+        mval = None
+
+        for i in rows[start:end + 1]:
+            if usable[i]:
+                k = index.get(cokey[i])
+
+                if k is None:
+                    index[cokey[i]] = len(sumT)
+                    sumT.append(float(hzT[i]))
+                    sumV.append(float(aws[i]))
+                    sumPct = sumPct + pct[i]
+
+                else:
+                    sumV[k] = sumV[k] + float(aws[i])
+                    sumT[k] = sumT[k] + float(hzT[i])
+
+            # roll the components read so far up to the map unit
+            for k in range(len(sumT)):
+                divisor = sumPct * sumT[k]
+                newval = sumV[k] / divisor if divisor > 0 else 0.0
+                mval = newval if mval is None else newval + mval
+
+        if len(sumT) > 0:
+            dMu[m] = [sumPct, mval]
+            values = [sumV[k] / (sumPct * sumT[k]) if sumPct * sumT[k] > 0 else 0.0 for k in range(len(sumT))]
+            finished.append((n - 1 - end, m, values))
+
+        start = end + 1
+
+    if len(finished) == 0:
+        return dMu
+
+    # every later row adds the final component values again, in component order
+    finished.sort(key=lambda f: -f[0])
+    repeats = [f[0] for f in finished]
+    width = max(len(f[2]) for f in finished)
+    values = np.zeros((len(finished), width))
+
+    for j, f in enumerate(finished):
+        values[j, :len(f[2])] = f[2]
+
+    mval = np.array([dMu[f[1]][1] for f in finished], dtype=np.float64)
+    active = len(finished)
+
+    for t in range(repeats[0]):
+        while repeats[active - 1] <= t:
+            active -= 1
+
+        for k in range(width):
+            mval[:active] = values[:active, k] + mval[:active]
+
+    for j, f in enumerate(finished):
+        dMu[f[1]][1] = float(mval[j])
+
+    return dMu
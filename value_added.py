@@ -52,55 +52,44 @@ def tabRequest(qry, name):
 
     try:
 
-        theURL = "https://sdmdataaccess.nrcs.usda.gov"
-        url = theURL + "/Tabular/SDMTabularService/post.rest"
+        url = sda_client.SDA_URL + sda_client.TABULAR_PATH
 
         # Create request using JSON, return data as JSON
         request = {}
         request["format"] = "JSON+COLUMNNAME+METADATA"
-        request["query"] = surfHorQuery
+        request["query"] = qry
 
-        data = urllib.parse.urlencode(request).encode('utf-8')
+        # Send request to SDA Tabular service over the shared keep-alive connection pool,
+        # unless the same query was already answered for this SSURGO version.
+        # The returned JSON string is converted into a Python dictionary.
+        qData = sda_cache.cachedPostJSON(url, request)
 
-        # Send request to SDA Tabular service using urllib2 library
-        # because we are passing the "data" argument, this is a POST request, not a GET
-        req = urllib.request.Request(url, data)
-
-        with urllib.request.urlopen(req) as response:
-            # read query results
-            qResults = response.read()
-
-            qResults = qResults.decode('utf-8')
-
-            # Convert the returned JSON string into a Python dictionary.
-            qData = json.loads(qResults)
-
-            # get rid of objects
-            del qResults, response, req
+        Msg = 'Successfully collected ' + name + ' for ' + ws[3:]
 
         return True, Msg, qData
 
 
     except socket.timeout as e:
-    Msg = 'Soil Data Access timeout error'
-    return False, Msg, None
+        Msg = 'Soil Data Access timeout error'
+        return False, Msg, None
 
     except socket.error as e:
-    Msg = 'Socket error: ' + str(e)
-    return False, Msg, None
+        Msg = 'Socket error: ' + str(e)
+        return False, Msg, None
 
     except HTTPError as e:
-    Msg = 'HTTP Error' + str(e)
-    return False, Msg, None
+        Msg = 'HTTP Error' + str(e)
+        return False, Msg, None
 
     except URLError as e:
-    Msg = 'URL Error' + str(e)
-    return False, Msg, None
+        Msg = 'URL Error' + str(e)
+        return False, Msg, None
 
     except:
-    errorMsg()
-    Msg = 'Unknown error collecting tabular data'
-    print(Msg)
+        errorMsg()
+        Msg = 'Unknown error collecting tabular data'
+        print(Msg)
+        return False, Msg, None
 
 
 def surfHoriz(keys):
@@ -159,14 +148,8 @@ def surfHoriz(keys):
                 columnInfo = resLst.pop(0)
 
 
-                newTable = CreateNewTable(outputTable, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
             else:
                 arcpy.AddWarning('\t' + surfMsg + " but recieved no records or does not match raster count")
@@ -230,14 +213,8 @@ def surfTex(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(outputTable, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
 
             else:
@@ -326,57 +303,40 @@ def geoRequest(aoi):
         #arcpy.AddMessage(gQry)
 
         arcpy.AddMessage('\t' + 'Sending coordinates to Soil Data Access...')
-        theURL = "https://sdmdataaccess.nrcs.usda.gov"
-        url = theURL + "/Tabular/SDMTabularService/post.rest"
+        url = sda_client.SDA_URL + sda_client.TABULAR_PATH
 
         # Create request using JSON, return data as JSON
         request = {}
         request["FORMAT"] = "JSON"
         request["QUERY"] = gQry
 
-        #json.dumps = serialize obj (request dictionary) to a JSON formatted str
-        data = json.dumps(request)
-
-        # Send request to SDA Tabular service using urllib2 library
-        # because we are passing the "data" argument, this is a POST request, not a GET
-        req = urllib2.Request(url, data)
-        response = urllib2.urlopen(req)
-
-        # read query results
-        qResults = response.read()
-
-        # Convert the returned JSON string into a Python dictionary.
-        qData = json.loads(qResults)
-
-        # get rid of objects
-        del qResults, response, req
-
-        # if dictionary key "Table" is found
-        if "Table" in qData:
+        # Send request to SDA Tabular service over the shared keep-alive connection pool.
+        # Polygons are parsed from the JSON response and inserted one at a time.
+        resLst = sda_client.getClient().postRows(url, request)  # All values come back as string
 
+        rows =  arcpy.da.InsertCursor(sdaWGS, ["SHAPE@WKT", "t_mukey", "mukey"])
 
-            # get its value
-            resLst = qData["Table"]  # Data as a list of lists. All values come back as string
+        keyDict = dict()
 
-            rows =  arcpy.da.InsertCursor(sdaWGS, ["SHAPE@WKT", "t_mukey", "mukey"])
+        for e in resLst:
 
-            keyDict = dict()
+            mukey = e[0]
+            imukey = int(e[0])
+            geog = e[1]
 
-            for e in resLst:
+            #arcpy.AddMessage(mukey)
 
-                mukey = e[0]
-                imukey = int(e[0])
-                geog = e[1]
+            if not mukey in keyDict:
+                keyDict[mukey] = int(mukey)
 
-                #arcpy.AddMessage(mukey)
+            value = geog, mukey, imukey
+            rows.insertRow(value)
 
-                if not mukey in keyDict:
-                    keyDict[mukey] = int(mukey)
+        del rows
 
-                value = geog, mukey, imukey
-                rows.insertRow(value)
+        # if any polygons came back
+        if keyDict:
 
-            del rows
             arcpy.AddMessage('\tReceived SSURGO polygons information successfully.')
 
 
@@ -472,14 +432,8 @@ def muaggat(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -685,14 +639,8 @@ def rootZnDep(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -942,14 +890,8 @@ def soc(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
             else:
@@ -1085,14 +1027,8 @@ def potWet(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1227,14 +1163,8 @@ def ksat50150(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1558,14 +1488,8 @@ def rootZnAwsDrt(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1682,14 +1606,8 @@ def om(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -1845,14 +1763,8 @@ def coarseFrag(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -2179,14 +2091,8 @@ def aws(keys):
                 columnNames = resLst.pop(0)
                 columnInfo = resLst.pop(0)
 
-                newTable = CreateNewTable(jTbl, columnNames, columnInfo)
-
-                with arcpy.da.InsertCursor(newTable, columnNames) as cursor:
-
-                    for row in resLst:
-                        cursor.insertRow(row)
-
-                arcpy.conversion.TableToTable(newTable, os.path.join(inDir, gdb), tbl)
+                # write the rows once, straight into the geodatabase table
+                table_writer.writeTable(os.path.join(inDir, gdb, tbl), columnNames, columnInfo, resLst)
 
                 return True, jTbl
 
@@ -2233,70 +2139,11 @@ def soilProfileTbl(keys):
         cVal = [key]
         cursor.insertRow(cVal)
 
-def CreateNewTable(newTable, columnNames, columnInfo):
-    # Create new table. Start with in-memory and then export to geodatabase table
-    #
-    # ColumnNames and columnInfo come from the Attribute query JSON string
-    # MUKEY would normally be included in the list, but it should already exist in the output featureclass
-    #
-    try:
-        # Dictionary: SQL Server to FGDB
-        dType = dict()
-
-        dType["int"] = "long"
-        dType["smallint"] = "short"
-        dType["bit"] = "short"
-        dType["varbinary"] = "blob"
-        dType["nvarchar"] = "text"
-        dType["varchar"] = "text"
-        dType["char"] = "text"
-        dType["datetime"] = "date"
-        dType["datetime2"] = "date"
-        dType["smalldatetime"] = "date"
-        dType["decimal"] = "double"
-        dType["numeric"] = "double"
-        dType["float"] ="double"
-
-        # numeric type conversion depends upon the precision and scale
-        dType["numeric"] = "float"  # 4 bytes
-        dType["real"] = "double" # 8 bytes
-
-        # Iterate through list of field names and add them to the output table
-        i = 0
-
-        # ColumnInfo contains:
-        # ColumnOrdinal, ColumnSize, NumericPrecision, NumericScale, ProviderType, IsLong, ProviderSpecificDataType, DataTypeName
-        #PrintMsg(" \nFieldName, Length, Precision, Scale, Type", 1)
-
-        joinFields = list()
-        outputTbl = os.path.join("IN_MEMORY", os.path.basename(newTable))
-        arcpy.CreateTable_management(os.path.dirname(outputTbl), os.path.basename(outputTbl))
-
-        for i, fldName in enumerate(columnNames):
-            vals = columnInfo[i].split(",")
-            length = int(vals[1].split("=")[1])
-            precision = int(vals[2].split("=")[1])
-            scale = int(vals[3].split("=")[1])
-            dataType = dType[vals[4].lower().split("=")[1]]
-
-            if fldName.lower().endswith("key"):
-                # Per SSURGO standards, key fields should be string. They come from Soil Data Access as long integer.
-                dataType = 'text'
-                length = 30
-
-            arcpy.AddField_management(outputTbl, fldName, dataType, precision, scale, length)
-
-
-        return outputTbl
-
-    except:
-        errorMsg()
-        return False
-
 #===============================================================================
 
 import sys, os, json, socket, arcpy, urllib.request, traceback, datetime
 from urllib.request import HTTPError, URLError
+import sda_client, sda_cache, table_writer
 
 from arcpy import env
 